@@ -0,0 +1,68 @@
+"""
+界面启动耗时检查（发布前运行）
+
+在新的解释器中创建 HomeWindow 并显示，测量到首个窗口出现的时间，
+并确认启动时没有导入 matplotlib / seaborn / tensorflow 等重量级后端。
+超出预算或导入了禁止的模块时退出码为 1。
+用法: python check_startup.py [--budget-ms 1500]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+DEFAULT_BUDGET_MS = 1500
+# 首页显示时不应加载的模块（只在分析 / 可视化 / 导出时按需导入）
+FORBIDDEN_MODULES = ("matplotlib", "seaborn", "tensorflow", "torch", "numpy", "PIL")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+from src.gui.home_window import HomeWindow
+app = QApplication(sys.argv)
+window = HomeWindow()
+window.show()
+app.processEvents()
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({"elapsed_ms": elapsed, "modules": sorted(m for m in sys.modules if "." not in m)}))
+"""
+
+
+def measure() -> dict:
+    """在子进程中启动界面，返回耗时与已导入的顶层模块"""
+    env = dict(os.environ)
+    if sys.platform.startswith("linux") and not env.get("DISPLAY") and not env.get("WAYLAND_DISPLAY"):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    result = subprocess.run([sys.executable, "-c", _PROBE], cwd=Path(__file__).parent, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"界面启动失败:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="检查界面启动耗时与导入的模块")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="到首个窗口显示的时间预算（毫秒）")
+    parser.add_argument("--runs", type=int, default=3, help="测量次数，取最小值")
+    args = parser.parse_args()
+
+    samples = [measure() for _ in range(max(1, args.runs))]
+    elapsed = min(s["elapsed_ms"] for s in samples)
+    loaded = sorted(set(FORBIDDEN_MODULES).intersection(samples[0]["modules"]))
+
+    print(f"首个窗口显示用时: {elapsed:.0f}ms（预算 {args.budget_ms:.0f}ms）")
+    ok = True
+    if elapsed > args.budget_ms:
+        print("超出启动时间预算", file=sys.stderr)
+        ok = False
+    if loaded:
+        print(f"启动时导入了重量级模块: {', '.join(loaded)}", file=sys.stderr)
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
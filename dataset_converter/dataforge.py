@@ -0,0 +1,10 @@
+import multiprocessing
+import sys
+
+from src.cli import main
+
+
+if __name__ == "__main__":
+    # 打包为可执行文件时进程池子进程需要
+    multiprocessing.freeze_support()
+    sys.exit(main())
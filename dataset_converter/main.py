@@ -1,4 +1,5 @@
-﻿import sys
+﻿import multiprocessing
+import sys
 from pathlib import Path
 
 from PyQt5.QtWidgets import QApplication
@@ -21,4 +22,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包为可执行文件时进程池子进程需要
+    multiprocessing.freeze_support()
     main()
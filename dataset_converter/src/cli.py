@@ -0,0 +1,312 @@
+"""
+dataforge 命令行入口（无界面，适合批处理服务器）
+
+参数解析只用标准库；各子命令执行时才导入所需的核心模块，
+不会导入 PyQt5 / matplotlib / seaborn / tensorflow，启动开销只有解释器本身。
+用法: python dataforge.py <子命令> -h
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+# 与 core.converter.PARSERS 的键保持一致（此处不导入 converter，避免启动时加载 numpy 等依赖）
+FORMATS = ("yolo", "yolo_seg", "voc", "json", "coco", "tfrecord")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp")
+
+
+def _dump(data, output: Optional[Path]) -> None:
+    """输出 JSON：指定 output 时写入文件，否则打印到标准输出"""
+    text = json.dumps(data, ensure_ascii=False, indent=2, default=str)
+    if output is None:
+        print(text)
+    else:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(text, encoding="utf-8")
+        print(f"结果已保存: {output}")
+
+
+def _parser(fmt: str, args):
+    from .core.converter import new_parser
+    parser = new_parser(fmt)
+    parser.set_parallel(args.workers, args.chunk_size)
+    return parser
+
+
+def _image_files(dataset_dir: Path) -> List[Path]:
+    """标准结构取 images/<子集>/ 下的图片，否则取目录本身（不递归）"""
+    from .core.dataset_index import DatasetIndex, scan_files
+    index = DatasetIndex.build(dataset_dir)
+    if index.images_dir.is_dir():
+        return [f for subset in index.subsets.values() for f in subset.image_files]
+    return scan_files(dataset_dir, IMAGE_EXTS)
+
+
+# ---- 子命令 ----
+
+def cmd_convert(args) -> int:
+    from .core.converter import PARSERS, convert
+    if args.to == "json":
+        PARSERS["json"].set_output_mode(args.json_mode, args.shard_size, args.compression)
+    label_map = json.loads(args.label_map.read_text(encoding="utf-8")) if args.label_map else None
+    convert(args.input, args.from_format, args.output, args.to, label_map,
+            workers=args.workers, chunk_size=args.chunk_size, incremental=args.incremental)
+    return 0
+
+
+def cmd_analyze(args) -> int:
+    from .core.dataset_analyzer import DatasetAnalyzer
+    result = DatasetAnalyzer().analyze_dataset(args.dataset, args.format)
+    if "error" in result:
+        print(f"错误: {result['error']}", file=sys.stderr)
+        return 1
+    if not args.full:
+        # 默认只输出摘要，不含累加器状态（直方图与分位数草图）
+        result.pop("accumulators", None)
+    _dump(result, args.output)
+    return 0
+
+
+def cmd_validate(args) -> int:
+    from .core.dataset_validator import DatasetValidator
+    info = DatasetValidator.get_dataset_info(args.dataset)
+    _dump(info, args.output)
+    if not info["is_valid"]:
+        print(f"数据集无效: {info['message']}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_dedup(args) -> int:
+    from .core.dataset_comparator import DatasetComparator
+    files = _image_files(args.dataset)
+    groups = DatasetComparator().find_identical_files(files)
+    print(f"检查 {len(files)} 张图片，发现 {len(groups)} 组重复文件")
+    _dump([[str(f) for f in group] for group in groups], args.output)
+    return 0
+
+
+def cmd_verify(args) -> int:
+    from .core.image_verify import LEVELS, ImageVerifier
+    files = _image_files(args.dataset)
+    verifier = ImageVerifier(LEVELS[args.level], args.decode_timeout, args.workers, args.chunk_size)
+    results = verifier.verify(files)
+    broken = {str(f): r.error for f, r in zip(files, results) if not r.ok}
+    inconclusive = sum(1 for r in results if r.inconclusive)
+    print(f"校验 {len(files)} 张图片（{args.level}，缓存命中 {verifier.stats['cache_hits']}），"
+          f"发现 {len(broken)} 张损坏")
+    if inconclusive:
+        print(f"{inconclusive} 张图片无法由 quick 校验判定，可用 --level full 确认")
+    _dump(broken, args.output)
+    return 1 if broken else 0
+
+
+def cmd_near_dup(args) -> int:
+    from .core.near_dedup import NearDuplicateFinder, dataset_splits, split_leakage
+    split_of = dataset_splits(args.dataset)
+    files = list(split_of) if split_of else _image_files(args.dataset)
+    finder = NearDuplicateFinder(args.radius, args.hash, args.workers, args.chunk_size)
+    clusters = finder.find(files)
+    leaks = split_leakage(finder.pairs, split_of)
+    print(f"检查 {len(files)} 张图片，发现 {len(clusters)} 组近似重复图片")
+    for name, images in leaks.items():
+        print(f"{name} 中有 {len(images)} 张图片与 train 近似重复")
+    _dump({
+        "clusters": [[str(f) for f in group] for group in clusters],
+        "leakage": {name: {str(img): [[str(other), dist] for other, dist in matches]
+                           for img, matches in images.items()}
+                    for name, images in leaks.items()},
+        "unreadable": [str(f) for f in finder.unreadable],
+    }, args.output)
+    return 0
+
+
+def cmd_split(args) -> int:
+    import random
+    from .core.dataset_organizer import DatasetOrganizer
+    if args.seed is not None:
+        random.seed(args.seed)
+    counts = DatasetOrganizer().split_dataset(args.dataset, args.output, args.train, args.val, args.test)
+    print(f"划分完成: 训练 {counts['train']}，验证 {counts['val']}，测试 {counts['test']}")
+    return 0
+
+
+def cmd_merge(args) -> int:
+    from .core.dataset_organizer import DatasetOrganizer
+    total = DatasetOrganizer().merge_datasets(args.datasets, args.output)
+    print(f"合并完成: 共 {total} 张图片 → {args.output}")
+    return 0
+
+
+def cmd_export_coco(args) -> int:
+    from .core.dataset_exporter import DatasetExporter
+    if not DatasetExporter().export_coco_format(args.dataset, args.output, args.name):
+        return 1
+    print(f"COCO 文件已保存: {args.output}")
+    return 0
+
+
+def cmd_export_tfrecord(args) -> int:
+    from .core.tfrecord_exporter import TFRecordExporter
+    exporter = TFRecordExporter(shard_size=args.shard_size, val_ratio=args.val_ratio)
+    exporter.set_parallel(args.workers, args.chunk_size)
+    parser = _parser(args.from_format, args)
+    parser.set_export_target(writes_polygons=False)  # TFRecord 只写矩形框
+    exporter.export(parser.iter_parse(args.input), args.output)
+    if args.verify_tf:
+        return _verify_tfrecords(args.output)
+    return 0
+
+
+def _verify_tfrecords(output_dir: Path) -> int:
+    from .utils.tfrecord import verify_with_tensorflow
+    failed = 0
+    for path in sorted(output_dir.glob("*.tfrecord")):
+        ok = verify_with_tensorflow(path)
+        if ok is None:
+            print("未安装 TensorFlow，跳过校验")
+            return 0
+        if not ok:
+            print(f"TensorFlow 校验失败: {path}")
+            failed += 1
+    print(f"TensorFlow 校验完成，失败 {failed} 个文件")
+    return 1 if failed else 0
+
+
+def cmd_quality(args) -> int:
+    from .core.image_verify import LEVELS
+    from .core.quality_checker import QualityChecker
+    parser = _parser(args.format, args)
+    checker = QualityChecker()
+    checker.set_parallel(args.workers, args.chunk_size)
+    checker.set_verify(LEVELS[args.verify], args.decode_timeout)
+    if args.incremental:
+        report = checker.check_incremental(parser, args.dataset, args.format)
+    else:
+        report = checker.check_dataset(parser.parse(args.dataset))
+    summary = report["summary"]
+    print(f"图片 {summary['total_images']} 张，问题 {summary['total_issues']} 个，"
+          f"健康度 {summary['health_score']:.1f}/100")
+    if args.output is not None:
+        if args.output.suffix.lower() in (".html", ".htm"):
+            checker.save_html_report(report, args.output)
+        else:
+            checker.save_report(report, args.output)
+    return 0
+
+
+# ---- 参数 ----
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    group = common.add_argument_group("并行与缓存")
+    group.add_argument("-j", "--workers", type=int, default=None,
+                       help="进程数，0 表示 CPU 核数，1 表示串行（默认沿用各模块设置）")
+    group.add_argument("--chunk-size", type=int, default=None, help="每次提交给子进程的文件数")
+    group.add_argument("--cache-path", type=Path, default=None, help="图片元数据缓存（SQLite）路径")
+    group.add_argument("--no-cache", action="store_true", help="不使用图片元数据缓存")
+
+    parser = argparse.ArgumentParser(prog="dataforge", description="数据集转换与分析工具（命令行）")
+    sub = parser.add_subparsers(dest="command", metavar="<子命令>")
+    sub.required = True
+
+    def add(name: str, func, help_text: str) -> argparse.ArgumentParser:
+        p = sub.add_parser(name, parents=[common], help=help_text, description=help_text)
+        p.set_defaults(func=func)
+        return p
+
+    p = add("convert", cmd_convert, "格式转换（images/<子集> + labels/<子集> 结构）")
+    p.add_argument("input", type=Path, help="输入数据集目录")
+    p.add_argument("output", type=Path, help="输出目录")
+    p.add_argument("-f", "--from", dest="from_format", required=True, choices=FORMATS, help="输入格式")
+    p.add_argument("-t", "--to", required=True, choices=FORMATS, help="输出格式")
+    p.add_argument("--label-map", type=Path, help="标签映射 JSON 文件（名称→id）")
+    p.add_argument("--incremental", action="store_true", help="增量转换：只处理新增 / 变化 / 删除的源文件")
+    p.add_argument("--json-mode", choices=("files", "jsonl", "batch"), default="files", help="JSON 输出方式")
+    p.add_argument("--shard-size", type=int, default=None, help="JSONL 每个分片的记录数")
+    p.add_argument("--compression", choices=("none", "gzip", "zstd"), default=None, help="JSONL / 批量 JSON 压缩")
+
+    p = add("analyze", cmd_analyze, "数据集统计分析（图片与 .txt / .json 标注在同一目录）")
+    p.add_argument("dataset", type=Path)
+    p.add_argument("--format", choices=("yolo", "json"), default="yolo")
+    p.add_argument("--full", action="store_true", help="同时输出累加器状态（直方图与分位数草图，可与其他结果合并）")
+    p.add_argument("-o", "--output", type=Path, help="结果 JSON 文件（默认打印）")
+
+    p = add("validate", cmd_validate, "检查数据集目录结构与格式，无效时退出码为 1")
+    p.add_argument("dataset", type=Path)
+    p.add_argument("-o", "--output", type=Path, help="结果 JSON 文件（默认打印）")
+
+    p = add("dedup", cmd_dedup, "查找内容完全相同的图片")
+    p.add_argument("dataset", type=Path, help="标准结构数据集或图片目录")
+    p.add_argument("-o", "--output", type=Path, help="重复文件分组 JSON 文件（默认打印）")
+
+    p = add("verify", cmd_verify, "校验图片完整性，发现损坏图片时退出码为 1")
+    p.add_argument("dataset", type=Path, help="标准结构数据集或图片目录")
+    p.add_argument("--level", choices=("quick", "full"), default="quick",
+                   help="quick 只检查文件头与结束标记，full 解码全部像素")
+    p.add_argument("--decode-timeout", type=float, default=30.0, help="full 校验单张图片的超时（秒），0 表示不限")
+    p.add_argument("-o", "--output", type=Path, help="损坏图片及原因 JSON 文件（默认打印）")
+
+    p = add("near-dup", cmd_near_dup, "查找近似重复图片（重新编码 / 缩放 / 压缩的副本）及 train 与 val/test 间的泄漏")
+    p.add_argument("dataset", type=Path, help="标准结构数据集或图片目录")
+    p.add_argument("--radius", type=int, default=6, help="感知哈希的汉明距离阈值（0~16）")
+    p.add_argument("--hash", choices=("phash", "dhash"), default="phash", help="感知哈希类型")
+    p.add_argument("-o", "--output", type=Path, help="重复组与泄漏 JSON 文件（默认打印）")
+
+    p = add("split", cmd_split, "把平铺目录（图片与 .txt 同目录）划分为 train/val/test")
+    p.add_argument("dataset", type=Path)
+    p.add_argument("output", type=Path)
+    p.add_argument("--train", type=float, default=0.7)
+    p.add_argument("--val", type=float, default=0.2)
+    p.add_argument("--test", type=float, default=0.1)
+    p.add_argument("--seed", type=int, default=None, help="随机种子（指定后划分可复现）")
+
+    p = add("merge", cmd_merge, "合并多个平铺目录并统一重命名")
+    p.add_argument("datasets", type=Path, nargs="+")
+    p.add_argument("-o", "--output", type=Path, required=True)
+
+    p = add("export-coco", cmd_export_coco, "把平铺的 YOLO 目录导出为 COCO 文件")
+    p.add_argument("dataset", type=Path)
+    p.add_argument("output", type=Path, help="COCO JSON 文件路径")
+    p.add_argument("--name", default="Custom Dataset", help="info.description")
+
+    p = add("export-tfrecord", cmd_export_tfrecord, "导出为分片 TFRecord（不需要 TensorFlow）")
+    p.add_argument("input", type=Path)
+    p.add_argument("output", type=Path)
+    p.add_argument("-f", "--from", dest="from_format", required=True, choices=FORMATS, help="输入格式")
+    p.add_argument("--shard-size", type=int, default=1024, help="每个分片的记录数")
+    p.add_argument("--val-ratio", type=float, default=0.2, help="不在 images/<子集>/ 下的图片划入 val 的比例")
+    p.add_argument("--verify-tf", action="store_true", help="导出后用 TensorFlow 交叉校验各分片（未安装时跳过）")
+
+    p = add("quality", cmd_quality, "数据质量检查")
+    p.add_argument("dataset", type=Path)
+    p.add_argument("--format", choices=FORMATS, default="yolo")
+    p.add_argument("--incremental", action="store_true",
+                   help="增量检查：结果保存在数据集目录，只重新检查有变化的文件")
+    p.add_argument("--verify", choices=("quick", "full"), default="quick",
+                   help="图片完整性校验级别：quick 只检查文件头与结束标记，full 解码全部像素")
+    p.add_argument("--decode-timeout", type=float, default=30.0, help="full 校验单张图片的超时（秒），0 表示不限")
+    p.add_argument("-o", "--output", type=Path, help="报告文件（.json 或 .html）")
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.no_cache or args.cache_path is not None:
+        from .utils.metadata_cache import configure_metadata_cache
+        configure_metadata_cache(enabled=False if args.no_cache else None, path=args.cache_path)
+
+    start = time.perf_counter()
+    try:
+        code = args.func(args)
+    except KeyboardInterrupt:
+        print("已中断", file=sys.stderr)
+        return 130
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    print(f"完成，用时 {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return code
@@ -1,11 +1,18 @@
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 import shutil
-from PIL import Image
+import numpy as np
+
+from .yolo_decoder import YOLOLabelBatch, iter_label_batches
+from .dedup import find_duplicate_files
+from .image_verify import FULL, QUICK, ImageVerifier
+from ..utils.metadata_cache import cached_image_size
 
 class AnnotationFixer:
     """标注修复器"""
     
+    verify_level: int = QUICK  # 筛查图片损坏所用的校验级别，见 image_verify.py；删除前总是用 FULL 确认
+    
     def __init__(self):
         self.fixes_applied = []
         self.backup_dir = None
@@ -25,10 +32,19 @@ class AnnotationFixer:
         }
         
         image_files = list(dataset_dir.glob('*.jpg')) + list(dataset_dir.glob('*.png'))
+        pairs: List[Tuple[Path, Path]] = []
         
-        for img_file in image_files:
-            # 检查图片是否有效
-            if not self._is_valid_image(img_file):
+        # 批量校验图片完整性（缓存中已有结论的不再读取）
+        verdicts = ImageVerifier(self.verify_level).verify(image_files)
+        # QUICK 的结构检查可能误判，要删除的文件先解码确认
+        suspects = [k for k, verdict in enumerate(verdicts) if not verdict.ok and verdict.level < FULL]
+        if suspects:
+            confirmed = ImageVerifier(FULL).verify([image_files[k] for k in suspects])
+            for k, verdict in zip(suspects, confirmed):
+                verdicts[k] = verdict
+        for img_file, verdict in zip(image_files, verdicts):
+            # 只删除解码失败的图片（解码超时无法判定，不删除）
+            if not verdict.ok and not verdict.timed_out:
                 img_file.unlink()
                 txt_file = img_file.with_suffix('.txt')
                 if txt_file.exists():
@@ -44,11 +60,15 @@ class AnnotationFixer:
                 fixes['missing_annotations_created'] += 1
                 continue
             
-            # 修复标注文件
-            fixed_content = self._fix_annotation_file(txt_file, img_file)
-            if fixed_content is not None:
-                txt_file.write_text(fixed_content, encoding='utf-8')
-                fixes['coordinate_fixes'] += 1
+            pairs.append((txt_file, img_file))
+        
+        # 批量解码并修复标注文件
+        for start, batch in iter_label_batches([txt_file for txt_file, _ in pairs]):
+            img_files = [img_file for _, img_file in pairs[start:start + len(batch)]]
+            for txt_file, fixed_content in zip(batch.files, self._fix_annotation_batch(batch, img_files)):
+                if fixed_content is not None:
+                    txt_file.write_text(fixed_content, encoding='utf-8')
+                    fixes['coordinate_fixes'] += 1
         
         # 移除重复文件
         duplicates = self._find_and_remove_duplicates(dataset_dir)
@@ -62,99 +82,61 @@ class AnnotationFixer:
             shutil.rmtree(backup_dir)
         shutil.copytree(src_dir, backup_dir)
     
-    def _is_valid_image(self, img_file: Path) -> bool:
-        """检查图片是否有效"""
-        try:
-            with Image.open(img_file) as img:
-                img.verify()
-            return True
-        except:
-            return False
-    
-    def _fix_annotation_file(self, txt_file: Path, img_file: Path) -> str:
-        """修复标注文件"""
-        try:
-            content = txt_file.read_text(encoding='utf-8').strip()
-            if not content:
-                return ''  # 空文件保持空
-            
-            # 获取图片尺寸
-            with Image.open(img_file) as img:
-                width, height = img.size
-            
-            lines = content.split('\n')
-            fixed_lines = []
-            has_fixes = False
-            
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                parts = line.split()
-                if len(parts) < 5:
-                    continue  # 跳过格式错误的行
-                
-                try:
-                    class_id = parts[0]
-                    coords = [float(x) for x in parts[1:]]
-                    
-                    # 修复坐标范围
-                    fixed_coords = []
-                    for coord in coords:
-                        if coord < 0:
-                            fixed_coords.append(0.0)
-                            has_fixes = True
-                        elif coord > 1:
-                            fixed_coords.append(1.0)
-                            has_fixes = True
-                        else:
-                            fixed_coords.append(coord)
-                    
-                    # 重建行
-                    coord_str = ' '.join(f'{c:.6f}' for c in fixed_coords)
-                    fixed_lines.append(f'{class_id} {coord_str}')
-                    
-                except ValueError:
-                    continue  # 跳过无法解析的行
+    def _fix_annotation_batch(self, batch: YOLOLabelBatch, img_files: List[Path]) -> List[Optional[str]]:
+        """
+        修复一批已解码的标注文件，返回每个文件的新内容：
+        None 表示无需修改；坐标越界时整体截断到 [0,1] 并重建（丢弃无法解析的行）；
+        空文件、读取失败或图片尺寸不可读时返回空内容。
+        """
+        n = len(batch)
+        # 向量化检查坐标越界，统计到文件
+        det_out = ((batch.det_xywh < 0) | (batch.det_xywh > 1)).any(axis=1)
+        seg_out = (batch.seg_coords < 0) | (batch.seg_coords > 1)
+        seg_coord_file = np.repeat(batch.seg_file, np.diff(batch.seg_offsets))
+        has_fixes = (np.bincount(batch.det_file, weights=det_out, minlength=n)
+                     + np.bincount(seg_coord_file, weights=seg_out, minlength=n)) > 0
+        det_xywh = np.clip(batch.det_xywh, 0.0, 1.0)
+        seg_coords = np.clip(batch.seg_coords, 0.0, 1.0)
+        
+        results: List[Optional[str]] = []
+        for i, img_file in enumerate(img_files):
+            if not batch.readable[i] or batch.line_counts[i] == 0:
+                results.append('')  # 空文件保持空
+                continue
+            if cached_image_size(img_file) is None:
+                results.append('')  # 无法读取图片尺寸
+                continue
+            if not has_fixes[i]:
+                results.append(None)  # 没有修复，不需要重写文件
+                continue
             
-            if has_fixes:
-                return '\n'.join(fixed_lines)
-            else:
-                return None  # 没有修复，不需要重写文件
-                
-        except Exception:
-            return ''  # 出错时返回空内容
+            # 按原始行号重建
+            lines = []
+            r = batch.det_range(i)
+            for j in range(r.start, r.stop):
+                coord_str = ' '.join(f'{c:.6f}' for c in det_xywh[j])
+                lines.append((int(batch.det_line[j]), f'{batch.det_class[j]} {coord_str}'))
+            r = batch.seg_range(i)
+            for j in range(r.start, r.stop):
+                coord_str = ' '.join(f'{c:.6f}' for c in seg_coords[batch.seg_offsets[j]:batch.seg_offsets[j + 1]])
+                lines.append((int(batch.seg_line[j]), f'{batch.seg_class[j]} {coord_str}'))
+            lines.sort()
+            results.append('\n'.join(line for _, line in lines))
+        return results
     
     def _find_and_remove_duplicates(self, dataset_dir: Path) -> List[str]:
-        """查找并移除重复文件"""
-        from collections import defaultdict
-        import hashlib
-        
-        file_hashes = defaultdict(list)
+        """查找并移除重复文件：每组内容相同的图片保留第一个"""
         image_files = list(dataset_dir.glob('*.jpg')) + list(dataset_dir.glob('*.png'))
         
-        # 计算文件哈希
-        for img_file in image_files:
-            try:
-                with open(img_file, 'rb') as f:
-                    file_hash = hashlib.md5(f.read()).hexdigest()
-                file_hashes[file_hash].append(img_file)
-            except:
-                continue
-        
-        # 移除重复文件
         removed_files = []
-        for file_hash, files in file_hashes.items():
-            if len(files) > 1:
-                # 保留第一个，删除其余的
-                for duplicate_file in files[1:]:
-                    # 删除图片和对应的标注文件
-                    duplicate_file.unlink()
-                    txt_file = duplicate_file.with_suffix('.txt')
-                    if txt_file.exists():
-                        txt_file.unlink()
-                    removed_files.append(duplicate_file.name)
+        for files in find_duplicate_files(image_files):
+            for duplicate_file in files[1:]:
+                # 删除图片和对应的标注文件
+                duplicate_file.unlink()
+                txt_file = duplicate_file.with_suffix('.txt')
+                if txt_file.exists():
+                    txt_file.unlink()
+                removed_files.append(duplicate_file.name)
         
         return removed_files
     
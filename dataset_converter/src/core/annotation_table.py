@@ -0,0 +1,357 @@
+"""
+列式标注存储
+
+BBox / Polygon 每个实例都带 __dict__ 与独立的标签字符串，千万级框时内存以 GB 计。
+AnnotationTable 把整个数据集的标注存为若干 NumPy 列：
+    图片：路径与源标签文件列表、宽高 (int32)
+    矩形框：图片下标 / 类别 id (int32)、坐标 xmin ymin xmax ymax (int32, N×4)
+    多边形：图片下标 / 类别 id (int32)、顶点偏移 (int64) 与扁平坐标 (float32)
+    标签：驻留表，每个标签字符串只保存一份
+同一图片的框 / 多边形连续存放，按图片切片即为零拷贝视图。
+table[i] 返回的 ImageView 提供与 ImageAnnotation 相同的属性，现有分析、质检和导出代码可直接使用。
+"""
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from .base_parser import BBox, ImageAnnotation, Polygon
+
+
+class LabelTable:
+    """标签驻留表：label ↔ 类别 id"""
+
+    def __init__(self, names: Optional[Iterable[str]] = None):
+        self.names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        for name in names or []:
+            self.intern(name)
+
+    def intern(self, name: str) -> int:
+        cid = self._ids.get(name)
+        if cid is None:
+            cid = len(self.names)
+            self._ids[name] = cid
+            self.names.append(name)
+        return cid
+
+    def id_of(self, name: str) -> Optional[int]:
+        return self._ids.get(name)
+
+    def __getitem__(self, cid: int) -> str:
+        return self.names[cid]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class BoxView:
+    """表中一个矩形框的视图，属性与 BBox 相同，赋值直接写回表"""
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table: "AnnotationTable", row: int):
+        self._table = table
+        self._row = row
+
+    def _get(self, col: int) -> int:
+        return int(self._table.box_coords[self._row, col])
+
+    def _set(self, col: int, value) -> None:
+        self._table.box_coords[self._row, col] = value
+
+    xmin = property(lambda self: self._get(0), lambda self, v: self._set(0, v))
+    ymin = property(lambda self: self._get(1), lambda self, v: self._set(1, v))
+    xmax = property(lambda self: self._get(2), lambda self, v: self._set(2, v))
+    ymax = property(lambda self: self._get(3), lambda self, v: self._set(3, v))
+
+    @property
+    def label(self) -> str:
+        return self._table.labels[int(self._table.box_class[self._row])]
+
+    @label.setter
+    def label(self, value: str) -> None:
+        self._table.box_class[self._row] = self._table.labels.intern(value)
+
+    def to_bbox(self) -> BBox:
+        xmin, ymin, xmax, ymax = (int(v) for v in self._table.box_coords[self._row])
+        return BBox(xmin=xmin, ymin=ymin, xmax=xmax, ymax=ymax, label=self.label)
+
+    def __repr__(self) -> str:
+        return f"BoxView({self.to_bbox()!r})"
+
+
+class PolygonView:
+    """
+    表中一个多边形的视图：coords 为零拷贝 float32 数组，points 返回与 Polygon 相同的 float 列表。
+    坐标以 float32 存储，归一化坐标精度约 1e-7，足够写出 6 位小数。
+    """
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table: "AnnotationTable", row: int):
+        self._table = table
+        self._row = row
+
+    @property
+    def coords(self) -> np.ndarray:
+        offsets = self._table.poly_offsets
+        return self._table.poly_coords[offsets[self._row]:offsets[self._row + 1]]
+
+    @property
+    def points(self) -> List[float]:
+        return self.coords.tolist()
+
+    @property
+    def label(self) -> str:
+        return self._table.labels[int(self._table.poly_class[self._row])]
+
+    @label.setter
+    def label(self, value: str) -> None:
+        self._table.poly_class[self._row] = self._table.labels.intern(value)
+
+    def to_polygon(self) -> Polygon:
+        return Polygon(points=self.points, label=self.label)
+
+    def __repr__(self) -> str:
+        return f"PolygonView({self.to_polygon()!r})"
+
+
+class _RowsView(Sequence):
+    """某张图片的框 / 多边形序列，按需创建行视图"""
+
+    __slots__ = ("_table", "_start", "_stop", "_factory")
+
+    def __init__(self, table: "AnnotationTable", start: int, stop: int, factory):
+        self._table = table
+        self._start = start
+        self._stop = stop
+        self._factory = factory
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._factory(self._table, self._start + i)
+
+    def __iter__(self):
+        for row in range(self._start, self._stop):
+            yield self._factory(self._table, row)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class ImageView:
+    """表中一张图片的视图，提供 ImageAnnotation 的 image_path / width / height / boxes / polygons / source"""
+
+    __slots__ = ("_table", "index")
+
+    def __init__(self, table: "AnnotationTable", index: int):
+        self._table = table
+        self.index = index
+
+    @property
+    def image_path(self) -> Path:
+        return self._table.image_paths[self.index]
+
+    @image_path.setter
+    def image_path(self, value) -> None:
+        self._table.image_paths[self.index] = Path(value)
+
+    @property
+    def source(self) -> Optional[Path]:
+        return self._table.sources[self.index]
+
+    @source.setter
+    def source(self, value) -> None:
+        self._table.sources[self.index] = None if value is None else Path(value)
+
+    width = property(lambda self: int(self._table.widths[self.index]),
+                     lambda self, v: self._table.widths.__setitem__(self.index, v))
+    height = property(lambda self: int(self._table.heights[self.index]),
+                      lambda self, v: self._table.heights.__setitem__(self.index, v))
+
+    @property
+    def boxes(self) -> Sequence[BoxView]:
+        offsets = self._table.box_image_offsets
+        return _RowsView(self._table, int(offsets[self.index]), int(offsets[self.index + 1]), BoxView)
+
+    @property
+    def polygons(self) -> Optional[Sequence[PolygonView]]:
+        offsets = self._table.poly_image_offsets
+        start, stop = int(offsets[self.index]), int(offsets[self.index + 1])
+        if start == stop and not self._table.has_polygon_list[self.index]:
+            return None
+        return _RowsView(self._table, start, stop, PolygonView)
+
+    # 零拷贝的数组切片，供向量化计算使用
+    @property
+    def box_coords(self) -> np.ndarray:
+        offsets = self._table.box_image_offsets
+        return self._table.box_coords[offsets[self.index]:offsets[self.index + 1]]
+
+    @property
+    def box_class(self) -> np.ndarray:
+        offsets = self._table.box_image_offsets
+        return self._table.box_class[offsets[self.index]:offsets[self.index + 1]]
+
+    def to_annotation(self) -> ImageAnnotation:
+        """物化为普通的 ImageAnnotation（拷贝）"""
+        polygons = self.polygons
+        return ImageAnnotation(
+            image_path=self.image_path,
+            width=self.width,
+            height=self.height,
+            boxes=[b.to_bbox() for b in self.boxes],
+            polygons=None if polygons is None else [p.to_polygon() for p in polygons],
+            source=self.source,
+        )
+
+    def __repr__(self) -> str:
+        return (f"ImageView(index={self.index}, image_path={self.image_path!r}, "
+                f"width={self.width}, height={self.height}, boxes={len(self.boxes)})")
+
+
+class AnnotationTable:
+    """数据集全部标注的列式存储，使用 AnnotationTableBuilder 或 from_annotations 构建"""
+
+    def __init__(self, image_paths: List[Path], widths: np.ndarray, heights: np.ndarray,
+                 has_polygon_list: np.ndarray, labels: LabelTable,
+                 box_image: np.ndarray, box_class: np.ndarray, box_coords: np.ndarray,
+                 poly_image: np.ndarray, poly_class: np.ndarray,
+                 poly_offsets: np.ndarray, poly_coords: np.ndarray,
+                 sources: Optional[List[Optional[Path]]] = None):
+        self.image_paths = image_paths
+        self.sources = sources if sources is not None else [None] * len(image_paths)  # 产生标注的源标签文件
+        self.widths = widths
+        self.heights = heights
+        self.has_polygon_list = has_polygon_list  # 区分 polygons=None 与空列表
+        self.labels = labels
+        self.box_image = box_image
+        self.box_class = box_class
+        self.box_coords = box_coords
+        self.poly_image = poly_image
+        self.poly_class = poly_class
+        self.poly_offsets = poly_offsets
+        self.poly_coords = poly_coords
+
+        # 框 / 多边形按图片连续存放，每张图片的行范围为 [offsets[i], offsets[i+1])
+        n = len(image_paths)
+        self.box_image_offsets = np.searchsorted(box_image, np.arange(n + 1)).astype(np.int64)
+        self.poly_image_offsets = np.searchsorted(poly_image, np.arange(n + 1)).astype(np.int64)
+
+    @classmethod
+    def from_annotations(cls, annotations: Iterable[ImageAnnotation],
+                         labels: Optional[LabelTable] = None) -> "AnnotationTable":
+        """从 ImageAnnotation 列表或 iter_parse 流构建（流式追加，不保留中间对象）"""
+        builder = AnnotationTableBuilder(labels)
+        for ann in annotations:
+            builder.append(ann)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.image_paths)
+
+    def __getitem__(self, index: int) -> ImageView:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return ImageView(self, index)
+
+    def __iter__(self) -> Iterator[ImageView]:
+        for i in range(len(self)):
+            yield ImageView(self, i)
+
+    @property
+    def num_boxes(self) -> int:
+        return len(self.box_class)
+
+    @property
+    def num_polygons(self) -> int:
+        return len(self.poly_class)
+
+    @property
+    def nbytes(self) -> int:
+        """数组列占用的字节数（不含路径与标签字符串）"""
+        arrays = (self.widths, self.heights, self.has_polygon_list, self.box_image, self.box_class,
+                  self.box_coords, self.poly_image, self.poly_class, self.poly_offsets, self.poly_coords,
+                  self.box_image_offsets, self.poly_image_offsets)
+        return sum(a.nbytes for a in arrays)
+
+    def class_counts(self) -> Dict[str, int]:
+        """各标签的标注数（框 + 多边形）"""
+        n = len(self.labels)
+        counts = (np.bincount(self.box_class, minlength=n) + np.bincount(self.poly_class, minlength=n))
+        return {name: int(c) for name, c in zip(self.labels.names, counts) if c}
+
+    def to_annotations(self) -> List[ImageAnnotation]:
+        return [view.to_annotation() for view in self]
+
+
+class AnnotationTableBuilder:
+    """逐张追加标注，build() 时一次性转换为 NumPy 列"""
+
+    def __init__(self, labels: Optional[LabelTable] = None):
+        self.labels = labels if labels is not None else LabelTable()
+        self._paths: List[Path] = []
+        self._sources: List[Optional[Path]] = []
+        self._widths = array("i")
+        self._heights = array("i")
+        self._has_poly = array("b")
+        self._box_image = array("i")
+        self._box_class = array("i")
+        self._box_coords = array("i")
+        self._poly_image = array("i")
+        self._poly_class = array("i")
+        self._poly_offsets = array("q", [0])
+        self._poly_coords = array("f")
+
+    def append(self, ann: ImageAnnotation) -> int:
+        """追加一张图片的标注，返回其图片下标"""
+        index = len(self._paths)
+        self._paths.append(Path(ann.image_path))
+        self._sources.append(None if ann.source is None else Path(ann.source))
+        self._widths.append(int(ann.width))
+        self._heights.append(int(ann.height))
+        self._has_poly.append(ann.polygons is not None)
+
+        intern = self.labels.intern
+        for b in ann.boxes:
+            self._box_image.append(index)
+            self._box_class.append(intern(b.label))
+            self._box_coords.extend((int(b.xmin), int(b.ymin), int(b.xmax), int(b.ymax)))
+        for p in ann.polygons or ():
+            self._poly_image.append(index)
+            self._poly_class.append(intern(p.label))
+            self._poly_coords.extend(p.points)
+            self._poly_offsets.append(len(self._poly_coords))
+        return index
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def build(self) -> AnnotationTable:
+        return AnnotationTable(
+            image_paths=self._paths,
+            widths=np.array(self._widths, dtype=np.int32),
+            heights=np.array(self._heights, dtype=np.int32),
+            has_polygon_list=np.array(self._has_poly, dtype=np.bool_),
+            labels=self.labels,
+            box_image=np.array(self._box_image, dtype=np.int32),
+            box_class=np.array(self._box_class, dtype=np.int32),
+            box_coords=np.array(self._box_coords, dtype=np.int32).reshape(-1, 4),
+            poly_image=np.array(self._poly_image, dtype=np.int32),
+            poly_class=np.array(self._poly_class, dtype=np.int32),
+            poly_offsets=np.array(self._poly_offsets, dtype=np.int64),
+            poly_coords=np.array(self._poly_coords, dtype=np.float32),
+            sources=self._sources,
+        )
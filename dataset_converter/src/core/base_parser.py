@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
+
+from .parallel import DEFAULT_CHUNK_SIZE
 
 
 @dataclass
@@ -25,15 +27,55 @@ class ImageAnnotation:
     height: int
     boxes: List[BBox]
     polygons: Optional[List[Polygon]] = None  # 分割标注
+    source: Optional[Path] = None  # 产生该标注的源标签文件（增量转换用）
 
 
 class BaseParser:
     """统一解析器接口：解析目录为标准注释结构、并可导出。"""
 
     format_name: str = "base"
+    workers: int = 0  # 解析进程数，0 表示自动（CPU 核数），1 表示串行
+    chunk_size: int = DEFAULT_CHUNK_SIZE  # 每次提交给子进程的文件数
+    per_image_output: bool = True  # 作为导出器时每张图片写一个文件（增量转换依赖此性质）
+    writes_polygons: bool = False  # 作为导出器时写出多边形（否则只写矩形框）
 
-    def parse(self, input_dir: Path) -> List[ImageAnnotation]:
+    def set_parallel(self, workers: Optional[int] = None, chunk_size: Optional[int] = None):
+        """设置并行解析参数，None 表示保持当前值"""
+        if workers is not None:
+            self.workers = int(workers)
+        if chunk_size is not None:
+            self.chunk_size = max(1, int(chunk_size))
+
+    def set_export_target(self, writes_polygons: bool) -> None:
+        """解析结果将交给是否写出多边形的导出器；需要按目标调整产出内容的解析器覆盖此方法"""
+
+    def iter_parse(self, input_dir: Path, only: Optional[Set[Path]] = None) -> Iterator[ImageAnnotation]:
+        """
+        逐张产出标注（生成器），内存占用与数据集大小无关。
+        only 不为 None 时只解析其中列出的源标签文件（路径形式与 source_units 一致）。
+        """
+        raise NotImplementedError
+
+    def source_units(self, input_dir: Path) -> List[Tuple[Path, Optional[Path]]]:
+        """
+        列出数据集的源文件单元 (标签文件, 对应图片)，不解析内容；
+        一个标签文件对应多张图片（如批量 JSON）时图片为 None。
+        """
         raise NotImplementedError
 
-    def export(self, annotations: List[ImageAnnotation], output_dir: Path) -> None:
-        raise NotImplementedError
\ No newline at end of file
+    def output_name(self, ann: ImageAnnotation) -> Optional[str]:
+        """作为导出器时该标注写出的文件名（相对输出目录），不按图片写文件的格式返回 None"""
+        return None
+
+    def parse(self, input_dir: Path) -> List[ImageAnnotation]:
+        """一次性解析为列表，等价于 list(iter_parse(input_dir))"""
+        return list(self.iter_parse(input_dir))
+
+    def parse_table(self, input_dir: Path):
+        """解析为列式 AnnotationTable（流式追加，内存远小于 parse() 的对象列表）"""
+        from .annotation_table import AnnotationTable
+        return AnnotationTable.from_annotations(self.iter_parse(input_dir))
+
+    def export(self, annotations: Iterable[ImageAnnotation], output_dir: Path) -> None:
+        """写出标注；annotations 可以是列表或 iter_parse 返回的迭代器（只遍历一次）"""
+        raise NotImplementedError
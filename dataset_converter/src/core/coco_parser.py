@@ -0,0 +1,229 @@
+"""
+COCO 输入解析
+
+一次线性遍历 COCO 文件建立 image_id→标注 与 category_id→名称 的索引，
+不对每张图片重新扫描标注列表（O(图片 × 标注)）。
+    - 大文件用增量读取器逐个元素解码（见 utils/json_stream），不加载全文
+    - 标注按列存入紧凑数组，遍历结束后按图片做一次稳定排序分组
+    - 图片尺寸取自 images[]，不打开任何图片
+"""
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .base_parser import BaseParser, ImageAnnotation, BBox, Polygon
+from .coco_writer import COCOStreamWriter
+from .dataset_index import DatasetIndex, SubsetIndex, scan_files
+from ..utils.compression import open_compressed
+from ..utils.json_stream import iter_json_arrays, loads
+
+STREAM_THRESHOLD = 64 << 20  # 超过该大小（字节）的文件流式读取
+EXPORT_NAME = "instances.json"
+_COCO_KEYS = ("images", "annotations", "categories")
+
+
+def _iter_coco_items(coco_file: Path) -> Iterator[Tuple[str, Any]]:
+    """按文件顺序产出 (数组名, 元素)，小文件一次解码，大文件流式读取"""
+    if coco_file.stat().st_size <= STREAM_THRESHOLD:
+        with open_compressed(coco_file) as f:
+            data = loads(f.read())
+        if not isinstance(data, dict):
+            return
+        for key in _COCO_KEYS:
+            for item in data.get(key) or []:
+                yield key, item
+    else:
+        yield from iter_json_arrays(coco_file, _COCO_KEYS)
+
+
+class COCOIndex:
+    """单个 COCO 文件的一次遍历索引：图片表、类别表与按图片分组的列式标注"""
+
+    def __init__(self):
+        self.image_ids: List[int] = []
+        self.file_names: List[str] = []
+        self.widths: List[int] = []
+        self.heights: List[int] = []
+        self.categories: Dict[int, str] = {}
+        # 标注列
+        self.ann_image = array("q")
+        self.ann_category = array("q")
+        self.ann_bbox = array("d")  # x y w h
+        self.ann_crowd = array("b")
+        self.ann_rings = array("q")  # 每个标注第一个多边形环的下标（环按标注顺序存放）
+        self.ring_offsets = array("q", [0])
+        self.ring_coords = array("d")
+        self.skipped_annotations = 0
+
+    def add_image(self, im: Dict) -> None:
+        image_id, width, height = int(im["id"]), int(im.get("width") or 0), int(im.get("height") or 0)
+        self.image_ids.append(image_id)
+        self.file_names.append(str(im.get("file_name", "")))
+        self.widths.append(width)
+        self.heights.append(height)
+
+    def add_category(self, cat: Dict) -> None:
+        self.categories[int(cat["id"])] = str(cat.get("name", cat["id"]))
+
+    def add_annotation(self, a: Dict) -> None:
+        # 先完成全部转换再追加，保证出错时各列长度一致
+        image_id = int(a["image_id"])
+        category_id = int(a.get("category_id", 0))
+        bbox = [float(v) for v in a.get("bbox") or ()]
+        seg = a.get("segmentation")
+        # iscrowd 的 RLE 分割（dict）只保留 bbox
+        rings = [array("d", ring) for ring in seg if isinstance(ring, list) and len(ring) >= 6 and len(ring) % 2 == 0] \
+            if isinstance(seg, list) else []
+        if len(bbox) != 4 and not rings:
+            self.skipped_annotations += 1
+            return
+        self.ann_image.append(image_id)
+        self.ann_category.append(category_id)
+        self.ann_bbox.extend(bbox if len(bbox) == 4 else (0.0, 0.0, 0.0, 0.0))
+        self.ann_crowd.append(1 if a.get("iscrowd") else 0)
+        self.ann_rings.append(len(self.ring_offsets) - 1)
+        for ring in rings:
+            self.ring_coords.extend(ring)
+            self.ring_offsets.append(len(self.ring_coords))
+
+    @classmethod
+    def build(cls, coco_file: Path) -> "COCOIndex":
+        index = cls()
+        handlers = {"images": index.add_image, "annotations": index.add_annotation,
+                    "categories": index.add_category}
+        for key, item in _iter_coco_items(coco_file):
+            try:
+                handlers[key](item)
+            except (KeyError, TypeError, ValueError):
+                if key == "annotations":
+                    index.skipped_annotations += 1
+        index.ann_rings.append(len(index.ring_offsets) - 1)  # 哨兵：最后一个标注的环结束位置
+        return index
+
+    def grouped(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        返回 (order, starts)：order 为按图片下标稳定排序后的标注下标，
+        第 i 张图片的标注为 order[starts[i]:starts[i + 1]]；引用未知图片的标注被丢弃。
+        """
+        ann_image = np.asarray(self.ann_image, dtype=np.int64)
+        ids = np.asarray(self.image_ids, dtype=np.int64)
+        if len(ids):
+            sorter = np.argsort(ids, kind="stable")
+            image_idx = sorter[np.searchsorted(ids, ann_image, sorter=sorter).clip(max=len(ids) - 1)]
+            known = ids[image_idx] == ann_image
+        else:
+            image_idx = np.zeros(len(ann_image), dtype=np.int64)
+            known = np.zeros(len(ann_image), dtype=bool)
+        self.skipped_annotations += int((~known).sum())
+        image_idx = np.where(known, image_idx, len(ids))
+        order = np.argsort(image_idx, kind="stable")
+        starts = np.searchsorted(image_idx[order], np.arange(len(ids) + 1))
+        return order, starts
+
+
+class COCOParser(BaseParser):
+    """
+    COCO 格式解析器：labels/<subset>/ 下的每个 .json（可 .gz / .zst 压缩）为一个 COCO 文件，
+    file_name 在 images/<subset>/ 中解析。
+    """
+    format_name = "coco"
+    per_image_output = False
+    writes_polygons = True
+    segment_boxes: bool = False  # 分割标注同时产出其 bbox（导出为只写矩形框的格式时由 set_export_target 打开）
+    skip_crowd: bool = False  # 跳过 iscrowd=1 的标注
+
+    def set_export_target(self, writes_polygons: bool) -> None:
+        self.segment_boxes = not writes_polygons
+
+    def iter_parse(self, input_dir: Path, only: Optional[Set[Path]] = None) -> Iterator[ImageAnnotation]:
+        """
+        解析标准目录结构的COCO数据集:
+        dataset/
+        ├── images/
+        │   ├── train/
+        │   ├── test/
+        │   └── val/
+        └── labels/
+            ├── train/   (instances_train.json 等)
+            ├── test/
+            └── val/
+        """
+        index = DatasetIndex.build(input_dir)
+        if not index.has_structure:
+            raise ValueError(f"数据集目录结构不正确。需要包含 'images' 和 'labels' 文件夹。\n当前目录: {input_dir}")
+
+        for subset in index.complete_subsets():
+            for coco_file in self._coco_files(subset):
+                if only is not None and coco_file not in only:
+                    continue
+                try:
+                    coco = COCOIndex.build(coco_file)
+                except (OSError, ValueError, EOFError) as e:
+                    print(f"警告: COCO 文件读取失败 {coco_file}: {e}")
+                    continue
+                yield from self._iter_images(coco, coco_file, subset)
+                if coco.skipped_annotations:
+                    print(f"警告: {coco_file.name} 中 {coco.skipped_annotations} 个标注无效或引用了不存在的图片，已跳过")
+
+    @staticmethod
+    def _coco_files(subset: SubsetIndex) -> List[Path]:
+        files = scan_files(subset.labels_dir, (".json", ".gz", ".zst"))
+        return [f for f in files if f.name.lower().endswith((".json", ".json.gz", ".json.zst"))]
+
+    def _iter_images(self, coco: COCOIndex, coco_file: Path, subset: SubsetIndex) -> Iterator[ImageAnnotation]:
+        order, starts = coco.grouped()
+        categories = coco.categories
+        category = coco.ann_category.tolist()
+        bbox = coco.ann_bbox.tolist()
+        crowd = coco.ann_crowd.tolist()
+        first_ring = coco.ann_rings.tolist()
+        ring_offsets = coco.ring_offsets.tolist()
+        ring_coords = np.asarray(coco.ring_coords, dtype=np.float64)
+        starts = starts.tolist()
+        order = order.tolist()
+
+        for i, file_name in enumerate(coco.file_names):
+            width, height = coco.widths[i], coco.heights[i]
+            boxes: List[BBox] = []
+            polygons: List[Polygon] = []
+            for j in order[starts[i]:starts[i + 1]]:
+                if crowd[j] and self.skip_crowd:
+                    continue
+                cid = category[j]
+                label = categories.get(cid, str(cid))
+                r0, r1 = first_ring[j], first_ring[j + 1]
+                if r1 == r0 or self.segment_boxes:
+                    x, y, w, h = bbox[4 * j:4 * j + 4]
+                    if w > 0 and h > 0:
+                        boxes.append(BBox(xmin=int(round(x)), ymin=int(round(y)),
+                                          xmax=int(round(x + w)), ymax=int(round(y + h)), label=label))
+                for r in range(r0, r1):
+                    # 多边形坐标归一化到 [0,1]（与 YOLO 分割一致）
+                    coords = ring_coords[ring_offsets[r]:ring_offsets[r + 1]]
+                    if width > 0 and height > 0:
+                        coords = (coords.reshape(-1, 2) / (width, height)).ravel()
+                    polygons.append(Polygon(points=coords.tolist(), label=label))
+
+            yield ImageAnnotation(
+                image_path=subset.resolve_image(file_name) if file_name else Path("unknown.jpg"),
+                width=width,
+                height=height,
+                boxes=boxes,
+                polygons=polygons,
+                source=coco_file
+            )
+
+    def source_units(self, input_dir: Path) -> List[Tuple[Path, Optional[Path]]]:
+        units: List[Tuple[Path, Optional[Path]]] = []
+        for subset in DatasetIndex.build(input_dir).complete_subsets():
+            units.extend((f, None) for f in self._coco_files(subset))
+        return units
+
+    def export(self, annotations: Iterable[ImageAnnotation], output_dir: Path) -> None:
+        """导出为 output_dir/instances.json（单遍流式写出，见 coco_writer）"""
+        output_file = Path(output_dir) / EXPORT_NAME
+        with COCOStreamWriter(output_file) as coco:
+            coco.write_all(annotations)
+        print(f"已写出 {coco.num_images} 张图片、{coco.num_annotations} 个标注: {output_file}")
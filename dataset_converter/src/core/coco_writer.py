@@ -0,0 +1,180 @@
+"""
+流式 COCO 写出
+
+单遍写出 COCO 文件，内存中只保留类别表：
+    - 图片与标注 id 在写入时分配，序列化后的条目攒满一块即提交给后台写线程
+    - annotations 直接写入目标文件，images 先写入同目录的临时文件，结束时拼接到目标文件之后
+    - categories 最后写出（JSON 对象的键顺序不影响读取）
+    - 紧凑输出，不缩进
+"""
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .base_parser import ImageAnnotation
+from ..utils.async_writer import AsyncFileWriter, AsyncWriteError
+from ..utils.json_stream import dumps
+
+FLUSH_BYTES = 1 << 20  # 每个数组攒满多少字节提交一次写入
+
+
+class _ArrayStream:
+    """一个 JSON 数组的流式写出：元素以逗号分隔，按块提交"""
+
+    def __init__(self, writer: AsyncFileWriter, path: Path, opening: bytes):
+        self.writer = writer
+        self.path = path
+        self.count = 0
+        self._buf = bytearray(opening)
+
+    def extend(self, items: List[Dict]) -> None:
+        if not items:
+            return
+        if self.count:
+            self._buf += b","
+        self._buf += dumps(items)[1:-1]  # 整批一次序列化，去掉外层方括号
+        self.count += len(items)
+        if len(self._buf) >= FLUSH_BYTES:
+            self.flush()
+
+    def write_raw(self, data: bytes) -> None:
+        self._buf += data
+
+    def flush(self) -> None:
+        if self._buf:
+            self.writer.append(self.path, bytes(self._buf))
+            self._buf = bytearray()
+
+
+class COCOStreamWriter:
+    """单遍写出 COCO 文件，用作上下文管理器时退出即 close()"""
+
+    def __init__(self, output_path: Path, info: Optional[Dict] = None, supercategory: str = "",
+                 writer: Optional[AsyncFileWriter] = None):
+        self.output_path = Path(output_path)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.supercategory = supercategory
+        self.categories: Dict[str, int] = {}
+        self._own_writer = writer is None
+        self._writer = writer or AsyncFileWriter(workers=2)
+        self._images_path = self.output_path.with_name(f".{self.output_path.name}.images.tmp")
+        header = b'{"info":' + dumps(info or {}) + b',"licenses":[],"annotations":['
+        self._annotations = _ArrayStream(self._writer, self.output_path, header)
+        self._images = _ArrayStream(self._writer, self._images_path, b"")
+        self._pending_images: List[Dict] = []
+        self._closed = False
+
+    @property
+    def num_images(self) -> int:
+        return self._images.count + len(self._pending_images)
+
+    @property
+    def num_annotations(self) -> int:
+        return self._annotations.count
+
+    def category_id(self, name: str) -> int:
+        """类别 id 在首次出现时分配（从 1 开始）"""
+        cid = self.categories.get(name)
+        if cid is None:
+            cid = self.categories[name] = len(self.categories) + 1
+        return cid
+
+    def add_image(self, file_name: str, width: int, height: int) -> int:
+        """写入一张图片，返回分配的 image_id"""
+        image_id = self.num_images + 1
+        self._pending_images.append({"id": image_id, "width": width, "height": height, "file_name": file_name})
+        if len(self._pending_images) >= 1024:
+            self._images.extend(self._pending_images)
+            self._pending_images = []
+        return image_id
+
+    def add_annotations(self, annotations: List[Dict]) -> None:
+        """写入一批标注（需已含 image_id / category_id），按顺序分配 id"""
+        next_id = self._annotations.count + 1
+        for i, ann in enumerate(annotations):
+            ann["id"] = next_id + i
+        self._annotations.extend(annotations)
+
+    def add_image_annotation(self, ann: ImageAnnotation) -> int:
+        """写入一张图片及其矩形框 / 多边形（归一化坐标换算为像素），返回 image_id"""
+        image_id = self.add_image(Path(ann.image_path).name, ann.width, ann.height)
+        items = []
+        for box in ann.boxes:
+            w, h = box.xmax - box.xmin, box.ymax - box.ymin
+            items.append({
+                "image_id": image_id,
+                "category_id": self.category_id(box.label),
+                "bbox": [box.xmin, box.ymin, w, h],
+                "area": w * h,
+                "iscrowd": 0
+            })
+        for poly in ann.polygons or []:
+            n = len(poly.points) // 2 * 2
+            if n < 6:  # 至少3个点
+                continue
+            xs = [x * ann.width for x in poly.points[0:n:2]]
+            ys = [y * ann.height for y in poly.points[1:n:2]]
+            segmentation = [v for xy in zip(xs, ys) for v in xy]
+            x0, y0 = min(xs), min(ys)
+            bw, bh = max(xs) - x0, max(ys) - y0
+            items.append({
+                "image_id": image_id,
+                "category_id": self.category_id(poly.label),
+                "segmentation": [segmentation],
+                "bbox": [x0, y0, bw, bh],
+                "area": bw * bh,
+                "iscrowd": 0
+            })
+        self.add_annotations(items)
+        return image_id
+
+    def write_all(self, annotations: Iterable[ImageAnnotation]) -> None:
+        for ann in annotations:
+            self.add_image_annotation(ann)
+
+    def close(self, discard: bool = False) -> None:
+        """
+        拼接 images 与 categories 并完成文件；写入失败时抛出 AsyncWriteError。
+        discard=True 时（写出过程出错）删除不完整的输出。
+        """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if not discard:
+                self._images.extend(self._pending_images)
+                self._pending_images = []
+                self._images.flush()
+                self._annotations.write_raw(b'],"images":[')
+                self._annotations.flush()
+            self._writer.close_stream(self._images_path)
+            self._writer.flush()
+            if not discard and not self._writer.errors:
+                # images 临时文件已写完，按块拼接到目标文件
+                if self._images_path.exists():
+                    with open(self._images_path, "rb") as f:
+                        for block in iter(lambda: f.read(FLUSH_BYTES), b""):
+                            self._writer.append(self.output_path, block)
+                categories = [{"id": cid, "name": name, "supercategory": self.supercategory}
+                              for name, cid in self.categories.items()]
+                self._annotations.write_raw(b'],"categories":' + dumps(categories) + b"}")
+                self._annotations.flush()
+            self._writer.close_stream(self.output_path)
+        finally:
+            if self._own_writer:
+                self._writer.close(raise_errors=False)
+            else:
+                self._writer.flush()
+            for path in ([self._images_path, self.output_path] if discard else [self._images_path]):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if self._writer.errors and not discard:
+            raise AsyncWriteError(self._writer.errors)
+
+    def __enter__(self) -> "COCOStreamWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close(discard=exc_type is not None)
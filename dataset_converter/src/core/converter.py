@@ -1,11 +1,15 @@
+import copy
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, Dict, Iterable, Iterator, Optional
 
 from .base_parser import BaseParser, ImageAnnotation
 from .yolo_parser import YOLOParser
 from .yolo_seg_parser import YOLOSegParser
 from .voc_parser import VOCParser
 from .json_parser import JSONParser
+from .coco_parser import COCOParser
+from .tfrecord_parser import TFRecordParser
+from .incremental import convert_incremental
 
 
 PARSERS: Dict[str, BaseParser] = {
@@ -13,24 +17,64 @@ PARSERS: Dict[str, BaseParser] = {
     "yolo_seg": YOLOSegParser(),
     "voc": VOCParser(),
     "json": JSONParser(),
+    "coco": COCOParser(),
+    "tfrecord": TFRecordParser(),
 }
 
 
-def convert(input_dir: Path, input_format: str, output_dir: Path, output_format: str, label_map: Optional[Dict[str, int]] = None) -> None:
+def set_parallel_options(workers: Optional[int] = None, chunk_size: Optional[int] = None) -> None:
+    """为所有已注册解析器设置并行解析参数（workers: 0=自动, 1=串行）"""
+    for parser in PARSERS.values():
+        parser.set_parallel(workers, chunk_size)
+
+
+def new_parser(fmt: str) -> BaseParser:
+    """
+    为单个任务创建解析器：复制已注册实例（沿用其并行、输出方式等设置），
+    任务中的 set_label_map / exported_label_map 等状态不会影响同时运行的其他任务。
+    """
+    if fmt not in PARSERS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    return copy.copy(PARSERS[fmt])
+
+
+def _report_progress(annotations: Iterable[ImageAnnotation], progress: Callable[[int], None]) -> Iterator[ImageAnnotation]:
+    for count, ann in enumerate(annotations, 1):
+        progress(count)
+        yield ann
+
+
+def convert(input_dir: Path, input_format: str, output_dir: Path, output_format: str, label_map: Optional[Dict[str, int]] = None,
+            workers: Optional[int] = None, chunk_size: Optional[int] = None, incremental: bool = False,
+            progress: Optional[Callable[[int], None]] = None) -> None:
+    """
+    流式转换：解析器逐张产出标注，导出器边读边写，
+    内存占用与数据集大小无关，第一批结果解析完即开始写出。
+    incremental=True 时在输出目录维护清单，只处理新增 / 变化 / 删除的源文件（见 incremental.py）。
+    progress(已处理图片数) 在每张图片交给导出器前调用，回调抛出的异常（如取消任务）会中止转换。
+    """
     if input_format not in PARSERS:
         raise ValueError(f"Unsupported input format: {input_format}")
     if output_format not in PARSERS:
         raise ValueError(f"Unsupported output format: {output_format}")
 
     # 先为解析器设置标签映射（如支持），以便在解析阶段将 id→label 反解
-    parser = PARSERS[input_format]
+    parser = new_parser(input_format)
     if hasattr(parser, "set_label_map") and label_map is not None:
         getattr(parser, "set_label_map")(label_map)
-
-    annotations: List[ImageAnnotation] = parser.parse(input_dir)
+    # 未指定的并行参数沿用解析器当前设置
+    parser.set_parallel(workers, chunk_size)
 
     # 若导出器也支持标签映射（如 YOLO），同样传递以固定 label→id
-    exporter = PARSERS[output_format]
+    exporter = new_parser(output_format)
     if hasattr(exporter, "set_label_map") and label_map is not None:
         getattr(exporter, "set_label_map")(label_map)
-    exporter.export(annotations, output_dir)
\ No newline at end of file
+    # 只写矩形框的目标格式需要分割标注的外接框
+    parser.set_export_target(exporter.writes_polygons)
+    if incremental:
+        convert_incremental(parser, exporter, input_dir, output_dir, input_format, output_format)
+        return
+    annotations = parser.iter_parse(input_dir)
+    if progress is not None:
+        annotations = _report_progress(annotations, progress)
+    exporter.export(annotations, output_dir)
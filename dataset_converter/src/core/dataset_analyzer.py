@@ -1,8 +1,12 @@
 from pathlib import Path
-from typing import Dict, List, Tuple
-from collections import Counter, defaultdict
+from typing import Dict
 import json
-from PIL import Image
+
+import numpy as np
+
+from .stats_engine import NORMALIZED_BOX_SIZE_RANGE, DatasetStats
+from .yolo_decoder import iter_label_batches
+from ..utils.metadata_cache import cached_image_size
 
 class DatasetAnalyzer:
     """数据集统计分析器"""
@@ -18,135 +22,98 @@ class DatasetAnalyzer:
     
     def _analyze_yolo_dataset(self, dataset_dir: Path) -> Dict:
         """分析YOLO格式数据集"""
-        stats = {
-            'total_images': 0,
-            'total_annotations': 0,
-            'class_distribution': Counter(),
-            'image_sizes': [],
-            'annotation_counts': [],
-            'bbox_sizes': [],
-            'polygon_point_counts': []
-        }
+        # 标注框宽高为归一化坐标
+        stats = DatasetStats(box_size_range=NORMALIZED_BOX_SIZE_RANGE)
+        invalid_lines = []  # (标签文件名, 无法解析的行号列表)
         
         image_files = list(dataset_dir.glob('*.jpg')) + list(dataset_dir.glob('*.png'))
+        txt_files = []
         
         for img_file in image_files:
-            stats['total_images'] += 1
+            stats.total_images += 1
             
-            # 获取图片尺寸
-            try:
-                with Image.open(img_file) as img:
-                    stats['image_sizes'].append(img.size)
-            except:
+            # 获取图片尺寸（只读取文件头）
+            size = cached_image_size(img_file)
+            if size is None:
                 continue
+            stats.add_image_size(*size)
             
-            # 分析标注文件
             txt_file = img_file.with_suffix('.txt')
             if not txt_file.exists():
-                stats['annotation_counts'].append(0)
+                stats.add_annotation_count(0)
                 continue
+            txt_files.append(txt_file)
+        
+        # 批量解码标注文件
+        for _, batch in iter_label_batches(txt_files):
+            stats.add_annotation_counts(batch.line_counts[batch.readable])
+            stats.total_boxes += len(batch.det_class)
+            stats.total_polygons += len(batch.seg_class)
             
-            try:
-                content = txt_file.read_text(encoding='utf-8').strip()
-                if not content:
-                    stats['annotation_counts'].append(0)
-                    continue
-                
-                lines = content.split('\n')
-                stats['annotation_counts'].append(len(lines))
-                stats['total_annotations'] += len(lines)
-                
-                for line in lines:
-                    parts = line.strip().split()
-                    if len(parts) < 5:
-                        continue
-                    
-                    class_id = parts[0]
-                    stats['class_distribution'][class_id] += 1
-                    
-                    if len(parts) == 5:
-                        # 矩形框
-                        _, cx, cy, w, h = map(float, parts)
-                        stats['bbox_sizes'].append((w, h))
-                    else:
-                        # 多边形
-                        coords = [float(x) for x in parts[1:]]
-                        stats['polygon_point_counts'].append(len(coords) // 2)
-                        
-            except Exception:
-                continue
+            class_ids, class_counts = np.unique(np.concatenate((batch.det_class, batch.seg_class)), return_counts=True)
+            stats.class_counts.update(dict(zip(map(str, class_ids.tolist()), class_counts.tolist())))
+            
+            # 矩形框宽高与中心 / 多边形点数
+            xywh = batch.det_xywh
+            stats.add_boxes(xywh[:, 2], xywh[:, 3], xywh[:, 0], xywh[:, 1])
+            stats.add_polygon_points(np.diff(batch.seg_offsets) // 2)
+            
+            for i in np.unique(batch.invalid_file).tolist():
+                invalid_lines.append((batch.files[i].name, batch.invalid_lines(i)))
         
         # 计算统计摘要
-        return self._calculate_summary(stats)
+        summary = self._calculate_summary(stats)
+        summary['invalid_lines'] = invalid_lines
+        return summary
     
     def _analyze_json_dataset(self, dataset_dir: Path) -> Dict:
         """分析JSON格式数据集"""
-        stats = {
-            'total_images': 0,
-            'total_annotations': 0,
-            'class_distribution': Counter(),
-            'image_sizes': [],
-            'annotation_counts': []
-        }
+        stats = DatasetStats()
         
         json_files = list(dataset_dir.glob('*.json'))
         
         for json_file in json_files:
             try:
                 data = json.loads(json_file.read_text(encoding='utf-8'))
-                stats['total_images'] += 1
-                
-                width = data.get('width', 0)
-                height = data.get('height', 0)
-                stats['image_sizes'].append((width, height))
-                
                 annotations = data.get('annotations', [])
-                stats['annotation_counts'].append(len(annotations))
-                stats['total_annotations'] += len(annotations)
-                
-                for ann in annotations:
-                    label = ann.get('label', 'unknown')
-                    stats['class_distribution'][label] += 1
-                    
+                labels = [ann.get('label', 'unknown') for ann in annotations]
             except Exception:
                 continue
+            stats.total_images += 1
+            stats.add_image_size(data.get('width', 0), data.get('height', 0))
+            stats.add_annotation_count(len(annotations))
+            stats.total_boxes += len(annotations)
+            stats.class_counts.update(labels)
         
         return self._calculate_summary(stats)
     
-    def _calculate_summary(self, stats: Dict) -> Dict:
-        """计算统计摘要"""
-        summary = dict(stats)
+    def _calculate_summary(self, stats: DatasetStats) -> Dict:
+        """计算统计摘要；accumulators 为可合并的累加器状态（含直方图与分位数草图）"""
+        summary = {
+            'total_images': stats.total_images,
+            'total_annotations': stats.total_annotations,
+            'class_distribution': dict(stats.class_counts),
+        }
         
         # 图片尺寸统计
-        if stats['image_sizes']:
-            widths = [size[0] for size in stats['image_sizes']]
-            heights = [size[1] for size in stats['image_sizes']]
-            
-            summary['image_size_stats'] = {
-                'avg_width': sum(widths) / len(widths),
-                'avg_height': sum(heights) / len(heights),
-                'min_width': min(widths),
-                'max_width': max(widths),
-                'min_height': min(heights),
-                'max_height': max(heights)
-            }
+        image_size_stats = stats.image_size_stats()
+        if image_size_stats:
+            summary['image_size_stats'] = image_size_stats
         
         # 标注数量统计
-        if stats['annotation_counts']:
-            counts = stats['annotation_counts']
-            summary['annotation_stats'] = {
-                'avg_per_image': sum(counts) / len(counts),
-                'min_per_image': min(counts),
-                'max_per_image': max(counts),
-                'images_without_annotations': counts.count(0)
-            }
+        annotation_stats = stats.annotation_stats()
+        if annotation_stats:
+            summary['annotation_stats'] = annotation_stats
+        
+        # 标注框尺寸 / 多边形点数分布
+        if stats.box_width.count:
+            summary['bbox_size_stats'] = {'width': stats.box_width.summary(), 'height': stats.box_height.summary()}
+        if stats.polygon_points.count:
+            summary['polygon_point_stats'] = stats.polygon_points.summary()
         
         # 类别平衡性分析
-        if stats['class_distribution']:
-            total = sum(stats['class_distribution'].values())
-            summary['class_balance'] = {
-                class_id: count / total 
-                for class_id, count in stats['class_distribution'].items()
-            }
+        if stats.class_counts:
+            summary['class_balance'] = stats.class_balance()
         
-        return summary
\ No newline at end of file
+        summary['accumulators'] = stats.to_dict()
+        return summary
@@ -3,6 +3,11 @@ from typing import Dict, List, Set, Tuple
 from collections import Counter
 import json
 
+import numpy as np
+
+from .yolo_decoder import iter_label_batches
+from .dedup import find_duplicate_files
+
 class DatasetComparator:
     """数据集比较器"""
     
@@ -34,7 +39,8 @@ class DatasetComparator:
             'image_files': set(),
             'annotation_files': set(),
             'missing_annotations': [],
-            'empty_annotations': []
+            'empty_annotations': [],
+            'invalid_lines': []  # (标签文件名, 无法解析的行号列表)
         }
         
         # 获取所有文件
@@ -45,31 +51,24 @@ class DatasetComparator:
         stats['annotation_files'] = {f.stem for f in txt_files}
         stats['total_images'] = len(image_files)
         
-        # 分析标注
+        # 分析标注：缺失的先记录，其余批量解码
+        labelled = []
         for img_file in image_files:
-            txt_file = img_file.with_suffix('.txt')
-            
-            if not txt_file.exists():
+            if img_file.stem not in stats['annotation_files']:
                 stats['missing_annotations'].append(img_file.stem)
-                continue
+            else:
+                labelled.append(img_file.with_suffix('.txt'))
+        
+        for _, batch in iter_label_batches(labelled):
+            empty = batch.readable & (batch.line_counts == 0)
+            stats['empty_annotations'].extend(batch.files[i].stem for i in np.flatnonzero(empty).tolist())
+            stats['total_annotations'] += int(batch.line_counts[batch.readable].sum())
+            
+            class_ids, class_counts = np.unique(np.concatenate((batch.det_class, batch.seg_class)), return_counts=True)
+            stats['class_distribution'].update(dict(zip(map(str, class_ids.tolist()), class_counts.tolist())))
             
-            try:
-                content = txt_file.read_text(encoding='utf-8').strip()
-                if not content:
-                    stats['empty_annotations'].append(img_file.stem)
-                    continue
-                
-                lines = content.split('\n')
-                stats['total_annotations'] += len(lines)
-                
-                for line in lines:
-                    parts = line.strip().split()
-                    if len(parts) >= 5:
-                        class_id = parts[0]
-                        stats['class_distribution'][class_id] += 1
-                        
-            except Exception:
-                continue
+            for i in np.unique(batch.invalid_file).tolist():
+                stats['invalid_lines'].append((batch.files[i].name, batch.invalid_lines(i)))
         
         return stats
     
@@ -153,30 +152,14 @@ class DatasetComparator:
         
         return recommendations
     
-    def find_duplicate_images(self, dataset_dir: Path) -> List[Tuple[str, str]]:
-        """查找重复图片（基于文件大小）"""
-        from collections import defaultdict
-        
-        size_groups = defaultdict(list)
+    def find_duplicate_images(self, dataset_dir: Path) -> List[List[str]]:
+        """查找目录下内容完全相同的图片，返回每组重复图片的文件名"""
         image_files = list(dataset_dir.glob('*.jpg')) + list(dataset_dir.glob('*.png'))
-        
-        # 按文件大小分组
-        for img_file in image_files:
-            try:
-                size = img_file.stat().st_size
-                size_groups[size].append(img_file.name)
-            except:
-                continue
-        
-        # 找出可能的重复文件
-        duplicates = []
-        for size, files in size_groups.items():
-            if len(files) > 1:
-                for i in range(len(files)):
-                    for j in range(i+1, len(files)):
-                        duplicates.append((files[i], files[j]))
-        
-        return duplicates
+        return [[f.name for f in group] for group in self.find_identical_files(image_files)]
+    
+    def find_identical_files(self, files: List[Path]) -> List[List[Path]]:
+        """查找内容完全相同的文件，返回每组重复文件（组内按输入顺序），见 dedup.DuplicateFinder"""
+        return find_duplicate_files(files)
     
     def merge_class_mappings(self, mapping1: Dict[str, int], mapping2: Dict[str, int]) -> Dict[str, int]:
         """合并两个类别映射"""
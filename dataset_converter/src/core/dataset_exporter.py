@@ -6,6 +6,13 @@ import zipfile
 import shutil
 from datetime import datetime
 
+import numpy as np
+
+from .coco_writer import COCOStreamWriter
+from .parallel import chunked
+from .yolo_decoder import DEFAULT_BATCH_SIZE, YOLOLabelBatch, decode_label_files, iter_label_batches
+from ..utils.metadata_cache import cached_image_size
+
 class DatasetExporter:
     """数据集导出器"""
     
@@ -33,71 +40,46 @@ class DatasetExporter:
     
     def export_coco_format(self, dataset_dir: Path, output_path: Path, 
                           dataset_name: str = "Custom Dataset") -> bool:
-        """导出为COCO格式"""
+        """
+        导出为COCO格式：单遍处理，按批解码标注并流式写出（见 coco_writer），
+        类别 id 在首次出现时分配，内存中只保留类别表。
+        """
         try:
-            coco_data = {
-                "info": {
-                    "description": dataset_name,
-                    "version": "1.0",
-                    "year": datetime.now().year,
-                    "date_created": datetime.now().isoformat()
-                },
-                "licenses": [],
-                "images": [],
-                "annotations": [],
-                "categories": []
+            info = {
+                "description": dataset_name,
+                "version": "1.0",
+                "year": datetime.now().year,
+                "date_created": datetime.now().isoformat()
             }
-            
-            # 收集类别信息
-            categories = self._collect_categories(dataset_dir)
-            category_map = {}
-            for i, cat_name in enumerate(categories):
-                cat_id = i + 1
-                category_map[cat_name] = cat_id
-                coco_data["categories"].append({
-                    "id": cat_id,
-                    "name": cat_name,
-                    "supercategory": ""
-                })
-            
-            # 处理图片和标注
-            image_id = 1
-            annotation_id = 1
-            
             image_files = list(dataset_dir.glob('*.jpg')) + list(dataset_dir.glob('*.png'))
             
-            for img_file in image_files:
-                # 添加图片信息
-                try:
-                    from PIL import Image
-                    with Image.open(img_file) as img:
-                        width, height = img.size
-                except:
-                    continue
-                
-                coco_data["images"].append({
-                    "id": image_id,
-                    "width": width,
-                    "height": height,
-                    "file_name": img_file.name
-                })
-                
-                # 处理标注
-                txt_file = img_file.with_suffix('.txt')
-                if txt_file.exists():
-                    annotations = self._convert_yolo_to_coco(
-                        txt_file, image_id, width, height, category_map
-                    )
-                    for ann in annotations:
-                        ann["id"] = annotation_id
-                        coco_data["annotations"].append(ann)
-                        annotation_id += 1
-                
-                image_id += 1
-            
-            # 保存COCO格式文件
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(coco_data, f, indent=2, ensure_ascii=False)
+            with COCOStreamWriter(output_path, info) as coco:
+                for chunk in chunked(image_files, DEFAULT_BATCH_SIZE):
+                    # 添加图片信息
+                    labelled = []  # (标注文件, image_id, 宽, 高)
+                    for img_file in chunk:
+                        size = cached_image_size(img_file)
+                        if size is None:
+                            continue
+                        width, height = size
+                        image_id = coco.add_image(img_file.name, width, height)
+                        txt_file = img_file.with_suffix('.txt')
+                        if txt_file.exists():
+                            labelled.append((txt_file, image_id, width, height))
+                    if not labelled:
+                        continue
+                    
+                    # 整批解码并转换标注
+                    batch = decode_label_files([item[0] for item in labelled])
+                    class_ids = np.unique(np.concatenate((batch.det_class, batch.seg_class))).tolist()
+                    category_map = {str(cid): coco.category_id(str(cid)) for cid in class_ids}
+                    coco.add_annotations(self._convert_yolo_to_coco(
+                        batch,
+                        np.array([e[1] for e in labelled], dtype=np.int64),
+                        np.array([e[2] for e in labelled], dtype=np.float64),
+                        np.array([e[3] for e in labelled], dtype=np.float64),
+                        category_map
+                    ))
             
             return True
             
@@ -187,85 +169,81 @@ if __name__ == '__main__':
         categories = set()
         txt_files = list(dataset_dir.glob('*.txt'))
         
-        for txt_file in txt_files:
-            try:
-                content = txt_file.read_text(encoding='utf-8').strip()
-                if content:
-                    for line in content.split('\n'):
-                        parts = line.strip().split()
-                        if len(parts) >= 5:
-                            categories.add(parts[0])
-            except:
-                continue
+        for _, batch in iter_label_batches(txt_files):
+            class_ids = np.unique(np.concatenate((batch.det_class, batch.seg_class)))
+            categories.update(map(str, class_ids.tolist()))
         
         return sorted(list(categories))
     
-    def _convert_yolo_to_coco(self, txt_file: Path, image_id: int, 
-                             width: int, height: int, category_map: Dict) -> List[Dict]:
-        """将YOLO标注转换为COCO格式"""
-        annotations = []
+    def _convert_yolo_to_coco(self, batch: YOLOLabelBatch, image_ids: np.ndarray,
+                             widths: np.ndarray, heights: np.ndarray, category_map: Dict) -> List[Dict]:
+        """
+        将一批已解码的YOLO标注转换为COCO格式。
+        image_ids / widths / heights 与 batch.files 一一对应，坐标换算整批向量化完成，
+        结果按图片、再按原始行号排列。
+        """
+        category_ids = {int(cid): category_map.get(str(cid)) for cid in
+                        np.unique(np.concatenate((batch.det_class, batch.seg_class))).tolist()}
+        items = []
         
-        try:
-            content = txt_file.read_text(encoding='utf-8').strip()
-            if not content:
-                return annotations
+        # 矩形框：转换为COCO格式 (x, y, width, height)
+        W = widths[batch.det_file]
+        H = heights[batch.det_file]
+        cx, cy, w, h = batch.det_xywh.T
+        x = (cx - w / 2) * W
+        y = (cy - h / 2) * H
+        bbox_width = w * W
+        bbox_height = h * H
+        for j, (cid, x_, y_, bw, bh) in enumerate(zip(batch.det_class.tolist(), x.tolist(), y.tolist(),
+                                                       bbox_width.tolist(), bbox_height.tolist())):
+            if category_ids[cid] is None:
+                continue
+            file_idx = int(batch.det_file[j])
+            items.append((file_idx, int(batch.det_line[j]), {
+                "image_id": int(image_ids[file_idx]),
+                "category_id": category_ids[cid],
+                "bbox": [x_, y_, bw, bh],
+                "area": bw * bh,
+                "iscrowd": 0
+            }))
+        
+        # 多边形 - 转换为像素坐标的分割格式
+        if len(batch.seg_class):
+            seg_file = batch.seg_file
+            lengths = np.diff(batch.seg_offsets)
+            coord_file = np.repeat(seg_file, lengths)
+            is_x = (np.arange(len(batch.seg_coords)) - np.repeat(batch.seg_offsets[:-1], lengths)) % 2 == 0
+            scale = np.where(is_x, widths[coord_file], heights[coord_file])
+            pixel = batch.seg_coords * scale
             
-            for line in content.split('\n'):
-                parts = line.strip().split()
-                if len(parts) < 5:
-                    continue
-                
-                class_name = parts[0]
-                if class_name not in category_map:
+            # 每个多边形的边界框
+            starts = batch.seg_offsets[:-1]
+            xs = np.where(is_x, pixel, np.nan)
+            ys = np.where(is_x, np.nan, pixel)
+            x_min = np.fmin.reduceat(xs, starts)
+            x_max = np.fmax.reduceat(xs, starts)
+            y_min = np.fmin.reduceat(ys, starts)
+            y_max = np.fmax.reduceat(ys, starts)
+            
+            pixel_list = pixel.tolist()
+            offsets = batch.seg_offsets.tolist()
+            for j, cid in enumerate(batch.seg_class.tolist()):
+                if category_ids[cid] is None:
                     continue
-                
-                category_id = category_map[class_name]
-                
-                if len(parts) == 5:
-                    # 矩形框
-                    _, cx, cy, w, h = map(float, parts)
-                    
-                    # 转换为COCO格式 (x, y, width, height)
-                    x = (cx - w/2) * width
-                    y = (cy - h/2) * height
-                    bbox_width = w * width
-                    bbox_height = h * height
-                    
-                    annotations.append({
-                        "image_id": image_id,
-                        "category_id": category_id,
-                        "bbox": [x, y, bbox_width, bbox_height],
-                        "area": bbox_width * bbox_height,
-                        "iscrowd": 0
-                    })
-                else:
-                    # 多边形 - 转换为分割格式
-                    coords = [float(x) for x in parts[1:]]
-                    if len(coords) % 2 == 0 and len(coords) >= 6:
-                        # 转换为像素坐标
-                        pixel_coords = []
-                        for i in range(0, len(coords), 2):
-                            pixel_coords.extend([coords[i] * width, coords[i+1] * height])
-                        
-                        # 计算边界框
-                        x_coords = pixel_coords[::2]
-                        y_coords = pixel_coords[1::2]
-                        x_min, x_max = min(x_coords), max(x_coords)
-                        y_min, y_max = min(y_coords), max(y_coords)
-                        
-                        annotations.append({
-                            "image_id": image_id,
-                            "category_id": category_id,
-                            "segmentation": [pixel_coords],
-                            "bbox": [x_min, y_min, x_max - x_min, y_max - y_min],
-                            "area": (x_max - x_min) * (y_max - y_min),
-                            "iscrowd": 0
-                        })
-        
-        except Exception:
-            pass
+                file_idx = int(seg_file[j])
+                bx, by = float(x_min[j]), float(y_min[j])
+                bw, bh = float(x_max[j]) - bx, float(y_max[j]) - by
+                items.append((file_idx, int(batch.seg_line[j]), {
+                    "image_id": int(image_ids[file_idx]),
+                    "category_id": category_ids[cid],
+                    "segmentation": [pixel_list[offsets[j]:offsets[j + 1]]],
+                    "bbox": [bx, by, bw, bh],
+                    "area": bw * bh,
+                    "iscrowd": 0
+                }))
         
-        return annotations
+        items.sort(key=lambda item: item[:2])
+        return [ann for _, _, ann in items]
     
     def create_dataset_report(self, dataset_dir: Path, output_path: Path) -> bool:
         """创建数据集报告"""
@@ -0,0 +1,211 @@
+"""
+数据集目录索引
+
+对标准结构 (images/<subset>, labels/<subset>) 的每个子集目录只做一次 os.scandir，
+建立 stem→图片 / stem→标签 的映射并记录两侧的孤立文件，
+替代逐个标签文件按扩展名 Path.exists() 探测图片的做法。
+目录列表按目录 mtime 在进程内缓存：目录中增删、重命名文件都会更新其 mtime，
+未变化的目录（如 source_units 之后紧接着 iter_parse）不再重复扫描。
+recursive=True 时同时索引子集下的嵌套目录（如 images/train/cam1/），以相对子集目录的路径配对；
+子目录的变化不会更新上层目录的 mtime，递归列表不缓存。
+"""
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+
+SUBSETS = ("train", "test", "val")
+# 同一 stem 存在多个文件时按此顺序优先
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp")
+LABEL_EXTS = (".txt", ".json", ".xml")
+BATCH_LABEL_NAME = "annotations.json"  # JSON 批量标注文件，不对应单张图片
+LISTING_CACHE_SIZE = 64  # 缓存列表的目录数
+RACY_SECONDS = 2.0  # mtime 距扫描时间不足该值的目录不缓存（同一时间刻内的再次修改无法从 mtime 看出）
+
+_listing_cache: Dict[Tuple[str, Tuple[str, ...]], Tuple[int, List[Path]]] = {}
+
+
+def _walk_files(directory: Path, ext_set: Set[str]) -> List[Path]:
+    """递归列出目录下指定扩展名的文件（不进入指向目录的符号链接），按相对路径排序"""
+    files: List[Path] = []
+    pending = [str(directory)]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif os.path.splitext(entry.name)[1].lower() in ext_set and entry.is_file():
+                        files.append(Path(entry.path))
+        except OSError:
+            continue
+    files.sort(key=lambda p: p.relative_to(directory).parts)
+    return files
+
+
+def scan_files(directory: Path, exts: Sequence[str], recursive: bool = False) -> List[Path]:
+    """单次 scandir 列出目录下指定扩展名的文件，按文件名排序；recursive=True 时包含子目录（按相对路径排序）"""
+    ext_set = {e.lower() for e in exts}
+    if recursive:
+        return _walk_files(directory, ext_set)
+    cache_key = (str(directory), tuple(sorted(ext_set)))
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError:
+        return []
+    cached = _listing_cache.get(cache_key)
+    if cached is not None and cached[0] == mtime_ns:
+        return list(cached[1])
+    files: List[Path] = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if os.path.splitext(entry.name)[1].lower() in ext_set and entry.is_file():
+                    files.append(Path(entry.path))
+    except OSError:
+        return []
+    files.sort(key=lambda p: p.name)
+    if time.time_ns() - mtime_ns > RACY_SECONDS * 1e9:
+        if len(_listing_cache) >= LISTING_CACHE_SIZE:
+            _listing_cache.pop(next(iter(_listing_cache)))
+        _listing_cache[cache_key] = (mtime_ns, files)
+        files = list(files)
+    return files
+
+
+def _by_stem(files: List[Path], exts: Sequence[str], key: Callable[[Path], str]) -> Dict[str, Path]:
+    """key(文件)→文件，多个扩展名冲突时按 exts 顺序取优先者"""
+    rank = {e: i for i, e in enumerate(exts)}
+    mapping: Dict[str, Path] = {}
+    for f in files:
+        stem = key(f)
+        current = mapping.get(stem)
+        if current is None or rank.get(f.suffix.lower(), len(rank)) < rank.get(current.suffix.lower(), len(rank)):
+            mapping[stem] = f
+    return mapping
+
+
+@dataclass
+class SubsetIndex:
+    name: str
+    images_dir: Path
+    labels_dir: Path
+    image_files: List[Path] = field(default_factory=list)
+    label_files: List[Path] = field(default_factory=list)
+    has_images_dir: bool = False
+    has_labels_dir: bool = False
+    recursive: bool = False  # 是否包含嵌套目录；为 True 时映射的键是相对子集目录、不含扩展名的路径
+
+    def __post_init__(self):
+        self.images: Dict[str, Path] = _by_stem(self.image_files, IMAGE_EXTS, self.image_key)
+        self.images_by_name: Dict[str, Path] = {f.name: f for f in self.image_files}
+        self.labels: Dict[str, Path] = _by_stem(self.label_files, LABEL_EXTS, self.label_key)
+
+    @classmethod
+    def scan(cls, name: str, images_dir: Path, labels_dir: Path, recursive: bool = False) -> "SubsetIndex":
+        has_images = images_dir.is_dir()
+        has_labels = labels_dir.is_dir()
+        return cls(
+            name=name,
+            images_dir=images_dir,
+            labels_dir=labels_dir,
+            image_files=scan_files(images_dir, IMAGE_EXTS, recursive) if has_images else [],
+            label_files=scan_files(labels_dir, LABEL_EXTS, recursive) if has_labels else [],
+            has_images_dir=has_images,
+            has_labels_dir=has_labels,
+            recursive=recursive,
+        )
+
+    def _key(self, path: Path, root: Path) -> str:
+        if not self.recursive:
+            return path.stem
+        return path.relative_to(root).with_suffix("").as_posix()
+
+    def image_key(self, path: Path) -> str:
+        """图片在索引中的键（非递归索引即 stem）"""
+        return self._key(path, self.images_dir)
+
+    def label_key(self, path: Path) -> str:
+        """标签在索引中的键（非递归索引即 stem）"""
+        return self._key(path, self.labels_dir)
+
+    @property
+    def complete(self) -> bool:
+        """images 与 labels 子目录都存在"""
+        return self.has_images_dir and self.has_labels_dir
+
+    def labels_with_ext(self, ext: str) -> List[Path]:
+        ext = ext.lower()
+        return [f for f in self.label_files if f.suffix.lower() == ext]
+
+    def pairs(self, label_ext: str) -> List[Tuple[Path, Path]]:
+        """返回 (标签文件, 同名图片) 列表，按标签文件名排序，没有图片的标签被跳过"""
+        result = []
+        for label_file in self.labels_with_ext(label_ext):
+            img_file = self.images.get(self.label_key(label_file))
+            if img_file is not None:
+                result.append((label_file, img_file))
+        return result
+
+    def image_for(self, stem: str) -> Optional[Path]:
+        return self.images.get(stem)
+
+    def label_for(self, stem: str) -> Optional[Path]:
+        return self.labels.get(stem)
+
+    def resolve_image(self, file_name: str) -> Path:
+        """按标注中的 file_name 找到实际图片：先精确匹配文件名，再按 stem 匹配"""
+        name_path = Path(file_name)
+        if name_path.parent != Path("."):
+            # 带目录的文件名（如绝对路径）按原样解析
+            candidate = self.images_dir / name_path
+            if candidate.exists():
+                return candidate
+        found = self.images_by_name.get(name_path.name) or self.images.get(name_path.stem)
+        return found if found is not None else name_path
+
+    @property
+    def orphan_images(self) -> List[Path]:
+        """没有任何标签的图片"""
+        return [f for f in self.image_files if self.image_key(f) not in self.labels]
+
+    @property
+    def orphan_labels(self) -> List[Path]:
+        """没有对应图片的标签"""
+        return [f for f in self.label_files if self.label_key(f) not in self.images and f.name != BATCH_LABEL_NAME]
+
+
+class DatasetIndex:
+    """标准目录结构数据集的索引"""
+
+    def __init__(self, root: Path, subsets: Dict[str, SubsetIndex]):
+        self.root = root
+        self.images_dir = root / "images"
+        self.labels_dir = root / "labels"
+        self.subsets = subsets
+
+    @classmethod
+    def build(cls, root: Path, subsets: Sequence[str] = SUBSETS, recursive: bool = False) -> "DatasetIndex":
+        root = Path(root)
+        index: Dict[str, SubsetIndex] = {}
+        for name in subsets:
+            sub = SubsetIndex.scan(name, root / "images" / name, root / "labels" / name, recursive)
+            if sub.has_images_dir or sub.has_labels_dir:
+                index[name] = sub
+        return cls(root, index)
+
+    @property
+    def has_structure(self) -> bool:
+        return self.images_dir.is_dir() and self.labels_dir.is_dir()
+
+    def complete_subsets(self) -> List[SubsetIndex]:
+        """images 与 labels 都存在的子集，按 train/test/val 顺序"""
+        return [sub for sub in self.subsets.values() if sub.complete]
+
+    def pairs(self, label_ext: str) -> List[Tuple[Path, Path]]:
+        result = []
+        for sub in self.complete_subsets():
+            result.extend(sub.pairs(label_ext))
+        return result
@@ -5,6 +5,8 @@ from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 import json
 
+from .dataset_index import DatasetIndex
+
 
 class DatasetValidator:
     """数据集格式验证器"""
@@ -32,8 +34,8 @@ class DatasetValidator:
         if not labels_dir.exists():
             return False, "缺少 'labels' 目录", {}
         
-        # 检查子集目录
-        subsets = ["train", "test", "val"]
+        # 检查子集目录：每个子集目录只扫描一次
+        index = DatasetIndex.build(dataset_path)
         found_subsets = []
         stats = {
             "total_images": 0,
@@ -43,33 +45,28 @@ class DatasetValidator:
             "label_formats": set()
         }
         
-        for subset in subsets:
-            img_subset = images_dir / subset
-            label_subset = labels_dir / subset
+        for subset in index.complete_subsets():
+            found_subsets.append(subset.name)
+            
+            # 统计图片和标签文件
+            img_files = subset.image_files
+            label_files = subset.label_files
+            
+            stats["subsets"][subset.name] = {
+                "images": len(img_files),
+                "labels": len(label_files),
+                "orphan_images": len(subset.orphan_images),
+                "orphan_labels": len(subset.orphan_labels)
+            }
+            
+            stats["total_images"] += len(img_files)
+            stats["total_labels"] += len(label_files)
             
-            if img_subset.exists() and label_subset.exists():
-                found_subsets.append(subset)
-                
-                # 统计图片和标签文件
-                img_files = list(img_subset.glob("*"))
-                img_files = [f for f in img_files if f.is_file() and f.suffix.lower() in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']]
-                
-                label_files = list(label_subset.glob("*"))
-                label_files = [f for f in label_files if f.is_file() and f.suffix.lower() in ['.txt', '.xml', '.json']]
-                
-                stats["subsets"][subset] = {
-                    "images": len(img_files),
-                    "labels": len(label_files)
-                }
-                
-                stats["total_images"] += len(img_files)
-                stats["total_labels"] += len(label_files)
-                
-                # 记录文件格式
-                for img in img_files:
-                    stats["image_formats"].add(img.suffix.lower())
-                for label in label_files:
-                    stats["label_formats"].add(label.suffix.lower())
+            # 记录文件格式
+            for img in img_files:
+                stats["image_formats"].add(img.suffix.lower())
+            for label in label_files:
+                stats["label_formats"].add(label.suffix.lower())
         
         if not found_subsets:
             return False, "未找到有效的子集目录 (train/test/val)", stats
@@ -0,0 +1,143 @@
+"""
+重复文件查找（内容完全相同）
+
+分阶段排除，只有越来越少的候选文件需要读取更多内容：
+    1. 按文件大小分组，大小唯一的文件直接排除（只需 stat）
+    2. 同大小的文件计算首尾各 64KB 的哈希，不同者排除
+       （不超过 128KB 的文件这一步已读完整个文件，结果即完整哈希）
+    3. 剩余文件分块流式计算完整内容哈希（BLAKE2b，与元数据缓存的 content_hash 相同）
+元数据缓存中已有完整哈希且文件未变化的直接使用，跳过读取；
+哈希计算在线程池中进行（hashlib 计算时释放 GIL），结果按重复组返回。
+"""
+import hashlib
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..utils.metadata_cache import hash_file, lookup_file_hashes, store_file_hashes
+
+
+DEFAULT_HASH_THREADS = 8
+EDGE_BYTES = 64 * 1024  # 第二阶段读取的文件头 / 文件尾长度
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def edge_hash(file_path: Path, size: int) -> str:
+    """文件首尾各 EDGE_BYTES 字节的哈希；文件不超过 2 * EDGE_BYTES 时与 hash_file 结果相同"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        if size <= 2 * EDGE_BYTES:
+            h.update(f.read())
+        else:
+            h.update(f.read(EDGE_BYTES))
+            f.seek(-EDGE_BYTES, os.SEEK_END)
+            h.update(f.read(EDGE_BYTES))
+    return h.hexdigest()
+
+
+class DuplicateFinder:
+    """查找内容完全相同的文件，返回重复组（组内与组间都按输入顺序）"""
+
+    def __init__(self, threads: int = DEFAULT_HASH_THREADS, use_cache: bool = True):
+        self.threads = max(1, int(threads))
+        self.use_cache = use_cache
+        self.unreadable: List[Path] = []  # 无法读取的文件（不参与比较）
+        self.stats: Dict[str, int] = {}
+
+    def find(self, files: Iterable[Path], progress: Optional[ProgressCallback] = None) -> List[List[Path]]:
+        """
+        progress(已完成, 总数) 在计算哈希期间定期调用；回调抛出的异常（如取消任务）会中止查找。
+        """
+        self.unreadable = []
+        sizes: Dict[Path, int] = {}
+        by_size: Dict[int, List[Path]] = defaultdict(list)
+        for f in files:
+            f = Path(f)
+            if f in sizes:
+                continue  # 同一路径重复出现不算重复文件
+            try:
+                size = os.stat(f).st_size
+            except OSError:
+                self.unreadable.append(f)
+                continue
+            sizes[f] = size
+            by_size[size].append(f)
+        candidates = [f for group in by_size.values() if len(group) > 1 for f in group]
+
+        # 缓存中已有完整哈希的文件跳过第二、三阶段
+        digests: Dict[Path, str] = {}
+        if self.use_cache and candidates:
+            for f, digest in zip(candidates, lookup_file_hashes(candidates)):
+                if digest is not None:
+                    digests[f] = digest
+        cache_hits = len(digests)
+
+        # 第二阶段：首尾哈希
+        need_edge = [f for f in candidates if f not in digests]
+        edges = self._hash_all(lambda f: edge_hash(f, sizes[f]), need_edge, progress, 0, len(need_edge))
+        computed: Dict[Path, str] = {}
+        for f, digest in edges.items():
+            if sizes[f] <= 2 * EDGE_BYTES:
+                computed[f] = digest
+
+        # 同大小且首尾相同（或同大小存在已知完整哈希）的大文件进入第三阶段
+        edge_groups: Dict[Tuple[int, str], int] = defaultdict(int)
+        for f, digest in edges.items():
+            edge_groups[sizes[f], digest] += 1
+        known_sizes = {sizes[f] for f in digests}
+        need_full = [
+            f for f, digest in edges.items()
+            if f not in computed and (edge_groups[sizes[f], digest] > 1 or sizes[f] in known_sizes)
+        ]
+        computed.update(self._hash_all(hash_file, need_full, progress, len(need_edge),
+                                       len(need_edge) + len(need_full)))
+
+        if self.use_cache and computed:
+            store_file_hashes(computed.items())
+        digests.update(computed)
+
+        self.stats = {
+            "files": len(sizes),
+            "same_size": len(candidates),
+            "cache_hits": cache_hits,
+            "edge_hashed": len(edges),
+            "full_hashed": len(need_full),
+        }
+
+        groups: Dict[Tuple[int, str], List[Path]] = defaultdict(list)
+        for f, size in sizes.items():
+            digest = digests.get(f)
+            if digest is not None:
+                groups[size, digest].append(f)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def _hash_all(self, func: Callable[[Path], str], files: List[Path], progress: Optional[ProgressCallback],
+                  done: int, total: int) -> Dict[Path, str]:
+        """在线程池中计算 files 的哈希，读取失败的文件记入 unreadable"""
+        results: Dict[Path, str] = {}
+        if not files:
+            return results
+        executor = ThreadPoolExecutor(max_workers=min(self.threads, len(files)))
+        try:
+            futures = {executor.submit(func, f): f for f in files}
+            for future in as_completed(futures):
+                f = futures[future]
+                try:
+                    results[f] = future.result()
+                except OSError:
+                    self.unreadable.append(f)
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        # 按输入顺序返回，保证结果与线程完成顺序无关
+        return {f: results[f] for f in files if f in results}
+
+
+def find_duplicate_files(files: Iterable[Path], progress: Optional[ProgressCallback] = None) -> List[List[Path]]:
+    """使用默认设置查找重复文件，见 DuplicateFinder.find"""
+    return DuplicateFinder().find(files, progress)
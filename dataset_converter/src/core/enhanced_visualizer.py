@@ -1,9 +1,9 @@
 """
 增强的数据可视化器
+
+matplotlib / seaborn 在第一次绘图时才导入（见 utils/lazy_import），
+导入本模块不会加载绘图后端。
 """
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-import seaborn as sns
 import numpy as np
 from pathlib import Path
 from typing import List, Tuple, Dict, Optional
@@ -13,18 +13,21 @@ from collections import Counter, defaultdict
 import colorsys
 
 from .base_parser import ImageAnnotation
+from .stats_engine import DatasetStats, Histogram2D, collect_stats
+from ..utils.lazy_import import lazy_import
+
+
+def _configure_matplotlib(pyplot) -> None:
+    """设置中文字体支持 - 更全面的字体配置（pyplot 第一次导入时执行）"""
+    pyplot.rcParams['font.sans-serif'] = ['SimSun', 'SimHei', 'Microsoft YaHei', 'WenQuanYi Micro Hei', 'DejaVu Sans', 'Arial Unicode MS']
+    pyplot.rcParams['axes.unicode_minus'] = False
+    pyplot.rcParams['font.size'] = 10
 
-# 设置中文字体支持 - 更全面的字体配置
-import matplotlib
-matplotlib.rcParams['font.sans-serif'] = ['SimSun', 'SimHei', 'Microsoft YaHei', 'WenQuanYi Micro Hei', 'DejaVu Sans', 'Arial Unicode MS']
-matplotlib.rcParams['axes.unicode_minus'] = False
-matplotlib.rcParams['font.size'] = 10
 
-# 确保字体缓存更新
-try:
-    matplotlib.font_manager._rebuild()
-except:
-    pass
+plt = lazy_import("matplotlib.pyplot", setup=_configure_matplotlib)
+patches = lazy_import("matplotlib.patches")
+sns = lazy_import("seaborn")
+
 
 class EnhancedVisualizer:
     """增强的数据可视化器"""
@@ -135,31 +138,31 @@ class EnhancedVisualizer:
         
         # 1. 类别分布饼图
         ax1 = plt.subplot(3, 3, 1)
-        self._plot_class_distribution_pie(stats['class_counts'], ax1, theme)
+        self._plot_class_distribution_pie(stats.class_counts, ax1, theme)
         
         # 2. 类别分布柱状图
         ax2 = plt.subplot(3, 3, 2)
-        self._plot_class_distribution_bar(stats['class_counts'], ax2, theme)
+        self._plot_class_distribution_bar(stats.class_counts, ax2, theme)
         
         # 3. 图片尺寸分布
         ax3 = plt.subplot(3, 3, 3)
-        self._plot_image_size_distribution(stats['image_sizes'], ax3, theme)
+        self._plot_image_size_distribution(stats.image_size_hist, ax3, theme)
         
         # 4. 标注框尺寸分布
         ax4 = plt.subplot(3, 3, 4)
-        self._plot_bbox_size_distribution(stats['bbox_sizes'], ax4, theme)
+        self._plot_bbox_size_distribution(stats.box_size_hist, ax4, theme)
         
         # 5. 每张图片标注数量分布
         ax5 = plt.subplot(3, 3, 5)
-        self._plot_annotations_per_image(stats['annotations_per_image'], ax5, theme)
+        self._plot_annotations_per_image(stats, ax5, theme)
         
         # 6. 标注密度热力图
         ax6 = plt.subplot(3, 3, 6)
-        self._plot_annotation_density_heatmap(annotations, ax6, theme)
+        self._plot_annotation_density_heatmap(stats.box_center_hist, ax6, theme)
         
         # 7. 宽高比分布
         ax7 = plt.subplot(3, 3, 7)
-        self._plot_aspect_ratio_distribution(stats['aspect_ratios'], ax7, theme)
+        self._plot_aspect_ratio_distribution(stats, ax7, theme)
         
         # 8. 数据集概览表格
         ax8 = plt.subplot(3, 3, 8)
@@ -183,45 +186,9 @@ class EnhancedVisualizer:
         
         print(f"统计仪表板已保存: {dashboard_file}")
     
-    def _collect_statistics(self, annotations: List[ImageAnnotation]) -> Dict:
-        """收集统计数据"""
-        stats = {
-            'total_images': len(annotations),
-            'total_boxes': 0,
-            'total_polygons': 0,
-            'class_counts': Counter(),
-            'image_sizes': [],
-            'bbox_sizes': [],
-            'annotations_per_image': [],
-            'aspect_ratios': []
-        }
-        
-        for ann in annotations:
-            # 图片尺寸
-            stats['image_sizes'].append((ann.width, ann.height))
-            stats['aspect_ratios'].append(ann.width / ann.height if ann.height > 0 else 1.0)
-            
-            # 标注数量
-            box_count = len(ann.boxes) if ann.boxes else 0
-            poly_count = len(ann.polygons) if ann.polygons else 0
-            stats['annotations_per_image'].append(box_count + poly_count)
-            
-            # 矩形框统计
-            if ann.boxes:
-                stats['total_boxes'] += len(ann.boxes)
-                for box in ann.boxes:
-                    stats['class_counts'][box.label] += 1
-                    width = box.xmax - box.xmin
-                    height = box.ymax - box.ymin
-                    stats['bbox_sizes'].append((width, height))
-            
-            # 多边形统计
-            if ann.polygons:
-                stats['total_polygons'] += len(ann.polygons)
-                for poly in ann.polygons:
-                    stats['class_counts'][poly.label] += 1
-        
-        return stats
+    def _collect_statistics(self, annotations: List[ImageAnnotation]) -> DatasetStats:
+        """收集统计数据（可合并的累加器，图表由固定分箱的直方图绘制，内存占用与图片数无关）"""
+        return collect_stats(annotations)
     
     def _plot_class_distribution_pie(self, class_counts: Counter, ax, theme: str):
         """绘制类别分布饼图"""
@@ -266,83 +233,68 @@ class EnhancedVisualizer:
             ax.text(bar.get_x() + bar.get_width()/2., height + max(counts)*0.01,
                    f'{count}', ha='center', va='bottom')
     
-    def _plot_image_size_distribution(self, image_sizes: List[Tuple[int, int]], ax, theme: str):
+    def _plot_image_size_distribution(self, size_hist: Histogram2D, ax, theme: str):
         """绘制图片尺寸分布"""
-        if not image_sizes:
+        if not size_hist.count:
             ax.text(0.5, 0.5, '无数据', ha='center', va='center', transform=ax.transAxes)
             return
         
-        widths, heights = zip(*image_sizes)
+        x_edges, y_edges, counts = size_hist.trimmed()
         
-        # 创建2D直方图
-        ax.hist2d(widths, heights, bins=20, cmap='Blues', alpha=0.7)
+        # 二维直方图（空分箱不着色）
+        mesh = ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts, 0).T, cmap='Blues', alpha=0.7)
         ax.set_xlabel('宽度 (像素)', fontfamily='sans-serif')
         ax.set_ylabel('高度 (像素)', fontfamily='sans-serif')
         ax.set_title('图片尺寸分布', fontsize=14, fontweight='bold', fontfamily='sans-serif')
         
         # 添加颜色条
-        plt.colorbar(ax.collections[0], ax=ax, label='图片数量')
+        plt.colorbar(mesh, ax=ax, label='图片数量')
     
-    def _plot_bbox_size_distribution(self, bbox_sizes: List[Tuple[int, int]], ax, theme: str):
+    def _plot_bbox_size_distribution(self, size_hist: Histogram2D, ax, theme: str):
         """绘制标注框尺寸分布"""
-        if not bbox_sizes:
+        if not size_hist.count:
             ax.text(0.5, 0.5, '无数据', ha='center', va='center', transform=ax.transAxes)
             return
         
-        widths, heights = zip(*bbox_sizes)
+        x_edges, y_edges, counts = size_hist.trimmed()
         
-        ax.scatter(widths, heights, alpha=0.6, s=10)
+        # 对数分箱的二维直方图
+        mesh = ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts, 0).T, cmap='viridis')
+        ax.set_xscale('log')
+        ax.set_yscale('log')
         ax.set_xlabel('标注框宽度', fontfamily='sans-serif')
         ax.set_ylabel('标注框高度', fontfamily='sans-serif')
         ax.set_title('标注框尺寸分布', fontsize=14, fontweight='bold', fontfamily='sans-serif')
         ax.grid(True, alpha=0.3)
+        plt.colorbar(mesh, ax=ax, label='标注框数量')
     
-    def _plot_annotations_per_image(self, annotations_per_image: List[int], ax, theme: str):
+    def _plot_annotations_per_image(self, stats: DatasetStats, ax, theme: str):
         """绘制每张图片标注数量分布"""
-        if not annotations_per_image:
+        if not stats.annotations_per_image.count:
             ax.text(0.5, 0.5, '无数据', ha='center', va='center', transform=ax.transAxes)
             return
         
-        ax.hist(annotations_per_image, bins=20, alpha=0.7, color='skyblue', edgecolor='black')
+        edges, counts = stats.annotation_count_hist.trimmed()
+        ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', alpha=0.7, color='skyblue', edgecolor='black')
         ax.set_xlabel('每张图片标注数量', fontfamily='sans-serif')
         ax.set_ylabel('图片数量', fontfamily='sans-serif')
         ax.set_title('标注数量分布', fontsize=14, fontweight='bold', fontfamily='sans-serif')
         ax.grid(True, alpha=0.3)
         
         # 添加统计信息
-        mean_annotations = np.mean(annotations_per_image)
+        mean_annotations = stats.annotations_per_image.mean
         ax.axvline(mean_annotations, color='red', linestyle='--', 
                   label=f'平均值: {mean_annotations:.1f}')
         ax.legend()
     
-    def _plot_annotation_density_heatmap(self, annotations: List[ImageAnnotation], ax, theme: str):
+    def _plot_annotation_density_heatmap(self, center_hist: Histogram2D, ax, theme: str):
         """绘制标注密度热力图"""
-        if not annotations:
+        if not center_hist.count:
             ax.text(0.5, 0.5, '无数据', ha='center', va='center', transform=ax.transAxes)
             return
         
-        # 创建密度网格
-        grid_size = 20
-        density_grid = np.zeros((grid_size, grid_size))
-        
-        for ann in annotations:
-            if not ann.boxes or ann.width <= 0 or ann.height <= 0:
-                continue
-                
-            for box in ann.boxes:
-                # 计算标注框中心点的归一化坐标
-                center_x = (box.xmin + box.xmax) / 2 / ann.width
-                center_y = (box.ymin + box.ymax) / 2 / ann.height
-                
-                # 映射到网格
-                grid_x = int(center_x * (grid_size - 1))
-                grid_y = int(center_y * (grid_size - 1))
-                
-                if 0 <= grid_x < grid_size and 0 <= grid_y < grid_size:
-                    density_grid[grid_y, grid_x] += 1
-        
-        # 绘制热力图
-        im = ax.imshow(density_grid, cmap='hot', interpolation='bilinear')
+        # 标注框中心点的归一化坐标网格，行对应高度方向
+        im = ax.imshow(center_hist.counts.T, cmap='hot', interpolation='bilinear')
         ax.set_title('标注密度热力图', fontsize=14, fontweight='bold', fontfamily='sans-serif')
         ax.set_xlabel('图片宽度方向', fontfamily='sans-serif')
         ax.set_ylabel('图片高度方向', fontfamily='sans-serif')
@@ -350,13 +302,15 @@ class EnhancedVisualizer:
         # 添加颜色条
         plt.colorbar(im, ax=ax, label='标注密度')
     
-    def _plot_aspect_ratio_distribution(self, aspect_ratios: List[float], ax, theme: str):
+    def _plot_aspect_ratio_distribution(self, stats: DatasetStats, ax, theme: str):
         """绘制宽高比分布"""
-        if not aspect_ratios:
+        aspect_ratio = stats.aspect_ratio
+        if not aspect_ratio.count:
             ax.text(0.5, 0.5, '无数据', ha='center', va='center', transform=ax.transAxes)
             return
         
-        ax.hist(aspect_ratios, bins=30, alpha=0.7, color='lightgreen', edgecolor='black')
+        edges, counts = stats.aspect_ratio_hist.trimmed()
+        ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', alpha=0.7, color='lightgreen', edgecolor='black')
         ax.set_xlabel('宽高比', fontfamily='sans-serif')
         ax.set_ylabel('图片数量', fontfamily='sans-serif')
         ax.set_title('图片宽高比分布', fontsize=14, fontweight='bold', fontfamily='sans-serif')
@@ -367,24 +321,25 @@ class EnhancedVisualizer:
         ratio_names = ['1:1', '4:3', '16:9', '3:2']
         
         for ratio, name in zip(common_ratios, ratio_names):
-            if min(aspect_ratios) <= ratio <= max(aspect_ratios):
+            if aspect_ratio.min <= ratio <= aspect_ratio.max:
                 ax.axvline(ratio, color='red', linestyle='--', alpha=0.7)
                 ax.text(ratio, ax.get_ylim()[1] * 0.9, name, 
                        rotation=90, ha='right', va='top')
     
-    def _plot_dataset_summary_table(self, stats: Dict, ax, theme: str):
+    def _plot_dataset_summary_table(self, stats: DatasetStats, ax, theme: str):
         """绘制数据集概览表格"""
         ax.axis('off')
         
         # 准备表格数据
+        size_stats = stats.image_size_stats()
         table_data = [
-            ['总图片数', f"{stats['total_images']:,}"],
-            ['总矩形框数', f"{stats['total_boxes']:,}"],
-            ['总多边形数', f"{stats['total_polygons']:,}"],
-            ['类别数量', f"{len(stats['class_counts']):,}"],
-            ['平均每图标注数', f"{np.mean(stats['annotations_per_image']):.1f}" if stats['annotations_per_image'] else "0"],
-            ['最大图片尺寸', f"{max(w for w, h in stats['image_sizes'])}x{max(h for w, h in stats['image_sizes'])}" if stats['image_sizes'] else "N/A"],
-            ['最小图片尺寸', f"{min(w for w, h in stats['image_sizes'])}x{min(h for w, h in stats['image_sizes'])}" if stats['image_sizes'] else "N/A"]
+            ['总图片数', f"{stats.total_images:,}"],
+            ['总矩形框数', f"{stats.total_boxes:,}"],
+            ['总多边形数', f"{stats.total_polygons:,}"],
+            ['类别数量', f"{len(stats.class_counts):,}"],
+            ['平均每图标注数', f"{stats.annotations_per_image.mean:.1f}" if stats.annotations_per_image.count else "0"],
+            ['最大图片尺寸', f"{size_stats['max_width']}x{size_stats['max_height']}" if size_stats else "N/A"],
+            ['最小图片尺寸', f"{size_stats['min_width']}x{size_stats['min_height']}" if size_stats else "N/A"]
         ]
         
         # 创建表格
@@ -478,11 +433,12 @@ class EnhancedVisualizer:
         
         print(f"交互式可视化页面已保存: {html_file}")
     
-    def _generate_interactive_html(self, stats: Dict) -> str:
+    def _generate_interactive_html(self, stats: DatasetStats) -> str:
         """生成交互式HTML页面"""
         # 准备数据
-        class_labels = list(stats['class_counts'].keys())
-        class_counts = list(stats['class_counts'].values())
+        class_labels = list(stats.class_counts.keys())
+        class_counts = list(stats.class_counts.values())
+        edges, hist_counts = stats.annotation_count_hist.trimmed()
         
         html = f"""
         <!DOCTYPE html>
@@ -511,19 +467,19 @@ class EnhancedVisualizer:
                 
                 <div class="stats-grid">
                     <div class="stat-card">
-                        <div class="stat-number">{stats['total_images']:,}</div>
+                        <div class="stat-number">{stats.total_images:,}</div>
                         <div class="stat-label">总图片数</div>
                     </div>
                     <div class="stat-card">
-                        <div class="stat-number">{stats['total_boxes']:,}</div>
+                        <div class="stat-number">{stats.total_boxes:,}</div>
                         <div class="stat-label">总矩形框数</div>
                     </div>
                     <div class="stat-card">
-                        <div class="stat-number">{stats['total_polygons']:,}</div>
+                        <div class="stat-number">{stats.total_polygons:,}</div>
                         <div class="stat-label">总多边形数</div>
                     </div>
                     <div class="stat-card">
-                        <div class="stat-number">{len(stats['class_counts']):,}</div>
+                        <div class="stat-number">{len(stats.class_counts):,}</div>
                         <div class="stat-label">类别数量</div>
                     </div>
                 </div>
@@ -575,11 +531,11 @@ class EnhancedVisualizer:
                 
                 Plotly.newPlot('class-distribution-bar', barData, barLayout);
                 
-                // 标注数量分布直方图
+                // 标注数量分布直方图（按每图标注数分箱）
                 var histData = [{{
-                    x: {stats['annotations_per_image']},
-                    type: 'histogram',
-                    nbinsx: 20,
+                    x: {edges[:-1].astype(int).tolist()},
+                    y: {hist_counts.tolist()},
+                    type: 'bar',
                     marker: {{ color: 'rgba(76, 175, 80, 0.8)' }}
                 }}];
                 
@@ -0,0 +1,332 @@
+"""
+图片完整性校验（分级）
+
+Image.verify() 只检查部分结构：JPEG 扫描数据被截断时照样通过，却仍要解析整个文件。这里分两级：
+    - QUICK：只读文件头与文件尾，不解码像素。格式可识别、头部尺寸可解析，
+      且文件含格式规定的结束标记（JPEG 的 EOI、PNG 的 IEND 块、GIF 的 0x3B），
+      BMP / WebP 的文件长度不小于头部声明的长度。能发现截断、下载不完整与非图片文件，适合每次导入时执行。
+      结束标记通常在文件尾 TAIL_SIZE 字节内；结束标记后还有附加数据（动态照片、追加的元数据）时
+      JPEG / PNG 向前查找结束标记（JPEG 只查找扫描数据之后的部分，不会误认缩略图的 EOI），
+      只有这类文件与截断的文件需要多读。GIF 无法向前查找，文件尾不是 0x3B 时记为通过但无法判定
+      （VerifyResult.inconclusive），由 FULL 确认
+    - FULL：头部可解析的文件解码全部像素（Image.load()，动图逐帧），以解码结果为准，
+      能发现结构检查看不出的数据损坏。在多个解码进程中逐个文件执行，超过 timeout 的文件记为失败，
+      卡住或崩溃的进程换新后继续，适合定期执行
+结果写入元数据缓存（decode_ok / verify_level / verify_error），按 (路径, 大小, mtime) 失效：
+同一版本的文件 FULL 校验只执行一次；QUICK 的结论（包括判定损坏）在要求 FULL 时仍会解码确认，超时的文件下次重试。
+"""
+import io
+import multiprocessing
+import multiprocessing.connection
+import os
+import struct
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image, ImageSequence
+
+from .parallel import parallel_imap, resolve_workers
+from ..utils.image_utils import HEADER_SIZE, probe_stream, sniff_format
+from ..utils.metadata_cache import lookup_verifications, store_verifications
+
+
+QUICK = 1
+FULL = 2
+LEVELS = {"quick": QUICK, "full": FULL}
+DEFAULT_DECODE_TIMEOUT = 30.0  # FULL 校验单个文件的超时（秒）
+DEFAULT_CHUNK_SIZE = 256  # QUICK 校验每次提交给子进程的文件数
+TAIL_SIZE = 4096  # 先在文件尾这么多字节内查找结束标记
+SEARCH_BLOCK = 1 << 16  # 文件尾没有结束标记时，向前查找每次读取的字节数
+
+ProgressCallback = Callable[[int, int], None]
+
+
+@dataclass
+class VerifyResult:
+    ok: bool
+    level: int  # 得出结论的校验级别
+    format: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    error: Optional[str] = None  # 失败原因；ok 时为 QUICK 无法判定的原因
+    timed_out: bool = False  # 解码超时：结论取决于超时设置而非文件本身，不写入缓存
+
+    def cache_fields(self) -> Dict:
+        """写入元数据缓存的字段"""
+        fields = {'decode_ok': self.ok, 'verify_level': self.level, 'verify_error': self.error}
+        if self.ok:
+            fields.update(width=self.width, height=self.height, format=self.format)
+        return fields
+
+    @property
+    def inconclusive(self) -> bool:
+        """QUICK 校验通过但无法判定是否截断（如 GIF 结束标记后有附加数据），需 FULL 确认"""
+        return self.ok and self.error is not None
+
+    def satisfies(self, level: int) -> bool:
+        """是否足以回答 level 级的校验（QUICK 判定损坏的文件在 FULL 时以解码结果为准）"""
+        return self.level >= level
+
+
+def _jpeg_scan_offset(f: BinaryIO) -> int:
+    """第一个 SOS 段之后（扫描数据开始处）的偏移；只读各段的段头，结构异常时返回 2"""
+    f.seek(2)
+    while True:
+        seg = f.read(4)
+        if len(seg) < 4 or seg[0] != 0xFF:
+            return 2
+        if seg[1] == 0xFF:  # 段前的填充字节
+            f.seek(-3, os.SEEK_CUR)
+            continue
+        length = int.from_bytes(seg[2:4], "big")
+        if length < 2:
+            return 2
+        if seg[1] == 0xDA:
+            return f.tell() - 2 + length
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _find_backwards(f: BinaryIO, marker: bytes, file_size: int, stop: int) -> bool:
+    """从文件尾向前查找 marker（不早于偏移 stop）：先查 TAIL_SIZE 字节，再按 SEARCH_BLOCK 分块"""
+    end, block = file_size, TAIL_SIZE
+    while end > stop:
+        start = max(stop, end - block)
+        f.seek(start)
+        if marker in f.read(end - start + len(marker) - 1):  # 与后一块重叠，标记跨块时也能找到
+            return True
+        end, block = start, SEARCH_BLOCK
+    return False
+
+
+def _trailer_error(fmt: str, f: BinaryIO, head: bytes, file_size: int) -> Tuple[Optional[str], bool]:
+    """按格式检查结束标记 / 声明长度，返回 (原因, 是否确定损坏)，正常时原因为 None"""
+    if fmt == "jpeg":
+        # 扫描数据中的 0xFF 都会被填充为 FF00，因此其后出现的 FFD9 一定是真正的 EOI
+        if not _find_backwards(f, b"\xff\xd9", file_size, _jpeg_scan_offset(f)):
+            return "缺少 JPEG 结束标记（文件被截断）", True
+    elif fmt == "png":
+        if not _find_backwards(f, b"IEND\xaeB`\x82", file_size, 8):
+            return "缺少 PNG IEND 块（文件被截断）", True
+    elif fmt == "gif":
+        f.seek(max(0, file_size - TAIL_SIZE))
+        if not f.read().rstrip(b"\x00").endswith(b"\x3b"):
+            return "文件尾不是 GIF 结束标记（可能被截断，也可能其后有附加数据），需 FULL 校验确认", False
+    elif fmt == "bmp" and len(head) >= 14:
+        declared, _, offset = struct.unpack("<IIi", head[2:14])
+        if file_size < offset or (declared > 0 and file_size < declared):
+            return "BMP 文件长度小于头部声明（文件被截断）", True
+    elif fmt == "webp" and file_size < struct.unpack("<I", head[4:8])[0] + 8:
+        return "WebP 文件长度小于头部声明（文件被截断）", True
+    return None, False  # TIFF 没有结束标记，只能由 FULL 校验
+
+
+def quick_verify_stream(f: BinaryIO, file_size: int) -> VerifyResult:
+    """QUICK 校验已打开的文件（位于开头，需支持 seek）"""
+    head = f.read(HEADER_SIZE)
+    fmt = sniff_format(head)
+    if fmt is None:
+        return VerifyResult(False, QUICK, error="无法识别的图片格式")
+    f.seek(0)
+    probed = probe_stream(f)
+    if probed is None:
+        return VerifyResult(False, QUICK, fmt, error="文件头损坏，无法读取尺寸")
+    error, broken = _trailer_error(fmt, f, head, file_size)
+    return VerifyResult(not broken, QUICK, fmt, probed[1], probed[2], error)
+
+
+def quick_verify_bytes(data: bytes) -> VerifyResult:
+    """QUICK 校验已读入内存的文件内容"""
+    return quick_verify_stream(io.BytesIO(data), len(data))
+
+
+def quick_verify(path: Path) -> VerifyResult:
+    """QUICK 校验：只读取文件头与文件尾"""
+    try:
+        with open(path, "rb") as f:
+            return quick_verify_stream(f, os.fstat(f.fileno()).st_size)
+    except OSError as e:
+        return VerifyResult(False, QUICK, error=str(e))
+
+
+def full_verify(path: Path) -> VerifyResult:
+    """FULL 校验：文件头可解析时解码全部像素，以解码结果为准（模块级函数，供进程池调用）"""
+    result = quick_verify(path)
+    result.level = FULL
+    if result.width is None:  # 无法识别或文件头损坏
+        return result
+    try:
+        with Image.open(path) as img:
+            for frame in ImageSequence.Iterator(img):
+                frame.load()
+    except Exception as e:
+        result.ok = False
+        result.error = str(e) or type(e).__name__
+    else:
+        result.ok = True
+        result.error = None
+    return result
+
+
+def _decode_loop(conn) -> None:
+    """解码进程：逐个接收路径，返回 full_verify 结果，收到 None 或连接关闭时退出"""
+    while True:
+        try:
+            path = conn.recv()
+        except EOFError:
+            return
+        if path is None:
+            return
+        conn.send(full_verify(path))
+
+
+class _DecodeWorker:
+    """一个解码进程及其专用管道；超时或崩溃时只终止这一个进程"""
+
+    def __init__(self):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_decode_loop, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.task: Optional[int] = None  # 正在处理的文件序号
+        self.started = 0.0
+
+    def submit(self, k: int, path: Path) -> None:
+        self.task = k
+        self.started = time.monotonic()
+        self.conn.send(path)
+
+    def stop(self, kill: bool = False) -> None:
+        if kill:
+            self.process.terminate()
+        else:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+def _decode_all(paths: List[Path], workers: int, timeout: Optional[float],
+                progress: Optional[ProgressCallback]) -> List[VerifyResult]:
+    """
+    在 workers 个解码进程中逐个文件执行 full_verify，每个进程同时只处理一个文件，从提交起计时。
+    超时的进程被终止并换一个新进程；进程崩溃（如解码器段错误）只影响当前文件。
+    """
+    results: List[Optional[VerifyResult]] = [None] * len(paths)
+    waiting = deque(range(len(paths)))
+    pool: List[_DecodeWorker] = []
+    done = 0
+    try:
+        pool = [_DecodeWorker() for _ in range(min(workers, len(paths)))]
+        while True:
+            for worker in pool:
+                if worker.task is None and waiting:
+                    k = waiting.popleft()
+                    worker.submit(k, paths[k])
+            busy = [w for w in pool if w.task is not None]
+            if not busy:
+                break
+            wait = None
+            if timeout is not None:
+                wait = max(0.0, timeout - (time.monotonic() - min(w.started for w in busy)))
+            ready = set(multiprocessing.connection.wait([w.conn for w in busy], timeout=wait))
+            now = time.monotonic()
+            for i, worker in enumerate(pool):
+                k = worker.task
+                if k is None:
+                    continue
+                if worker.conn in ready:
+                    try:
+                        results[k] = worker.conn.recv()
+                        restart = False
+                    except (EOFError, OSError):
+                        results[k] = VerifyResult(False, FULL, error="解码进程异常退出")
+                        restart = True
+                elif timeout is not None and now - worker.started >= timeout:
+                    results[k] = VerifyResult(False, FULL, error=f"解码超时（超过 {timeout:g}s）", timed_out=True)
+                    restart = True
+                else:
+                    continue
+                worker.task = None
+                done += 1
+                if restart:
+                    worker.stop(kill=True)
+                    pool[i] = _DecodeWorker()
+            if progress is not None:
+                progress(done, len(paths))
+    finally:
+        for worker in pool:
+            worker.stop(kill=worker.task is not None)
+    return results
+
+
+class ImageVerifier:
+    """按级别校验图片完整性，结果按输入顺序返回；缓存中已有足够级别结论的文件不再读取"""
+
+    def __init__(self, level: int = QUICK, timeout: Optional[float] = DEFAULT_DECODE_TIMEOUT,
+                 workers: Optional[int] = None, chunk_size: Optional[int] = None, use_cache: bool = True):
+        if level not in LEVELS.values():
+            raise ValueError(f"不支持的校验级别: {level}")
+        self.level = level
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.workers = workers
+        self.chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        self.use_cache = use_cache
+        self.stats: Dict[str, int] = {}
+
+    def verify(self, files: Iterable[Path], progress: Optional[ProgressCallback] = None) -> List[VerifyResult]:
+        """progress(已完成, 总数) 在校验期间定期调用；回调抛出的异常（如取消任务）会中止校验"""
+        files = [Path(f) for f in files]
+        results: List[Optional[VerifyResult]] = [None] * len(files)
+        if self.use_cache:
+            for k, meta in enumerate(lookup_verifications(files)):
+                if meta is None:
+                    continue
+                cached = VerifyResult(bool(meta.decode_ok), meta.verify_level, meta.format,
+                                      meta.width, meta.height, meta.verify_error)
+                if cached.satisfies(self.level):
+                    results[k] = cached
+        missing = [k for k, r in enumerate(results) if r is None]
+        paths = [files[k] for k in missing]
+
+        workers = resolve_workers(self.workers)
+        if self.level == QUICK:
+            verified = []
+            for done, result in enumerate(parallel_imap(quick_verify, paths, workers, self.chunk_size), 1):
+                verified.append(result)
+                if progress is not None:
+                    progress(done, len(paths))
+        elif workers <= 1 and self.timeout is None:
+            verified = []
+            for done, path in enumerate(paths, 1):
+                verified.append(full_verify(path))
+                if progress is not None:
+                    progress(done, len(paths))
+        else:
+            # 超时需要可以终止的子进程，单进程时也在进程池中执行
+            verified = _decode_all(paths, workers, self.timeout, progress) if paths else []
+
+        for k, result in zip(missing, verified):
+            results[k] = result
+        if self.use_cache and missing:
+            store_verifications((files[k], results[k].cache_fields()) for k in missing if not results[k].timed_out)
+        self.stats = {
+            "files": len(files),
+            "cache_hits": len(files) - len(missing),
+            "verified": len(missing),
+            "failed": sum(1 for r in results if not r.ok),
+        }
+        return results
+
+
+def verify_images(files: Iterable[Path], level: int = QUICK,
+                  progress: Optional[ProgressCallback] = None) -> List[VerifyResult]:
+    """使用默认设置校验图片，见 ImageVerifier.verify"""
+    return ImageVerifier(level).verify(files, progress)
@@ -0,0 +1,282 @@
+"""
+增量转换
+
+在输出目录保存清单（SQLite），记录每个源标签文件及其图片的指纹
+(大小, mtime_ns, 内容哈希) 和它产生的输出文件。再次转换时：
+    - 大小与 mtime 都未变的单元直接跳过
+    - 有变化时比较内容哈希，内容相同只更新指纹（如仅被 touch）
+    - 新增 / 内容变化的单元重新解析并导出
+    - 已删除或变化单元不再产生的旧输出被删除
+图片哈希只在其大小或 mtime 变化时才计算，首次全量转换不读取图片内容。
+"""
+import json
+import os
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .base_parser import BaseParser, ImageAnnotation
+from ..utils.metadata_cache import cached_file_hash, hash_file
+
+
+MANIFEST_NAME = ".dataforge_manifest.sqlite3"
+MANIFEST_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    label_size INTEGER NOT NULL,
+    label_mtime_ns INTEGER NOT NULL,
+    label_hash TEXT,
+    image_path TEXT,
+    image_size INTEGER,
+    image_mtime_ns INTEGER,
+    image_hash TEXT,
+    outputs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+@dataclass
+class FileStamp:
+    size: int
+    mtime_ns: int
+    hash: Optional[str] = None
+
+
+@dataclass
+class ManifestEntry:
+    key: str  # 源标签文件相对输入目录的路径
+    label: FileStamp
+    image_path: Optional[str] = None  # 图片相对输入目录的路径
+    image: Optional[FileStamp] = None
+    outputs: List[str] = field(default_factory=list)  # 输出文件相对输出目录的路径
+
+
+class ConversionManifest:
+    """输出目录中的增量转换清单"""
+
+    def __init__(self, output_dir: Path):
+        self.path = Path(output_dir) / MANIFEST_NAME
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.executescript(_SCHEMA)
+
+    def get_meta(self) -> Dict:
+        return {name: json.loads(value) for name, value in self._conn.execute("SELECT name, value FROM meta")}
+
+    def set_meta(self, meta: Dict) -> None:
+        self._conn.executemany("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                               [(name, json.dumps(value, ensure_ascii=False)) for name, value in meta.items()])
+
+    def load(self) -> Dict[str, ManifestEntry]:
+        entries = {}
+        for row in self._conn.execute("SELECT * FROM entries"):
+            key, l_size, l_mtime, l_hash, img_path, i_size, i_mtime, i_hash, outputs = row
+            entries[key] = ManifestEntry(
+                key=key,
+                label=FileStamp(l_size, l_mtime, l_hash),
+                image_path=img_path,
+                image=FileStamp(i_size, i_mtime, i_hash) if i_size is not None else None,
+                outputs=json.loads(outputs),
+            )
+        return entries
+
+    def upsert(self, entries: Iterable[ManifestEntry]) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(e.key, e.label.size, e.label.mtime_ns, e.label.hash, e.image_path,
+              e.image.size if e.image else None, e.image.mtime_ns if e.image else None,
+              e.image.hash if e.image else None, json.dumps(e.outputs, ensure_ascii=False))
+             for e in entries],
+        )
+
+    def delete(self, keys: Iterable[str]) -> None:
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in keys])
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM entries")
+        self._conn.execute("DELETE FROM meta")
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def relative_key(path: Path, root: Path) -> str:
+    """清单中的键：相对 root 的 POSIX 路径，不在 root 下时为完整路径"""
+    try:
+        return Path(path).relative_to(root).as_posix()
+    except ValueError:
+        return Path(path).as_posix()
+
+
+def _stamp(path: Path, old: Optional[FileStamp], hash_func, hash_new: bool) -> Tuple[FileStamp, bool]:
+    """
+    返回 (当前指纹, 是否变化)。大小与 mtime 不变视为未变化；
+    否则若旧记录有哈希则比较内容哈希；没有可比较的哈希时视为变化。
+    hash_new 为 False 时新增文件不计算哈希（留待下次变化时计算）。
+    """
+    st = os.stat(path)
+    if old is not None and old.size == st.st_size and old.mtime_ns == st.st_mtime_ns:
+        return old, False
+    if old is None and not hash_new:
+        return FileStamp(st.st_size, st.st_mtime_ns), True
+    digest = hash_func(path)
+    changed = old is None or old.hash is None or digest is None or digest != old.hash
+    return FileStamp(st.st_size, st.st_mtime_ns, digest), changed
+
+
+@dataclass
+class IncrementalPlan:
+    dirty: List[ManifestEntry]  # 需要重新解析导出（outputs 为旧输出）
+    refreshed: List[ManifestEntry]  # 内容未变、只需更新指纹
+    removed: List[ManifestEntry]  # 源文件已删除
+    unchanged: int = 0
+
+
+def plan_incremental(units: List[Tuple[Path, Optional[Path]]], old_entries: Dict[str, ManifestEntry],
+                     input_dir: Path) -> IncrementalPlan:
+    """比较当前源文件与清单，得到需要处理的单元"""
+    plan = IncrementalPlan(dirty=[], refreshed=[], removed=[])
+    seen: Set[str] = set()
+    for label_file, img_file in units:
+        key = relative_key(label_file, input_dir)
+        seen.add(key)
+        old = old_entries.get(key)
+        try:
+            label_stamp, label_changed = _stamp(label_file, old.label if old else None, hash_file, True)
+            image_stamp, image_changed = None, False
+            image_rel = relative_key(img_file, input_dir) if img_file is not None else None
+            if img_file is not None:
+                same_image = old is not None and old.image_path == image_rel
+                image_stamp, image_changed = _stamp(img_file, old.image if same_image else None,
+                                                    cached_file_hash, False)
+            elif old is not None and old.image_path is not None:
+                image_changed = True  # 图片被删除
+        except OSError:
+            continue  # 扫描后被删除，按不存在处理
+
+        entry = ManifestEntry(key=key, label=label_stamp, image_path=image_rel, image=image_stamp,
+                              outputs=old.outputs if old else [])
+        if old is None or label_changed or image_changed:
+            plan.dirty.append(entry)
+        elif label_stamp is not old.label or image_stamp is not old.image:
+            plan.refreshed.append(entry)
+        else:
+            plan.unchanged += 1
+
+    plan.removed = [entry for key, entry in old_entries.items() if key not in seen]
+    return plan
+
+
+def _remove_outputs(output_dir: Path, names: Iterable[str]) -> int:
+    removed = 0
+    for name in names:
+        try:
+            (output_dir / name).unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def convert_incremental(parser: BaseParser, exporter: BaseParser, input_dir: Path, output_dir: Path,
+                        input_format: str, output_format: str) -> Dict[str, int]:
+    """
+    增量转换，返回各类单元数量统计。
+    输入 / 输出格式或输入目录与清单记录不一致时按全量转换处理（清单中的旧输出会被删除）。
+    """
+    if not exporter.per_image_output:
+        raise ValueError(f"{output_format} 当前的输出模式不按图片写文件，不支持增量转换")
+    input_dir = Path(input_dir)
+    output_dir = Path(output_dir)
+    manifest = ConversionManifest(output_dir)
+    try:
+        meta = {
+            "version": MANIFEST_VERSION,
+            "input_dir": str(input_dir.resolve()),
+            "input_format": input_format,
+            "output_format": output_format,
+        }
+        old_meta = manifest.get_meta()
+        old_entries = manifest.load()
+        if any(old_meta.get(k) != v for k, v in meta.items()):
+            # 清单来自不同的转换，全部视为已删除后重建
+            old_entries_for_plan: Dict[str, ManifestEntry] = {}
+            stale = list(old_entries.values())
+            old_meta = {}
+        else:
+            old_entries_for_plan = old_entries
+            stale = []
+
+        plan = plan_incremental(parser.source_units(input_dir), old_entries_for_plan, input_dir)
+        plan.removed.extend(stale)
+
+        # 沿用上次导出的 label→id，保证未重写的文件与新文件类别 id 一致
+        previous_label_map = old_meta.get("label_map") or {}
+        saved_label_map = None
+        if previous_label_map and hasattr(exporter, "set_label_map"):
+            saved_label_map = dict(getattr(exporter, "_external_label_map", {}))
+            exporter.set_label_map({**previous_label_map, **saved_label_map})
+
+        # 先删除失效输出：已删除单元与变化单元的旧输出（仍被未变化单元引用的保留）
+        dirty_keys = {e.key for e in plan.dirty}
+        removed_keys = {e.key for e in plan.removed}
+        live_outputs: Set[str] = set()
+        for key, entry in old_entries_for_plan.items():
+            if key not in dirty_keys and key not in removed_keys:
+                live_outputs.update(entry.outputs)
+        stale_outputs = {name for e in plan.removed + plan.dirty for name in e.outputs} - live_outputs
+        n_deleted = _remove_outputs(output_dir, stale_outputs)
+
+        # 只解析变化的单元，导出时记录每个单元产生的输出
+        by_key = {e.key: e for e in plan.dirty}
+        for e in plan.dirty:
+            e.outputs = []
+        only = {input_dir / e.key for e in plan.dirty}
+
+        def record(annotations: Iterator[ImageAnnotation]) -> Iterator[ImageAnnotation]:
+            for ann in annotations:
+                entry = by_key.get(relative_key(ann.source, input_dir)) if ann.source is not None else None
+                name = exporter.output_name(ann)
+                if entry is not None and name and name not in entry.outputs:
+                    entry.outputs.append(name)
+                yield ann
+
+        try:
+            if plan.dirty:
+                exporter.export(record(parser.iter_parse(input_dir, only=only)), output_dir)
+        finally:
+            if saved_label_map is not None:
+                exporter.set_label_map(saved_label_map)
+
+        if not old_meta:
+            manifest.clear()
+        manifest.delete(e.key for e in plan.removed)
+        manifest.upsert(plan.dirty + plan.refreshed)
+        label_map_out = getattr(exporter, "exported_label_map", None) if plan.dirty else previous_label_map
+        if label_map_out:
+            meta["label_map"] = label_map_out
+        manifest.set_meta(meta)
+        manifest.commit()
+    finally:
+        manifest.close()
+
+    stats = {
+        "processed": len(plan.dirty),
+        "refreshed": len(plan.refreshed),
+        "removed": len(plan.removed),
+        "unchanged": plan.unchanged,
+        "deleted_outputs": n_deleted,
+    }
+    print(f"增量转换完成: 处理 {stats['processed']} 个, 删除 {stats['removed']} 个, "
+          f"未变化 {stats['unchanged']} 个, 清理旧输出 {stats['deleted_outputs']} 个")
+    return stats
@@ -0,0 +1,240 @@
+"""
+增量质量检查
+
+在数据集目录保存清单（SQLite）：
+    - 每个源标签文件一行：标签与其引用图片的 (大小, mtime_ns)，以及该文件的逐图片检查结果
+      （QualityStats.to_dict()：问题记录、统计、内容哈希）
+    - 全部文件结果的合并（执行数据集级规则之前），即上次检查的汇总
+再次检查时只 stat 文件比较指纹：
+    - 没有变化时直接使用保存的汇总，不解析、不读取图片，也不读取逐文件结果
+    - 有变化时从汇总中减去变化与已删除文件的旧结果，再合并重新解析、检查的新结果
+    - 依赖全部文件的规则（重复图片、标签写法不一致）由调用方在汇总上重新执行
+图片校验级别（QUICK / FULL）按文件记录：较高级别的结果可供较低级别沿用，反之重新检查。
+格式、标签映射或规则版本与清单记录不一致时全部重新检查。
+增量更新后问题与统计的顺序可能与完整检查不同，内容相同。
+"""
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..utils.json_stream import dumps, loads
+from .base_parser import BaseParser
+from .quality_checker import RULES_VERSION, QualityChecker, QualityStats
+from .incremental import relative_key
+
+
+MANIFEST_NAME = ".dataforge_quality.sqlite3"
+MANIFEST_VERSION = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    key TEXT PRIMARY KEY,
+    label_size INTEGER NOT NULL,
+    label_mtime_ns INTEGER NOT NULL,
+    image TEXT,
+    image_size INTEGER,
+    image_mtime_ns INTEGER,
+    extra_images TEXT,
+    verify_level INTEGER NOT NULL,
+    verdict BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aggregate (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    stats BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+_SQL_BATCH = 500  # IN (...) 查询每批的键数，低于 SQLite 的参数数量上限
+
+ProgressCallback = Callable[[int, int, str], None]  # (已完成, 总数, 阶段说明)
+ImageStamp = Tuple[str, int, int]  # (相对路径, 大小, mtime_ns)，图片不存在时大小与 mtime 为 -1
+# 清单中的一行（不含检查结果）：(标签大小, 标签 mtime_ns, 图片, 图片大小, 图片 mtime_ns, 其余图片 JSON, 校验级别)
+Fingerprint = Tuple[int, int, Optional[str], Optional[int], Optional[int], Optional[str], int]
+
+
+class QualityManifest:
+    """数据集目录中的逐文件质量检查结果与汇总"""
+
+    def __init__(self, dataset_dir: Path):
+        self.path = Path(dataset_dir) / MANIFEST_NAME
+        self._conn = sqlite3.connect(str(self.path))
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != MANIFEST_VERSION:
+            # 旧版本的清单结构不同，丢弃后重建（下次检查全部重新检查）
+            for table in ("verdicts", "aggregate", "meta"):
+                self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._conn.execute(f"PRAGMA user_version = {MANIFEST_VERSION}")
+        self._conn.executescript(_SCHEMA)
+
+    def get_meta(self) -> Dict:
+        return {name: json.loads(value) for name, value in self._conn.execute("SELECT name, value FROM meta")}
+
+    def set_meta(self, meta: Dict) -> None:
+        self._conn.executemany("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                               [(name, json.dumps(value, ensure_ascii=False)) for name, value in meta.items()])
+
+    def fingerprints(self) -> Dict[str, Fingerprint]:
+        """全部文件的指纹（不读取检查结果）"""
+        rows = self._conn.execute("SELECT key, label_size, label_mtime_ns, image, image_size, image_mtime_ns, "
+                                  "extra_images, verify_level FROM verdicts")
+        return {row[0]: row[1:] for row in rows}
+
+    def verdicts(self, keys: List[str]) -> Iterable[QualityStats]:
+        """指定文件保存的检查结果"""
+        for start in range(0, len(keys), _SQL_BATCH):
+            batch = keys[start:start + _SQL_BATCH]
+            sql = f"SELECT verdict FROM verdicts WHERE key IN ({','.join('?' * len(batch))})"
+            for (verdict,) in self._conn.execute(sql, batch):
+                yield QualityStats.from_dict(loads(verdict))
+
+    def get_aggregate(self) -> Optional[QualityStats]:
+        row = self._conn.execute("SELECT stats FROM aggregate WHERE id = 0").fetchone()
+        return QualityStats.from_dict(loads(row[0])) if row is not None else None
+
+    def set_aggregate(self, stats: QualityStats) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO aggregate (id, stats) VALUES (0, ?)", (dumps(stats.to_dict()),))
+
+    def upsert(self, rows: Iterable[Tuple]) -> None:
+        """rows: (键, *指纹, 检查结果 JSON)"""
+        self._conn.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        self._conn.executemany("DELETE FROM verdicts WHERE key = ?", [(k,) for k in keys])
+
+    def clear(self) -> None:
+        for table in ("verdicts", "aggregate", "meta"):
+            self._conn.execute(f"DELETE FROM {table}")
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _stat(path) -> Tuple[int, int]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (-1, -1)
+    return (st.st_size, st.st_mtime_ns)
+
+
+def _key_function(root: Path) -> Callable[[Path], str]:
+    """与 relative_key 结果相同；root 下的路径直接截取字符串，省去逐个构造 Path"""
+    prefix = os.path.join(str(root), "")
+    def key(path: Path) -> str:
+        text = str(path)
+        if text.startswith(prefix) and os.sep == "/":
+            return text[len(prefix):]
+        return relative_key(path, root)
+    return key
+
+
+def _unchanged(old: Fingerprint, label_stat: Tuple[int, int], image_key: Optional[str],
+               image_file: Optional[Path], dataset_dir: Path, verify_level: int) -> bool:
+    """标签文件与引用的图片都未变化（按大小与 mtime 比较），且上次的图片校验级别不低于本次"""
+    label_size, label_mtime_ns, old_image, image_size, image_mtime_ns, extra, old_level = old
+    if (label_size, label_mtime_ns) != label_stat or old_image != image_key or old_level < verify_level:
+        return False  # 标签有变化，或对应的图片换成了另一个文件（如扩展名变化）
+    if image_file is not None and _stat(image_file) != (image_size, image_mtime_ns):
+        return False
+    if extra is not None:
+        return all(_stat(dataset_dir / rel) == (size, mtime_ns) for rel, size, mtime_ns in json.loads(extra))
+    return True
+
+
+def check_dataset_incremental(checker: QualityChecker, parser: BaseParser, dataset_dir: Path, format_name: str,
+                              progress: Optional[ProgressCallback] = None) -> Tuple[QualityStats, Dict[str, int]]:
+    """
+    返回 (合并后的逐图片结果, 各类文件数)；数据集级规则由调用方在结果上执行。
+    progress(已完成, 总数, 阶段) 定期调用，抛出异常（如取消任务）时清单保持不变。
+    """
+    def report(done: int, total: int, message: str) -> None:
+        if progress is not None:
+            progress(done, total, message)
+
+    key_of = _key_function(dataset_dir)
+    manifest = QualityManifest(dataset_dir)
+    try:
+        meta = {
+            "rules_version": RULES_VERSION,
+            "format": format_name,
+            "label_map": dict(getattr(parser, "_external_label_map", {}) or {}),
+        }
+        old_meta = manifest.get_meta()
+        aggregate = None if any(old_meta.get(k) != v for k, v in meta.items()) else manifest.get_aggregate()
+        rebuild = aggregate is None
+        old_entries = {} if rebuild else manifest.fingerprints()
+
+        # 比较指纹：只需 stat，不读取文件内容
+        units = parser.source_units(dataset_dir)
+        seen = set()
+        dirty: Dict[str, Tuple[Tuple[int, int], Optional[Path], Optional[str]]] = {}
+        for i, (label_file, img_file) in enumerate(units):
+            if i % 1000 == 0:
+                report(i, len(units), "比较文件指纹")
+            label_stat = _stat(label_file)
+            if label_stat[0] < 0:
+                continue  # 扫描后被删除，按不存在处理
+            key = key_of(label_file)
+            seen.add(key)
+            image_key = key_of(img_file) if img_file is not None else None
+            old = old_entries.get(key)
+            if old is None or not _unchanged(old, label_stat, image_key, img_file, dataset_dir,
+                                             checker.verify_level):
+                dirty[key] = (label_stat, img_file, image_key)
+        removed = [key for key in old_entries if key not in seen]
+        stale = [key for key in dirty if key in old_entries] + removed
+
+        result = aggregate if aggregate is not None else QualityStats()
+        if dirty or removed:
+            # 从汇总中减去旧结果：先合并全部过期结果再减一次，列表只扫描一遍
+            expired = QualityStats()
+            for n, stats in enumerate(manifest.verdicts(stale), 1):
+                report(n, len(stale), "移除过期结果")
+                expired.merge(stats)
+            result.subtract(expired)
+
+            # 只解析、检查有变化的文件，每个标签文件的结果单独保存
+            verdicts: Dict[str, QualityStats] = {key: QualityStats() for key in dirty}
+            extra_images: Dict[str, Dict[str, ImageStamp]] = {key: {} for key in dirty}
+            if dirty:
+                only = {dataset_dir / key for key in dirty}
+                annotations = parser.iter_parse(dataset_dir, only=only)
+                for n, (ann, stats) in enumerate(checker.check_images(annotations), 1):
+                    report(n, len(dirty), "检查变化的文件")
+                    key = key_of(ann.source) if ann.source is not None else None
+                    if key not in dirty:
+                        continue
+                    verdicts[key].merge(stats)
+                    image_key = key_of(ann.image_path)
+                    if image_key != dirty[key][2]:
+                        extra_images[key][image_key] = (image_key,) + _stat(ann.image_path)
+
+            rows = []
+            for key, (label_stat, img_file, image_key) in dirty.items():
+                image_stat = _stat(img_file) if img_file is not None else (None, None)
+                extra = list(extra_images[key].values())
+                rows.append((key,) + label_stat + (image_key,) + image_stat +
+                            (json.dumps(extra, ensure_ascii=False) if extra else None,
+                             checker.verify_level, dumps(verdicts[key].to_dict())))
+                result.merge(verdicts[key])
+
+            if rebuild:
+                manifest.clear()
+            manifest.delete(removed)
+            manifest.upsert(rows)
+            manifest.set_aggregate(result)
+            manifest.set_meta(meta)
+            manifest.commit()
+    finally:
+        manifest.close()
+
+    counts = {"checked": len(dirty), "reused": len(seen) - len(dirty), "removed": len(removed)}
+    print(f"增量检查: 检查 {counts['checked']} 个文件, 沿用 {counts['reused']} 个, 移除 {counts['removed']} 个")
+    return result, counts
@@ -1,14 +1,64 @@
 import json
 from pathlib import Path
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
 
 from .base_parser import BaseParser, ImageAnnotation, BBox, Polygon
+from .dataset_index import BATCH_LABEL_NAME, DatasetIndex, SubsetIndex, scan_files
+from .parallel import parallel_imap
+from ..utils.async_writer import AsyncFileWriter
+from ..utils.compression import check_compression
+from ..utils.json_stream import dumps, iter_json_array, loads
+from ..utils.jsonl_store import (DEFAULT_SHARD_SIZE, OffsetIndex, ShardedRecordWriter, is_jsonl_file, iter_jsonl,
+                                 remove_record_files)
+
+
+OUTPUT_MODES = ("files", "jsonl", "batch")  # 每图一个文件 / JSONL 分片 / 单个批量 annotations.json
+_BATCH_NAMES = (BATCH_LABEL_NAME, BATCH_LABEL_NAME + ".gz", BATCH_LABEL_NAME + ".zst")
+
+
+def _record_files(labels_dir: Path) -> List[Path]:
+    """子集标签目录中的批量文件（含压缩版本）与 JSONL 分片，批量文件在前，各自按文件名排序"""
+    files = scan_files(labels_dir, (".json", ".jsonl", ".gz", ".zst"))
+    return [f for f in files if f.name in _BATCH_NAMES] + [f for f in files if is_jsonl_file(f)]
+
+
+def _parse_json_file(json_file: Path) -> Optional[Tuple[Optional[str], ImageAnnotation]]:
+    """
+    解析单个图片的 JSON 标注文件（在子进程中执行），失败返回 None。
+    返回 (file_name, 标注)，图片路径由主进程根据目录索引解析。
+    """
+    try:
+        data = loads(json_file.read_bytes())
+        return data.get("file_name"), JSONParser()._parse_single_image(data)
+    except Exception:
+        return None
 
 
 class JSONParser(BaseParser):
     format_name = "json"
+    writes_polygons = True
+    output_mode: str = "files"
+    shard_size: int = DEFAULT_SHARD_SIZE
+    compression: Optional[str] = None
 
-    def parse(self, input_dir: Path) -> List[ImageAnnotation]:
+    def set_output_mode(self, mode: str = "files", shard_size: Optional[int] = None,
+                        compression: Optional[str] = None):
+        """
+        设置导出方式：files 每张图片一个 JSON；jsonl 每 shard_size 张一个紧凑 JSONL 分片；
+        batch 单个批量 annotations.json。后两者可选 gzip / zstd 压缩，并生成偏移索引。
+        """
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f"不支持的 JSON 输出模式: {mode}（可选 {', '.join(OUTPUT_MODES)}）")
+        self.output_mode = mode
+        if shard_size is not None:
+            self.shard_size = max(1, int(shard_size))
+        self.compression = check_compression(compression)
+
+    @property
+    def per_image_output(self) -> bool:
+        return self.output_mode == "files"
+
+    def iter_parse(self, input_dir: Path, only: Optional[Set[Path]] = None) -> Iterator[ImageAnnotation]:
         """
         解析标准目录结构的JSON数据集:
         dataset/
@@ -21,59 +71,78 @@ class JSONParser(BaseParser):
             ├── test/
             └── val/
         
-        支持两种 JSON 结构：
+        支持三种 JSON 结构：
         1. 批量格式：{"images": [{"file_name": "...", "width": ..., "annotations": [...]}]}
         2. 单文件格式：{"file_name": "...", "width": ..., "annotations": [...]}
+        3. JSONL 分片：*.jsonl，每行一个单文件格式的条目
+        批量文件与分片可以是 .gz / .zst 压缩的。
         """
-        results: List[ImageAnnotation] = []
-        
         # 检查标准目录结构
-        images_dir = input_dir / "images"
-        labels_dir = input_dir / "labels"
-        
-        if not images_dir.exists() or not labels_dir.exists():
+        index = DatasetIndex.build(input_dir)
+        if not index.has_structure:
             raise ValueError(f"数据集目录结构不正确。需要包含 'images' 和 'labels' 文件夹。\n当前目录: {input_dir}")
         
-        # 处理所有子集 (train, test, val)
-        subsets = ["train", "test", "val"]
-        
-        for subset in subsets:
-            img_subset_dir = images_dir / subset
-            label_subset_dir = labels_dir / subset
-            
-            # 如果子集目录不存在，跳过
-            if not img_subset_dir.exists() or not label_subset_dir.exists():
-                continue
+        # 处理所有子集 (train, test, val)：先产出批量文件与分片中的条目，再产出单文件结果
+        for subset in index.complete_subsets():
+            # 首先流式读取 annotations.json (批量格式) 与 JSONL 分片
+            for record_fp in _record_files(subset.labels_dir):
+                if only is None or record_fp in only:
+                    yield from self._iter_record_file(record_fp, subset)
             
-            # 首先尝试读取 annotations.json (批量格式)
-            batch_fp = label_subset_dir / "annotations.json"
-            if batch_fp.exists():
-                try:
-                    data = json.loads(batch_fp.read_text(encoding="utf-8"))
-                    images = data.get("images", [])
-                    for im in images:
-                        ann = self._parse_single_image(im, img_subset_dir)
-                        if ann:
-                            results.append(ann)
-                except Exception:
-                    pass
-            
-            # 然后扫描目录中的所有 .json 文件 (单文件格式)
-            json_files = list(label_subset_dir.glob("*.json"))
-            for json_file in json_files:
-                if json_file.name == "annotations.json":
-                    continue  # 跳过批量文件
+            # 然后使用目录索引中的所有 .json 文件 (单文件格式)，分块并行解析
+            json_files = [f for f in subset.labels_with_ext(".json") if f.name != BATCH_LABEL_NAME]  # 跳过批量文件
+            if only is not None:
+                json_files = [f for f in json_files if f in only]
+            for json_file, item in zip(json_files, parallel_imap(_parse_json_file, json_files, self.workers, self.chunk_size)):
+                if item is None:
+                    continue
+                file_name, ann = item
+                if file_name:
+                    ann.image_path = subset.resolve_image(file_name)
+                ann.source = json_file
+                yield ann
+    
+    def _iter_record_file(self, record_fp: Path, subset: SubsetIndex) -> Iterator[ImageAnnotation]:
+        """流式读取批量文件 / JSONL 分片，条目逐个解析，内存只与单个条目大小有关"""
+        jsonl = is_jsonl_file(record_fp)
+        try:
+            for im in (iter_jsonl(record_fp) if jsonl else iter_json_array(record_fp, "images")):
                 try:
-                    data = json.loads(json_file.read_text(encoding="utf-8"))
-                    ann = self._parse_single_image(data, img_subset_dir)
-                    if ann:
-                        results.append(ann)
+                    ann = self._parse_single_image(loads(im) if jsonl else im, subset)
                 except Exception:
                     continue
-        
-        return results
+                if ann:
+                    ann.source = record_fp
+                    yield ann
+        except (OSError, ValueError, EOFError) as e:
+            # 文件损坏：已读出的条目保留，其余跳过
+            print(f"警告: 批量标注文件读取中断 {record_fp}: {e}")
+    
+    def source_units(self, input_dir: Path) -> List[Tuple[Path, Optional[Path]]]:
+        """批量文件与 JSONL 分片对应多张图片，图片记为 None；单文件按同名 stem 对应图片"""
+        units: List[Tuple[Path, Optional[Path]]] = []
+        for subset in DatasetIndex.build(input_dir).complete_subsets():
+            units.extend((f, None) for f in _record_files(subset.labels_dir))
+            for f in subset.labels_with_ext(".json"):
+                if f.name != BATCH_LABEL_NAME:
+                    units.append((f, subset.image_for(f.stem)))
+        return units
+    
+    def output_name(self, ann: ImageAnnotation) -> Optional[str]:
+        if self.output_mode != "files":
+            return None
+        return Path(ann.image_path).with_suffix(".json").name or "annotation.json"
     
-    def _parse_single_image(self, im_data: dict, img_dir: Path = None) -> ImageAnnotation:
+    def lookup(self, output_dir: Path, image_name: str) -> Optional[ImageAnnotation]:
+        """按图片文件名从 jsonl / batch 模式的输出中随机读取一条标注（使用偏移索引），不存在返回 None"""
+        index = OffsetIndex(output_dir)
+        try:
+            data = index.read(image_name)
+        finally:
+            index.close()
+        return self._parse_single_image(loads(data)) if data is not None else None
+    
+    def _parse_single_image(self, im_data: dict, subset: Optional[SubsetIndex] = None) -> ImageAnnotation:
         """解析单个图片的标注数据"""
         file_name = im_data.get("file_name")
         width = int(im_data.get("width", 0))
@@ -93,15 +162,9 @@ class JSONParser(BaseParser):
                 if len(polygon) >= 6 and len(polygon) % 2 == 0:
                     polygons.append(Polygon(points=polygon, label=label))
         
-        # 构建完整的图片路径
-        if file_name and img_dir:
-            img_path = img_dir / file_name
-            if not img_path.exists():
-                # 如果指定的文件不存在，尝试查找同名文件
-                stem = Path(file_name).stem
-                img_path = self._find_image_in_dir(img_dir, stem)
-                if img_path is None:
-                    img_path = Path(file_name)  # 使用原始文件名
+        # 构建完整的图片路径：按文件名或同名 stem 在子集索引中查找，找不到时使用原始文件名
+        if file_name and subset:
+            img_path = subset.resolve_image(file_name)
         else:
             img_path = Path(file_name) if file_name else Path("unknown.jpg")
         
@@ -113,38 +176,49 @@ class JSONParser(BaseParser):
             polygons=polygons
         )
     
-    def _find_image_in_dir(self, img_dir: Path, stem: str) -> Path:
-        """在指定目录中查找同名图片文件"""
-        exts = [".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"]
-        for ext in exts:
-            img_path = img_dir / f"{stem}{ext}"
-            if img_path.exists():
-                return img_path
-        return None
-
-    def export(self, annotations: List[ImageAnnotation], output_dir: Path) -> None:
+    @staticmethod
+    def _entry(ann: ImageAnnotation) -> dict:
+        """单张图片条目，包含 file_name/width/height/annotations"""
+        annotations_list = []
+        # 添加矩形框标注
+        for b in ann.boxes:
+            annotations_list.append({"label": b.label, "bbox": [b.xmin, b.ymin, b.xmax, b.ymax]})
+        # 添加分割标注
+        if ann.polygons:
+            for p in ann.polygons:
+                annotations_list.append({"label": p.label, "polygon": p.points})
+        
+        return {
+            "file_name": str(ann.image_path),
+            "width": ann.width,
+            "height": ann.height,
+            "annotations": annotations_list,
+        }
+    
+    def export(self, annotations: Iterable[ImageAnnotation], output_dir: Path) -> None:
         """
-        导出为每张图片一个独立的 JSON 文件：<stem>.json。
-        结构与单张图片条目一致，包含 file_name/width/height/annotations。
+        按 output_mode 导出（见 set_output_mode），默认每张图片一个独立的 JSON 文件：<stem>.json。
         """
         output_dir.mkdir(parents=True, exist_ok=True)
-        for ann in annotations:
-            annotations_list = []
-            # 添加矩形框标注
-            for b in ann.boxes:
-                annotations_list.append({"label": b.label, "bbox": [b.xmin, b.ymin, b.xmax, b.ymax]})
-            # 添加分割标注
-            if ann.polygons:
-                for p in ann.polygons:
-                    annotations_list.append({"label": p.label, "polygon": p.points})
-            
-            entry = {
-                "file_name": str(ann.image_path),
-                "width": ann.width,
-                "height": ann.height,
-                "annotations": annotations_list,
-            }
-            out_name = Path(ann.image_path).with_suffix(".json").name or "annotation.json"
-            (output_dir / out_name).write_text(
-                json.dumps(entry, ensure_ascii=False, indent=2), encoding="utf-8"
-            )
\ No newline at end of file
+        if self.output_mode != "files":
+            self._export_records(annotations, output_dir)
+            return
+        with AsyncFileWriter() as writer:
+            for ann in annotations:
+                # 序列化在当前线程，写盘交给后台线程
+                writer.write(output_dir / self.output_name(ann),
+                             json.dumps(self._entry(ann), ensure_ascii=False, indent=2).encode("utf-8"))
+    
+    def _export_records(self, annotations: Iterable[ImageAnnotation], output_dir: Path) -> None:
+        """紧凑条目写入 JSONL 分片或单个批量文件，并生成按图片文件名的偏移索引"""
+        # 清理上次导出的分片 / 批量文件，否则再次解析时会重复读取
+        remove_record_files(output_dir)
+        with AsyncFileWriter() as writer:
+            store = ShardedRecordWriter(output_dir, writer, self.compression, self.shard_size,
+                                        batch=self.output_mode == "batch")
+            try:
+                for ann in annotations:
+                    store.write(Path(ann.image_path).name, dumps(self._entry(ann)))
+            finally:
+                store.close()
+        print(f"已写出 {store.records} 条标注到 {len(store.files)} 个文件: {output_dir}")
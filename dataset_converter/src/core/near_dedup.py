@@ -0,0 +1,292 @@
+"""
+近似重复图片查找（感知哈希）
+
+重新编码、缩放、重新压缩后的副本内容哈希不同，dedup.py 找不到。这里为每张图片计算
+64 位感知哈希，汉明距离不超过 radius 的两张图片视为近似重复：
+    - dHash：8x9 灰度图相邻像素的明暗关系，计算最快
+    - pHash：32x32 灰度图 DCT 的低频 8x8 系数与中位数比较，对压缩与缩放更稳定
+    - JPEG 用 draft() 按 1/2~1/8 缩小解码，只解出够用的分辨率；
+      指纹在进程池中计算，并写入元数据缓存，未变化的图片再次检查时不必解码
+
+两两比较是 O(n²)。多索引哈希（multi-index hashing）把 64 位分成 m 段：
+距离不超过 r 的两个哈希至少有一段的距离不超过 r // m（抽屉原理）。
+对每段排序后，用该段翻转不超过 r // m 位的所有取值做二分查找得到候选，再用完整哈希校验距离。
+m 按图片数与 radius 估算的查找量 + 候选量自动选择，全部用 NumPy 向量化完成。
+结果按连通分量（并查集）聚成重复组；split_leakage() 给出 train 与 val / test 之间的近似重复。
+"""
+from itertools import combinations
+from math import comb
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .parallel import parallel_imap
+from ..utils.metadata_cache import lookup_fingerprints, store_fingerprints
+
+
+HASH_TYPES = ("phash", "dhash")
+DEFAULT_HASH_TYPE = "phash"
+DEFAULT_RADIUS = 6  # 64 位哈希的汉明距离阈值
+MAX_RADIUS = 16
+DEFAULT_CHUNK_SIZE = 64  # 每次提交给子进程的图片数
+DECODE_SIZE = 64  # JPEG 缩小解码的目标尺寸（不小于 PHASH_SIZE）
+PHASH_SIZE = 32
+QUERY_BLOCK = 1 << 16  # 每批展开候选的查询数，限制临时数组大小
+TABLE_BITS = 24  # 不超过此位数的分段用直接寻址桶表
+
+ProgressCallback = Callable[[int, int, str], None]  # (已完成, 总数, 阶段说明)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """正交 DCT-II 矩阵"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int(np.packbits(bits.ravel()).view(">u8")[0])
+
+
+def image_fingerprint(image_path: Path) -> Optional[Tuple[int, int]]:
+    """计算 (dhash, phash)，无法解码时返回 None（模块级函数，供进程池调用）"""
+    try:
+        with Image.open(image_path) as img:
+            img.draft("L", (DECODE_SIZE, DECODE_SIZE))
+            small = img.convert("L").resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.LANCZOS)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    pixels = np.asarray(small, dtype=np.float64)
+    diff = np.asarray(small.resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+    dhash = _bits_to_int(diff[:, 1:] > diff[:, :-1])
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8].ravel()
+    phash = _bits_to_int(low > np.median(low[1:]))  # 直流分量不参与中位数
+    return dhash, phash
+
+
+if hasattr(np, "bitwise_count"):
+    def popcount(values: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(values).astype(np.int64)
+else:
+    _BYTE_BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+    def popcount(values: np.ndarray) -> np.ndarray:
+        """uint64 数组逐元素的置位数"""
+        data = np.ascontiguousarray(values, dtype=np.uint64)
+        return _BYTE_BITS[data.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _segments(m: int) -> List[Tuple[int, int]]:
+    """把 64 位分成 m 段，返回 [(起始位, 位数)]"""
+    result = []
+    start = 0
+    for k in range(m):
+        bits = 64 // m + (1 if k < 64 % m else 0)
+        result.append((start, bits))
+        start += bits
+    return result
+
+
+def _probe_count(bits: int, flips: int) -> int:
+    return sum(comb(bits, k) for k in range(flips + 1))
+
+
+def plan_segments(n: int, radius: int) -> List[Tuple[int, int]]:
+    """按估算的二分查找次数 + 候选数选择分段数"""
+    best, best_cost = None, None
+    for m in range(1, min(radius + 1, 64) + 1):
+        flips = radius // m
+        cost = sum(_probe_count(bits, flips) * (n + n * n / 2.0 ** bits) for _, bits in _segments(m))
+        if best_cost is None or cost < best_cost:
+            best, best_cost = m, cost
+    return _segments(best)
+
+
+def _flip_masks(bits: int, flips: int) -> np.ndarray:
+    masks = [sum(1 << b for b in positions)
+             for k in range(flips + 1) for positions in combinations(range(bits), k)]
+    return np.array(masks, dtype=np.uint64)
+
+
+def _bucket_lookup(keys: np.ndarray, bits: int) -> Tuple[np.ndarray, Callable]:
+    """对一段的取值排序，返回 (排序下标, lookup(probe) -> (起点, 个数))"""
+    order = np.argsort(keys, kind="stable")
+    if bits <= TABLE_BITS:
+        # 段较短时用直接寻址的桶表，一次取下标代替二分查找
+        counts_table = np.bincount(keys.astype(np.intp), minlength=1 << bits)
+        starts_table = np.cumsum(counts_table) - counts_table
+
+        def lookup(probe: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            index = probe.astype(np.intp)
+            return starts_table[index], counts_table[index]
+    else:
+        sorted_keys = keys[order]
+
+        def lookup(probe: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            lo = np.searchsorted(sorted_keys, probe, "left")
+            return lo, np.searchsorted(sorted_keys, probe, "right") - lo
+    return order, lookup
+
+
+def hamming_pairs(hashes: np.ndarray, radius: int,
+                  progress: Optional[Callable[[int, int], None]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    汉明距离不超过 radius 的所有下标对，返回 (i, j, 距离)，i < j，按 (i, j) 排序。
+    progress(已完成, 总数) 按探测轮次调用。
+    """
+    hashes = np.ascontiguousarray(hashes, dtype=np.uint64)
+    n = len(hashes)
+    empty = np.empty(0, dtype=np.int64)
+    if n < 2:
+        return empty, empty, empty
+    segments = plan_segments(n, radius)
+    flips = radius // len(segments)
+    plan = [(start, bits, _flip_masks(bits, flips)) for start, bits in segments]
+    total = sum(len(masks) for _, _, masks in plan)
+    done = 0
+    found_i, found_j = [], []
+    for start, bits, masks in plan:
+        keys = (hashes >> np.uint64(start)) & np.uint64((1 << bits) - 1)
+        order, lookup = _bucket_lookup(keys, bits)
+        for mask in masks:
+            for q0 in range(0, n, QUERY_BLOCK):
+                block = keys[q0:q0 + QUERY_BLOCK]
+                probe = block ^ mask
+                # 翻转 mask 得到的两个桶互相查找结果相同，只从取值较小的一侧查
+                queries = np.nonzero(probe >= block)[0]
+                lo, counts = lookup(probe[queries])
+                hits = int(counts.sum())
+                if not hits:
+                    continue
+                query = np.repeat(queries + q0, counts)
+                offset = np.arange(hits) - np.repeat(np.cumsum(counts) - counts, counts)
+                target = order[np.repeat(lo, counts) + offset]
+                if not mask:
+                    keep = query < target  # 同一桶内每对只保留一次，排除自身
+                    query, target = query[keep], target[keep]
+                close = popcount(hashes[query] ^ hashes[target]) <= radius
+                found_i.append(np.minimum(query[close], target[close]))
+                found_j.append(np.maximum(query[close], target[close]))
+            done += 1
+            if progress is not None:
+                progress(done, total)
+    if not found_i:
+        return empty, empty, empty
+    # 同一对可能在多个分段中被找到
+    pair_keys = np.unique(np.concatenate(found_i).astype(np.int64) * n + np.concatenate(found_j))
+    i, j = pair_keys // n, pair_keys % n
+    return i, j, popcount(hashes[i] ^ hashes[j])
+
+
+def cluster_pairs(n: int, i: Sequence[int], j: Sequence[int]) -> List[List[int]]:
+    """并查集合并下标对，返回成员数大于 1 的连通分量（组内与组间按下标排序）"""
+    parent = list(range(n))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(i, j):
+        ra, rb = find(int(a)), find(int(b))
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    groups: Dict[int, List[int]] = {}
+    for x in range(n):
+        groups.setdefault(find(x), []).append(x)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+class NearDuplicateFinder:
+    """查找近似重复图片，返回重复组（组内与组间都按输入顺序）"""
+
+    def __init__(self, radius: int = DEFAULT_RADIUS, hash_type: str = DEFAULT_HASH_TYPE,
+                 workers: Optional[int] = None, chunk_size: Optional[int] = None, use_cache: bool = True):
+        if hash_type not in HASH_TYPES:
+            raise ValueError(f"不支持的哈希类型: {hash_type}")
+        if not 0 <= int(radius) <= MAX_RADIUS:
+            raise ValueError(f"距离阈值应在 0~{MAX_RADIUS} 之间: {radius}")
+        self.radius = int(radius)
+        self.hash_type = hash_type
+        self.workers = workers
+        self.chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        self.use_cache = use_cache
+        self.unreadable: List[Path] = []  # 无法解码的图片（不参与比较）
+        self.pairs: List[Tuple[Path, Path, int]] = []  # 距离不超过 radius 的图片对
+        self.stats: Dict[str, int] = {}
+
+    def fingerprints(self, files: List[Path],
+                     progress: Optional[ProgressCallback] = None) -> List[Optional[Tuple[int, int]]]:
+        """逐个文件的 (dhash, phash)，缓存未命中的在进程池中计算"""
+        results = lookup_fingerprints(files) if self.use_cache else [None] * len(files)
+        missing = [k for k, fp in enumerate(results) if fp is None]
+        computed = []
+        fingerprints = parallel_imap(image_fingerprint, (files[k] for k in missing), self.workers, self.chunk_size)
+        for done, (k, fp) in enumerate(zip(missing, fingerprints), 1):
+            results[k] = fp
+            if fp is not None:
+                computed.append((files[k], fp[0], fp[1]))
+            if progress is not None:
+                progress(done, len(missing), "计算图片指纹")
+        if self.use_cache and computed:
+            store_fingerprints(computed)
+        self.stats["cache_hits"] = len(files) - len(missing)
+        self.stats["decoded"] = len(missing)
+        return results
+
+    def find(self, files: Iterable[Path], progress: Optional[ProgressCallback] = None) -> List[List[Path]]:
+        """
+        progress(已完成, 总数, 阶段) 在计算指纹与查找期间定期调用；
+        回调抛出的异常（如取消任务）会中止查找。
+        """
+        files = list(dict.fromkeys(Path(f) for f in files))
+        self.stats = {"files": len(files)}
+        fingerprints = self.fingerprints(files, progress)
+        self.unreadable = [f for f, fp in zip(files, fingerprints) if fp is None]
+        readable = [f for f, fp in zip(files, fingerprints) if fp is not None]
+        column = 1 if self.hash_type == "phash" else 0  # 指纹为 (dhash, phash)
+        hashes = np.array([fp[column] for fp in fingerprints if fp is not None], dtype=np.uint64)
+
+        step = None if progress is None else (lambda done, total: progress(done, total, "查找相似图片"))
+        i, j, dist = hamming_pairs(hashes, self.radius, step)
+        self.pairs = [(readable[a], readable[b], int(d)) for a, b, d in zip(i.tolist(), j.tolist(), dist.tolist())]
+        clusters = [[readable[k] for k in group] for group in cluster_pairs(len(readable), i, j)]
+        self.stats.update(pairs=len(self.pairs), clusters=len(clusters))
+        return clusters
+
+
+def dataset_splits(dataset_dir: Path) -> Dict[Path, str]:
+    """标准结构数据集中 {图片: 子集名}，按 train/test/val 顺序"""
+    from .dataset_index import DatasetIndex
+    index = DatasetIndex.build(dataset_dir)
+    return {f: name for name, subset in index.subsets.items() for f in subset.image_files}
+
+
+def split_leakage(pairs: Iterable[Tuple[Path, Path, int]], split_of: Dict[Path, str],
+                  reference: str = "train") -> Dict[str, Dict[Path, List[Tuple[Path, int]]]]:
+    """
+    跨子集泄漏：{子集: {该子集的图片: [(reference 子集中的近似图片, 距离), ...]}}，
+    只包含与 reference 子集存在近似重复的图片，近似图片按距离排序。
+    """
+    leaks: Dict[str, Dict[Path, List[Tuple[Path, int]]]] = {}
+    for a, b, dist in pairs:
+        split_a, split_b = split_of.get(a), split_of.get(b)
+        if split_a == split_b or reference not in (split_a, split_b):
+            continue
+        if split_a == reference:
+            a, b, split_a = b, a, split_b
+        if split_a is None:
+            continue
+        leaks.setdefault(split_a, {}).setdefault(a, []).append((b, dist))
+    for images in leaks.values():
+        for matches in images.values():
+            matches.sort(key=lambda item: item[1])
+    return leaks
@@ -0,0 +1,82 @@
+"""
+进程池并行工具
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional
+
+
+DEFAULT_CHUNK_SIZE = 256
+PREFETCH_CHUNKS = 2  # 每个进程最多预先提交的分块数，限制在途结果占用的内存
+
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    """workers 为 None 或 <=0 时取 CPU 核数"""
+    if workers is None or workers <= 0:
+        return os.cpu_count() or 1
+    return int(workers)
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    """按 size 个一组产出列表"""
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run_chunk(func: Callable, chunk: List) -> List:
+    return [func(item) for item in chunk]
+
+
+def parallel_imap(func: Callable, items: Iterable, workers: Optional[int] = None,
+                  chunk_size: Optional[int] = None) -> Iterator:
+    """
+    流式版本的 parallel_map：按需从 items 取分块提交到进程池，结果按原始顺序逐个产出。
+    在途分块数不超过 workers * PREFETCH_CHUNKS，内存占用与任务总数无关。
+    func 与 items 必须可被 pickle（模块级函数 / functools.partial）。
+    单进程或任务量不足两个分块时直接在当前进程串行执行，避免进程启动开销。
+    """
+    workers = resolve_workers(workers)
+    chunk_size = max(1, int(chunk_size or DEFAULT_CHUNK_SIZE))
+    it = iter(items)
+
+    if workers <= 1:
+        for item in it:
+            yield func(item)
+        return
+
+    first = list(islice(it, chunk_size))
+    second = list(islice(it, chunk_size))
+    if not second:
+        for item in first:
+            yield func(item)
+        return
+
+    def chunks():
+        yield first
+        yield second
+        yield from chunked(it, chunk_size)
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for chunk in chunks():
+            pending.append(executor.submit(_run_chunk, func, chunk))
+            if len(pending) >= workers * PREFETCH_CHUNKS:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        # 消费方提前结束时取消尚未开始的分块
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def parallel_map(func: Callable, items: Iterable, workers: Optional[int] = None,
+                 chunk_size: Optional[int] = None) -> List:
+    """将 items 分块并行执行 func，结果按原始顺序以列表返回"""
+    return list(parallel_imap(func, items, workers, chunk_size))
@@ -1,267 +1,458 @@
 """
 数据质量检查工具
+
+逐图片规则（图片缺失 / 损坏 / 尺寸不符、标注框与多边形异常、空标注、内容哈希）
+在一次遍历中完成：图片分块提交到进程池，每张图片只读取一次文件，
+同一份数据既计算内容哈希也用于完整性校验（QUICK 级，见 image_verify.py）；
+verify_level 为 FULL 时先在解码进程中逐张解码全部像素（带超时）。
+元数据缓存中已有所需级别校验结论且未变化的图片不再读取。
+每个分块返回一个 QualityStats（统计、问题记录与按类型计数），最后按顺序合并；
+统计由 stats_engine 的可合并累加器收集，大小与图片数无关；
+依赖全部图片的规则（重复图片、标签写法不一致）在合并后的结果上执行。
+check_incremental() 在数据集目录保存逐文件的检查结果，之后只检查变化的文件（见 incremental_quality.py）。
 """
 import hashlib
+import os
+from collections import Counter
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Dict, Set, Tuple
-from PIL import Image
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 import json
 
 from .base_parser import ImageAnnotation
+from .image_verify import DEFAULT_DECODE_TIMEOUT, FULL, QUICK, ImageVerifier, VerifyResult, quick_verify_bytes
+from .parallel import chunked, parallel_imap
+from .stats_engine import DatasetStats
+from ..utils.metadata_cache import get_metadata_cache
+
+
+DEFAULT_CHUNK_SIZE = 64  # 每个进程任务检查的图片数
+RULES_VERSION = 3  # 逐图片规则变化时递增，已保存的逐文件结果随之失效
+
+# 问题类型（问题记录的 'type' 字段）
+DUPLICATE_IMAGE = 'duplicate_image'
+EMPTY_ANNOTATION = 'empty_annotation'
+INVALID_BBOX = 'invalid_bbox'
+INVALID_POLYGON = 'invalid_polygon'
+MISSING_IMAGE = 'missing_image'
+SIZE_MISMATCH = 'size_mismatch'
+CORRUPTED_IMAGE = 'corrupted_image'
+INCONSISTENT_LABEL = 'inconsistent_label'
+
+# 问题类型 → 报告中的分类
+ISSUE_CATEGORIES = {
+    DUPLICATE_IMAGE: 'duplicates',
+    EMPTY_ANNOTATION: 'empty_annotations',
+    INVALID_BBOX: 'invalid_annotations',
+    INVALID_POLYGON: 'invalid_annotations',
+    MISSING_IMAGE: 'corrupted_images',
+    SIZE_MISMATCH: 'corrupted_images',
+    CORRUPTED_IMAGE: 'corrupted_images',
+    INCONSISTENT_LABEL: 'inconsistent_labels',
+}
+REPORT_CATEGORIES = ('duplicates', 'empty_annotations', 'invalid_annotations', 'corrupted_images',
+                     'inconsistent_labels')
+
+
+def _record_key(record: Dict) -> str:
+    return json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _remove_items(items: List, removed: List, key=None) -> List:
+    """按多重集合从 items 中去掉 removed 的元素（每个只去掉一次），保持其余元素的顺序"""
+    if not removed:
+        return items
+    pending = Counter(map(key, removed) if key else removed)
+    left = len(removed)
+    kept = []
+    for i, item in enumerate(items):
+        if not left:
+            kept.extend(items[i:])  # 已全部去掉，其余元素不再逐个计算键
+            break
+        k = key(item) if key else item
+        if pending[k] > 0:
+            pending[k] -= 1
+            left -= 1
+        else:
+            kept.append(item)
+    return kept
+
+
+@dataclass
+class QualityStats:
+    """一批图片的检查结果，可按顺序合并，也可减去其中一部分（增量检查）"""
+    # 计数、类别与尺寸分布（不含直方图）
+    statistics: DatasetStats = field(default_factory=lambda: DatasetStats(histograms=False))
+    label_variants: Dict[str, Counter] = field(default_factory=dict)  # 小写标签 → 各写法的标注框数
+    records: Dict[str, List[Dict]] = field(default_factory=lambda: {c: [] for c in REPORT_CATEGORIES})
+    counts: Counter = field(default_factory=Counter)  # 问题类型 → 问题数
+    messages: List[str] = field(default_factory=list)  # 每个问题一条说明
+    digests: List[Tuple[str, str]] = field(default_factory=list)  # (图片路径, 内容哈希)
+    cache_updates: List[Tuple[str, Dict]] = field(default_factory=list)  # 待写回元数据缓存的字段
+
+    @property
+    def total_images(self) -> int:
+        return self.statistics.total_images
+
+    @property
+    def total_boxes(self) -> int:
+        return self.statistics.total_boxes
+
+    @property
+    def total_polygons(self) -> int:
+        return self.statistics.total_polygons
+
+    @property
+    def class_counts(self) -> Counter:
+        """类别 → 标注框与多边形数"""
+        return self.statistics.class_counts
+
+    @property
+    def classes(self) -> Set[str]:
+        return set(self.class_counts)
+
+    def add_issue(self, record: Dict, *messages: str) -> None:
+        """记录一个问题；一条记录可对应多个问题（如一组重复图片）"""
+        self.records[ISSUE_CATEGORIES[record['type']]].append(record)
+        self.counts[record['type']] += len(messages)
+        self.messages.extend(messages)
+
+    def merge(self, other: "QualityStats") -> "QualityStats":
+        self.statistics.merge(other.statistics)
+        for label, variants in other.label_variants.items():
+            self.label_variants.setdefault(label, Counter()).update(variants)
+        for category, records in other.records.items():
+            self.records[category].extend(records)
+        self.counts.update(other.counts)
+        self.messages.extend(other.messages)
+        self.digests.extend(other.digests)
+        self.cache_updates.extend(other.cache_updates)
+        return self
+
+    def subtract(self, other: "QualityStats") -> "QualityStats":
+        """减去此前合并进来的 other（列表按元素值去掉，顺序不变）"""
+        self.statistics.subtract(other.statistics)
+        for label, variants in other.label_variants.items():
+            remaining = self.label_variants.get(label, Counter())
+            remaining.subtract(variants)
+            remaining = +remaining  # 去掉计数不为正的写法
+            if remaining:
+                self.label_variants[label] = remaining
+            else:
+                self.label_variants.pop(label, None)
+        for category, records in other.records.items():
+            self.records[category] = _remove_items(self.records[category], records, _record_key)
+        self.counts.subtract(other.counts)
+        self.counts = +self.counts
+        self.messages = _remove_items(self.messages, other.messages)
+        self.digests = _remove_items(self.digests, other.digests)
+        return self
+
+    @property
+    def total_issues(self) -> int:
+        return sum(self.counts.values())
+
+    def to_dict(self) -> Dict:
+        """可 JSON 序列化的形式，省略空字段（不含待写回缓存的字段）"""
+        data = {
+            'statistics': self.statistics.to_dict(),
+            'label_variants': {label: dict(variants) for label, variants in self.label_variants.items()},
+            'records': {category: records for category, records in self.records.items() if records},
+            'counts': dict(self.counts),
+            'messages': self.messages,
+            'digests': self.digests,
+        }
+        return {name: value for name, value in data.items() if value}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "QualityStats":
+        stats = cls(
+            statistics=DatasetStats.from_dict(data.get('statistics', {})),
+            label_variants={label: Counter(variants) for label, variants in data.get('label_variants', {}).items()},
+            counts=Counter(data.get('counts', {})),
+            messages=list(data.get('messages', ())),
+            digests=[tuple(item) for item in data.get('digests', ())],
+        )
+        for category, records in data.get('records', {}).items():
+            stats.records[category].extend(records)
+        return stats
+
+
+def _check_annotations(ann: ImageAnnotation, stats: QualityStats) -> None:
+    """标注相关规则与统计（不读取图片）"""
+    name = ann.image_path.name
+    polygons = ann.polygons or []
+    stats.statistics.add_annotation(ann)
+
+    if not ann.boxes and not polygons:
+        stats.add_issue({'type': EMPTY_ANNOTATION, 'file': str(ann.image_path), 'message': '没有标注信息'},
+                        f"空标注: {name}")
+
+    for i, box in enumerate(ann.boxes):
+        stats.label_variants.setdefault(box.label.lower(), Counter())[box.label] += 1
+        width = box.xmax - box.xmin
+        height = box.ymax - box.ymin
+
+        issues = []
+        # 检查坐标范围
+        if box.xmin < 0 or box.ymin < 0:
+            issues.append("坐标为负数")
+        if box.xmax > ann.width or box.ymax > ann.height:
+            issues.append("坐标超出图片边界")
+        if box.xmin >= box.xmax or box.ymin >= box.ymax:
+            issues.append("无效的矩形框尺寸")
+        # 检查标注框大小
+        if width < 5 or height < 5:
+            issues.append("标注框过小")
+        if width > ann.width * 0.9 or height > ann.height * 0.9:
+            issues.append("标注框过大")
+        if issues:
+            stats.add_issue({
+                'type': INVALID_BBOX,
+                'file': str(ann.image_path),
+                'bbox_index': i,
+                'bbox': [box.xmin, box.ymin, box.xmax, box.ymax],
+                'issues': issues
+            }, f"异常标注: {name} - {', '.join(issues)}")
+
+    for i, poly in enumerate(polygons):
+        if len(poly.points) < 6:  # 至少3个点
+            stats.add_issue({
+                'type': INVALID_POLYGON,
+                'file': str(ann.image_path),
+                'polygon_index': i,
+                'issues': ['多边形点数不足']
+            }, f"异常多边形: {name} - 点数不足")
+
+
+def _check_image_file(ann: ImageAnnotation, cached: Optional[Tuple], stats: QualityStats) -> None:
+    """
+    图片文件规则：存在性、完整性校验、尺寸是否与标注一致，并计算内容哈希。
+    cached 为主进程给出的 (校验结论, 内容哈希)；没有满足所需级别的结论时按 QUICK 级校验
+    读入的文件内容（与计算哈希共用一次读取），都已知时不读取文件。
+    """
+    path = ann.image_path
+    try:
+        os.stat(path)
+    except OSError:
+        stats.add_issue({'type': MISSING_IMAGE, 'file': str(path), 'message': '图片文件不存在'},
+                        f"缺失图片: {path.name}")
+        return
+
+    verdict, digest = cached or (None, None)
+    if verdict is None or (verdict.ok and not digest):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            stats.add_issue({'type': CORRUPTED_IMAGE, 'file': str(path), 'error': str(e)},
+                            f"损坏图片: {path.name} - {e}")
+            return
+        updates = {}
+        if not digest:
+            digest = updates['content_hash'] = hashlib.blake2b(data, digest_size=16).hexdigest()
+        if verdict is None:
+            verdict = quick_verify_bytes(data)
+            updates.update(verdict.cache_fields())
+        stats.cache_updates.append((str(path), updates))
+
+    if not verdict.ok:
+        stats.add_issue({'type': CORRUPTED_IMAGE, 'file': str(path), 'error': verdict.error},
+                        f"损坏图片: {path.name} - {verdict.error}")
+        return
+
+    stats.digests.append((str(path), digest))
+    if (verdict.width, verdict.height) != (ann.width, ann.height):
+        stats.add_issue({
+            'type': SIZE_MISMATCH,
+            'file': str(path),
+            'expected_size': (ann.width, ann.height),
+            'actual_size': (verdict.width, verdict.height)
+        }, f"尺寸不匹配: {path.name}")
+
+
+def _check_one(ann: ImageAnnotation, cached: Optional[Tuple], stats: QualityStats) -> None:
+    _check_image_file(ann, cached, stats)
+    _check_annotations(ann, stats)
+
+
+def _check_chunk(tasks: List[Tuple[ImageAnnotation, Optional[Tuple]]]) -> QualityStats:
+    """对一批图片执行全部逐图片规则，结果合并为一个（模块级函数，供进程池调用）"""
+    stats = QualityStats()
+    for ann, cached in tasks:
+        _check_one(ann, cached, stats)
+    return stats
+
+
+def _check_each(tasks: List[Tuple[ImageAnnotation, Optional[Tuple]]]) -> List[QualityStats]:
+    """同 _check_chunk，但每张图片单独返回结果（增量检查按文件保存）"""
+    results = []
+    for ann, cached in tasks:
+        stats = QualityStats()
+        _check_one(ann, cached, stats)
+        results.append(stats)
+    return results
 
 
 class QualityChecker:
     """数据质量检查器"""
     
+    workers: int = 0  # 检查进程数，0 表示自动（CPU 核数），1 表示串行
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    verify_level: int = QUICK  # 图片完整性校验级别（image_verify.QUICK / FULL）
+    decode_timeout: Optional[float] = DEFAULT_DECODE_TIMEOUT  # FULL 校验单张图片的超时（秒）
+    
     def __init__(self):
         self.issues = []
+        self.issue_counts = Counter()
         self.stats = {}
     
+    def set_parallel(self, workers: Optional[int] = None, chunk_size: Optional[int] = None):
+        if workers is not None:
+            self.workers = int(workers)
+        if chunk_size is not None:
+            self.chunk_size = max(1, int(chunk_size))
+    
+    def set_verify(self, level: Optional[int] = None, timeout: Optional[float] = None):
+        if level is not None:
+            self.verify_level = int(level)
+        if timeout is not None:
+            self.decode_timeout = float(timeout) if timeout > 0 else None
+    
     def check_dataset(self, annotations: List[ImageAnnotation]) -> Dict:
         """全面检查数据集质量"""
-        self.issues = []
-        self.stats = {
-            'total_images': len(annotations),
-            'total_boxes': 0,
-            'total_polygons': 0,
-            'classes': set(),
-            'image_sizes': [],
-            'box_sizes': []
-        }
-        
         print("开始数据质量检查...")
+        cache = get_metadata_cache()
         
-        # 1. 检查重复图片
-        duplicates = self._check_duplicates(annotations)
-        
-        # 2. 检查空标注
-        empty_annotations = self._check_empty_annotations(annotations)
+        # 逐图片规则：每个分块在子进程中检查，结果按顺序合并
+        result = QualityStats()
+        tasks = self._tasks(annotations, cache, self._verify_full(annotations))
+        for partial in parallel_imap(_check_chunk, tasks, self.workers, 1):
+            result.merge(partial)
+        self._store_cache_updates(cache, result.cache_updates)
         
-        # 3. 检查异常标注
-        invalid_annotations = self._check_invalid_annotations(annotations)
-        
-        # 4. 检查图片完整性
-        corrupted_images = self._check_image_integrity(annotations)
-        
-        # 5. 检查标注一致性
-        inconsistent_labels = self._check_label_consistency(annotations)
-        
-        # 6. 统计信息
-        self._collect_statistics(annotations)
+        return self.build_report(result)
+    
+    def check_images(self, annotations: Iterable[ImageAnnotation]) -> Iterator[Tuple[ImageAnnotation, QualityStats]]:
+        """逐图片规则的逐张结果 (标注, 结果)，按输入顺序产出；不执行数据集级规则"""
+        cache = get_metadata_cache()
+        annotations = list(annotations)
+        tasks = self._tasks(annotations, cache, self._verify_full(annotations))
+        checked = chain.from_iterable(parallel_imap(_check_each, tasks, self.workers, 1))
+        updates = []
+        try:
+            for ann, stats in zip(annotations, checked):
+                updates.extend(stats.cache_updates)
+                stats.cache_updates = []
+                yield ann, stats
+        finally:
+            self._store_cache_updates(cache, updates)
+    
+    def check_incremental(self, parser, dataset_dir: Path, format_name: str,
+                          progress: Optional[Callable[[int, int, str], None]] = None) -> Dict:
+        """
+        增量检查：逐文件结果保存在数据集目录中，只重新解析、检查标签或图片有变化的文件，
+        数据集级规则在全部结果上重新执行。报告的 'incremental' 字段给出各类文件数。
+        """
+        from .incremental_quality import check_dataset_incremental
+        print("开始数据质量检查（增量）...")
+        result, counts = check_dataset_incremental(self, parser, Path(dataset_dir), format_name, progress)
+        report = self.build_report(result)
+        report['incremental'] = counts
+        return report
+    
+    @staticmethod
+    def _store_cache_updates(cache, updates: List[Tuple[str, Dict]]) -> None:
+        if cache:
+            for path, fields in updates:
+                cache.update(path, **fields)
+            cache.flush()
+    
+    def build_report(self, result: QualityStats) -> Dict:
+        """在合并后的逐图片结果上执行数据集级规则并生成报告"""
+        # 数据集级规则
+        self._check_duplicates(result)
+        self._check_label_consistency(result)
+        
+        self.issues = result.messages
+        self.issue_counts = result.counts
+        statistics = result.statistics
+        self.stats = {
+            'total_images': result.total_images,
+            'total_boxes': result.total_boxes,
+            'total_polygons': result.total_polygons,
+            'classes': list(result.classes),  # 转换set为list以便JSON序列化
+            'class_counts': dict(result.class_counts),
+            'invalid_image_sizes': statistics.invalid_image_sizes,  # 宽或高 <= 0 的图片数
+            'image_size_stats': {'width': statistics.image_width.summary(),
+                                 'height': statistics.image_height.summary()},
+            'box_size_stats': {'width': statistics.box_width.summary(), 'height': statistics.box_height.summary()}
+        }
         
         # 生成报告
         report = {
             'summary': {
                 'total_images': self.stats['total_images'],
-                'total_issues': len(self.issues),
+                'total_issues': result.total_issues,
+                'issue_counts': dict(result.counts),
                 'health_score': self._calculate_health_score()
             },
-            'issues': {
-                'duplicates': duplicates,
-                'empty_annotations': empty_annotations,
-                'invalid_annotations': invalid_annotations,
-                'corrupted_images': corrupted_images,
-                'inconsistent_labels': inconsistent_labels
-            },
+            'issues': result.records,
             'statistics': self.stats,
             'recommendations': self._generate_recommendations()
         }
         
-        print(f"质量检查完成，发现 {len(self.issues)} 个问题")
+        print(f"质量检查完成，发现 {result.total_issues} 个问题")
         return report
     
-    def _check_duplicates(self, annotations: List[ImageAnnotation]) -> List[Dict]:
-        """检查重复图片"""
-        print("检查重复图片...")
-        duplicates = []
-        hash_to_files = {}
-        
-        for ann in annotations:
-            if not ann.image_path.exists():
-                continue
-                
-            try:
-                # 计算文件哈希
-                with open(ann.image_path, 'rb') as f:
-                    file_hash = hashlib.md5(f.read()).hexdigest()
-                
-                if file_hash in hash_to_files:
-                    duplicates.append({
-                        'type': 'duplicate_image',
-                        'files': [hash_to_files[file_hash], str(ann.image_path)],
-                        'hash': file_hash
-                    })
-                    self.issues.append(f"重复图片: {ann.image_path.name}")
-                else:
-                    hash_to_files[file_hash] = str(ann.image_path)
-                    
-            except Exception as e:
-                self.issues.append(f"无法读取图片: {ann.image_path.name} - {e}")
-        
-        return duplicates
-    
-    def _check_empty_annotations(self, annotations: List[ImageAnnotation]) -> List[Dict]:
-        """检查空标注"""
-        print("检查空标注...")
-        empty_annotations = []
-        
-        for ann in annotations:
-            box_count = len(ann.boxes) if ann.boxes else 0
-            poly_count = len(ann.polygons) if ann.polygons else 0
-            
-            if box_count == 0 and poly_count == 0:
-                empty_annotations.append({
-                    'type': 'empty_annotation',
-                    'file': str(ann.image_path),
-                    'message': '没有标注信息'
-                })
-                self.issues.append(f"空标注: {ann.image_path.name}")
-        
-        return empty_annotations
+    def _verify_full(self, annotations: List[ImageAnnotation]) -> Dict[str, VerifyResult]:
+        """verify_level 为 FULL 时逐张解码校验（缓存中已有结论的跳过），返回 {绝对路径: 结论}"""
+        if self.verify_level < FULL:
+            return {}
+        paths = list(dict.fromkeys(os.path.abspath(ann.image_path) for ann in annotations))
+        paths = [path for path in paths if os.path.exists(path)]  # 缺失的图片由逐图片规则报告
+        verifier = ImageVerifier(FULL, self.decode_timeout, self.workers)
+        return dict(zip(paths, verifier.verify(paths)))
     
-    def _check_invalid_annotations(self, annotations: List[ImageAnnotation]) -> List[Dict]:
-        """检查异常标注"""
-        print("检查异常标注...")
-        invalid_annotations = []
-        
-        for ann in annotations:
-            # 检查矩形框
-            for i, box in enumerate(ann.boxes):
-                issues = []
-                
-                # 检查坐标范围
-                if box.xmin < 0 or box.ymin < 0:
-                    issues.append("坐标为负数")
-                if box.xmax > ann.width or box.ymax > ann.height:
-                    issues.append("坐标超出图片边界")
-                if box.xmin >= box.xmax or box.ymin >= box.ymax:
-                    issues.append("无效的矩形框尺寸")
-                
-                # 检查标注框大小
-                width = box.xmax - box.xmin
-                height = box.ymax - box.ymin
-                if width < 5 or height < 5:
-                    issues.append("标注框过小")
-                if width > ann.width * 0.9 or height > ann.height * 0.9:
-                    issues.append("标注框过大")
-                
-                if issues:
-                    invalid_annotations.append({
-                        'type': 'invalid_bbox',
-                        'file': str(ann.image_path),
-                        'bbox_index': i,
-                        'bbox': [box.xmin, box.ymin, box.xmax, box.ymax],
-                        'issues': issues
-                    })
-                    self.issues.append(f"异常标注: {ann.image_path.name} - {', '.join(issues)}")
-            
-            # 检查多边形
-            if ann.polygons:
-                for i, poly in enumerate(ann.polygons):
-                    if len(poly.points) < 6:  # 至少3个点
-                        invalid_annotations.append({
-                            'type': 'invalid_polygon',
-                            'file': str(ann.image_path),
-                            'polygon_index': i,
-                            'issues': ['多边形点数不足']
-                        })
-                        self.issues.append(f"异常多边形: {ann.image_path.name} - 点数不足")
-        
-        return invalid_annotations
+    def _tasks(self, annotations: List[ImageAnnotation], cache, verified: Dict[str, VerifyResult]):
+        """按分块产出 [(标注, (校验结论, 内容哈希))]，缓存在主进程中批量查询"""
+        for chunk in chunked(annotations, self.chunk_size):
+            metas = cache.get_many(ann.image_path for ann in chunk) if cache else {}
+            tasks = []
+            for ann in chunk:
+                key = os.path.abspath(ann.image_path)
+                meta = metas.get(key)
+                verdict = verified.get(key)
+                if verdict is None and meta is not None and meta.verify_level is not None:
+                    verdict = VerifyResult(bool(meta.decode_ok), meta.verify_level, meta.format,
+                                           meta.width, meta.height, meta.verify_error)
+                    if not verdict.satisfies(self.verify_level):
+                        verdict = None
+                tasks.append((ann, (verdict, meta.content_hash if meta else None)))
+            yield tasks
     
-    def _check_image_integrity(self, annotations: List[ImageAnnotation]) -> List[Dict]:
-        """检查图片完整性"""
-        print("检查图片完整性...")
-        corrupted_images = []
-        
-        for ann in annotations:
-            if not ann.image_path.exists():
-                corrupted_images.append({
-                    'type': 'missing_image',
-                    'file': str(ann.image_path),
-                    'message': '图片文件不存在'
-                })
-                self.issues.append(f"缺失图片: {ann.image_path.name}")
-                continue
-            
-            try:
-                with Image.open(ann.image_path) as img:
-                    # 尝试加载图片
-                    img.verify()
-                    
-                    # 检查图片尺寸
-                    if img.size != (ann.width, ann.height):
-                        corrupted_images.append({
-                            'type': 'size_mismatch',
-                            'file': str(ann.image_path),
-                            'expected_size': (ann.width, ann.height),
-                            'actual_size': img.size
-                        })
-                        self.issues.append(f"尺寸不匹配: {ann.image_path.name}")
-                        
-            except Exception as e:
-                corrupted_images.append({
-                    'type': 'corrupted_image',
-                    'file': str(ann.image_path),
-                    'error': str(e)
-                })
-                self.issues.append(f"损坏图片: {ann.image_path.name} - {e}")
-        
-        return corrupted_images
+    def _check_duplicates(self, result: QualityStats) -> None:
+        """内容哈希相同的图片每组记为一条"""
+        groups: Dict[str, List[str]] = {}
+        for path, digest in result.digests:
+            groups.setdefault(digest, []).append(path)
+        for files in groups.values():
+            # 同一图片被多条标注引用不算重复
+            files = list(dict.fromkeys(files))
+            if len(files) > 1:
+                result.add_issue({'type': DUPLICATE_IMAGE, 'files': files, 'count': len(files)},
+                                 *(f"重复图片: {Path(f).name}" for f in files[1:]))
     
-    def _check_label_consistency(self, annotations: List[ImageAnnotation]) -> List[Dict]:
-        """检查标签一致性"""
-        print("检查标签一致性...")
-        inconsistent_labels = []
-        
-        # 收集所有标签的不同写法
-        label_variants = {}
-        for ann in annotations:
-            for box in ann.boxes:
-                label_lower = box.label.lower()
-                if label_lower not in label_variants:
-                    label_variants[label_lower] = set()
-                label_variants[label_lower].add(box.label)
-        
-        # 检查是否有多种写法
-        for label_lower, variants in label_variants.items():
+    def _check_label_consistency(self, result: QualityStats) -> None:
+        """同一标签的不同大小写写法"""
+        for variants in result.label_variants.values():
             if len(variants) > 1:
-                inconsistent_labels.append({
-                    'type': 'inconsistent_label',
+                result.add_issue({
+                    'type': INCONSISTENT_LABEL,
                     'label_variants': list(variants),
                     'suggested_label': max(variants, key=len)  # 选择最长的作为建议
-                })
-                self.issues.append(f"标签不一致: {', '.join(variants)}")
-        
-        return inconsistent_labels
-    
-    def _collect_statistics(self, annotations: List[ImageAnnotation]):
-        """收集统计信息"""
-        print("收集统计信息...")
-        
-        for ann in annotations:
-            # 图片尺寸统计
-            self.stats['image_sizes'].append((ann.width, ann.height))
-            
-            # 标注统计
-            self.stats['total_boxes'] += len(ann.boxes)
-            if ann.polygons:
-                self.stats['total_polygons'] += len(ann.polygons)
-            
-            # 类别统计
-            for box in ann.boxes:
-                self.stats['classes'].add(box.label)
-                # 标注框尺寸统计
-                width = box.xmax - box.xmin
-                height = box.ymax - box.ymin
-                self.stats['box_sizes'].append((width, height))
-            
-            if ann.polygons:
-                for poly in ann.polygons:
-                    self.stats['classes'].add(poly.label)
-        
-        # 转换set为list以便JSON序列化
-        self.stats['classes'] = list(self.stats['classes'])
+                }, f"标签不一致: {', '.join(variants)}")
     
     def _calculate_health_score(self) -> float:
         """计算数据集健康度评分"""
@@ -272,52 +463,43 @@ class QualityChecker:
         score = 100.0
         
         # 根据问题数量扣分
-        issue_penalty = min(len(self.issues) * 2, 50)  # 每个问题扣2分，最多扣50分
+        issue_penalty = min(sum(self.issue_counts.values()) * 2, 50)  # 每个问题扣2分，最多扣50分
         score -= issue_penalty
         
         # 根据空标注比例扣分
-        empty_count = len([issue for issue in self.issues if "空标注" in issue])
-        empty_ratio = empty_count / self.stats['total_images']
+        empty_ratio = self.issue_counts[EMPTY_ANNOTATION] / self.stats['total_images']
         score -= empty_ratio * 30  # 空标注比例扣分
         
         return max(score, 0.0)
     
     def _generate_recommendations(self) -> List[str]:
         """生成改进建议"""
-        recommendations = []
+        counts = self.issue_counts
+        if sum(counts.values()) == 0:
+            return ["数据集质量良好，无需特别处理"]
         
-        if len(self.issues) == 0:
-            recommendations.append("数据集质量良好，无需特别处理")
-            return recommendations
+        recommendations = []
+        if counts[DUPLICATE_IMAGE]:
+            recommendations.append(f"发现 {counts[DUPLICATE_IMAGE]} 张重复图片，建议删除重复文件")
         
-        # 根据问题类型生成建议
-        issue_types = {}
-        for issue in self.issues:
-            if "重复图片" in issue:
-                issue_types['duplicates'] = issue_types.get('duplicates', 0) + 1
-            elif "空标注" in issue:
-                issue_types['empty'] = issue_types.get('empty', 0) + 1
-            elif "异常标注" in issue:
-                issue_types['invalid'] = issue_types.get('invalid', 0) + 1
-            elif "损坏图片" in issue:
-                issue_types['corrupted'] = issue_types.get('corrupted', 0) + 1
-            elif "标签不一致" in issue:
-                issue_types['inconsistent'] = issue_types.get('inconsistent', 0) + 1
+        if counts[EMPTY_ANNOTATION]:
+            recommendations.append(f"发现 {counts[EMPTY_ANNOTATION]} 张空标注图片，建议补充标注或移除")
         
-        if 'duplicates' in issue_types:
-            recommendations.append(f"发现 {issue_types['duplicates']} 张重复图片，建议删除重复文件")
+        invalid = counts[INVALID_BBOX] + counts[INVALID_POLYGON]
+        if invalid:
+            recommendations.append(f"发现 {invalid} 个异常标注，建议检查并修正")
         
-        if 'empty' in issue_types:
-            recommendations.append(f"发现 {issue_types['empty']} 张空标注图片，建议补充标注或移除")
+        if counts[CORRUPTED_IMAGE]:
+            recommendations.append(f"发现 {counts[CORRUPTED_IMAGE]} 张损坏图片，建议重新获取或移除")
         
-        if 'invalid' in issue_types:
-            recommendations.append(f"发现 {issue_types['invalid']} 个异常标注，建议检查并修正")
+        if counts[MISSING_IMAGE]:
+            recommendations.append(f"发现 {counts[MISSING_IMAGE]} 张缺失图片，建议补齐图片或删除对应标注")
         
-        if 'corrupted' in issue_types:
-            recommendations.append(f"发现 {issue_types['corrupted']} 张损坏图片，建议重新获取或移除")
+        if counts[SIZE_MISMATCH]:
+            recommendations.append(f"发现 {counts[SIZE_MISMATCH]} 张图片尺寸与标注不符，建议重新生成标注")
         
-        if 'inconsistent' in issue_types:
-            recommendations.append(f"发现 {issue_types['inconsistent']} 个标签不一致问题，建议统一标签命名")
+        if counts[INCONSISTENT_LABEL]:
+            recommendations.append(f"发现 {counts[INCONSISTENT_LABEL]} 个标签不一致问题，建议统一标签命名")
         
         return recommendations
     
@@ -4,10 +4,10 @@
 from pathlib import Path
 from typing import List, Dict, Optional
 import json
-from collections import Counter
 import colorsys
 
 from .base_parser import ImageAnnotation
+from .stats_engine import DatasetStats, collect_stats
 
 
 class SimpleVisualizer:
@@ -57,67 +57,26 @@ class SimpleVisualizer:
         # 保存JSON数据
         json_file = output_dir / "statistics_data.json"
         with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(stats, f, ensure_ascii=False, indent=2, default=str)
+            json.dump(stats.summary(), f, ensure_ascii=False, indent=2, default=str)
         
         print(f"统计报告已保存: {html_file}")
         print(f"统计数据已保存: {json_file}")
     
-    def _collect_statistics(self, annotations: List[ImageAnnotation]) -> Dict:
-        """收集统计数据"""
-        stats = {
-            'total_images': len(annotations),
-            'total_boxes': 0,
-            'total_polygons': 0,
-            'class_counts': {},
-            'image_sizes': [],
-            'bbox_sizes': [],
-            'annotations_per_image': [],
-            'aspect_ratios': []
-        }
-        
-        class_counter = Counter()
-        
-        for ann in annotations:
-            # 图片尺寸
-            stats['image_sizes'].append({'width': ann.width, 'height': ann.height})
-            if ann.height > 0:
-                stats['aspect_ratios'].append(ann.width / ann.height)
-            
-            # 标注数量
-            box_count = len(ann.boxes) if ann.boxes else 0
-            poly_count = len(ann.polygons) if ann.polygons else 0
-            stats['annotations_per_image'].append(box_count + poly_count)
-            
-            # 矩形框统计
-            if ann.boxes:
-                stats['total_boxes'] += len(ann.boxes)
-                for box in ann.boxes:
-                    class_counter[box.label] += 1
-                    width = box.xmax - box.xmin
-                    height = box.ymax - box.ymin
-                    stats['bbox_sizes'].append({'width': width, 'height': height})
-            
-            # 多边形统计
-            if ann.polygons:
-                stats['total_polygons'] += len(ann.polygons)
-                for poly in ann.polygons:
-                    class_counter[poly.label] += 1
-        
-        # 转换Counter为普通字典
-        stats['class_counts'] = dict(class_counter)
-        
-        return stats
+    def _collect_statistics(self, annotations: List[ImageAnnotation]) -> DatasetStats:
+        """收集统计数据（可合并的累加器，内存占用与图片数无关）"""
+        return collect_stats(annotations)
     
-    def _generate_html_report(self, stats: Dict) -> str:
+    def _generate_html_report(self, stats: DatasetStats) -> str:
         """生成HTML报告"""
         # 准备图表数据
-        class_labels = list(stats['class_counts'].keys())
-        class_counts = list(stats['class_counts'].values())
+        class_labels = list(stats.class_counts.keys())
+        class_counts = list(stats.class_counts.values())
         class_colors = [self.get_class_color(label) for label in class_labels]
         
         # 计算统计指标
-        avg_annotations = sum(stats['annotations_per_image']) / len(stats['annotations_per_image']) if stats['annotations_per_image'] else 0
-        avg_aspect_ratio = sum(stats['aspect_ratios']) / len(stats['aspect_ratios']) if stats['aspect_ratios'] else 0
+        avg_annotations = stats.annotations_per_image.mean
+        avg_aspect_ratio = stats.aspect_ratio.mean
+        edges, hist_counts = stats.annotation_count_hist.trimmed()
         
         html = f"""
         <!DOCTYPE html>
@@ -227,19 +186,19 @@ class SimpleVisualizer:
                 
                 <div class="stats-grid">
                     <div class="stat-card">
-                        <div class="stat-number">{stats['total_images']:,}</div>
+                        <div class="stat-number">{stats.total_images:,}</div>
                         <div class="stat-label">📷 总图片数</div>
                     </div>
                     <div class="stat-card">
-                        <div class="stat-number">{stats['total_boxes']:,}</div>
+                        <div class="stat-number">{stats.total_boxes:,}</div>
                         <div class="stat-label">📦 总矩形框数</div>
                     </div>
                     <div class="stat-card">
-                        <div class="stat-number">{stats['total_polygons']:,}</div>
+                        <div class="stat-number">{stats.total_polygons:,}</div>
                         <div class="stat-label">🔷 总多边形数</div>
                     </div>
                     <div class="stat-card">
-                        <div class="stat-number">{len(stats['class_counts']):,}</div>
+                        <div class="stat-number">{len(stats.class_counts):,}</div>
                         <div class="stat-label">🏷️ 类别数量</div>
                     </div>
                     <div class="stat-card">
@@ -258,7 +217,7 @@ class SimpleVisualizer:
         """
         
         # 添加类别列表
-        for i, (label, count) in enumerate(stats['class_counts'].items()):
+        for i, (label, count) in enumerate(stats.class_counts.items()):
             color = class_colors[i] if i < len(class_colors) else '#666'
             percentage = (count / sum(class_counts)) * 100 if class_counts else 0
             html += f"""
@@ -351,11 +310,11 @@ class SimpleVisualizer:
                 
                 Plotly.newPlot('class-distribution-bar', barData, barLayout, {responsive: true});
                 
-                // 标注数量分布直方图
+                // 标注数量分布直方图（按每图标注数分箱）
                 var histData = [{
-                    x: """ + str(stats['annotations_per_image']) + """,
-                    type: 'histogram',
-                    nbinsx: 20,
+                    x: """ + str(edges[:-1].astype(int).tolist()) + """,
+                    y: """ + str(hist_counts.tolist()) + """,
+                    type: 'bar',
                     marker: { 
                         color: 'rgba(76, 175, 80, 0.8)',
                         line: { color: 'rgba(76, 175, 80, 1)', width: 1 }
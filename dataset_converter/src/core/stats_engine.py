@@ -0,0 +1,752 @@
+"""
+可合并的流式统计
+
+数据集统计（图片尺寸、标注框尺寸、每图标注数、类别计数……）由固定大小的累加器逐个或按 numpy 批量累加，
+内存占用与数据集大小无关：
+    - Moments：计数、均值、方差（Welford；批量与合并用成对合并公式）、最小 / 最大值
+    - Histogram / Histogram2D：固定分箱（线性或对数）的直方图，超出范围的值计入两端的分箱
+    - QuantileSketch：对数分桶的分位数草图，分位数的相对误差不超过 alpha
+    - Distribution：Moments + QuantileSketch，summary() 给出常用汇总指标
+    - 类别计数用 Counter
+累加器都支持 merge()（分块在子进程中统计后在主进程合并，结果与合并顺序无关）、
+subtract()（增量更新时减去此前合并进来的一部分）以及 to_dict() / from_dict()（可 JSON 序列化）。
+减去一部分后 min / max 无法精确恢复：被减部分触及边界时改用分位数草图的估计值。
+DatasetStats 汇总一个数据集的常用统计，collect_stats() 分块（可并行）收集。
+"""
+import math
+from collections import Counter
+from functools import lru_cache, partial
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .base_parser import ImageAnnotation
+from .parallel import chunked, parallel_imap
+
+
+DEFAULT_ALPHA = 0.01  # 分位数草图的相对误差
+MAX_SKETCH_BINS = 2048  # 分位数草图每侧的分桶上限，超出时合并最小的分桶
+ZERO_THRESHOLD = 1e-12  # 绝对值不超过该值的数计入零桶
+DEFAULT_CHUNK_SIZE = 1024  # collect_stats 每个分块的标注数
+
+IMAGE_SIZE_RANGE = (0, 8192)  # 图片宽高直方图的范围（像素，线性分箱）
+IMAGE_SIZE_BINS = 128
+BOX_SIZE_RANGE = (1, 8192)  # 标注框宽高直方图的默认范围（像素，对数分箱）
+NORMALIZED_BOX_SIZE_RANGE = (1e-4, 1)  # 归一化坐标（YOLO）的标注框宽高
+BOX_SIZE_BINS = 48
+ASPECT_RATIO_RANGE = (0, 4)
+ASPECT_RATIO_BINS = 40
+ANNOTATION_COUNT_BINS = 100  # 每图标注数直方图：0..99 每个整数一个分箱，最后一个分箱含更大的值
+DENSITY_GRID = 20  # 标注框中心位置（归一化坐标）的网格大小
+
+
+class Moments:
+    """计数、均值、二阶中心矩之和（方差）与最小 / 最大值"""
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, x) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+
+    def add_many(self, values) -> None:
+        values = np.asarray(values).ravel()
+        if not values.size:
+            return
+        batch = Moments()
+        batch.count = int(values.size)
+        batch.mean = float(values.mean(dtype=np.float64))
+        batch.m2 = float(np.square(values - batch.mean, dtype=np.float64).sum())
+        batch.min = values.min().item()  # 整数输入保持整数
+        batch.max = values.max().item()
+        self.merge(batch)
+
+    def merge(self, other: "Moments") -> "Moments":
+        if not other.count:
+            return self
+        if not self.count:
+            self.count, self.mean, self.m2, self.min, self.max = other.count, other.mean, other.m2, other.min, other.max
+            return self
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / n
+        self.m2 += other.m2 + delta * delta * self.count * other.count / n
+        self.count = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def subtract(self, other: "Moments") -> "Moments":
+        """merge 的逆运算；min / max 保持不变（由调用方修正）"""
+        if not other.count:
+            return self
+        n = self.count - other.count
+        if n <= 0:
+            self.__init__()
+            return self
+        mean = (self.mean * self.count - other.mean * other.count) / n
+        delta = other.mean - mean
+        self.m2 = max(0.0, self.m2 - other.m2 - delta * delta * n * other.count / self.count)
+        self.mean = mean
+        self.count = n
+        return self
+
+    @property
+    def variance(self) -> float:
+        """总体方差"""
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def to_dict(self) -> List:
+        return [self.count, self.mean, self.m2, self.min, self.max]
+
+    @classmethod
+    def from_dict(cls, data: List) -> "Moments":
+        moments = cls()
+        moments.count, moments.mean, moments.m2, moments.min, moments.max = data
+        return moments
+
+
+@lru_cache(maxsize=None)
+def _log_gamma(alpha: float) -> float:
+    return math.log((1 + alpha) / (1 - alpha))
+
+
+class QuantileSketch:
+    """
+    对数分桶的分位数草图：正数 x 计入第 ceil(log_gamma(x)) 个分桶，gamma = (1 + alpha) / (1 - alpha)，
+    负数按绝对值计入另一组分桶。分桶数只取决于数值范围，合并就是逐桶相加。
+    """
+
+    __slots__ = ("alpha", "_log_gamma", "positive", "negative", "zeros")
+
+    def __init__(self, alpha: float = DEFAULT_ALPHA):
+        self.alpha = alpha
+        self._log_gamma = _log_gamma(alpha)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zeros = 0
+
+    @property
+    def count(self) -> int:
+        return self.zeros + sum(self.positive.values()) + sum(self.negative.values())
+
+    def _index(self, magnitude: float) -> int:
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        """分桶 (gamma^(i-1), gamma^i] 中相对误差最小的代表值"""
+        gamma = math.exp(self._log_gamma)
+        return 2 * gamma ** index / (gamma + 1)
+
+    def add(self, x) -> None:
+        if x > ZERO_THRESHOLD:
+            store = self.positive
+        elif x < -ZERO_THRESHOLD:
+            store, x = self.negative, -x
+        else:
+            self.zeros += 1
+            return
+        k = self._index(x)
+        store[k] = store.get(k, 0) + 1
+        if len(store) > MAX_SKETCH_BINS:
+            self._collapse(store)
+
+    def add_many(self, values) -> None:
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not values.size:
+            return
+        for store, magnitudes in ((self.positive, values[values > ZERO_THRESHOLD]),
+                                  (self.negative, -values[values < -ZERO_THRESHOLD])):
+            if magnitudes.size:
+                keys, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64),
+                                         return_counts=True)
+                for k, c in zip(keys.tolist(), counts.tolist()):
+                    store[k] = store.get(k, 0) + c
+                if len(store) > MAX_SKETCH_BINS:
+                    self._collapse(store)
+        self.zeros += int(np.count_nonzero(np.abs(values) <= ZERO_THRESHOLD))
+
+    @staticmethod
+    def _collapse(store: Dict[int, int]) -> None:
+        """分桶数超过上限时把绝对值最小的分桶并入一个（只影响最小值附近的精度）"""
+        keys = sorted(store)
+        excess = keys[:len(keys) - MAX_SKETCH_BINS + 1]
+        store[excess[-1]] = sum(store.pop(k) for k in excess)
+
+    def _check_compatible(self, other: "QuantileSketch") -> None:
+        if other.alpha != self.alpha:
+            raise ValueError(f"分位数草图的精度不同，无法合并: {self.alpha} / {other.alpha}")
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        self._check_compatible(other)
+        for store, incoming in ((self.positive, other.positive), (self.negative, other.negative)):
+            for k, c in incoming.items():
+                store[k] = store.get(k, 0) + c
+            if len(store) > MAX_SKETCH_BINS:
+                self._collapse(store)
+        self.zeros += other.zeros
+        return self
+
+    def subtract(self, other: "QuantileSketch") -> "QuantileSketch":
+        self._check_compatible(other)
+        for store, removed in ((self.positive, other.positive), (self.negative, other.negative)):
+            for k, c in removed.items():
+                left = store.get(k, 0) - c
+                if left > 0:
+                    store[k] = left
+                else:
+                    store.pop(k, None)
+        self.zeros = max(0, self.zeros - other.zeros)
+        return self
+
+    def _ordered(self) -> Iterable[Tuple[float, int]]:
+        """(代表值, 计数)，从小到大"""
+        for k in sorted(self.negative, reverse=True):
+            yield -self._value(k), self.negative[k]
+        if self.zeros:
+            yield 0.0, self.zeros
+        for k in sorted(self.positive):
+            yield self._value(k), self.positive[k]
+
+    def quantile(self, q: float) -> Optional[float]:
+        """第 q 分位数（0 <= q <= 1）的估计值，没有数据时返回 None"""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for value, count in self._ordered():
+            seen += count
+            if seen > rank:
+                return value
+        return value
+
+    def to_dict(self) -> Dict:
+        data = {}
+        if self.alpha != DEFAULT_ALPHA:
+            data['alpha'] = self.alpha
+        if self.zeros:
+            data['zeros'] = self.zeros
+        if self.positive:
+            data['pos'] = [[k, c] for k, c in sorted(self.positive.items())]
+        if self.negative:
+            data['neg'] = [[k, c] for k, c in sorted(self.negative.items())]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "QuantileSketch":
+        sketch = cls(data.get('alpha', DEFAULT_ALPHA))
+        sketch.zeros = data.get('zeros', 0)
+        sketch.positive = {k: c for k, c in data.get('pos', ())}
+        sketch.negative = {k: c for k, c in data.get('neg', ())}
+        return sketch
+
+
+class Histogram:
+    """[lo, hi) 上 bins 个等宽（log=True 时按对数等宽）分箱的直方图，超出范围的值计入两端的分箱"""
+
+    def __init__(self, lo: float, hi: float, bins: int, log: bool = False):
+        if log and lo <= 0:
+            raise ValueError("对数分箱的下限必须大于 0")
+        self.lo, self.hi, self.bins, self.log = lo, hi, int(bins), log
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+
+    @property
+    def edges(self) -> np.ndarray:
+        if self.log:
+            return np.geomspace(self.lo, self.hi, self.bins + 1)
+        return np.linspace(self.lo, self.hi, self.bins + 1)
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def _positions(self, values: np.ndarray) -> np.ndarray:
+        if self.log:
+            scaled = np.log(np.maximum(values, self.lo)) - math.log(self.lo)
+            scaled *= self.bins / (math.log(self.hi) - math.log(self.lo))
+        else:
+            scaled = (values - self.lo) * (self.bins / (self.hi - self.lo))
+        return np.clip(scaled, 0, self.bins - 1).astype(np.int64)
+
+    def add(self, x) -> None:
+        if self.log:
+            pos = (math.log(max(x, self.lo)) - math.log(self.lo)) * self.bins / (math.log(self.hi) - math.log(self.lo))
+        else:
+            pos = (x - self.lo) * self.bins / (self.hi - self.lo)
+        self.counts[min(max(int(pos), 0), self.bins - 1)] += 1
+
+    def add_many(self, values) -> None:
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size:
+            self.counts += np.bincount(self._positions(values), minlength=self.bins)
+
+    def _check_compatible(self, other: "Histogram") -> None:
+        if (self.lo, self.hi, self.bins, self.log) != (other.lo, other.hi, other.bins, other.log):
+            raise ValueError("直方图分箱不同，无法合并")
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        self._check_compatible(other)
+        self.counts += other.counts
+        return self
+
+    def subtract(self, other: "Histogram") -> "Histogram":
+        self._check_compatible(other)
+        self.counts = np.maximum(self.counts - other.counts, 0)
+        return self
+
+    def trimmed(self) -> Tuple[np.ndarray, np.ndarray]:
+        """去掉两端空分箱后的 (分箱边界, 计数)，用于绘图"""
+        nonzero = np.flatnonzero(self.counts)
+        if not nonzero.size:
+            return self.edges[:1], self.counts[:0]
+        first, last = nonzero[0], nonzero[-1] + 1
+        return self.edges[first:last + 1], self.counts[first:last]
+
+    def to_dict(self) -> Dict:
+        nonzero = np.flatnonzero(self.counts)
+        return {'range': [self.lo, self.hi], 'bins': self.bins, 'log': self.log,
+                'counts': [[i, c] for i, c in zip(nonzero.tolist(), self.counts[nonzero].tolist())]}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Histogram":
+        hist = cls(*data['range'], data['bins'], data.get('log', False))
+        for i, c in data.get('counts', ()):
+            hist.counts[i] = c
+        return hist
+
+
+class Histogram2D:
+    """二维固定分箱直方图（两个维度使用相同的分箱设置），用于尺寸分布与位置热力图"""
+
+    def __init__(self, lo: float, hi: float, bins: int, log: bool = False):
+        self.axis = Histogram(lo, hi, bins, log)  # 只用于计算分箱位置
+        self.counts = np.zeros((self.axis.bins, self.axis.bins), dtype=np.int64)
+
+    @property
+    def edges(self) -> np.ndarray:
+        return self.axis.edges
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def add(self, x, y) -> None:
+        i, j = self.axis._positions(np.array([x, y], dtype=np.float64)).tolist()
+        self.counts[i, j] += 1
+
+    def add_many(self, xs, ys) -> None:
+        xs = np.asarray(xs, dtype=np.float64).ravel()
+        ys = np.asarray(ys, dtype=np.float64).ravel()
+        if xs.size:
+            bins = self.axis.bins
+            flat = self.axis._positions(xs) * bins + self.axis._positions(ys)
+            self.counts += np.bincount(flat, minlength=bins * bins).reshape(bins, bins)
+
+    def merge(self, other: "Histogram2D") -> "Histogram2D":
+        self.axis._check_compatible(other.axis)
+        self.counts += other.counts
+        return self
+
+    def subtract(self, other: "Histogram2D") -> "Histogram2D":
+        self.axis._check_compatible(other.axis)
+        self.counts = np.maximum(self.counts - other.counts, 0)
+        return self
+
+    def trimmed(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """去掉四周空分箱后的 (x 分箱边界, y 分箱边界, 计数[x, y])"""
+        rows = np.flatnonzero(self.counts.any(axis=1))
+        cols = np.flatnonzero(self.counts.any(axis=0))
+        edges = self.edges
+        if not rows.size:
+            return edges[:1], edges[:1], self.counts[:0, :0]
+        r0, r1, c0, c1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        return edges[r0:r1 + 1], edges[c0:c1 + 1], self.counts[r0:r1, c0:c1]
+
+    def to_dict(self) -> Dict:
+        i, j = np.nonzero(self.counts)
+        axis = self.axis
+        return {'range': [axis.lo, axis.hi], 'bins': axis.bins, 'log': axis.log,
+                'counts': [[a, b, c] for a, b, c in zip(i.tolist(), j.tolist(), self.counts[i, j].tolist())]}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Histogram2D":
+        hist = cls(*data['range'], data['bins'], data.get('log', False))
+        for i, j, c in data.get('counts', ()):
+            hist.counts[i, j] = c
+        return hist
+
+
+class Distribution:
+    """一维数值分布：精确的计数 / 均值 / 方差 / 最值，加上近似分位数"""
+
+    __slots__ = ("moments", "sketch")
+
+    def __init__(self, alpha: float = DEFAULT_ALPHA):
+        self.moments = Moments()
+        self.sketch = QuantileSketch(alpha)
+
+    @property
+    def count(self) -> int:
+        return self.moments.count
+
+    @property
+    def mean(self) -> float:
+        return self.moments.mean
+
+    @property
+    def min(self):
+        return self.moments.min
+
+    @property
+    def max(self):
+        return self.moments.max
+
+    def add(self, x) -> None:
+        self.moments.add(x)
+        self.sketch.add(x)
+
+    def add_many(self, values) -> None:
+        self.moments.add_many(values)
+        self.sketch.add_many(values)
+
+    def merge(self, other: "Distribution") -> "Distribution":
+        if not other.moments.count:
+            return self
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def subtract(self, other: "Distribution") -> "Distribution":
+        moments = self.moments
+        moments.subtract(other.moments)
+        self.sketch.subtract(other.sketch)
+        if moments.count and other.count:
+            # 被减部分触及边界时，原来的最值可能已不存在，改用草图估计
+            if other.min <= moments.min:
+                moments.min = self.sketch.quantile(0.0)
+            if other.max >= moments.max:
+                moments.max = self.sketch.quantile(1.0)
+            moments.min, moments.max = min(moments.min, moments.max), max(moments.min, moments.max)
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """草图的估计值，限制在 [min, max] 内"""
+        value = self.sketch.quantile(q)
+        if value is None:
+            return None
+        return min(max(value, self.min), self.max)
+
+    def summary(self) -> Dict:
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'std': self.moments.std,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+        }
+
+    def to_dict(self) -> Dict:
+        data = {'m': self.moments.to_dict()}
+        data.update(self.sketch.to_dict())
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Distribution":
+        dist = cls.__new__(cls)
+        dist.moments = Moments.from_dict(data['m'])
+        dist.sketch = QuantileSketch.from_dict(data)
+        return dist
+
+
+def _restore_distribution(moments: List, alpha: float, positive: Dict[int, int], negative: Dict[int, int],
+                          zeros: int) -> Distribution:
+    dist = Distribution(alpha)
+    dist.moments = Moments.from_dict(moments)
+    dist.sketch.positive, dist.sketch.negative, dist.sketch.zeros = positive, negative, zeros
+    return dist
+
+
+# DatasetStats 中的分布与直方图字段
+_DISTRIBUTIONS = ('image_width', 'image_height', 'aspect_ratio', 'annotations_per_image',
+                  'box_width', 'box_height', 'polygon_points')
+_HISTOGRAMS = {
+    'image_size_hist': Histogram2D,
+    'box_size_hist': Histogram2D,
+    'box_center_hist': Histogram2D,
+    'aspect_ratio_hist': Histogram,
+    'annotation_count_hist': Histogram,
+}
+_COUNTERS = ('total_images', 'total_boxes', 'total_polygons', 'images_without_annotations', 'invalid_image_sizes')
+
+
+class DatasetStats:
+    """
+    数据集统计：计数、类别计数、各项数值分布，histograms=True 时另有绘图用的直方图。
+    尺寸未知（宽或高 <= 0）的图片只计入 invalid_image_sizes，不计入尺寸分布。
+    box_size_range 为标注框宽高直方图的范围（对数分箱）：像素坐标用默认值，归一化坐标用 NORMALIZED_BOX_SIZE_RANGE。
+    """
+
+    def __init__(self, histograms: bool = True, box_size_range: Tuple[float, float] = BOX_SIZE_RANGE):
+        for name in _COUNTERS:
+            setattr(self, name, 0)
+        self.class_counts: Counter = Counter()
+        for name in _DISTRIBUTIONS:
+            setattr(self, name, Distribution())
+        self.histograms = histograms
+        if histograms:
+            self.image_size_hist = Histogram2D(*IMAGE_SIZE_RANGE, IMAGE_SIZE_BINS)
+            self.box_size_hist = Histogram2D(*box_size_range, BOX_SIZE_BINS, log=True)
+            self.box_center_hist = Histogram2D(0, 1, DENSITY_GRID)
+            self.aspect_ratio_hist = Histogram(*ASPECT_RATIO_RANGE, ASPECT_RATIO_BINS)
+            self.annotation_count_hist = Histogram(0, ANNOTATION_COUNT_BINS, ANNOTATION_COUNT_BINS)
+
+    @property
+    def total_annotations(self) -> int:
+        return self.total_boxes + self.total_polygons
+
+    # ---- 逐个累加（单张图片的标注） ----
+
+    def add_image_size(self, width, height) -> None:
+        if width <= 0 or height <= 0:
+            self.invalid_image_sizes += 1
+            return
+        ratio = width / height
+        self.image_width.add(width)
+        self.image_height.add(height)
+        self.aspect_ratio.add(ratio)
+        if self.histograms:
+            self.image_size_hist.add(width, height)
+            self.aspect_ratio_hist.add(ratio)
+
+    def add_annotation_count(self, n: int) -> None:
+        self.annotations_per_image.add(n)
+        if n == 0:
+            self.images_without_annotations += 1
+        if self.histograms:
+            self.annotation_count_hist.add(n)
+
+    def add_annotation(self, ann: ImageAnnotation) -> None:
+        """累加一张图片的尺寸、标注框、多边形与类别"""
+        polygons = ann.polygons or []
+        self.total_images += 1
+        self.total_boxes += len(ann.boxes)
+        self.total_polygons += len(polygons)
+        self.add_image_size(ann.width, ann.height)
+        self.add_annotation_count(len(ann.boxes) + len(polygons))
+        centers = self.histograms and ann.width > 0 and ann.height > 0
+        for box in ann.boxes:
+            self.class_counts[box.label] += 1
+            width = box.xmax - box.xmin
+            height = box.ymax - box.ymin
+            self.box_width.add(width)
+            self.box_height.add(height)
+            if self.histograms:
+                self.box_size_hist.add(width, height)
+                if centers:
+                    self.box_center_hist.add((box.xmin + box.xmax) / 2 / ann.width,
+                                             (box.ymin + box.ymax) / 2 / ann.height)
+        for poly in polygons:
+            self.class_counts[poly.label] += 1
+            self.polygon_points.add(len(poly.points) // 2)
+
+    # ---- 按 numpy 数组批量累加 ----
+
+    def add_image_sizes(self, widths, heights) -> None:
+        widths = np.asarray(widths).ravel()
+        heights = np.asarray(heights).ravel()
+        valid = (widths > 0) & (heights > 0)
+        self.invalid_image_sizes += int(widths.size - np.count_nonzero(valid))
+        widths, heights = widths[valid], heights[valid]
+        ratios = widths / heights
+        self.image_width.add_many(widths)
+        self.image_height.add_many(heights)
+        self.aspect_ratio.add_many(ratios)
+        if self.histograms:
+            self.image_size_hist.add_many(widths, heights)
+            self.aspect_ratio_hist.add_many(ratios)
+
+    def add_annotation_counts(self, counts) -> None:
+        counts = np.asarray(counts).ravel()
+        self.annotations_per_image.add_many(counts)
+        self.images_without_annotations += int(np.count_nonzero(counts == 0))
+        if self.histograms:
+            self.annotation_count_hist.add_many(counts)
+
+    def add_boxes(self, widths, heights, centers_x=None, centers_y=None) -> None:
+        """标注框宽高；centers_x / centers_y 为归一化的中心坐标（可省略）"""
+        self.box_width.add_many(widths)
+        self.box_height.add_many(heights)
+        if self.histograms:
+            self.box_size_hist.add_many(widths, heights)
+            if centers_x is not None:
+                self.box_center_hist.add_many(centers_x, centers_y)
+
+    def add_polygon_points(self, counts) -> None:
+        self.polygon_points.add_many(counts)
+
+    # ---- 合并与序列化 ----
+
+    def __getstate__(self):
+        # 紧凑的 pickle 形式：逐图片结果在进程间传递，通用的对象序列化比统计本身还慢
+        dists = []
+        for name in _DISTRIBUTIONS:
+            dist = getattr(self, name)
+            sketch = dist.sketch
+            dists.append((dist.moments.to_dict(), sketch.alpha, sketch.positive, sketch.negative, sketch.zeros))
+        hists = [getattr(self, name) for name in _HISTOGRAMS] if self.histograms else None
+        return [getattr(self, name) for name in _COUNTERS], dict(self.class_counts), dists, hists
+
+    def __setstate__(self, state):
+        counters, class_counts, dists, hists = state
+        for name, value in zip(_COUNTERS, counters):
+            setattr(self, name, value)
+        self.class_counts = Counter(class_counts)
+        for name, dist in zip(_DISTRIBUTIONS, dists):
+            setattr(self, name, _restore_distribution(*dist))
+        self.histograms = hists is not None
+        if hists is not None:
+            for name, hist in zip(_HISTOGRAMS, hists):
+                setattr(self, name, hist)
+
+    def merge(self, other: "DatasetStats") -> "DatasetStats":
+        for name in _COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.class_counts.update(other.class_counts)
+        for name in _DISTRIBUTIONS:
+            getattr(self, name).merge(getattr(other, name))
+        if self.histograms and other.histograms:
+            for name in _HISTOGRAMS:
+                getattr(self, name).merge(getattr(other, name))
+        return self
+
+    def subtract(self, other: "DatasetStats") -> "DatasetStats":
+        """减去此前合并进来的 other"""
+        for name in _COUNTERS:
+            setattr(self, name, getattr(self, name) - getattr(other, name))
+        self.class_counts.subtract(other.class_counts)
+        self.class_counts = +self.class_counts  # 去掉计数不为正的类别
+        for name in _DISTRIBUTIONS:
+            getattr(self, name).subtract(getattr(other, name))
+        if self.histograms and other.histograms:
+            for name in _HISTOGRAMS:
+                getattr(self, name).subtract(getattr(other, name))
+        return self
+
+    def to_dict(self) -> Dict:
+        """可 JSON 序列化的形式，省略空字段"""
+        data = {name: getattr(self, name) for name in _COUNTERS if getattr(self, name)}
+        if self.class_counts:
+            data['class_counts'] = dict(self.class_counts)
+        for name in _DISTRIBUTIONS:
+            if getattr(self, name).count:
+                data[name] = getattr(self, name).to_dict()
+        if self.histograms:
+            data['histograms'] = {name: getattr(self, name).to_dict() for name in _HISTOGRAMS}
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "DatasetStats":
+        histograms = data.get('histograms')
+        stats = cls(histograms=False)
+        for name in _COUNTERS:
+            setattr(stats, name, data.get(name, 0))
+        stats.class_counts = Counter(data.get('class_counts', {}))
+        for name in _DISTRIBUTIONS:
+            if name in data:
+                setattr(stats, name, Distribution.from_dict(data[name]))
+        if histograms:
+            stats.histograms = True
+            for name, kind in _HISTOGRAMS.items():
+                setattr(stats, name, kind.from_dict(histograms[name]))
+        return stats
+
+    # ---- 汇总 ----
+
+    def image_size_stats(self) -> Optional[Dict]:
+        if not self.image_width.count:
+            return None
+        return {
+            'avg_width': self.image_width.mean,
+            'avg_height': self.image_height.mean,
+            'min_width': self.image_width.min,
+            'max_width': self.image_width.max,
+            'min_height': self.image_height.min,
+            'max_height': self.image_height.max,
+            'median_width': self.image_width.quantile(0.5),
+            'median_height': self.image_height.quantile(0.5),
+        }
+
+    def annotation_stats(self) -> Optional[Dict]:
+        counts = self.annotations_per_image
+        if not counts.count:
+            return None
+        return {
+            'avg_per_image': counts.mean,
+            'min_per_image': counts.min,
+            'max_per_image': counts.max,
+            'std_per_image': counts.moments.std,
+            'images_without_annotations': self.images_without_annotations,
+        }
+
+    def class_balance(self) -> Dict[str, float]:
+        total = sum(self.class_counts.values())
+        return {label: count / total for label, count in self.class_counts.items()} if total else {}
+
+    def summary(self) -> Dict:
+        """报告用的汇总（不含直方图），大小与数据集无关"""
+        summary = {
+            'total_images': self.total_images,
+            'total_boxes': self.total_boxes,
+            'total_polygons': self.total_polygons,
+            'total_annotations': self.total_annotations,
+            'class_counts': dict(self.class_counts),
+            'invalid_image_sizes': self.invalid_image_sizes,
+        }
+        for name in _DISTRIBUTIONS:
+            summary[f'{name}_stats'] = getattr(self, name).summary()
+        return summary
+
+
+def _collect_chunk(options: Dict, annotations: List[ImageAnnotation]) -> DatasetStats:
+    """统计一个分块（模块级函数，供进程池调用）"""
+    stats = DatasetStats(**options)
+    for ann in annotations:
+        stats.add_annotation(ann)
+    return stats
+
+
+def collect_stats(annotations: Iterable[ImageAnnotation], workers: Optional[int] = 1,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE, **options) -> DatasetStats:
+    """
+    统计一组标注，options 传给 DatasetStats。workers > 1（或 0 表示 CPU 核数）时
+    各分块在子进程中统计，主进程只合并固定大小的结果；标注已在内存中时串行通常更快（省去传输）。
+    """
+    stats = DatasetStats(**options)
+    for partial_stats in parallel_imap(partial(_collect_chunk, options), chunked(annotations, chunk_size),
+                                       workers, 1):
+        stats.merge(partial_stats)
+    return stats
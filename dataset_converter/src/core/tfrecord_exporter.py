@@ -1,103 +1,177 @@
 """
 TensorFlow Record 导出器
+
+按子集分片写出（train-00000-of-00128.tfrecord），便于训练时并行读取：
+    - 读图、构建 Example 与计算记录帧校验在进程池中完成，结果按原始顺序返回
+    - 不依赖 TensorFlow：Example 编码与记录帧见 utils/tfrecord.py
+    - 边读边写：记录到达即按子集依次填满分片，写满的分片交给 AsyncFileWriter 关闭，内存占用恒定
+    - 分片先以临时名写出，总数确定后再重命名为 -of-N
+    - image/format 取自文件头魔数，而不是固定为 jpeg
 """
-import tensorflow as tf
+import json
+import os
+import re
+import zlib
+from collections import deque
 from pathlib import Path
-from typing import List
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Set
+
 from .base_parser import ImageAnnotation
-import json
+from .dataset_index import SUBSETS
+from .parallel import parallel_imap
+from ..utils.async_writer import AsyncFileWriter
+from ..utils.image_utils import sniff_format
+from ..utils.tfrecord import bytes_feature, encode_example, float_feature, frame_record, int64_feature
+
+
+DEFAULT_SHARD_SIZE = 1024  # 每个分片的记录数
+DEFAULT_CHUNK_SIZE = 16  # 每次提交给子进程的图片数（结果含整张图片字节，不宜过大）
+DEFAULT_VAL_RATIO = 0.2
+
+_SUFFIX_FORMATS = {".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".bmp": "bmp", ".gif": "gif",
+                   ".webp": "webp", ".tif": "tiff", ".tiff": "tiff"}
+
+
+def shard_file_name(split: str, index: int, num_shards: int) -> str:
+    return f"{split}-{index:05d}-of-{num_shards:05d}.tfrecord"
+
+
+def _partial_file_name(split: str, index: int) -> str:
+    return f"{split}-{index:05d}.tfrecord.part"
+
+
+def _image_format(data: bytes, image_path: Path) -> str:
+    return sniff_format(data[:16]) or _SUFFIX_FORMATS.get(image_path.suffix.lower(), image_path.suffix.lower()[1:])
+
+
+def _build_example(ann: ImageAnnotation) -> Optional[bytes]:
+    """子进程：读取图片并构建 Example，返回完整的 TFRecord 帧；图片不存在返回 None"""
+    try:
+        image_data = ann.image_path.read_bytes()
+    except OSError:
+        return None
+
+    # 提取标注信息
+    xmins, ymins, xmaxs, ymaxs, labels = [], [], [], [], []
+    for box in ann.boxes:
+        xmins.append(box.xmin / ann.width)  # 归一化
+        ymins.append(box.ymin / ann.height)
+        xmaxs.append(box.xmax / ann.width)
+        ymaxs.append(box.ymax / ann.height)
+        labels.append(box.label.encode('utf-8'))
+
+    example = encode_example({
+        'image/encoded': bytes_feature([image_data]),
+        'image/format': bytes_feature([_image_format(image_data, ann.image_path).encode('utf-8')]),
+        'image/filename': bytes_feature([ann.image_path.name.encode('utf-8')]),
+        'image/height': int64_feature([ann.height]),
+        'image/width': int64_feature([ann.width]),
+        'image/object/bbox/xmin': float_feature(xmins),
+        'image/object/bbox/ymin': float_feature(ymins),
+        'image/object/bbox/xmax': float_feature(xmaxs),
+        'image/object/bbox/ymax': float_feature(ymaxs),
+        'image/object/class/text': bytes_feature(labels),
+    })
+    return frame_record(example)
 
 
 class TFRecordExporter:
     """TensorFlow Record 格式导出器"""
-    
-    def __init__(self):
+
+    def __init__(self, shard_size: int = DEFAULT_SHARD_SIZE, workers: int = 0,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, val_ratio: float = DEFAULT_VAL_RATIO):
         self.format_name = "tfrecord"
-    
-    def export(self, annotations: List[ImageAnnotation], output_dir: Path) -> None:
-        """导出为TFRecord格式"""
+        self.shard_size = max(1, int(shard_size))
+        self.workers = workers  # 构建 Example 的进程数，0 表示自动（CPU 核数），1 表示串行
+        self.chunk_size = max(1, int(chunk_size))
+        self.val_ratio = val_ratio
+
+    def set_parallel(self, workers: Optional[int] = None, chunk_size: Optional[int] = None):
+        if workers is not None:
+            self.workers = int(workers)
+        if chunk_size is not None:
+            self.chunk_size = max(1, int(chunk_size))
+
+    def split_of(self, ann: ImageAnnotation) -> str:
+        """
+        图片所属子集：位于 images/<train|val|test>/ 下时沿用该子集，
+        否则按文件名哈希稳定划分（约 val_ratio 进入 val），与输入顺序无关。
+        """
+        subset = ann.image_path.parent.name
+        if subset in SUBSETS:
+            return subset
+        bucket = zlib.crc32(ann.image_path.name.encode('utf-8')) / 0xFFFFFFFF
+        return "val" if bucket < self.val_ratio else "train"
+
+    def export(self, annotations: Iterable[ImageAnnotation], output_dir: Path) -> None:
+        """导出为分片的TFRecord格式"""
         output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 分别创建训练和验证集
-        train_file = output_dir / "train.tfrecord"
-        val_file = output_dir / "val.tfrecord"
-        
-        # 简单划分：80%训练，20%验证
-        split_idx = int(len(annotations) * 0.8)
-        train_annotations = annotations[:split_idx]
-        val_annotations = annotations[split_idx:]
-        
-        # 写入训练集
-        self._write_tfrecord(train_annotations, train_file)
-        print(f"训练集TFRecord已保存: {train_file} ({len(train_annotations)}张图片)")
-        
-        # 写入验证集
-        self._write_tfrecord(val_annotations, val_file)
-        print(f"验证集TFRecord已保存: {val_file} ({len(val_annotations)}张图片)")
-        
-        # 生成标签映射文件
-        self._create_label_map(annotations, output_dir)
-    
-    def _write_tfrecord(self, annotations: List[ImageAnnotation], output_file: Path):
-        """写入TFRecord文件"""
-        with tf.io.TFRecordWriter(str(output_file)) as writer:
+
+        all_labels: Set[str] = set()
+        pending: Deque[str] = deque()  # 已提交给进程池、尚未返回记录的图片所属子集
+
+        def feed() -> Iterator[ImageAnnotation]:
             for ann in annotations:
-                if not ann.image_path.exists():
+                pending.append(self.split_of(ann))
+                all_labels.update(box.label for box in ann.boxes)
+                yield ann
+
+        counts: Dict[str, List[int]] = {}  # 子集 -> 各分片记录数
+        with AsyncFileWriter() as writer:
+            for record in parallel_imap(_build_example, feed(), self.workers, self.chunk_size):
+                split = pending.popleft()
+                shards = counts.get(split)
+                if shards is None:
+                    remove_shards(output_dir, split)
+                    shards = counts[split] = [0]
+                if record is None:
                     continue
-                    
-                # 读取图片数据
-                image_data = ann.image_path.read_bytes()
-                
-                # 提取标注信息
-                xmins, ymins, xmaxs, ymaxs, labels = [], [], [], [], []
-                for box in ann.boxes:
-                    xmins.append(box.xmin / ann.width)  # 归一化
-                    ymins.append(box.ymin / ann.height)
-                    xmaxs.append(box.xmax / ann.width)
-                    ymaxs.append(box.ymax / ann.height)
-                    labels.append(box.label.encode('utf-8'))
-                
-                # 创建TF Example
-                example = tf.train.Example(features=tf.train.Features(feature={
-                    'image/encoded': tf.train.Feature(
-                        bytes_list=tf.train.BytesList(value=[image_data])),
-                    'image/format': tf.train.Feature(
-                        bytes_list=tf.train.BytesList(value=[b'jpeg'])),
-                    'image/filename': tf.train.Feature(
-                        bytes_list=tf.train.BytesList(value=[ann.image_path.name.encode('utf-8')])),
-                    'image/height': tf.train.Feature(
-                        int64_list=tf.train.Int64List(value=[ann.height])),
-                    'image/width': tf.train.Feature(
-                        int64_list=tf.train.Int64List(value=[ann.width])),
-                    'image/object/bbox/xmin': tf.train.Feature(
-                        float_list=tf.train.FloatList(value=xmins)),
-                    'image/object/bbox/ymin': tf.train.Feature(
-                        float_list=tf.train.FloatList(value=ymins)),
-                    'image/object/bbox/xmax': tf.train.Feature(
-                        float_list=tf.train.FloatList(value=xmaxs)),
-                    'image/object/bbox/ymax': tf.train.Feature(
-                        float_list=tf.train.FloatList(value=ymaxs)),
-                    'image/object/class/text': tf.train.Feature(
-                        bytes_list=tf.train.BytesList(value=labels)),
-                }))
-                
-                writer.write(example.SerializeToString())
-    
-    def _create_label_map(self, annotations: List[ImageAnnotation], output_dir: Path):
+                if shards[-1] >= self.shard_size:
+                    writer.close_stream(output_dir / _partial_file_name(split, len(shards) - 1))
+                    shards.append(0)
+                writer.append(output_dir / _partial_file_name(split, len(shards) - 1), record)
+                shards[-1] += 1
+
+            for split, shards in counts.items():
+                last = output_dir / _partial_file_name(split, len(shards) - 1)
+                if shards[-1]:
+                    writer.close_stream(last)
+                else:
+                    writer.write(last, b"")  # 整个子集没有可写的图片时也写出一个空分片
+            writer.flush()
+
+            for split, shards in counts.items():
+                num_shards = len(shards)
+                for i in range(num_shards):
+                    os.replace(output_dir / _partial_file_name(split, i),
+                               output_dir / shard_file_name(split, i, num_shards))
+                print(f"{split} TFRecord已保存: {output_dir / shard_file_name(split, 0, num_shards)} 等 "
+                      f"{num_shards} 个分片 ({sum(shards)}张图片)")
+            # 生成标签映射文件
+            self._create_label_map(all_labels, output_dir, writer)
+
+    def _create_label_map(self, all_labels: Set[str], output_dir: Path, writer: AsyncFileWriter):
         """创建标签映射文件"""
-        # 收集所有标签
-        all_labels = set()
-        for ann in annotations:
-            for box in ann.boxes:
-                all_labels.add(box.label)
-        
-        # 创建标签映射
         label_map = {label: idx + 1 for idx, label in enumerate(sorted(all_labels))}
-        
+
         # 保存为JSON格式
         label_file = output_dir / "label_map.json"
-        with open(label_file, 'w', encoding='utf-8') as f:
-            json.dump(label_map, f, ensure_ascii=False, indent=2)
-        
+        writer.write(label_file, json.dumps(label_map, ensure_ascii=False, indent=2).encode("utf-8"))
+
         print(f"标签映射已保存: {label_file}")
-        print(f"标签数量: {len(label_map)}")
\ No newline at end of file
+        print(f"标签数量: {len(label_map)}")
+
+
+def remove_shards(output_dir: Path, split: str) -> int:
+    """删除上一次导出留下的同一子集分片（分片数可能不同）、中断时残留的临时分片，以及旧版的单文件输出"""
+    pattern = re.compile(rf"^{re.escape(split)}((-\d{{5}}-of-\d{{5}})?\.tfrecord|-\d{{5}}\.tfrecord\.part)$")
+    removed = 0
+    try:
+        names = os.listdir(output_dir)
+    except OSError:
+        return 0
+    for name in names:
+        if pattern.match(name):
+            os.remove(os.path.join(output_dir, name))
+            removed += 1
+    return removed
@@ -0,0 +1,90 @@
+"""
+TFRecord 输入解析
+
+流式读取目录下的 *.tfrecord 分片（见 tfrecord_exporter 的命名），逐条解码 Example 为 ImageAnnotation：
+    - 不依赖 TensorFlow，不加载整个文件，也不复制 image/encoded 中的图片字节
+    - 子集取自分片文件名（train-00000-of-00004.tfrecord → train），
+      image_path 为 <输入目录>/images/<子集>/<image/filename>
+"""
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .base_parser import BaseParser, ImageAnnotation, BBox
+from .dataset_index import scan_files
+from .tfrecord_exporter import DEFAULT_SHARD_SIZE, TFRecordExporter
+from ..utils.tfrecord import decode_example, iter_tfrecords
+
+TFRECORD_EXTS = (".tfrecord", ".tfrecords")
+_SHARD_PATTERN = re.compile(r"^(.*?)(-\d+-of-\d+)?\.tfrecords?$", re.IGNORECASE)
+_KEYS = frozenset({
+    "image/filename", "image/width", "image/height",
+    "image/object/bbox/xmin", "image/object/bbox/ymin", "image/object/bbox/xmax", "image/object/bbox/ymax",
+    "image/object/class/text", "image/object/class/label",
+})
+
+
+def split_of_file(tfrecord_file: Path) -> str:
+    match = _SHARD_PATTERN.match(tfrecord_file.name)
+    return match.group(1) if match and match.group(1) else "train"
+
+
+class TFRecordParser(BaseParser):
+    """TFRecord（tf.train.Example，TF Object Detection API 字段）解析器，导出委托给 TFRecordExporter"""
+    format_name = "tfrecord"
+    per_image_output = False
+    verify_crc: bool = True  # 校验每条记录数据的 CRC（长度的 CRC 总是校验）
+    shard_size: int = DEFAULT_SHARD_SIZE
+
+    def iter_parse(self, input_dir: Path, only: Optional[Set[Path]] = None) -> Iterator[ImageAnnotation]:
+        files = scan_files(input_dir, TFRECORD_EXTS)
+        if not files:
+            raise ValueError(f"未找到 TFRecord 文件（*.tfrecord）。\n当前目录: {input_dir}")
+        for tfrecord_file in files:
+            if only is not None and tfrecord_file not in only:
+                continue
+            images_dir = Path(input_dir) / "images" / split_of_file(tfrecord_file)
+            try:
+                for record in iter_tfrecords(tfrecord_file, self.verify_crc):
+                    yield self._to_annotation(decode_example(record, _KEYS), images_dir, tfrecord_file)
+            except (OSError, ValueError) as e:
+                print(f"警告: TFRecord 文件读取失败 {tfrecord_file}: {e}")
+
+    @staticmethod
+    def _to_annotation(features: Dict[str, List], images_dir: Path, source: Path) -> ImageAnnotation:
+        def first(key, default):
+            values = features.get(key)
+            return values[0] if values else default
+
+        file_name = first("image/filename", b"").decode("utf-8")
+        width = int(first("image/width", 0))
+        height = int(first("image/height", 0))
+        xmins = features.get("image/object/bbox/xmin", [])
+        ymins = features.get("image/object/bbox/ymin", [])
+        xmaxs = features.get("image/object/bbox/xmax", [])
+        ymaxs = features.get("image/object/bbox/ymax", [])
+        texts = features.get("image/object/class/text")
+        labels = [t.decode("utf-8") for t in texts] if texts else \
+            [str(v) for v in features.get("image/object/class/label", [])]
+
+        boxes = [
+            # 坐标为归一化值，换算回像素
+            BBox(xmin=int(round(x0 * width)), ymin=int(round(y0 * height)),
+                 xmax=int(round(x1 * width)), ymax=int(round(y1 * height)), label=label)
+            for x0, y0, x1, y1, label in zip(xmins, ymins, xmaxs, ymaxs, labels)
+        ]
+        return ImageAnnotation(
+            image_path=images_dir / file_name if file_name else Path("unknown.jpg"),
+            width=width,
+            height=height,
+            boxes=boxes,
+            polygons=None,
+            source=source
+        )
+
+    def source_units(self, input_dir: Path) -> List[Tuple[Path, Optional[Path]]]:
+        return [(f, None) for f in scan_files(input_dir, TFRECORD_EXTS)]
+
+    def export(self, annotations: Iterable[ImageAnnotation], output_dir: Path) -> None:
+        exporter = TFRecordExporter(shard_size=self.shard_size, workers=self.workers)
+        exporter.export(annotations, Path(output_dir))
@@ -1,14 +1,130 @@
+from itertools import chain
 from pathlib import Path
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
 
-from .base_parser import BaseParser, ImageAnnotation
-from ..utils.xml_utils import read_xml
+from lxml import etree
+
+from .base_parser import BaseParser, ImageAnnotation, BBox
+from .dataset_index import DatasetIndex
+from .parallel import chunked, parallel_imap
+from ..utils.async_writer import AsyncFileWriter
+from ..utils.image_utils import get_image_size
+from ..utils.metadata_cache import store_image_sizes
+from ..utils.xml_utils import to_xml_bytes
+
+
+def _to_int(text: Optional[str]) -> int:
+    # VOC 坐标 / 尺寸可能写成 "123.0"
+    return int(float(text)) if text else 0
+
+
+def _parse_voc_file(xml_file: Path, img_file: Path) -> Optional[Tuple[ImageAnnotation, bool]]:
+    """
+    用 iterparse 流式解析单个 VOC XML，只关心 <size> 与 <object>，处理完即清理元素。
+    返回 (标注, 尺寸是否来自图片)；XML 无法解析时返回 None。
+    只有 <size> 缺失或为 0 时才读取图片头获取尺寸。
+    """
+    width = height = 0
+    boxes: List[BBox] = []
+    try:
+        for _, elem in etree.iterparse(str(xml_file), events=("end",), tag=("size", "object")):
+            if elem.tag == "size":
+                try:
+                    width, height = _to_int(elem.findtext("width")), _to_int(elem.findtext("height"))
+                except ValueError:
+                    width = height = 0
+            else:
+                bndbox = elem.find("bndbox")
+                if bndbox is not None:
+                    try:
+                        boxes.append(BBox(
+                            xmin=_to_int(bndbox.findtext("xmin")),
+                            ymin=_to_int(bndbox.findtext("ymin")),
+                            xmax=_to_int(bndbox.findtext("xmax")),
+                            ymax=_to_int(bndbox.findtext("ymax")),
+                            label=(elem.findtext("name") or "").strip(),
+                        ))
+                    except ValueError:
+                        pass  # 坐标不是数字的目标跳过
+            # 清理已处理的元素及其之前的兄弟节点，保持内存恒定
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    except (OSError, etree.XMLSyntaxError):
+        return None
+
+    from_image = False
+    if width <= 0 or height <= 0:
+        width, height = get_image_size(img_file) or (0, 0)
+        from_image = True
+    ann = ImageAnnotation(image_path=img_file, width=width, height=height, boxes=boxes, polygons=None,
+                          source=xml_file)
+    return ann, from_image
+
+
+def _parse_xml_chunk(tasks: List[Tuple[Path, Path]]) -> List[Optional[Tuple[ImageAnnotation, bool]]]:
+    """批量解析一组 VOC XML（在子进程中执行）"""
+    return [_parse_voc_file(xml_file, img_file) for xml_file, img_file in tasks]
+
+
+class _VOCTemplate:
+    """
+    可复用的 VOC XML 元素模板：文档骨架只构建一次，
+    每张图片只改写文本并挂上所需数量的 <object>（对象元素同样复用）。
+    """
+
+    def __init__(self):
+        self.root = etree.Element("annotation")
+        self.folder = etree.SubElement(self.root, "folder")
+        self.filename = etree.SubElement(self.root, "filename")
+        source = etree.SubElement(self.root, "source")
+        etree.SubElement(source, "database").text = "Unknown"
+        size = etree.SubElement(self.root, "size")
+        self.width = etree.SubElement(size, "width")
+        self.height = etree.SubElement(size, "height")
+        etree.SubElement(size, "depth").text = "3"
+        etree.SubElement(self.root, "segmented").text = "0"
+        self._objects: List[Tuple[etree._Element, etree._Element, List[etree._Element]]] = []
+        self._attached = 0
+
+    def _new_object(self):
+        obj = etree.Element("object")
+        name = etree.SubElement(obj, "name")
+        etree.SubElement(obj, "pose").text = "Unspecified"
+        etree.SubElement(obj, "truncated").text = "0"
+        etree.SubElement(obj, "difficult").text = "0"
+        bndbox = etree.SubElement(obj, "bndbox")
+        coords = [etree.SubElement(bndbox, tag) for tag in ("xmin", "ymin", "xmax", "ymax")]
+        return obj, name, coords
+
+    def render(self, ann: ImageAnnotation) -> bytes:
+        image_path = Path(ann.image_path)
+        self.folder.text = image_path.parent.name
+        self.filename.text = image_path.name
+        self.width.text = str(ann.width)
+        self.height.text = str(ann.height)
+
+        # 注意：VOC格式不支持分割标注，只导出矩形框
+        boxes = ann.boxes
+        while len(self._objects) < len(boxes):
+            self._objects.append(self._new_object())
+        for obj, _, _ in self._objects[len(boxes):self._attached]:
+            self.root.remove(obj)
+        for i, box in enumerate(boxes):
+            obj, name, coords = self._objects[i]
+            name.text = box.label
+            for el, value in zip(coords, (box.xmin, box.ymin, box.xmax, box.ymax)):
+                el.text = str(value)
+            if i >= self._attached:
+                self.root.append(obj)
+        self._attached = len(boxes)
+        return to_xml_bytes(self.root)
 
 
 class VOCParser(BaseParser):
     format_name = "voc"
 
-    def parse(self, input_dir: Path) -> List[ImageAnnotation]:
+    def iter_parse(self, input_dir: Path, only: Optional[Set[Path]] = None) -> Iterator[ImageAnnotation]:
         """
         解析标准目录结构的VOC数据集:
         dataset/
@@ -21,80 +137,44 @@ class VOCParser(BaseParser):
             ├── test/
             └── val/
         """
-        results: List[ImageAnnotation] = []
-        
         # 检查标准目录结构
-        images_dir = input_dir / "images"
-        labels_dir = input_dir / "labels"
-        
-        if not images_dir.exists() or not labels_dir.exists():
+        index = DatasetIndex.build(input_dir)
+        if not index.has_structure:
             raise ValueError(f"数据集目录结构不正确。需要包含 'images' 和 'labels' 文件夹。\n当前目录: {input_dir}")
-        
-        # 处理所有子集 (train, test, val)
-        subsets = ["train", "test", "val"]
-        
-        for subset in subsets:
-            img_subset_dir = images_dir / subset
-            label_subset_dir = labels_dir / subset
-            
-            # 如果子集目录不存在，跳过
-            if not img_subset_dir.exists() or not label_subset_dir.exists():
-                continue
-            
-            # 获取所有XML标签文件
-            xml_files = list(label_subset_dir.glob("*.xml"))
-            
-            for xml_file in xml_files:
-                stem = xml_file.stem
-                
-                # 在对应的图片目录中查找同名图片
-                img_file = self._find_image_in_dir(img_subset_dir, stem)
-                if img_file is None:
-                    continue
-                
-                try:
-                    # 解析XML文件 (这里需要实现XML解析逻辑)
-                    annotation_data = read_xml(xml_file)
-                    
-                    # 获取图片尺寸
-                    try:
-                        from PIL import Image
-                        with Image.open(img_file) as im:
-                            width, height = im.size
-                    except Exception:
-                        width, height = 0, 0
-                    
-                    # 这里应该根据XML内容创建BBox对象
-                    # 暂时返回空的标注作为占位符
-                    boxes = []
-                    
-                    results.append(ImageAnnotation(
-                        image_path=img_file, 
-                        width=width, 
-                        height=height, 
-                        boxes=boxes,
-                        polygons=None
-                    ))
-                    
-                except Exception:
+
+        # 处理所有子集 (train, test, val)：XML 标签与同名图片的配对
+        tasks: List[Tuple[Path, Path]] = index.pairs(".xml")
+        if only is not None:
+            tasks = [task for task in tasks if task[0] in only]
+
+        # 分块并行解析，结果保持原顺序逐个产出；尺寸以 XML 为准，不查询缓存
+        parsed = chain.from_iterable(parallel_imap(_parse_xml_chunk, chunked(tasks, self.chunk_size),
+                                                   self.workers, 1))
+        misses = []
+        try:
+            for item in parsed:
+                if item is None:
                     # XML解析失败，跳过
                     continue
-        
-        return results
-    
-    def _find_image_in_dir(self, img_dir: Path, stem: str) -> Path:
-        """在指定目录中查找同名图片文件"""
-        exts = [".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"]
-        for ext in exts:
-            img_path = img_dir / f"{stem}{ext}"
-            if img_path.exists():
-                return img_path
-        return None
+                ann, from_image = item
+                if from_image:
+                    misses.append((ann.image_path, ann.width, ann.height))
+                yield ann
+        finally:
+            # 从图片读到的尺寸写回元数据缓存
+            store_image_sizes(misses)
+
+    def source_units(self, input_dir: Path) -> List[Tuple[Path, Optional[Path]]]:
+        return DatasetIndex.build(input_dir).pairs(".xml")
+
+    def output_name(self, ann: ImageAnnotation) -> Optional[str]:
+        return Path(ann.image_path).stem + ".xml"
 
-    def export(self, annotations: List[ImageAnnotation], output_dir: Path) -> None:
+    def export(self, annotations: Iterable[ImageAnnotation], output_dir: Path) -> None:
+        """导出为 VOC XML：每张图片一个文件，由模板序列化后交给后台线程写出"""
         output_dir.mkdir(parents=True, exist_ok=True)
-        # 占位：写出 VOC XML（注意：VOC格式不支持分割标注，只导出矩形框）
-        for ann in annotations:
-            # 只处理矩形框，忽略分割标注
-            for _ in ann.boxes:
-                pass
\ No newline at end of file
+        template = _VOCTemplate()
+        with AsyncFileWriter() as writer:
+            for ann in annotations:
+                writer.write(output_dir / self.output_name(ann), template.render(ann))
+        print(f"已生成 {writer.files_written} 个标注文件: {output_dir}")
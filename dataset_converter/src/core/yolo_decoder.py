@@ -0,0 +1,214 @@
+"""
+YOLO 标签批量解码
+
+一次读取多个标签文件，拼接字节后整体切分为 token 并转换为 NumPy 数组，
+不再逐行 str.split() / float()。检测行（class cx cy w h）与分割行
+（class x1 y1 ... xn yn）分开存放，无法解析的行按 (文件下标, 行号) 报告。
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+DEFAULT_BATCH_SIZE = 4096  # iter_label_batches 每批解码的文件数
+
+# 与 bytes.split() 一致的空白字符
+_WHITESPACE = np.zeros(256, dtype=np.bool_)
+_WHITESPACE[list(b" \t\n\r\x0b\x0c")] = True
+_NEWLINE = ord("\n")
+
+
+@dataclass
+class YOLOLabelBatch:
+    """
+    一批标签文件的解码结果。
+    *_file_offsets 长度为 文件数+1，文件 i 的行位于 [offsets[i], offsets[i+1])。
+    行号 (det_line / seg_line / invalid_line) 为文件内从 0 开始的物理行号。
+    """
+    files: List[Path]
+    readable: np.ndarray  # bool，文件能否读取
+    line_counts: np.ndarray  # int32，每个文件的非空行数
+
+    det_file: np.ndarray  # int32
+    det_line: np.ndarray  # int32
+    det_class: np.ndarray  # int32
+    det_xywh: np.ndarray  # float64 (N, 4)，归一化 cx cy w h
+    det_file_offsets: np.ndarray
+
+    seg_file: np.ndarray  # int32
+    seg_line: np.ndarray  # int32
+    seg_class: np.ndarray  # int32
+    seg_offsets: np.ndarray  # int64，多边形 j 的坐标为 seg_coords[seg_offsets[j]:seg_offsets[j+1]]
+    seg_coords: np.ndarray  # float64，扁平归一化坐标 x1 y1 x2 y2 ...
+    seg_file_offsets: np.ndarray
+
+    invalid_file: np.ndarray  # int32
+    invalid_line: np.ndarray  # int32
+    invalid_file_offsets: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def det_range(self, i: int) -> slice:
+        return slice(int(self.det_file_offsets[i]), int(self.det_file_offsets[i + 1]))
+
+    def seg_range(self, i: int) -> slice:
+        return slice(int(self.seg_file_offsets[i]), int(self.seg_file_offsets[i + 1]))
+
+    def polygon(self, j: int) -> np.ndarray:
+        return self.seg_coords[self.seg_offsets[j]:self.seg_offsets[j + 1]]
+
+    def invalid_lines(self, i: int) -> List[int]:
+        """文件 i 中无法解析的行号"""
+        lo, hi = int(self.invalid_file_offsets[i]), int(self.invalid_file_offsets[i + 1])
+        return self.invalid_line[lo:hi].tolist()
+
+    @property
+    def num_annotations(self) -> int:
+        return len(self.det_class) + len(self.seg_class)
+
+
+def _to_floats(tokens: List[bytes]) -> np.ndarray:
+    """token → float64，无法转换的 token 为 NaN"""
+    if not tokens:
+        return np.empty(0, dtype=np.float64)
+    try:
+        return np.array(tokens).astype(np.float64)
+    except ValueError:
+        # 存在非法 token 时才逐个转换
+        values = np.empty(len(tokens), dtype=np.float64)
+        for i, tok in enumerate(tokens):
+            try:
+                values[i] = float(tok)
+            except ValueError:
+                values[i] = np.nan
+        return values
+
+
+def _group_offsets(file_idx: np.ndarray, n_files: int) -> np.ndarray:
+    return np.searchsorted(file_idx, np.arange(n_files + 1)).astype(np.int64)
+
+
+def decode_label_files(files: Sequence[Path]) -> YOLOLabelBatch:
+    """批量解码一组 YOLO 标签文件"""
+    files = list(files)
+    n_files = len(files)
+    contents: List[bytes] = []
+    readable = np.ones(n_files, dtype=np.bool_)
+    for i, fp in enumerate(files):
+        try:
+            with open(fp, "rb") as f:
+                contents.append(f.read())
+        except OSError:
+            contents.append(b"")
+            readable[i] = False
+
+    # 每个文件的物理行数；文件之间以换行拼接，保证行不会跨文件
+    phys_lines = np.array([c.count(b"\n") + 1 for c in contents], dtype=np.int64)
+    file_line_start = np.concatenate(([0], np.cumsum(phys_lines)))
+    total_lines = int(file_line_start[-1])
+    buf = b"\n".join(contents)
+
+    # token 起始位置 → 所在全局行号 → 每行 token 数
+    arr = np.frombuffer(buf, dtype=np.uint8)
+    is_sep = _WHITESPACE[arr]
+    token_start = ~is_sep
+    token_start[1:] &= is_sep[:-1]
+    line_of_pos = np.cumsum(arr == _NEWLINE)
+    token_line = line_of_pos[token_start]
+    tokens_per_line = np.bincount(token_line, minlength=total_lines)
+
+    tokens = buf.split()
+    values = _to_floats(tokens)
+    del tokens
+
+    # 行合法性：所有 token 可解析为有限数值，类别为非负整数
+    first_token = np.cumsum(tokens_per_line) - tokens_per_line
+    bad_token = ~np.isfinite(values)
+    line_has_bad = np.bincount(token_line, weights=bad_token, minlength=total_lines) > 0
+    nonempty = tokens_per_line > 0
+    class_vals = np.zeros(total_lines, dtype=np.float64)
+    class_vals[nonempty] = values[first_token[nonempty]]
+    with np.errstate(invalid="ignore"):
+        class_ok = (class_vals >= 0) & (np.floor(class_vals) == class_vals)
+    line_ok = nonempty & ~line_has_bad & class_ok
+
+    is_det = line_ok & (tokens_per_line == 5)
+    is_seg = line_ok & (tokens_per_line >= 7) & ((tokens_per_line - 1) % 2 == 0)
+    is_invalid = nonempty & ~is_det & ~is_seg
+
+    line_file = np.repeat(np.arange(n_files, dtype=np.int32), phys_lines)
+    line_local = (np.arange(total_lines) - file_line_start[line_file]).astype(np.int32)
+    line_counts = np.bincount(line_file[nonempty], minlength=n_files).astype(np.int32)
+
+    # 检测行：每行 5 个连续 token
+    det_rows = np.flatnonzero(is_det)
+    det_vals = values[first_token[det_rows][:, None] + np.arange(5)]
+    det_file = line_file[det_rows]
+
+    # 分割行：去掉类别 token 后的坐标按行连续存放
+    seg_rows = np.flatnonzero(is_seg)
+    seg_file = line_file[seg_rows]
+    token_is_coord = is_seg[token_line]
+    token_is_coord[first_token[seg_rows]] = False
+    seg_offsets = np.concatenate(([0], np.cumsum(tokens_per_line[seg_rows] - 1))).astype(np.int64)
+
+    invalid_rows = np.flatnonzero(is_invalid)
+    invalid_file = line_file[invalid_rows]
+
+    return YOLOLabelBatch(
+        files=files,
+        readable=readable,
+        line_counts=line_counts,
+        det_file=det_file,
+        det_line=line_local[det_rows],
+        det_class=det_vals[:, 0].astype(np.int32),
+        det_xywh=np.ascontiguousarray(det_vals[:, 1:]),
+        det_file_offsets=_group_offsets(det_file, n_files),
+        seg_file=seg_file,
+        seg_line=line_local[seg_rows],
+        seg_class=class_vals[seg_rows].astype(np.int32),
+        seg_offsets=seg_offsets,
+        seg_coords=values[token_is_coord],
+        seg_file_offsets=_group_offsets(seg_file, n_files),
+        invalid_file=invalid_file,
+        invalid_line=line_local[invalid_rows],
+        invalid_file_offsets=_group_offsets(invalid_file, n_files),
+    )
+
+
+def iter_label_batches(files: Sequence[Path], batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Tuple[int, YOLOLabelBatch]]:
+    """按批解码，产出 (该批第一个文件在 files 中的下标, 批结果)，限制拼接缓冲区大小"""
+    files = list(files)
+    for start in range(0, len(files), batch_size):
+        yield start, decode_label_files(files[start:start + batch_size])
+
+
+def denormalize_boxes(xywh: np.ndarray, widths: np.ndarray, heights: np.ndarray) -> np.ndarray:
+    """
+    归一化中心点框 → 像素 (xmin, ymin, xmax, ymax)，float64 (N, 4)。
+    widths / heights 为每个框对应图片的宽高（与 xywh 行数相同）。
+    """
+    w = xywh[:, 2] * widths
+    h = xywh[:, 3] * heights
+    cx = xywh[:, 0] * widths
+    cy = xywh[:, 1] * heights
+    return np.stack((cx - w / 2.0, cy - h / 2.0, cx + w / 2.0, cy + h / 2.0), axis=1)
+
+
+def denormalize_boxes_int(xywh: np.ndarray, widths: np.ndarray, heights: np.ndarray) -> np.ndarray:
+    """
+    同 denormalize_boxes，四舍五入为 int32 像素坐标（与逐框 int(round(...)) 结果一致）；
+    宽或高不大于 0 的图片对应的框为全 0。
+    """
+    boxes = np.rint(denormalize_boxes(xywh, widths, heights)).astype(np.int32)
+    boxes[(widths <= 0) | (heights <= 0)] = 0
+    return boxes
+
+
+def image_dims_for(file_idx: np.ndarray, sizes: Sequence[Optional[Tuple[int, int]]]) -> Tuple[np.ndarray, np.ndarray]:
+    """按每行所属文件下标展开图片宽高数组，尺寸未知为 0"""
+    dims = np.array([s if s else (0, 0) for s in sizes], dtype=np.float64).reshape(-1, 2)
+    return dims[file_idx, 0], dims[file_idx, 1]
@@ -0,0 +1,106 @@
+"""
+YOLO 标签批量编码
+
+导出时按批收集一组图片的全部框，标签→id 每批只解析一次，
+归一化 cx cy w h 以数组整体计算，每张图片的文本由一次 % 格式化生成，
+不再逐框拼接 f-string。输出与逐行格式化（.6f，行间以换行分隔、末尾无换行）完全一致。
+"""
+from itertools import chain
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from .base_parser import ImageAnnotation
+
+
+EXPORT_BATCH_SIZE = 1024  # 每批编码的图片数
+
+_BOX_FORMAT = "%d %.6f %.6f %.6f %.6f\n"
+
+
+def assign_label_ids(labels: Sequence[str], label_to_id: Dict[str, int]) -> List[int]:
+    """按首次出现顺序为新标签分配递增 id（就地更新 label_to_id），返回每个标签的 id"""
+    next_id = (max(label_to_id.values()) + 1) if label_to_id else 0
+    for label in dict.fromkeys(labels):
+        if label not in label_to_id:
+            label_to_id[label] = next_id
+            next_id += 1
+    return [label_to_id[label] for label in labels]
+
+
+def normalize_boxes(coords: np.ndarray, widths: np.ndarray, heights: np.ndarray) -> np.ndarray:
+    """像素框 (xmin, ymin, xmax, ymax) → 归一化 (cx, cy, w, h)；widths / heights 与框逐行对应"""
+    xmin, ymin, xmax, ymax = coords.T
+    return np.stack((
+        ((xmin + xmax) / 2.0) / widths,
+        ((ymin + ymax) / 2.0) / heights,
+        (xmax - xmin) / widths,
+        (ymax - ymin) / heights,
+    ), axis=1)
+
+
+def _box_coords(ann: ImageAnnotation) -> np.ndarray:
+    # AnnotationTable 的图片视图直接提供坐标数组
+    coords = getattr(ann, "box_coords", None)
+    if coords is not None:
+        return coords
+    return np.array([(b.xmin, b.ymin, b.xmax, b.ymax) for b in ann.boxes], dtype=np.float64).reshape(-1, 4)
+
+
+def encode_yolo_batch(annotations: Sequence[ImageAnnotation], label_to_id: Dict[str, int],
+                      with_polygons: bool = False) -> List[str]:
+    """
+    将一批图片编码为 YOLO 文本，返回与 annotations 一一对应的字符串。
+    每张图片先写矩形框行，with_polygons 时再写多边形行（class x1 y1 ... xn yn）。
+    所有图片的宽高必须大于 0。
+    """
+    # 按图片内"先框后多边形"的顺序收集标签，保证 id 分配顺序与逐行导出一致
+    box_counts: List[int] = []
+    poly_counts: List[int] = []
+    label_seq: List[str] = []
+    is_box: List[bool] = []
+    polygons = []
+    for ann in annotations:
+        box_labels = [b.label for b in ann.boxes]
+        box_counts.append(len(box_labels))
+        label_seq.extend(box_labels)
+        is_box.extend([True] * len(box_labels))
+        polys = list(ann.polygons or []) if with_polygons else []
+        poly_counts.append(len(polys))
+        label_seq.extend(p.label for p in polys)
+        is_box.extend([False] * len(polys))
+        polygons.extend(polys)
+
+    ids = assign_label_ids(label_seq, label_to_id)
+    box_ids = [cid for cid, box in zip(ids, is_box) if box]
+    poly_ids = [cid for cid, box in zip(ids, is_box) if not box]
+
+    # 所有框一次归一化
+    n_boxes = len(box_ids)
+    if n_boxes:
+        coords = np.concatenate([_box_coords(ann) for ann in annotations]).astype(np.float64)
+        counts = np.array(box_counts)
+        widths = np.repeat(np.array([ann.width for ann in annotations], dtype=np.float64), counts)
+        heights = np.repeat(np.array([ann.height for ann in annotations], dtype=np.float64), counts)
+        rows = list(zip(box_ids, *normalize_boxes(coords, widths, heights).T.tolist()))
+    else:
+        rows = []
+
+    texts: List[str] = []
+    box_pos = poly_pos = 0
+    for n_box, n_poly in zip(box_counts, poly_counts):
+        # 每张图片的所有框由一次格式化生成
+        text = (_BOX_FORMAT * n_box) % tuple(chain.from_iterable(rows[box_pos:box_pos + n_box]))
+        box_pos += n_box
+        if n_poly:
+            fmt = []
+            values = []
+            for poly, cid in zip(polygons[poly_pos:poly_pos + n_poly], poly_ids[poly_pos:poly_pos + n_poly]):
+                points = list(poly.points)
+                fmt.append("%d" + " %.6f" * len(points) + "\n")
+                values.append(cid)
+                values.extend(points)
+            text += "".join(fmt) % tuple(values)
+            poly_pos += n_poly
+        texts.append(text[:-1])  # 去掉末尾换行
+    return texts
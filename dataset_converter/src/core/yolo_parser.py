@@ -1,19 +1,60 @@
+from functools import partial
+from itertools import chain
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+import numpy as np
 
 from .base_parser import BaseParser, ImageAnnotation, BBox
-from ..utils.file_utils import list_files_by_ext, find_image_by_stem
-from PIL import Image
+from .dataset_index import DatasetIndex
+from .parallel import chunked, parallel_imap
+from .yolo_decoder import decode_label_files, denormalize_boxes_int, image_dims_for
+from .yolo_encoder import EXPORT_BATCH_SIZE, encode_yolo_batch
+from ..utils.async_writer import AsyncFileWriter
+from ..utils.image_utils import get_image_size
+from ..utils.metadata_cache import lookup_image_sizes, store_image_sizes
+
+
+def _parse_label_chunk(tasks: List[Tuple[Path, Path, Optional[Tuple[int, int]]]],
+                       id_to_label: Dict[int, str]) -> List[Tuple[Optional[ImageAnnotation], List[int]]]:
+    """
+    批量解析一组 YOLO 标签文件（在子进程中执行）。
+    每个文件返回 (标注, 无法解析的行号)，文件读取失败时标注为 None。
+    """
+    batch = decode_label_files([txt_file for txt_file, _, _ in tasks])
+    sizes = [cached_size or get_image_size(img_file) or (0, 0) for _, img_file, cached_size in tasks]
+    
+    # 整批一次反归一化：从中心点换算到像素框
+    widths, heights = image_dims_for(batch.det_file, sizes)
+    pixel_boxes = denormalize_boxes_int(batch.det_xywh, widths, heights).tolist()
+    names = {int(cid): id_to_label.get(int(cid), str(int(cid))) for cid in np.unique(batch.det_class)}
+    labels = [names[cid] for cid in batch.det_class.tolist()]
+    
+    results: List[Tuple[Optional[ImageAnnotation], List[int]]] = []
+    for i, (txt_file, img_file, _) in enumerate(tasks):
+        if not batch.readable[i]:
+            # 标注文件读取失败，跳过
+            results.append((None, []))
+            continue
+        r = batch.det_range(i)
+        boxes = [BBox(*pixel_boxes[j], label=labels[j]) for j in range(r.start, r.stop)]
+        width, height = sizes[i]
+        ann = ImageAnnotation(image_path=img_file, width=width, height=height, boxes=boxes, polygons=None,
+                              source=txt_file)
+        results.append((ann, batch.invalid_lines(i)))
+    return results
 
 
 class YOLOParser(BaseParser):
     format_name = "yolo"
     _external_label_map: Dict[str, int] = {}
+    invalid_lines: List[Tuple[Path, List[int]]] = []  # 最近一次解析中无法解析的 (标签文件, 行号列表)
+    exported_label_map: Dict[str, int] = {}  # 最近一次导出使用的完整 label→id
 
     def set_label_map(self, mapping: Dict[str, int]):
         self._external_label_map = dict(mapping or {})
 
-    def parse(self, input_dir: Path) -> List[ImageAnnotation]:
+    def iter_parse(self, input_dir: Path, only: Optional[Set[Path]] = None) -> Iterator[ImageAnnotation]:
         """
         解析标准目录结构的YOLO数据集:
         dataset/
@@ -26,119 +67,63 @@ class YOLOParser(BaseParser):
             ├── test/
             └── val/
         """
-        results: List[ImageAnnotation] = []
         id_to_label = {v: k for k, v in self._external_label_map.items()} if self._external_label_map else {}
         
         # 检查标准目录结构
-        images_dir = input_dir / "images"
-        labels_dir = input_dir / "labels"
-        
-        if not images_dir.exists() or not labels_dir.exists():
+        index = DatasetIndex.build(input_dir)
+        if not index.has_structure:
             raise ValueError(f"数据集目录结构不正确。需要包含 'images' 和 'labels' 文件夹。\n当前目录: {input_dir}")
         
-        # 处理所有子集 (train, test, val)
-        subsets = ["train", "test", "val"]
+        # 处理所有子集 (train, test, val)：一次目录扫描得到标签与同名图片的配对
+        tasks: List[Tuple[Path, Path]] = index.pairs(".txt")
+        if only is not None:
+            tasks = [task for task in tasks if task[0] in only]
         
-        for subset in subsets:
-            img_subset_dir = images_dir / subset
-            label_subset_dir = labels_dir / subset
-            
-            # 如果子集目录不存在，跳过
-            if not img_subset_dir.exists() or not label_subset_dir.exists():
-                continue
-            
-            # 获取所有标签文件
-            txt_files = list_files_by_ext(label_subset_dir, [".txt"])
-            
-            for txt_file in txt_files:
-                stem = txt_file.stem
-                
-                # 在对应的图片目录中查找同名图片
-                img_file = self._find_image_in_dir(img_subset_dir, stem)
-                if img_file is None:
-                    continue
-                
-                try:
-                    with Image.open(img_file) as im:
-                        width, height = im.size
-                except Exception:
-                    width, height = 0, 0
-                
-                # 解析标注
-                boxes: List[BBox] = []
-                try:
-                    for line in txt_file.read_text(encoding="utf-8").splitlines():
-                        line = line.strip()
-                        if not line:
-                            continue
-                        parts = line.split()
-                        if len(parts) != 5:
-                            continue
-                        try:
-                            cid = int(parts[0])
-                            cx = float(parts[1])
-                            cy = float(parts[2])
-                            w = float(parts[3])
-                            h = float(parts[4])
-                        except ValueError:
-                            continue
-                        
-                        label = id_to_label.get(cid, str(cid))
-                        if width > 0 and height > 0:
-                            # 反归一化：从中心点换算到像素框
-                            box_w = w * width
-                            box_h = h * height
-                            x_center = cx * width
-                            y_center = cy * height
-                            xmin = int(round(x_center - box_w / 2.0))
-                            ymin = int(round(y_center - box_h / 2.0))
-                            xmax = int(round(x_center + box_w / 2.0))
-                            ymax = int(round(y_center + box_h / 2.0))
-                        else:
-                            xmin = ymin = xmax = ymax = 0
-                        boxes.append(BBox(xmin=xmin, ymin=ymin, xmax=xmax, ymax=ymax, label=label))
-                except Exception:
-                    # 标注文件读取失败，跳过
-                    continue
-                
-                results.append(ImageAnnotation(image_path=img_file, width=width, height=height, boxes=boxes, polygons=None))
+        # 先从元数据缓存取尺寸，命中的图片在子进程中不再打开
+        sizes = lookup_image_sizes([img_file for _, img_file in tasks])
+        
+        # 分块并行解析（每块在子进程中整体解码），结果保持原顺序逐个产出
+        worker = partial(_parse_label_chunk, id_to_label=id_to_label)
+        chunks = chunked((task + (size,) for task, size in zip(tasks, sizes)), self.chunk_size)
+        parsed = chain.from_iterable(parallel_imap(worker, chunks, self.workers, 1))
         
-        return results
+        self.invalid_lines = []
+        misses = []
+        try:
+            for (ann, bad_lines), (txt_file, _), size in zip(parsed, tasks, sizes):
+                if bad_lines:
+                    self.invalid_lines.append((txt_file, bad_lines))
+                if ann is None:
+                    continue
+                if size is None:
+                    misses.append((ann.image_path, ann.width, ann.height))
+                yield ann
+        finally:
+            # 写回未命中的尺寸（提前结束遍历时也写回已解析部分）
+            store_image_sizes(misses)
+            if self.invalid_lines:
+                n_lines = sum(len(lines) for _, lines in self.invalid_lines)
+                print(f"警告: {len(self.invalid_lines)} 个标签文件中共 {n_lines} 行无法解析，已跳过（详见 invalid_lines）")
     
-    def _find_image_in_dir(self, img_dir: Path, stem: str) -> Path:
-        """在指定目录中查找同名图片文件"""
-        exts = [".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"]
-        for ext in exts:
-            img_path = img_dir / f"{stem}{ext}"
-            if img_path.exists():
-                return img_path
-        return None
-
-    def export(self, annotations: List[ImageAnnotation], output_dir: Path) -> None:
+    def source_units(self, input_dir: Path) -> List[Tuple[Path, Optional[Path]]]:
+        return DatasetIndex.build(input_dir).pairs(".txt")
+    
+    def output_name(self, ann: ImageAnnotation) -> Optional[str]:
+        return Path(ann.image_path).with_suffix(".txt").name or "annotations.txt"
+    
+    def export(self, annotations: Iterable[ImageAnnotation], output_dir: Path) -> None:
         """
         将统一结构写出为 YOLO 格式：每张图片一个 .txt 文件，行格式：
         class_id cx cy w h （归一化到 [0,1]）。
         这里使用简单的 label→id 的映射：按出现顺序分配递增 id。
+        按批编码（见 yolo_encoder），由后台线程写出。
         """
         output_dir.mkdir(parents=True, exist_ok=True)
         label_to_id: Dict[str, int] = dict(self._external_label_map)
-        next_id = (max(label_to_id.values()) + 1) if label_to_id else 0
-        for ann in annotations:
-            if ann.width <= 0 or ann.height <= 0:
+        with AsyncFileWriter() as writer:
+            for batch in chunked(annotations, EXPORT_BATCH_SIZE):
                 # 缺少尺寸信息无法归一化，跳过写出
-                continue
-            txt_name = Path(ann.image_path).with_suffix(".txt").name or "annotations.txt"
-            out_fp = output_dir / txt_name
-            lines = []
-            for b in ann.boxes:
-                if b.label not in label_to_id:
-                    label_to_id[b.label] = next_id
-                    next_id += 1
-                cid = label_to_id[b.label]
-                # 像素框转 YOLO：中心点与宽高（归一化）
-                x_center = ((b.xmin + b.xmax) / 2.0) / ann.width
-                y_center = ((b.ymin + b.ymax) / 2.0) / ann.height
-                w = (b.xmax - b.xmin) / ann.width
-                h = (b.ymax - b.ymin) / ann.height
-                lines.append(f"{cid} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}")
-            out_fp.write_text("\n".join(lines), encoding="utf-8")
\ No newline at end of file
+                batch = [ann for ann in batch if ann.width > 0 and ann.height > 0]
+                for ann, text in zip(batch, encode_yolo_batch(batch, label_to_id)):
+                    writer.write(output_dir / self.output_name(ann), text.encode("utf-8"))
+        self.exported_label_map = label_to_id
@@ -1,20 +1,78 @@
+from functools import partial
+from itertools import chain
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+import numpy as np
 
 from .base_parser import BaseParser, ImageAnnotation, BBox, Polygon
-from ..utils.file_utils import list_files_by_ext, find_image_by_stem
-from PIL import Image
+from .dataset_index import DatasetIndex
+from .parallel import chunked, parallel_imap
+from .yolo_decoder import decode_label_files, denormalize_boxes_int, image_dims_for
+from .yolo_encoder import EXPORT_BATCH_SIZE, encode_yolo_batch
+from ..utils.async_writer import AsyncFileWriter
+from ..utils.image_utils import get_image_size
+from ..utils.metadata_cache import lookup_image_sizes, store_image_sizes
+
+
+def _parse_label_chunk(tasks: List[Tuple[Path, Path, Optional[Tuple[int, int]]]],
+                       id_to_label: Dict[int, str]) -> List[Tuple[Optional[ImageAnnotation], List[int]]]:
+    """
+    批量解析一组 YOLO 分割标签文件（在子进程中执行）。
+    每个文件返回 (标注, 无法解析的行号)，文件读取失败时标注为 None。
+    """
+    batch = decode_label_files([txt_file for txt_file, _, _ in tasks])
+    sizes = [cached_size or get_image_size(img_file) or (0, 0) for _, img_file, cached_size in tasks]
+    
+    classes = np.unique(np.concatenate((batch.det_class, batch.seg_class)))
+    names = {int(cid): id_to_label.get(int(cid), str(int(cid))) for cid in classes}
+    
+    # 目标检测行: class cx cy w h，整批一次反归一化
+    widths, heights = image_dims_for(batch.det_file, sizes)
+    pixel_boxes = denormalize_boxes_int(batch.det_xywh, widths, heights).tolist()
+    box_labels = [names[cid] for cid in batch.det_class.tolist()]
+    
+    # 分割行: class x1 y1 x2 y2 ... xn yn（至少3个点），保持归一化坐标
+    coords = batch.seg_coords.tolist()
+    offsets = batch.seg_offsets.tolist()
+    poly_labels = [names[cid] for cid in batch.seg_class.tolist()]
+    
+    results: List[Tuple[Optional[ImageAnnotation], List[int]]] = []
+    for i, (txt_file, img_file, _) in enumerate(tasks):
+        if not batch.readable[i]:
+            # 标注文件读取失败，跳过
+            results.append((None, []))
+            continue
+        r = batch.det_range(i)
+        boxes = [BBox(*pixel_boxes[j], label=box_labels[j]) for j in range(r.start, r.stop)]
+        r = batch.seg_range(i)
+        polygons = [Polygon(points=coords[offsets[j]:offsets[j + 1]], label=poly_labels[j])
+                    for j in range(r.start, r.stop)]
+        width, height = sizes[i]
+        ann = ImageAnnotation(
+            image_path=img_file, 
+            width=width, 
+            height=height, 
+            boxes=boxes,
+            polygons=polygons,
+            source=txt_file
+        )
+        results.append((ann, batch.invalid_lines(i)))
+    return results
 
 
 class YOLOSegParser(BaseParser):
     """YOLO分割格式解析器，支持多边形标注"""
     format_name = "yolo_seg"
+    writes_polygons = True
     _external_label_map: Dict[str, int] = {}
+    invalid_lines: List[Tuple[Path, List[int]]] = []  # 最近一次解析中无法解析的 (标签文件, 行号列表)
+    exported_label_map: Dict[str, int] = {}  # 最近一次导出使用的完整 label→id
 
     def set_label_map(self, mapping: Dict[str, int]):
         self._external_label_map = dict(mapping or {})
 
-    def parse(self, input_dir: Path) -> List[ImageAnnotation]:
+    def iter_parse(self, input_dir: Path, only: Optional[Set[Path]] = None) -> Iterator[ImageAnnotation]:
         """
         解析标准目录结构的YOLO分割数据集:
         dataset/
@@ -27,165 +85,80 @@ class YOLOSegParser(BaseParser):
             ├── test/
             └── val/
         """
-        results: List[ImageAnnotation] = []
         id_to_label = {v: k for k, v in self._external_label_map.items()} if self._external_label_map else {}
         
         # 检查标准目录结构
-        images_dir = input_dir / "images"
-        labels_dir = input_dir / "labels"
-        
-        if not images_dir.exists() or not labels_dir.exists():
+        index = DatasetIndex.build(input_dir)
+        if not index.has_structure:
             raise ValueError(f"数据集目录结构不正确。需要包含 'images' 和 'labels' 文件夹。\n当前目录: {input_dir}")
         
-        # 处理所有子集 (train, test, val)
-        subsets = ["train", "test", "val"]
+        # 处理所有子集 (train, test, val)：一次目录扫描得到标签与同名图片的配对
+        tasks: List[Tuple[Path, Path]] = index.pairs(".txt")
+        if only is not None:
+            tasks = [task for task in tasks if task[0] in only]
         
-        for subset in subsets:
-            img_subset_dir = images_dir / subset
-            label_subset_dir = labels_dir / subset
-            
-            # 如果子集目录不存在，跳过
-            if not img_subset_dir.exists() or not label_subset_dir.exists():
-                continue
-            
-            # 获取所有标签文件
-            txt_files = list_files_by_ext(label_subset_dir, [".txt"])
-            
-            for txt_file in txt_files:
-                stem = txt_file.stem
-                
-                # 在对应的图片目录中查找同名图片
-                img_file = self._find_image_in_dir(img_subset_dir, stem)
-                if img_file is None:
-                    continue
-                
-                try:
-                    with Image.open(img_file) as im:
-                        width, height = im.size
-                except Exception:
-                    width, height = 0, 0
-                
-                # 解析标注
-                boxes: List[BBox] = []
-                polygons: List[Polygon] = []
-                
-                try:
-                    for line in txt_file.read_text(encoding="utf-8").splitlines():
-                        line = line.strip()
-                        if not line:
-                            continue
-                            
-                        parts = line.split()
-                        if len(parts) < 5:
-                            continue
-                            
-                        try:
-                            cid = int(parts[0])
-                            label = id_to_label.get(cid, str(cid))
-                            
-                            if len(parts) == 5:
-                                # 目标检测格式: class cx cy w h
-                                cx = float(parts[1])
-                                cy = float(parts[2])
-                                w = float(parts[3])
-                                h = float(parts[4])
-                                
-                                if width > 0 and height > 0:
-                                    box_w = w * width
-                                    box_h = h * height
-                                    x_center = cx * width
-                                    y_center = cy * height
-                                    xmin = int(round(x_center - box_w / 2.0))
-                                    ymin = int(round(y_center - box_h / 2.0))
-                                    xmax = int(round(x_center + box_w / 2.0))
-                                    ymax = int(round(y_center + box_h / 2.0))
-                                else:
-                                    xmin = ymin = xmax = ymax = 0
-                                    
-                                boxes.append(BBox(xmin=xmin, ymin=ymin, xmax=xmax, ymax=ymax, label=label))
-                                
-                            else:
-                                # 分割格式: class x1 y1 x2 y2 ... xn yn
-                                coords = [float(x) for x in parts[1:]]
-                                if len(coords) % 2 == 0 and len(coords) >= 6:  # 至少3个点
-                                    polygons.append(Polygon(points=coords, label=label))
-                                    
-                        except ValueError:
-                            continue
-                except Exception:
-                    # 标注文件读取失败，跳过
+        # 先从元数据缓存取尺寸，命中的图片在子进程中不再打开
+        sizes = lookup_image_sizes([img_file for _, img_file in tasks])
+        
+        # 分块并行解析（每块在子进程中整体解码），结果保持原顺序逐个产出
+        worker = partial(_parse_label_chunk, id_to_label=id_to_label)
+        chunks = chunked((task + (size,) for task, size in zip(tasks, sizes)), self.chunk_size)
+        parsed = chain.from_iterable(parallel_imap(worker, chunks, self.workers, 1))
+        
+        self.invalid_lines = []
+        misses = []
+        try:
+            for (ann, bad_lines), (txt_file, _), size in zip(parsed, tasks, sizes):
+                if bad_lines:
+                    self.invalid_lines.append((txt_file, bad_lines))
+                if ann is None:
                     continue
-
-                results.append(ImageAnnotation(
-                    image_path=img_file, 
-                    width=width, 
-                    height=height, 
-                    boxes=boxes,
-                    polygons=polygons
-                ))
-            
-        return results
+                if size is None:
+                    misses.append((ann.image_path, ann.width, ann.height))
+                yield ann
+        finally:
+            # 写回未命中的尺寸（提前结束遍历时也写回已解析部分）
+            store_image_sizes(misses)
+            if self.invalid_lines:
+                n_lines = sum(len(lines) for _, lines in self.invalid_lines)
+                print(f"警告: {len(self.invalid_lines)} 个标签文件中共 {n_lines} 行无法解析，已跳过（详见 invalid_lines）")
     
-    def _find_image_in_dir(self, img_dir: Path, stem: str) -> Path:
-        """在指定目录中查找同名图片文件"""
-        exts = [".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"]
-        for ext in exts:
-            img_path = img_dir / f"{stem}{ext}"
-            if img_path.exists():
-                return img_path
-        return None
-
-    def export(self, annotations: List[ImageAnnotation], output_dir: Path) -> None:
-        """导出为YOLO分割格式"""
+    def source_units(self, input_dir: Path) -> List[Tuple[Path, Optional[Path]]]:
+        return DatasetIndex.build(input_dir).pairs(".txt")
+    
+    def output_name(self, ann: ImageAnnotation) -> Optional[str]:
+        # 从图片路径提取文件名，生成对应的txt文件名
+        if ann.image_path and ann.image_path != Path("") and ann.image_path.name:
+            return Path(ann.image_path).stem + ".txt"
+        return "annotation.txt"
+    
+    def export(self, annotations: Iterable[ImageAnnotation], output_dir: Path) -> None:
+        """导出为YOLO分割格式：按批编码（见 yolo_encoder），由后台线程写出"""
         output_dir.mkdir(parents=True, exist_ok=True)
         label_to_id: Dict[str, int] = dict(self._external_label_map)
-        next_id = (max(label_to_id.values()) + 1) if label_to_id else 0
+        missing_size = 0
         
-        for ann in annotations:
-            # 跳过没有尺寸信息的标注（但允许只有多边形的情况）
-            if ann.width <= 0 or ann.height <= 0:
-                # 如果有多边形但没有尺寸信息，使用默认尺寸
-                if ann.polygons:
-                    print(f"警告: 图片 {ann.image_path} 缺少尺寸信息，使用默认尺寸 800x600")
-                    ann.width = 800
-                    ann.height = 600
-                else:
-                    continue
-                
-            # 从图片路径提取文件名，生成对应的txt文件名
-            if ann.image_path and ann.image_path != Path("") and ann.image_path.name:
-                txt_name = Path(ann.image_path).stem + ".txt"
-            else:
-                txt_name = "annotation.txt"
-            
-            out_fp = output_dir / txt_name
-            lines = []
-            
-            # 导出矩形框
-            for b in ann.boxes:
-                if b.label not in label_to_id:
-                    label_to_id[b.label] = next_id
-                    next_id += 1
-                cid = label_to_id[b.label]
+        with AsyncFileWriter() as writer:
+            for batch in chunked(annotations, EXPORT_BATCH_SIZE):
+                valid = []
+                for ann in batch:
+                    # 跳过没有尺寸信息的标注（但允许只有多边形的情况）
+                    if ann.width <= 0 or ann.height <= 0:
+                        if not ann.polygons:
+                            continue
+                        # 如果有多边形但没有尺寸信息，使用默认尺寸
+                        ann.width = 800
+                        ann.height = 600
+                        missing_size += 1
+                    valid.append(ann)
                 
-                x_center = ((b.xmin + b.xmax) / 2.0) / ann.width
-                y_center = ((b.ymin + b.ymax) / 2.0) / ann.height
-                w = (b.xmax - b.xmin) / ann.width
-                h = (b.ymax - b.ymin) / ann.height
-                lines.append(f"{cid} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}")
-            
-            # 导出多边形
-            if ann.polygons:
-                for poly in ann.polygons:
-                    if poly.label not in label_to_id:
-                        label_to_id[poly.label] = next_id
-                        next_id += 1
-                    cid = label_to_id[poly.label]
-                    
-                    coords_str = " ".join(f"{coord:.6f}" for coord in poly.points)
-                    lines.append(f"{cid} {coords_str}")
-            
-            # 只有在有标注的情况下才写文件
-            if lines:
-                out_fp.write_text("\n".join(lines), encoding="utf-8")
-                print(f"已生成文件: {out_fp} ({len(lines)} 行标注)")
\ No newline at end of file
+                for ann, text in zip(valid, encode_yolo_batch(valid, label_to_id, with_polygons=True)):
+                    # 只有在有标注的情况下才写文件
+                    if not text:
+                        continue
+                    writer.write(output_dir / self.output_name(ann), text.encode("utf-8"))
+        self.exported_label_map = label_to_id
+        
+        if missing_size:
+            print(f"警告: {missing_size} 张图片缺少尺寸信息，已使用默认尺寸 800x600")
+        print(f"已生成 {writer.files_written} 个标注文件: {output_dir}")
@@ -1,21 +1,13 @@
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, 
-    QTextEdit, QFileDialog, QMessageBox, QProgressBar, QComboBox,
+    QTextEdit, QFileDialog, QMessageBox, QComboBox,
     QSpinBox, QCheckBox, QGroupBox, QGridLayout, QInputDialog,
     QScrollArea
 )
-from PyQt5.QtCore import QThread, pyqtSignal
 from pathlib import Path
 import json
 
-from ..core.dataset_analyzer import DatasetAnalyzer
-from ..core.dataset_validator import DatasetValidator
-from ..core.data_augmentation import DataAugmentor
-from ..core.dataset_organizer import DatasetOrganizer
-from ..core.annotation_visualizer import AnnotationVisualizer
-from ..core.dataset_comparator import DatasetComparator
-from ..core.annotation_fixer import AnnotationFixer
-from ..core.dataset_exporter import DatasetExporter
+from .widgets.job_status import JobStatusBar
 
 
 class AnalysisPanel(QWidget):
@@ -25,15 +17,7 @@ class AnalysisPanel(QWidget):
         super().__init__(parent)
         self.setup_ui()
         
-        self.analyzer = DatasetAnalyzer()
-        self.validator = DatasetValidator()
-        self.augmentor = DataAugmentor()
-        self.organizer = DatasetOrganizer()
-        self.visualizer = AnnotationVisualizer()
-        self.comparator = DatasetComparator()
-        self.fixer = AnnotationFixer()
-        self.exporter = DatasetExporter()
-        
+        # 核心模块在各操作中按需导入，创建面板时不加载 numpy / PIL 等依赖
         self.dataset_dir = None
     
     def setup_ui(self):
@@ -83,10 +67,9 @@ class AnalysisPanel(QWidget):
         main_layout.addWidget(result_label)
         main_layout.addWidget(self.result_text)
         
-        # 进度条 - 固定在底部
-        self.progress_bar = QProgressBar()
-        self.progress_bar.setVisible(False)
-        main_layout.addWidget(self.progress_bar)
+        # 后台任务进度 - 固定在底部
+        self.jobs = JobStatusBar()
+        main_layout.addWidget(self.jobs)
     
     def setup_analysis_group(self, layout):
         """设置分析功能组"""
@@ -162,9 +145,14 @@ class AnalysisPanel(QWidget):
         btn_find_duplicates.setProperty("buttonType", "default")
         btn_find_duplicates.clicked.connect(self.find_duplicates)
         
+        btn_near_duplicates = QPushButton("近似重复与泄漏")
+        btn_near_duplicates.setProperty("buttonType", "default")
+        btn_near_duplicates.clicked.connect(self.find_near_duplicates)
+        
         group_layout.addWidget(btn_remove_small, 0, 0)
         group_layout.addWidget(btn_normalize_ids, 0, 1)
         group_layout.addWidget(btn_find_duplicates, 0, 2)
+        group_layout.addWidget(btn_near_duplicates, 1, 0)
         
         layout.addWidget(group)
     
@@ -252,6 +240,10 @@ class AnalysisPanel(QWidget):
     
     def select_dataset(self):
         """选择数据集目录"""
+        if self.jobs.is_busy():
+            QMessageBox.information(self, "提示", "有任务正在进行，请等待完成或取消后再切换数据集")
+            return
+        
         dir_path = QFileDialog.getExistingDirectory(self, "选择数据集目录")
         if not dir_path:
             return
@@ -292,104 +284,80 @@ class AnalysisPanel(QWidget):
             QMessageBox.critical(self, "错误", f"选择数据集失败: {str(e)}")
             print(f"选择数据集错误详情: {e}")  # 调试用
     
+    def _open_dataset(self, job, dataset_dir, fallback_format):
+        """工作线程：验证目录结构并选择解析器，返回 (dataset_info, 格式, parser)"""
+        from ..core.dataset_validator import DatasetValidator
+        from ..core.converter import new_parser
+        
+        job.set_progress(0, 0, "检查目录结构")
+        dataset_info = DatasetValidator.get_dataset_info(dataset_dir)
+        if not dataset_info["is_valid"]:
+            raise ValueError(f"数据集格式不正确: {dataset_info['message']}")
+        
+        # 使用检测到的格式或用户选择的格式
+        format_type = dataset_info["detected_format"] or fallback_format
+        parser = new_parser(format_type)
+        
+        # 如果解析器支持标签映射，设置空映射避免错误
+        if hasattr(parser, "set_label_map"):
+            parser.set_label_map({})
+        return dataset_info, format_type, parser
+    
+    def _parse_dataset(self, job, dataset_dir, fallback_format):
+        """工作线程：验证目录结构并解析全部标注，返回 (dataset_info, 格式, annotations)"""
+        dataset_info, format_type, parser = self._open_dataset(job, dataset_dir, fallback_format)
+        annotations = []
+        for ann in parser.iter_parse(dataset_dir):
+            annotations.append(ann)
+            job.set_progress(len(annotations), 0, "解析标注")
+        return dataset_info, format_type, annotations
+    
     def analyze_dataset(self):
         """分析数据集"""
         if not self.dataset_dir:
             QMessageBox.warning(self, "警告", "请先选择数据集目录")
             return
         
-        try:
-            # 验证数据集结构
-            from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
-            
-            if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "数据集格式错误", 
-                    f"数据集格式不符合要求:\n{dataset_info['message']}\n\n"
-                    f"请确保数据集采用标准结构")
-                return
-            
-            # 使用检测到的格式或用户选择的格式
-            detected_format = dataset_info["detected_format"]
-            if detected_format:
-                format_type = detected_format
-                # 更新格式选择框
-                format_index = self.format_combo.findText(detected_format)
-                if format_index >= 0:
-                    self.format_combo.setCurrentIndex(format_index)
-            else:
-                format_type = self.format_combo.currentText()
-            
-            # 解析数据集
-            from ..core.converter import PARSERS
-            parser = PARSERS[format_type]
-            
-            # 如果解析器支持标签映射，设置空映射避免错误
-            if hasattr(parser, "set_label_map"):
-                parser.set_label_map({})
-            
-            annotations = parser.parse(self.dataset_dir)
-            
+        def work(job, dataset_dir, fallback_format):
+            dataset_info, format_type, annotations = self._parse_dataset(job, dataset_dir, fallback_format)
             if not annotations:
-                QMessageBox.warning(self, "警告", "未找到有效的标注数据")
-                return
-            
-            # 分析数据集
-            result = self.analyze_annotations(annotations, dataset_info["statistics"])
-            
+                raise ValueError("未找到有效的标注数据")
+            job.set_progress(0, 0, "统计分析")
+            return format_type, self.analyze_annotations(annotations, dataset_info["statistics"])
+        
+        def done(result):
+            format_type, analysis = result
+            # 更新格式选择框
+            format_index = self.format_combo.findText(format_type)
+            if format_index >= 0:
+                self.format_combo.setCurrentIndex(format_index)
             # 格式化显示结果
-            output = self.format_analysis_result(result)
-            self.result_text.setText(output)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"分析失败: {str(e)}")
-            print(f"分析错误详情: {e}")  # 调试用
+            self.result_text.setText(self.format_analysis_result(analysis))
+        
+        self.jobs.run("分析", work, self.dataset_dir, self.format_combo.currentText(), on_done=done)
     
     def analyze_annotations(self, annotations, dataset_stats):
         """分析标注数据"""
+        from ..core.stats_engine import collect_stats
+        stats = collect_stats(annotations, histograms=False)
         result = {}
         
         # 基本统计
-        result['total_images'] = len(annotations)
-        result['total_annotations'] = sum(len(ann.boxes) + (len(ann.polygons) if ann.polygons else 0) 
-                                        for ann in annotations)
+        result['total_images'] = stats.total_images
+        result['total_annotations'] = stats.total_annotations
         
         # 类别分布
-        class_counts = {}
-        for ann in annotations:
-            for box in ann.boxes:
-                class_counts[box.label] = class_counts.get(box.label, 0) + 1
-            if ann.polygons:
-                for poly in ann.polygons:
-                    class_counts[poly.label] = class_counts.get(poly.label, 0) + 1
+        result['class_distribution'] = dict(stats.class_counts)
         
-        result['class_distribution'] = class_counts
-        
-        # 图片尺寸统计
-        widths = [ann.width for ann in annotations if ann.width > 0]
-        heights = [ann.height for ann in annotations if ann.height > 0]
-        
-        if widths and heights:
-            result['image_size_stats'] = {
-                'avg_width': sum(widths) / len(widths),
-                'avg_height': sum(heights) / len(heights),
-                'min_width': min(widths),
-                'max_width': max(widths),
-                'min_height': min(heights),
-                'max_height': max(heights)
-            }
+        # 图片尺寸统计（尺寸未知的图片不计入）
+        image_size_stats = stats.image_size_stats()
+        if image_size_stats:
+            result['image_size_stats'] = image_size_stats
         
         # 标注统计
-        annotations_per_image = [len(ann.boxes) + (len(ann.polygons) if ann.polygons else 0) 
-                               for ann in annotations]
-        
-        if annotations_per_image:
-            result['annotation_stats'] = {
-                'avg_per_image': sum(annotations_per_image) / len(annotations_per_image),
-                'min_per_image': min(annotations_per_image),
-                'max_per_image': max(annotations_per_image),
-                'images_without_annotations': annotations_per_image.count(0)
-            }
+        annotation_stats = stats.annotation_stats()
+        if annotation_stats:
+            result['annotation_stats'] = annotation_stats
         
         # 添加数据集统计信息
         result['dataset_stats'] = dataset_stats
@@ -402,46 +370,33 @@ class AnalysisPanel(QWidget):
             QMessageBox.warning(self, "警告", "请先选择数据集目录")
             return
         
-        try:
-            # 使用新的数据集验证器
-            from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
-            
-            if not dataset_info["is_valid"]:
-                output = f"数据集验证失败\n"
-                output += f"错误: {dataset_info['message']}\n\n"
-                output += "请确保数据集采用标准目录结构"
-                self.result_text.setText(output)
-                return
-            
-            # 解析数据集进行详细验证
-            from ..core.converter import PARSERS
-            detected_format = dataset_info["detected_format"]
-            if not detected_format:
-                detected_format = self.format_combo.currentText()
-            
-            parser = PARSERS[detected_format]
-            if hasattr(parser, "set_label_map"):
-                parser.set_label_map({})
+        def work(job, dataset_dir, fallback_format):
+            from ..core.quality_checker import QualityChecker
+            dataset_info, format_type, parser = self._open_dataset(job, dataset_dir, fallback_format)
             
-            annotations = parser.parse(self.dataset_dir)
+            # 增量检查：只重新检查上次验证后有变化的文件
+            checker = QualityChecker()
+            report = checker.check_incremental(parser, dataset_dir, format_type, job.set_progress)
             
             # 计算健康度评分
-            health_score = self.calculate_health_score(annotations, dataset_info["statistics"])
+            health_score = self.calculate_health_score(report, dataset_info["statistics"])
             
             # 检查问题
-            issues = self.check_dataset_issues(annotations, dataset_info["statistics"])
+            issues = self.check_dataset_issues(report, dataset_info["statistics"]) + checker.issues
             
             # 格式化输出
             output = f"数据集健康度评分: {health_score:.1f}/100\n\n"
             
             stats = dataset_info["statistics"]
+            quality_stats = report["statistics"]
+            counts = report["incremental"]
             output += f"统计信息:\n"
             output += f"  总图片数: {stats['total_images']}\n"
             output += f"  总标签数: {stats['total_labels']}\n"
-            output += f"  有效标注数: {len(annotations)}\n"
+            output += f"  有效标注数: {quality_stats['total_images']}\n"
             output += f"  子集数量: {len(stats['subsets'])}\n"
-            output += f"  类别数量: {len(set(box.label for ann in annotations for box in ann.boxes))}\n\n"
+            output += f"  类别数量: {len(quality_stats['class_counts'])}\n"
+            output += f"  本次检查文件: {counts['checked']}（沿用上次结果 {counts['reused']}）\n\n"
             
             if issues:
                 output += f"发现的问题 ({len(issues)} 个):\n"
@@ -451,24 +406,31 @@ class AnalysisPanel(QWidget):
                     output += f"  ... 还有 {len(issues) - 20} 个问题\n"
             else:
                 output += "未发现明显问题，数据集质量良好！\n"
-            
-            self.result_text.setText(output)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"验证失败: {str(e)}")
-            print(f"验证错误详情: {e}")  # 调试用
+            return output
+        
+        def failed(message):
+            # 目录结构不符合要求时在结果区说明，其他错误弹窗
+            if message.startswith("数据集格式不正确"):
+                self.result_text.setText(f"数据集验证失败\n错误: {message}\n\n请确保数据集采用标准目录结构")
+            else:
+                QMessageBox.critical(self, "错误", f"验证失败: {message}")
+        
+        self.jobs.run("验证", work, self.dataset_dir, self.format_combo.currentText(),
+                      on_done=self.result_text.setText, on_error=failed)
     
-    def calculate_health_score(self, annotations, stats):
-        """计算数据集健康度评分"""
+    def calculate_health_score(self, report, stats):
+        """根据质量检查报告计算数据集健康度评分"""
+        from ..core.quality_checker import EMPTY_ANNOTATION
         score = 100.0
         
-        if not annotations:
+        quality_stats = report['statistics']
+        n_images = quality_stats['total_images']
+        if not n_images:
             return 0.0
         
         # 检查标注密度 (30分)
-        total_annotations = sum(len(ann.boxes) + (len(ann.polygons) if ann.polygons else 0) 
-                              for ann in annotations)
-        avg_annotations = total_annotations / len(annotations) if annotations else 0
+        total_annotations = quality_stats['total_boxes'] + quality_stats['total_polygons']
+        avg_annotations = total_annotations / n_images
         
         if avg_annotations >= 3:
             annotation_score = 30
@@ -480,13 +442,7 @@ class AnalysisPanel(QWidget):
             annotation_score = 0
         
         # 检查类别平衡性 (25分)
-        class_counts = {}
-        for ann in annotations:
-            for box in ann.boxes:
-                class_counts[box.label] = class_counts.get(box.label, 0) + 1
-            if ann.polygons:
-                for poly in ann.polygons:
-                    class_counts[poly.label] = class_counts.get(poly.label, 0) + 1
+        class_counts = quality_stats['class_counts']
         
         if class_counts:
             counts = list(class_counts.values())
@@ -506,15 +462,12 @@ class AnalysisPanel(QWidget):
             balance_score = 0
         
         # 检查图片质量 (20分)
-        valid_images = sum(1 for ann in annotations if ann.width > 0 and ann.height > 0)
-        image_quality_ratio = valid_images / len(annotations) if annotations else 0
-        image_score = image_quality_ratio * 20
+        valid_images = n_images - quality_stats['invalid_image_sizes']
+        image_score = valid_images / n_images * 20
         
         # 检查数据完整性 (15分)
-        complete_annotations = sum(1 for ann in annotations 
-                                 if len(ann.boxes) > 0 or (ann.polygons and len(ann.polygons) > 0))
-        completeness_ratio = complete_annotations / len(annotations) if annotations else 0
-        completeness_score = completeness_ratio * 15
+        complete_annotations = n_images - report['summary']['issue_counts'].get(EMPTY_ANNOTATION, 0)
+        completeness_score = complete_annotations / n_images * 15
         
         # 检查子集分布 (10分)
         subset_count = len(stats.get('subsets', {}))
@@ -530,33 +483,28 @@ class AnalysisPanel(QWidget):
         total_score = annotation_score + balance_score + image_score + completeness_score + subset_score
         return min(100.0, total_score)
     
-    def check_dataset_issues(self, annotations, stats):
-        """检查数据集问题"""
+    def check_dataset_issues(self, report, stats):
+        """根据质量检查报告检查数据集整体问题（逐文件问题见 QualityChecker.issues）"""
+        from ..core.quality_checker import EMPTY_ANNOTATION
         issues = []
         
-        if not annotations:
+        quality_stats = report['statistics']
+        if not quality_stats['total_images']:
             issues.append("未找到有效的标注数据")
             return issues
         
         # 检查空标注
-        empty_annotations = sum(1 for ann in annotations 
-                              if len(ann.boxes) == 0 and (not ann.polygons or len(ann.polygons) == 0))
+        empty_annotations = report['summary']['issue_counts'].get(EMPTY_ANNOTATION, 0)
         if empty_annotations > 0:
             issues.append(f"发现 {empty_annotations} 个空标注文件")
         
         # 检查图片尺寸问题
-        invalid_size = sum(1 for ann in annotations if ann.width <= 0 or ann.height <= 0)
+        invalid_size = quality_stats['invalid_image_sizes']
         if invalid_size > 0:
             issues.append(f"发现 {invalid_size} 个图片尺寸信息缺失")
         
         # 检查类别不平衡
-        class_counts = {}
-        for ann in annotations:
-            for box in ann.boxes:
-                class_counts[box.label] = class_counts.get(box.label, 0) + 1
-            if ann.polygons:
-                for poly in ann.polygons:
-                    class_counts[poly.label] = class_counts.get(poly.label, 0) + 1
+        class_counts = quality_stats['class_counts']
         
         if class_counts:
             counts = list(class_counts.values())
@@ -593,41 +541,22 @@ class AnalysisPanel(QWidget):
         
         multiplier = self.multiplier_spin.value()
         
-        try:
-            # 验证数据集格式
-            from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
-            
-            if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"数据集格式不正确: {dataset_info['message']}")
-                return
-            
-            # 解析数据集
-            from ..core.converter import PARSERS
-            detected_format = dataset_info["detected_format"] or self.format_combo.currentText()
-            parser = PARSERS[detected_format]
-            
-            if hasattr(parser, "set_label_map"):
-                parser.set_label_map({})
-            
-            annotations = parser.parse(self.dataset_dir)
-            
+        def work(job, dataset_dir, fallback_format, output_path):
+            _, format_type, annotations = self._parse_dataset(job, dataset_dir, fallback_format)
             if not annotations:
-                QMessageBox.warning(self, "警告", "未找到有效的标注数据")
-                return
+                raise ValueError("未找到有效的标注数据")
             
             # 执行数据增强
-            output_path = Path(output_dir)
-            augmented_count = self.perform_augmentation(annotations, output_path, selected_augs, multiplier, detected_format)
-            
+            return self.perform_augmentation(job, annotations, output_path, selected_augs, multiplier, format_type)
+        
+        def done(augmented_count):
             QMessageBox.information(self, "完成", f"数据增强完成！生成了 {augmented_count} 个增强样本")
             self.result_text.setText(f"数据增强完成\n输出目录: {output_dir}\n增强倍数: {multiplier}\n生成样本: {augmented_count}")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"数据增强失败: {str(e)}")
-            print(f"数据增强错误详情: {e}")  # 调试用
+        
+        self.jobs.run("数据增强", work, self.dataset_dir, self.format_combo.currentText(), Path(output_dir),
+                      on_done=done)
     
-    def perform_augmentation(self, annotations, output_path, selected_augs, multiplier, format_type):
+    def perform_augmentation(self, job, annotations, output_path, selected_augs, multiplier, format_type):
         """执行数据增强"""
         from PIL import Image, ImageEnhance, ImageFilter
         import random
@@ -642,6 +571,7 @@ class AnalysisPanel(QWidget):
         augmented_count = 0
         
         for i, ann in enumerate(annotations):
+            job.set_progress(i, len(annotations), "生成增强样本")
             # 复制原始文件
             if ann.image_path.exists():
                 original_img_dest = output_path / "images" / "train" / ann.image_path.name
@@ -697,8 +627,9 @@ class AnalysisPanel(QWidget):
                     continue
         
         # 导出标注
-        from ..core.converter import PARSERS
-        exporter = PARSERS[format_type]
+        job.set_progress(0, 0, "导出标注")
+        from ..core.converter import new_parser
+        exporter = new_parser(format_type)
         if hasattr(exporter, "set_label_map"):
             exporter.set_label_map({})
         
@@ -712,35 +643,33 @@ class AnalysisPanel(QWidget):
             QMessageBox.warning(self, "警告", "请先选择数据集目录")
             return
         
-        try:
+        # 获取重命名参数
+        prefix, ok1 = QInputDialog.getText(self, "设置前缀", "文件名前缀:", text="img")
+        if not ok1:
+            return
+        
+        start_num, ok2 = QInputDialog.getInt(self, "设置起始编号", "起始编号:", 0, 0, 999999)
+        if not ok2:
+            return
+        
+        def work(job, dataset_dir):
             # 验证数据集格式
             from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
+            dataset_info = DatasetValidator.get_dataset_info(dataset_dir)
             
             if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"数据集格式不正确: {dataset_info['message']}")
-                return
-            
-            # 获取重命名参数
-            prefix, ok1 = QInputDialog.getText(self, "设置前缀", "文件名前缀:", text="img")
-            if not ok1:
-                return
-            
-            start_num, ok2 = QInputDialog.getInt(self, "设置起始编号", "起始编号:", 0, 0, 999999)
-            if not ok2:
-                return
+                raise ValueError(f"数据集格式不正确: {dataset_info['message']}")
             
             # 执行重命名
-            renamed_count = self.perform_rename(dataset_info["statistics"], prefix, start_num)
-            
+            return self.perform_rename(job, dataset_info["statistics"], prefix, start_num)
+        
+        def done(renamed_count):
             QMessageBox.information(self, "完成", f"文件重命名完成！重命名了 {renamed_count} 个文件")
             self.result_text.setText(f"批量重命名完成\n重命名文件数: {renamed_count}\n前缀: {prefix}\n起始编号: {start_num}")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"重命名失败: {str(e)}")
-            print(f"重命名错误详情: {e}")  # 调试用
+        
+        self.jobs.run("重命名", work, self.dataset_dir, on_done=done)
     
-    def perform_rename(self, stats, prefix, start_num):
+    def perform_rename(self, job, stats, prefix, start_num):
         """执行文件重命名"""
         renamed_count = 0
         current_num = start_num
@@ -760,6 +689,7 @@ class AnalysisPanel(QWidget):
             
             # 重命名文件
             for img_file in img_files:
+                job.set_progress(renamed_count, 0, "重命名文件")
                 try:
                     # 新文件名
                     new_name = f"{prefix}_{current_num:06d}{img_file.suffix}"
@@ -799,46 +729,29 @@ class AnalysisPanel(QWidget):
         if not output_dir:
             return
         
-        try:
-            # 验证数据集格式
-            from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
-            
-            if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"数据集格式不正确: {dataset_info['message']}")
-                return
-            
-            # 获取划分比例
-            train_ratio, ok1 = QInputDialog.getDouble(self, "训练集比例", "训练集比例 (0-1):", 0.7, 0.1, 0.9, 2)
-            if not ok1:
-                return
-            
-            val_ratio, ok2 = QInputDialog.getDouble(self, "验证集比例", "验证集比例 (0-1):", 0.2, 0.05, 0.8, 2)
-            if not ok2:
-                return
-            
-            test_ratio = 1.0 - train_ratio - val_ratio
-            if test_ratio < 0:
-                QMessageBox.warning(self, "警告", "比例设置不正确，训练集和验证集比例之和不能超过1")
-                return
-            
-            # 解析数据集
-            from ..core.converter import PARSERS
-            detected_format = dataset_info["detected_format"] or self.format_combo.currentText()
-            parser = PARSERS[detected_format]
-            
-            if hasattr(parser, "set_label_map"):
-                parser.set_label_map({})
-            
-            annotations = parser.parse(self.dataset_dir)
-            
+        # 获取划分比例
+        train_ratio, ok1 = QInputDialog.getDouble(self, "训练集比例", "训练集比例 (0-1):", 0.7, 0.1, 0.9, 2)
+        if not ok1:
+            return
+        
+        val_ratio, ok2 = QInputDialog.getDouble(self, "验证集比例", "验证集比例 (0-1):", 0.2, 0.05, 0.8, 2)
+        if not ok2:
+            return
+        
+        test_ratio = 1.0 - train_ratio - val_ratio
+        if test_ratio < 0:
+            QMessageBox.warning(self, "警告", "比例设置不正确，训练集和验证集比例之和不能超过1")
+            return
+        
+        def work(job, dataset_dir, fallback_format, output_path):
+            _, format_type, annotations = self._parse_dataset(job, dataset_dir, fallback_format)
             if not annotations:
-                QMessageBox.warning(self, "警告", "未找到有效的标注数据")
-                return
+                raise ValueError("未找到有效的标注数据")
             
             # 执行数据集划分
-            result = self.perform_split(annotations, Path(output_dir), train_ratio, val_ratio, test_ratio, detected_format)
-            
+            return self.perform_split(job, annotations, output_path, train_ratio, val_ratio, test_ratio, format_type)
+        
+        def done(result):
             QMessageBox.information(self, "完成", "数据集划分完成！")
             
             output = f"数据集划分完成\n"
@@ -847,12 +760,11 @@ class AnalysisPanel(QWidget):
             output += f"测试集: {result['test']} 张\n"
             output += f"输出目录: {output_dir}"
             self.result_text.setText(output)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"数据集划分失败: {str(e)}")
-            print(f"划分错误详情: {e}")  # 调试用
+        
+        self.jobs.run("数据集划分", work, self.dataset_dir, self.format_combo.currentText(), Path(output_dir),
+                      on_done=done)
     
-    def perform_split(self, annotations, output_path, train_ratio, val_ratio, test_ratio, format_type):
+    def perform_split(self, job, annotations, output_path, train_ratio, val_ratio, test_ratio, format_type):
         """执行数据集划分"""
         import random
         import shutil
@@ -880,16 +792,19 @@ class AnalysisPanel(QWidget):
         result = {}
         
         # 复制文件并导出标注
-        from ..core.converter import PARSERS
-        exporter = PARSERS[format_type]
+        from ..core.converter import new_parser
+        exporter = new_parser(format_type)
         if hasattr(exporter, "set_label_map"):
             exporter.set_label_map({})
         
+        copied = 0
         for subset, subset_annotations in splits.items():
             result[subset] = len(subset_annotations)
             
             # 复制图片文件
             for ann in subset_annotations:
+                job.set_progress(copied, total, "复制图片")
+                copied += 1
                 if ann.image_path.exists():
                     dest_path = output_path / "images" / subset / ann.image_path.name
                     shutil.copy2(ann.image_path, dest_path)
@@ -925,47 +840,55 @@ class AnalysisPanel(QWidget):
         if not output_dir:
             return
         
-        try:
-            # 验证所有数据集
+        # 不同来源的数据集常含同一图片的不同编码版本
+        check_near = QMessageBox.question(self, "近似重复", "合并后是否检查近似重复图片？",
+                                          QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes
+        
+        def work(job, dataset_dirs, fallback_format, output_path):
+            # 验证并解析所有数据集
             all_annotations = []
             format_type = None
             
-            for i, dataset_dir in enumerate(dirs):
-                from ..core.dataset_validator import DatasetValidator
-                dataset_info = DatasetValidator.get_dataset_info(dataset_dir)
-                
-                if not dataset_info["is_valid"]:
-                    QMessageBox.critical(self, "错误", f"数据集 {i+1} 格式不正确: {dataset_info['message']}")
-                    return
+            for i, dataset_dir in enumerate(dataset_dirs):
+                try:
+                    dataset_info, detected_format, annotations = self._parse_dataset(
+                        job, dataset_dir, format_type or fallback_format)
+                except ValueError as e:
+                    raise ValueError(f"数据集 {i+1}: {e}") from e
                 
                 # 使用第一个数据集的格式
                 if format_type is None:
-                    format_type = dataset_info["detected_format"] or self.format_combo.currentText()
-                
-                # 解析数据集
-                from ..core.converter import PARSERS
-                parser = PARSERS[format_type]
-                if hasattr(parser, "set_label_map"):
-                    parser.set_label_map({})
-                
-                annotations = parser.parse(dataset_dir)
+                    format_type = detected_format
                 all_annotations.extend(annotations)
             
             if not all_annotations:
-                QMessageBox.warning(self, "警告", "未找到有效的标注数据")
-                return
+                raise ValueError("未找到有效的标注数据")
             
             # 执行合并
-            merged_count = self.perform_merge(all_annotations, Path(output_dir), format_type)
-            
+            merged_count = self.perform_merge(job, all_annotations, output_path, format_type)
+            clusters = None
+            if check_near:
+                from ..core.dataset_index import scan_files, IMAGE_EXTS
+                from ..core.near_dedup import NearDuplicateFinder
+                merged_images = scan_files(output_path / "images" / "train", IMAGE_EXTS)
+                clusters = NearDuplicateFinder().find(merged_images, job.set_progress)
+            return merged_count, clusters
+        
+        def done(result):
+            merged_count, clusters = result
             QMessageBox.information(self, "完成", f"数据集合并完成！共处理 {merged_count} 个文件")
-            self.result_text.setText(f"数据集合并完成\n合并数据集数: {len(dirs)}\n处理文件数: {merged_count}\n输出目录: {output_dir}")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"数据集合并失败: {str(e)}")
-            print(f"合并错误详情: {e}")  # 调试用
+            output = f"数据集合并完成\n合并数据集数: {len(dirs)}\n处理文件数: {merged_count}\n输出目录: {output_dir}"
+            if clusters is not None:
+                output += f"\n\n近似重复图片: {len(clusters)} 组\n"
+                for i, group in enumerate(clusters[:20]):
+                    output += f"{i+1}. {' <-> '.join(f.name for f in group)}\n"
+                if len(clusters) > 20:
+                    output += f"... 还有 {len(clusters) - 20} 组"
+            self.result_text.setText(output)
+        
+        self.jobs.run("数据集合并", work, dirs, self.format_combo.currentText(), Path(output_dir), on_done=done)
     
-    def perform_merge(self, all_annotations, output_path, format_type):
+    def perform_merge(self, job, all_annotations, output_path, format_type):
         """执行数据集合并"""
         import shutil
         
@@ -980,7 +903,8 @@ class AnalysisPanel(QWidget):
         # 处理文件名冲突
         used_names = set()
         
-        for ann in all_annotations:
+        for i, ann in enumerate(all_annotations):
+            job.set_progress(i, len(all_annotations), "复制图片")
             if not ann.image_path.exists():
                 continue
             
@@ -1008,8 +932,8 @@ class AnalysisPanel(QWidget):
             file_counter += 1
         
         # 导出标注
-        from ..core.converter import PARSERS
-        exporter = PARSERS[format_type]
+        from ..core.converter import new_parser
+        exporter = new_parser(format_type)
         if hasattr(exporter, "set_label_map"):
             exporter.set_label_map({})
         
@@ -1110,28 +1034,13 @@ class AnalysisPanel(QWidget):
                                    QMessageBox.Yes | QMessageBox.No)
         create_backup = reply == QMessageBox.Yes
         
-        try:
-            # 验证数据集格式
-            from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
-            
-            if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"数据集格式不正确: {dataset_info['message']}")
-                return
-            
-            # 解析数据集
-            from ..core.converter import PARSERS
-            detected_format = dataset_info["detected_format"] or self.format_combo.currentText()
-            parser = PARSERS[detected_format]
-            
-            if hasattr(parser, "set_label_map"):
-                parser.set_label_map({})
-            
-            annotations = parser.parse(self.dataset_dir)
+        def work(job, dataset_dir, fallback_format):
+            dataset_info, format_type, annotations = self._parse_dataset(job, dataset_dir, fallback_format)
             
             # 执行修复
-            fixes = self.perform_fixes(annotations, dataset_info["statistics"], create_backup, detected_format)
-            
+            return self.perform_fixes(job, annotations, dataset_info["statistics"], create_backup, format_type)
+        
+        def done(fixes):
             output = "数据集修复完成:\n"
             output += f"- 坐标修复: {fixes['coordinate_fixes']} 个文件\n"
             output += f"- 创建缺失标注: {fixes['missing_annotations_created']} 个\n"
@@ -1140,12 +1049,10 @@ class AnalysisPanel(QWidget):
             
             self.result_text.setText(output)
             QMessageBox.information(self, "完成", "数据集修复完成！")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"修复失败: {str(e)}")
-            print(f"修复错误详情: {e}")  # 调试用
+        
+        self.jobs.run("修复", work, self.dataset_dir, self.format_combo.currentText(), on_done=done)
     
-    def perform_fixes(self, annotations, stats, create_backup, format_type):
+    def perform_fixes(self, job, annotations, stats, create_backup, format_type):
         """执行数据集修复"""
         import shutil
         
@@ -1157,6 +1064,7 @@ class AnalysisPanel(QWidget):
         }
         
         if create_backup:
+            job.set_progress(0, 0, "创建备份")
             backup_dir = self.dataset_dir.parent / f"{self.dataset_dir.name}_backup"
             if backup_dir.exists():
                 shutil.rmtree(backup_dir)
@@ -1205,6 +1113,7 @@ class AnalysisPanel(QWidget):
                 img_files.extend(img_dir.glob(f"*{ext}"))
             
             for img_file in img_files:
+                job.check_cancelled()
                 # 检查是否有对应的标签文件
                 has_label = False
                 for ext in ['.txt', '.xml', '.json']:
@@ -1234,6 +1143,7 @@ class AnalysisPanel(QWidget):
                 label_files.extend(label_dir.glob(f"*{ext}"))
             
             for label_file in label_files:
+                job.check_cancelled()
                 # 检查是否有对应的图片文件
                 has_image = False
                 for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']:
@@ -1258,41 +1168,21 @@ class AnalysisPanel(QWidget):
         if not dataset2_dir:
             return
         
-        try:
-            # 验证两个数据集
-            from ..core.dataset_validator import DatasetValidator
-            
-            dataset1_info = DatasetValidator.get_dataset_info(self.dataset_dir)
-            dataset2_info = DatasetValidator.get_dataset_info(Path(dataset2_dir))
-            
-            if not dataset1_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"第一个数据集格式不正确: {dataset1_info['message']}")
-                return
-            
-            if not dataset2_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"第二个数据集格式不正确: {dataset2_info['message']}")
-                return
-            
-            # 解析两个数据集
-            from ..core.converter import PARSERS
-            
-            format1 = dataset1_info["detected_format"] or self.format_combo.currentText()
-            format2 = dataset2_info["detected_format"] or format1
-            
-            parser1 = PARSERS[format1]
-            parser2 = PARSERS[format2]
-            
-            if hasattr(parser1, "set_label_map"):
-                parser1.set_label_map({})
-            if hasattr(parser2, "set_label_map"):
-                parser2.set_label_map({})
-            
-            annotations1 = parser1.parse(self.dataset_dir)
-            annotations2 = parser2.parse(Path(dataset2_dir))
+        def work(job, dataset1_dir, dataset2_dir, fallback_format):
+            # 验证并解析两个数据集
+            try:
+                dataset1_info, format1, annotations1 = self._parse_dataset(job, dataset1_dir, fallback_format)
+            except ValueError as e:
+                raise ValueError(f"第一个数据集: {e}") from e
+            try:
+                dataset2_info, _, annotations2 = self._parse_dataset(job, dataset2_dir, format1)
+            except ValueError as e:
+                raise ValueError(f"第二个数据集: {e}") from e
             
             # 执行比较
-            result = self.perform_comparison(annotations1, annotations2, dataset1_info["statistics"], dataset2_info["statistics"])
-            
+            return self.perform_comparison(annotations1, annotations2, dataset1_info["statistics"], dataset2_info["statistics"])
+        
+        def done(result):
             # 格式化输出
             output = "数据集比较结果:\n" + "="*50 + "\n\n"
             
@@ -1318,10 +1208,9 @@ class AnalysisPanel(QWidget):
                     output += f"- {rec}\n"
             
             self.result_text.setText(output)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"比较失败: {str(e)}")
-            print(f"比较错误详情: {e}")  # 调试用
+        
+        self.jobs.run("比较", work, self.dataset_dir, Path(dataset2_dir), self.format_combo.currentText(),
+                      on_done=done)
     
     def perform_comparison(self, annotations1, annotations2, stats1, stats2):
         """执行数据集比较"""
@@ -1389,40 +1278,22 @@ class AnalysisPanel(QWidget):
         if not output_dir:
             return
         
-        try:
-            # 验证数据集格式
-            from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
-            
-            if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"数据集格式不正确: {dataset_info['message']}")
-                return
-            
-            # 解析数据集
-            from ..core.converter import PARSERS
-            detected_format = dataset_info["detected_format"] or self.format_combo.currentText()
-            parser = PARSERS[detected_format]
-            
-            if hasattr(parser, "set_label_map"):
-                parser.set_label_map({})
-            
-            annotations = parser.parse(self.dataset_dir)
-            
+        def work(job, dataset_dir, fallback_format, output_path):
+            _, _, annotations = self._parse_dataset(job, dataset_dir, fallback_format)
             if not annotations:
-                QMessageBox.warning(self, "警告", "未找到有效的标注数据")
-                return
+                raise ValueError("未找到有效的标注数据")
             
             # 执行可视化
-            processed = self.perform_visualization(annotations[:20], Path(output_dir))  # 只处理前20张
-            
+            return self.perform_visualization(job, annotations[:20], output_path)  # 只处理前20张
+        
+        def done(processed):
             QMessageBox.information(self, "完成", f"已可视化 {processed} 张图片")
             self.result_text.setText(f"标注可视化完成\n处理图片: {processed} 张\n输出目录: {output_dir}")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"可视化失败: {str(e)}")
-            print(f"可视化错误详情: {e}")  # 调试用
+        
+        self.jobs.run("可视化", work, self.dataset_dir, self.format_combo.currentText(), Path(output_dir),
+                      on_done=done)
     
-    def perform_visualization(self, annotations, output_path):
+    def perform_visualization(self, job, annotations, output_path):
         """执行标注可视化"""
         from PIL import Image, ImageDraw, ImageFont
         import random
@@ -1434,7 +1305,8 @@ class AnalysisPanel(QWidget):
         colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), 
                  (255, 0, 255), (0, 255, 255), (128, 0, 128), (255, 165, 0)]
         
-        for ann in annotations:
+        for i, ann in enumerate(annotations):
+            job.set_progress(i, len(annotations), "绘制标注")
             if not ann.image_path.exists():
                 continue
             
@@ -1491,38 +1363,21 @@ class AnalysisPanel(QWidget):
         if not output_dir:
             return
         
-        try:
-            # 验证数据集格式
-            from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
-            
-            if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"数据集格式不正确: {dataset_info['message']}")
-                return
-            
-            # 解析数据集
-            from ..core.converter import PARSERS
-            detected_format = dataset_info["detected_format"] or self.format_combo.currentText()
-            parser = PARSERS[detected_format]
-            
-            if hasattr(parser, "set_label_map"):
-                parser.set_label_map({})
-            
-            annotations = parser.parse(self.dataset_dir)
-            
+        def work(job, dataset_dir, fallback_format, output_path):
+            _, _, annotations = self._parse_dataset(job, dataset_dir, fallback_format)
             if not annotations:
-                QMessageBox.warning(self, "警告", "未找到有效的标注数据")
-                return
+                raise ValueError("未找到有效的标注数据")
             
             # 创建预览图
-            preview_path = self.create_dataset_preview(annotations, Path(output_dir))
-            
+            job.set_progress(0, 0, "生成预览图")
+            return self.create_dataset_preview(annotations, output_path)
+        
+        def done(preview_path):
             QMessageBox.information(self, "完成", f"预览图已生成: {preview_path}")
             self.result_text.setText(f"数据集预览图生成完成\n保存位置: {preview_path}")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"生成预览图失败: {str(e)}")
-            print(f"预览图错误详情: {e}")  # 调试用
+        
+        self.jobs.run("生成预览图", work, self.dataset_dir, self.format_combo.currentText(), Path(output_dir),
+                      on_done=done)
     
     def create_dataset_preview(self, annotations, output_path):
         """创建数据集预览图"""
@@ -1591,34 +1446,18 @@ class AnalysisPanel(QWidget):
         if not ok:
             return
         
-        try:
-            # 验证数据集格式
-            from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
-            
-            if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"数据集格式不正确: {dataset_info['message']}")
-                return
-            
-            # 解析数据集
-            from ..core.converter import PARSERS
-            detected_format = dataset_info["detected_format"] or self.format_combo.currentText()
-            parser = PARSERS[detected_format]
-            
-            if hasattr(parser, "set_label_map"):
-                parser.set_label_map({})
-            
-            annotations = parser.parse(self.dataset_dir)
+        def work(job, dataset_dir, fallback_format):
+            _, format_type, annotations = self._parse_dataset(job, dataset_dir, fallback_format)
             
             # 移除小标注
-            removed_count = self.perform_small_annotation_removal(annotations, min_area, detected_format)
-            
+            job.set_progress(0, 0, "移除小标注")
+            return self.perform_small_annotation_removal(annotations, min_area, format_type)
+        
+        def done(removed_count):
             QMessageBox.information(self, "完成", f"已移除 {removed_count} 个小标注")
             self.result_text.setText(f"小标注清理完成\n移除数量: {removed_count}\n最小面积: {min_area} 像素")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"清理失败: {str(e)}")
-            print(f"清理错误详情: {e}")  # 调试用
+        
+        self.jobs.run("清理", work, self.dataset_dir, self.format_combo.currentText(), on_done=done)
     
     def perform_small_annotation_removal(self, annotations, min_area, format_type):
         """执行小标注移除"""
@@ -1654,8 +1493,8 @@ class AnalysisPanel(QWidget):
                 removed_count += original_poly_count - len(ann.polygons)
         
         # 重新导出标注
-        from ..core.converter import PARSERS
-        exporter = PARSERS[format_type]
+        from ..core.converter import new_parser
+        exporter = new_parser(format_type)
         if hasattr(exporter, "set_label_map"):
             exporter.set_label_map({})
         
@@ -1676,32 +1515,13 @@ class AnalysisPanel(QWidget):
             QMessageBox.warning(self, "警告", "请先选择数据集目录")
             return
         
-        try:
-            # 验证数据集格式
-            from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
-            
-            if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"数据集格式不正确: {dataset_info['message']}")
-                return
-            
-            # 解析数据集
-            from ..core.converter import PARSERS
-            detected_format = dataset_info["detected_format"] or self.format_combo.currentText()
-            
-            if detected_format not in ['yolo', 'yolo_seg']:
-                QMessageBox.warning(self, "提示", "类别ID标准化仅支持YOLO格式")
-                return
-            
-            parser = PARSERS[detected_format]
-            if hasattr(parser, "set_label_map"):
-                parser.set_label_map({})
-            
-            annotations = parser.parse(self.dataset_dir)
+        def work(job, dataset_dir, fallback_format):
+            dataset_info, format_type, annotations = self._parse_dataset(job, dataset_dir, fallback_format)
             
+            if format_type not in ['yolo', 'yolo_seg']:
+                raise ValueError("类别ID标准化仅支持YOLO格式")
             if not annotations:
-                QMessageBox.warning(self, "警告", "未找到有效的标注数据")
-                return
+                raise ValueError("未找到有效的标注数据")
             
             # 收集所有类别并创建映射
             categories = set()
@@ -1717,19 +1537,21 @@ class AnalysisPanel(QWidget):
             class_mapping = {name: i for i, name in enumerate(sorted_categories)}
             
             # 应用映射并重新导出
-            normalized_count = self.apply_class_normalization(annotations, class_mapping, detected_format)
+            job.set_progress(0, 0, "重新导出标注")
+            normalized_count = self.apply_class_normalization(annotations, class_mapping, format_type)
             
             # 保存类别映射文件
-            mapping_file = self.dataset_dir / "class_mapping.txt"
+            mapping_file = dataset_dir / "class_mapping.txt"
             mapping_content = "\n".join(f"{i}: {name}" for name, i in class_mapping.items())
             mapping_file.write_text(mapping_content, encoding="utf-8")
-            
+            return normalized_count, len(class_mapping), mapping_file
+        
+        def done(result):
+            normalized_count, class_count, mapping_file = result
             QMessageBox.information(self, "完成", f"类别ID标准化完成！处理了 {normalized_count} 个标注文件")
-            self.result_text.setText(f"类别ID标准化完成\n处理文件数: {normalized_count}\n类别数量: {len(class_mapping)}\n映射文件: {mapping_file}")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"标准化失败: {str(e)}")
-            print(f"标准化错误详情: {e}")  # 调试用
+            self.result_text.setText(f"类别ID标准化完成\n处理文件数: {normalized_count}\n类别数量: {class_count}\n映射文件: {mapping_file}")
+        
+        self.jobs.run("标准化", work, self.dataset_dir, self.format_combo.currentText(), on_done=done)
     
     def apply_class_normalization(self, annotations, class_mapping, format_type):
         """应用类别标准化"""
@@ -1745,8 +1567,8 @@ class AnalysisPanel(QWidget):
                         poly.label = str(class_mapping[poly.label])
         
         # 重新导出标注
-        from ..core.converter import PARSERS
-        exporter = PARSERS[format_type]
+        from ..core.converter import new_parser
+        exporter = new_parser(format_type)
         if hasattr(exporter, "set_label_map"):
             exporter.set_label_map(class_mapping)
         
@@ -1769,69 +1591,99 @@ class AnalysisPanel(QWidget):
             QMessageBox.warning(self, "警告", "请先选择数据集目录")
             return
         
-        try:
+        def work(job, dataset_dir):
             # 验证数据集格式
             from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
+            dataset_info = DatasetValidator.get_dataset_info(dataset_dir)
             
             if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"数据集格式不正确: {dataset_info['message']}")
-                return
+                raise ValueError(f"数据集格式不正确: {dataset_info['message']}")
             
             # 查找重复文件
-            duplicates = self.find_duplicate_images()
-            
+            return self.find_duplicate_images(job, dataset_dir)
+        
+        def done(duplicates):
             if duplicates:
-                output = f"发现 {len(duplicates)} 组可能的重复文件:\n\n"
-                for i, (file1, file2, similarity) in enumerate(duplicates[:20]):  # 只显示前20组
-                    output += f"{i+1}. {file1.name} <-> {file2.name} (相似度: {similarity:.2f})\n"
+                extra = sum(len(group) - 1 for group in duplicates)
+                output = f"发现 {len(duplicates)} 组重复文件（多余副本 {extra} 个）:\n\n"
+                for i, group in enumerate(duplicates[:20]):  # 只显示前20组
+                    output += f"{i+1}. {' <-> '.join(f.name for f in group)}\n"
                 if len(duplicates) > 20:
                     output += f"\n... 还有 {len(duplicates) - 20} 组重复文件"
             else:
                 output = "未发现重复文件"
             
             self.result_text.setText(output)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"查找失败: {str(e)}")
-            print(f"查找重复文件错误详情: {e}")  # 调试用
-    
-    def find_duplicate_images(self):
-        """查找重复图片"""
-        import hashlib
-        from PIL import Image
         
-        duplicates = []
-        file_hashes = {}
+        self.jobs.run("查找重复文件", work, self.dataset_dir, on_done=done)
+    
+    def find_duplicate_images(self, job, dataset_dir):
+        """查找内容完全相同的图片，返回重复组（见 dedup.DuplicateFinder）"""
+        from ..core.dataset_index import DatasetIndex
+        from ..core.dedup import DuplicateFinder
         
         # 遍历所有子集
-        for subset in ["train", "test", "val"]:
-            img_dir = self.dataset_dir / "images" / subset
-            if not img_dir.exists():
-                continue
-            
-            # 获取所有图片文件
-            img_files = []
-            for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']:
-                img_files.extend(img_dir.glob(f"*{ext}"))
+        job.set_progress(0, 0, "扫描图片")
+        index = DatasetIndex.build(dataset_dir)
+        img_files = [f for subset in ["train", "test", "val"] if subset in index.subsets
+                     for f in index.subsets[subset].image_files]
+        
+        finder = DuplicateFinder()
+        duplicates = finder.find(img_files, lambda done, total: job.set_progress(done, total, "比较文件内容"))
+        for img_file in finder.unreadable:
+            print(f"处理文件 {img_file} 失败: 无法读取文件")
+        return duplicates
+    
+    def find_near_duplicates(self):
+        """查找近似重复图片（重新编码 / 缩放的副本），并列出 train 与 val / test 之间的泄漏"""
+        if not self.dataset_dir:
+            QMessageBox.warning(self, "警告", "请先选择数据集目录")
+            return
+        
+        radius, ok = QInputDialog.getInt(self, "近似重复", "汉明距离阈值 (越大越宽松):", 6, 0, 16)
+        if not ok:
+            return
+        
+        def work(job, dataset_dir, radius):
+            from ..core.near_dedup import NearDuplicateFinder, dataset_splits, split_leakage
+            
+            job.set_progress(0, 0, "扫描图片")
+            split_of = dataset_splits(dataset_dir)
+            if not split_of:
+                raise ValueError("未找到 images/<子集> 下的图片")
+            finder = NearDuplicateFinder(radius)
+            clusters = finder.find(list(split_of), job.set_progress)
+            return clusters, split_leakage(finder.pairs, split_of), finder.unreadable
+        
+        def done(result):
+            clusters, leaks, unreadable = result
+            output = f"近似重复检查（距离阈值 {radius}）\n{'='*50}\n\n"
+            if leaks:
+                output += "训练集泄漏:\n"
+                for subset, images in leaks.items():
+                    output += f"  {subset}: {len(images)} 张图片在 train 中有近似副本\n"
+                    for img, matches in list(images.items())[:20]:
+                        output += f"    {img.name} <-> {', '.join(f'{m.name}({d})' for m, d in matches[:3])}\n"
+                    if len(images) > 20:
+                        output += f"    ... 还有 {len(images) - 20} 张\n"
+                output += "\n"
+            else:
+                output += "train 与 val / test 之间未发现近似重复\n\n"
+            
+            if clusters:
+                output += f"发现 {len(clusters)} 组近似重复图片:\n"
+                for i, group in enumerate(clusters[:20]):  # 只显示前20组
+                    output += f"{i+1}. {' <-> '.join(f.name for f in group)}\n"
+                if len(clusters) > 20:
+                    output += f"\n... 还有 {len(clusters) - 20} 组"
+            else:
+                output += "未发现近似重复图片"
+            if unreadable:
+                output += f"\n\n无法解码的图片 {len(unreadable)} 张"
             
-            for img_file in img_files:
-                try:
-                    # 计算文件哈希
-                    with open(img_file, 'rb') as f:
-                        file_hash = hashlib.md5(f.read()).hexdigest()
-                    
-                    if file_hash in file_hashes:
-                        # 发现重复文件
-                        duplicates.append((file_hashes[file_hash], img_file, 1.0))
-                    else:
-                        file_hashes[file_hash] = img_file
-                
-                except Exception as e:
-                    print(f"处理文件 {img_file} 失败: {e}")
-                    continue
+            self.result_text.setText(output)
         
-        return duplicates
+        self.jobs.run("查找近似重复", work, self.dataset_dir, radius, on_done=done)
     
     def export_zip(self):
         """导出ZIP"""
@@ -1845,39 +1697,40 @@ class AnalysisPanel(QWidget):
         if not output_file:
             return
         
-        try:
+        def work(job, dataset_dir, output_path):
             # 验证数据集格式
             from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
+            dataset_info = DatasetValidator.get_dataset_info(dataset_dir)
             
             if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"数据集格式不正确: {dataset_info['message']}")
-                return
+                raise ValueError(f"数据集格式不正确: {dataset_info['message']}")
             
             # 创建ZIP文件
-            success = self.create_zip_export(Path(output_file))
-            
+            return self.create_zip_export(job, output_path)
+        
+        def done(success):
             if success:
                 QMessageBox.information(self, "完成", "ZIP导出完成！")
                 self.result_text.setText(f"数据集已导出为ZIP\n文件位置: {output_file}")
             else:
                 QMessageBox.critical(self, "错误", "ZIP导出失败")
-                
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"导出失败: {str(e)}")
-            print(f"ZIP导出错误详情: {e}")  # 调试用
+        
+        self.jobs.run("ZIP导出", work, self.dataset_dir, Path(output_file), on_done=done)
     
-    def create_zip_export(self, output_file):
+    def create_zip_export(self, job, output_file):
         """创建ZIP导出"""
         import zipfile
         
+        files = [path for path in self.dataset_dir.rglob('*')
+                 if path.is_file() and path.resolve() != output_file.resolve()]
+        
         with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
             # 添加所有文件到ZIP
-            for root, dirs, files in self.dataset_dir.rglob('*'):
-                if root.is_file():
-                    # 计算相对路径
-                    arcname = root.relative_to(self.dataset_dir)
-                    zipf.write(root, arcname)
+            for i, path in enumerate(files):
+                job.set_progress(i, len(files), "压缩文件")
+                # 计算相对路径
+                arcname = path.relative_to(self.dataset_dir)
+                zipf.write(path, arcname)
         
         return True
     
@@ -1893,141 +1746,60 @@ class AnalysisPanel(QWidget):
         if not output_file:
             return
         
-        try:
+        def work(job, dataset_dir, fallback_format, output_path):
             # 验证数据集格式
             from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
+            dataset_info = DatasetValidator.get_dataset_info(dataset_dir)
             
             if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"数据集格式不正确: {dataset_info['message']}")
-                return
+                raise ValueError(f"数据集格式不正确: {dataset_info['message']}")
             
             # 解析数据集
-            from ..core.converter import PARSERS
-            detected_format = dataset_info["detected_format"] or self.format_combo.currentText()
-            parser = PARSERS[detected_format]
+            from ..core.converter import new_parser
+            detected_format = dataset_info["detected_format"] or fallback_format
+            parser = new_parser(detected_format)
             
             if hasattr(parser, "set_label_map"):
                 parser.set_label_map({})
             
-            annotations = parser.parse(self.dataset_dir)
-            
-            if not annotations:
-                QMessageBox.warning(self, "警告", "未找到有效的标注数据")
-                return
+            def annotations():
+                for i, ann in enumerate(parser.iter_parse(dataset_dir)):
+                    job.set_progress(i, 0, "写出图片与标注")
+                    yield ann
             
-            # 导出COCO格式
-            success = self.create_coco_export(annotations, Path(output_file))
-            
-            if success:
-                QMessageBox.information(self, "完成", "COCO格式导出完成！")
-                self.result_text.setText(f"数据集已导出为COCO格式\n文件位置: {output_file}")
-            else:
-                QMessageBox.critical(self, "错误", "COCO导出失败")
-                
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"导出失败: {str(e)}")
-            print(f"COCO导出错误详情: {e}")  # 调试用
+            # 导出COCO格式：边解析边写出
+            try:
+                exported = self.create_coco_export(annotations(), output_path)
+            except Exception:
+                output_path.unlink(missing_ok=True)  # 取消或失败时不留下不完整的文件
+                raise
+            if not exported:
+                output_path.unlink(missing_ok=True)
+                raise ValueError("未找到有效的标注数据")
+            return exported
+        
+        def done(exported):
+            QMessageBox.information(self, "完成", "COCO格式导出完成！")
+            self.result_text.setText(f"数据集已导出为COCO格式\n文件位置: {output_file}")
+        
+        self.jobs.run("COCO导出", work, self.dataset_dir, self.format_combo.currentText(), Path(output_file),
+                      on_done=done)
     
     def create_coco_export(self, annotations, output_file):
-        """创建COCO格式导出"""
-        import json
+        """创建COCO格式导出：annotations 可以是 iter_parse 的迭代器，单遍流式写出，返回导出的图片数"""
         from datetime import datetime
-        
-        # 创建COCO格式数据结构
-        coco_data = {
-            "info": {
-                "description": "Dataset exported by DataForge",
-                "version": "2.0",
-                "year": datetime.now().year,
-                "contributor": "DataForge",
-                "date_created": datetime.now().isoformat()
-            },
-            "licenses": [],
-            "images": [],
-            "annotations": [],
-            "categories": []
+        from ..core.coco_writer import COCOStreamWriter
+        
+        info = {
+            "description": "Dataset exported by DataForge",
+            "version": "2.0",
+            "year": datetime.now().year,
+            "contributor": "DataForge",
+            "date_created": datetime.now().isoformat()
         }
-        
-        # 收集所有类别
-        categories = set()
-        for ann in annotations:
-            for box in ann.boxes:
-                categories.add(box.label)
-            if ann.polygons:
-                for poly in ann.polygons:
-                    categories.add(poly.label)
-        
-        # 创建类别映射
-        category_map = {}
-        for i, cat_name in enumerate(sorted(categories)):
-            category_id = i + 1
-            category_map[cat_name] = category_id
-            coco_data["categories"].append({
-                "id": category_id,
-                "name": cat_name,
-                "supercategory": "object"
-            })
-        
-        # 处理图片和标注
-        annotation_id = 1
-        
-        for image_id, ann in enumerate(annotations, 1):
-            # 添加图片信息
-            coco_data["images"].append({
-                "id": image_id,
-                "width": ann.width,
-                "height": ann.height,
-                "file_name": ann.image_path.name
-            })
-            
-            # 添加边界框标注
-            for box in ann.boxes:
-                coco_data["annotations"].append({
-                    "id": annotation_id,
-                    "image_id": image_id,
-                    "category_id": category_map[box.label],
-                    "bbox": [box.xmin, box.ymin, box.xmax - box.xmin, box.ymax - box.ymin],
-                    "area": (box.xmax - box.xmin) * (box.ymax - box.ymin),
-                    "iscrowd": 0
-                })
-                annotation_id += 1
-            
-            # 添加分割标注
-            if ann.polygons:
-                for poly in ann.polygons:
-                    # 转换归一化坐标到像素坐标
-                    segmentation = []
-                    for i in range(0, len(poly.points), 2):
-                        if i + 1 < len(poly.points):
-                            x = poly.points[i] * ann.width
-                            y = poly.points[i + 1] * ann.height
-                            segmentation.extend([x, y])
-                    
-                    if len(segmentation) >= 6:  # 至少3个点
-                        # 计算边界框
-                        x_coords = segmentation[::2]
-                        y_coords = segmentation[1::2]
-                        bbox = [min(x_coords), min(y_coords), 
-                               max(x_coords) - min(x_coords), 
-                               max(y_coords) - min(y_coords)]
-                        
-                        coco_data["annotations"].append({
-                            "id": annotation_id,
-                            "image_id": image_id,
-                            "category_id": category_map[poly.label],
-                            "segmentation": [segmentation],
-                            "bbox": bbox,
-                            "area": bbox[2] * bbox[3],
-                            "iscrowd": 0
-                        })
-                        annotation_id += 1
-        
-        # 保存COCO文件
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(coco_data, f, indent=2, ensure_ascii=False)
-        
-        return True
+        with COCOStreamWriter(Path(output_file), info, supercategory="object") as coco:
+            coco.write_all(annotations)
+        return coco.num_images
     
     def export_yolo_config(self):
         """导出YOLO训练配置"""
@@ -2039,41 +1811,24 @@ class AnalysisPanel(QWidget):
         if not output_dir:
             return
         
-        try:
-            # 验证数据集格式
-            from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
-            
-            if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"数据集格式不正确: {dataset_info['message']}")
-                return
-            
+        def work(job, dataset_dir, fallback_format, output_path):
             # 解析数据集获取类别信息
-            from ..core.converter import PARSERS
-            detected_format = dataset_info["detected_format"] or self.format_combo.currentText()
-            parser = PARSERS[detected_format]
-            
-            if hasattr(parser, "set_label_map"):
-                parser.set_label_map({})
-            
-            annotations = parser.parse(self.dataset_dir)
-            
+            dataset_info, _, annotations = self._parse_dataset(job, dataset_dir, fallback_format)
             if not annotations:
-                QMessageBox.warning(self, "警告", "未找到有效的标注数据")
-                return
+                raise ValueError("未找到有效的标注数据")
             
             # 生成YOLO配置
-            success = self.create_yolo_config(annotations, dataset_info["statistics"], Path(output_dir))
-            
+            return self.create_yolo_config(annotations, dataset_info["statistics"], output_path)
+        
+        def done(success):
             if success:
                 QMessageBox.information(self, "完成", "YOLO训练配置生成完成！")
                 self.result_text.setText(f"YOLO训练配置已生成\n保存目录: {output_dir}")
             else:
                 QMessageBox.critical(self, "错误", "配置生成失败")
-                
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"生成失败: {str(e)}")
-            print(f"YOLO配置生成错误详情: {e}")  # 调试用
+        
+        self.jobs.run("YOLO配置生成", work, self.dataset_dir, self.format_combo.currentText(), Path(output_dir),
+                      on_done=done)
     
     def create_yolo_config(self, annotations, stats, output_dir):
         """创建YOLO训练配置"""
@@ -2201,37 +1956,22 @@ python train.py
         if not output_file:
             return
         
-        try:
-            # 验证数据集格式
-            from ..core.dataset_validator import DatasetValidator
-            dataset_info = DatasetValidator.get_dataset_info(self.dataset_dir)
-            
-            if not dataset_info["is_valid"]:
-                QMessageBox.critical(self, "错误", f"数据集格式不正确: {dataset_info['message']}")
-                return
-            
-            # 解析数据集
-            from ..core.converter import PARSERS
-            detected_format = dataset_info["detected_format"] or self.format_combo.currentText()
-            parser = PARSERS[detected_format]
-            
-            if hasattr(parser, "set_label_map"):
-                parser.set_label_map({})
-            
-            annotations = parser.parse(self.dataset_dir)
+        def work(job, dataset_dir, fallback_format, output_path):
+            dataset_info, _, annotations = self._parse_dataset(job, dataset_dir, fallback_format)
             
             # 生成报告
-            success = self.create_html_report(annotations, dataset_info, Path(output_file))
-            
+            job.set_progress(0, 0, "生成报告")
+            return self.create_html_report(annotations, dataset_info, output_path)
+        
+        def done(success):
             if success:
                 QMessageBox.information(self, "完成", "数据集报告生成完成！")
                 self.result_text.setText(f"数据集报告已生成\n文件位置: {output_file}")
             else:
                 QMessageBox.critical(self, "错误", "报告生成失败")
-                
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"生成失败: {str(e)}")
-            print(f"报告生成错误详情: {e}")  # 调试用
+        
+        self.jobs.run("报告生成", work, self.dataset_dir, self.format_combo.currentText(), Path(output_file),
+                      on_done=done)
     
     def create_html_report(self, annotations, dataset_info, output_file):
         """创建HTML报告"""
@@ -14,7 +14,7 @@ from PyQt5.QtWidgets import (
     QGridLayout,
 )
 
-from ..core.converter import convert
+from .widgets.job_status import JobStatusBar
 from ..utils.logger import get_logger
 from ..utils.label_utils import parse_label_map_txt
 
@@ -77,6 +77,10 @@ class ConverterPanel(QWidget):
             ("YOLO检测 → JSON", "yolo", "json"),
             ("JSON → YOLO检测", "json", "yolo"),
             ("JSON → VOC", "json", "voc"),
+            ("COCO → YOLO检测", "coco", "yolo"),
+            ("COCO → VOC", "coco", "voc"),
+            ("YOLO检测 → TFRecord", "yolo", "tfrecord"),
+            ("TFRecord → YOLO检测", "tfrecord", "yolo"),
         ])
         scroll_layout.addWidget(basic_group)
         
@@ -85,6 +89,7 @@ class ConverterPanel(QWidget):
             ("YOLO分割 → JSON", "yolo_seg", "json"),
             ("JSON → YOLO分割", "json", "yolo_seg"),
             ("YOLO分割 → YOLO检测", "yolo_seg", "yolo"),
+            ("COCO → JSON", "coco", "json"),
         ])
         scroll_layout.addWidget(seg_group)
 
@@ -96,6 +101,10 @@ class ConverterPanel(QWidget):
         scroll_area.setWidget(scroll_content)
         main_layout.addWidget(scroll_area)
 
+        # 后台任务进度 - 固定在底部
+        self.jobs = JobStatusBar()
+        main_layout.addWidget(self.jobs)
+
         # 日志输出 - 固定在底部
         self.log_view = QTextEdit()
         self.log_view.setReadOnly(True)
@@ -170,7 +179,9 @@ class ConverterPanel(QWidget):
             "yolo": "YOLO检测",
             "yolo_seg": "YOLO分割", 
             "voc": "VOC",
-            "json": "JSON"
+            "json": "JSON",
+            "coco": "COCO",
+            "tfrecord": "TFRecord"
         }
         
         inp_name = format_names.get(inp, inp.upper())
@@ -185,30 +196,42 @@ class ConverterPanel(QWidget):
         if not self.input_dir or not self.output_dir:
             QMessageBox.warning(self, "提示", "请先选择输入与输出目录")
             return
-        try:
-            format_names = {
-                "yolo": "YOLO检测",
-                "yolo_seg": "YOLO分割", 
-                "voc": "VOC",
-                "json": "JSON"
-            }
-            inp_name = format_names.get(self.input_fmt, self.input_fmt)
-            outp_name = format_names.get(self.output_fmt, self.output_fmt)
-            
-            self.append_log(f"开始转换: {inp_name} → {outp_name}")
-            if self.output_fmt == "json":
-                self.append_log("导出说明：将为每张图片生成一个独立的 JSON 文件，命名为 <stem>.json")
-            elif self.input_fmt == "yolo_seg":
-                self.append_log("输入说明：YOLO分割格式支持矩形框(5个值)和多边形(>5个值)混合标注")
-            elif self.output_fmt == "yolo_seg":
-                self.append_log("输出说明：YOLO分割格式将保留原有的矩形框和多边形标注")
-                
-            convert(self.input_dir, self.input_fmt, self.output_dir, self.output_fmt, label_map=self.label_map)
+        format_names = {
+            "yolo": "YOLO检测",
+            "yolo_seg": "YOLO分割", 
+            "voc": "VOC",
+            "json": "JSON",
+            "coco": "COCO",
+            "tfrecord": "TFRecord"
+        }
+        inp_name = format_names.get(self.input_fmt, self.input_fmt)
+        outp_name = format_names.get(self.output_fmt, self.output_fmt)
+        
+        self.append_log(f"开始转换: {inp_name} → {outp_name}")
+        if self.output_fmt == "json":
+            self.append_log("导出说明：将为每张图片生成一个独立的 JSON 文件，命名为 <stem>.json")
+        elif self.input_fmt == "yolo_seg":
+            self.append_log("输入说明：YOLO分割格式支持矩形框(5个值)和多边形(>5个值)混合标注")
+        elif self.output_fmt == "yolo_seg":
+            self.append_log("输出说明：YOLO分割格式将保留原有的矩形框和多边形标注")
+
+        def work(job, input_dir, input_fmt, output_dir, output_fmt, label_map):
+            from ..core.converter import convert  # 转换时才加载解析器及其依赖
+            convert(input_dir, input_fmt, output_dir, output_fmt, label_map=label_map,
+                    progress=lambda count: job.set_progress(count, 0, "已处理图片"))
+
+        def done(_):
             self.append_log("转换完成")
             QMessageBox.information(self, "完成", "转换完成！")
-        except Exception as e:
-            self.append_log(f"发生错误: {e}")
-            QMessageBox.critical(self, "错误", str(e))
+
+        def failed(message):
+            self.append_log(f"发生错误: {message}")
+            QMessageBox.critical(self, "错误", message)
+
+        job = self.jobs.run("转换", work, self.input_dir, self.input_fmt, self.output_dir, self.output_fmt,
+                            dict(self.label_map), on_done=done, on_error=failed)
+        if job is not None:
+            job.cancelled.connect(lambda: self.append_log("转换已取消"))
 
     def on_load_label_map(self):
         fp, _ = QFileDialog.getOpenFileName(self, "选择标签字典 txt", str(Path.cwd()), "Text Files (*.txt)")
@@ -4,8 +4,6 @@ from PyQt5.QtCore import QSize
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem, QFrame
 
-from .main_window import MainWindow
-
 
 class HomeWindow(QMainWindow):
     def __init__(self):
@@ -57,31 +55,25 @@ class HomeWindow(QMainWindow):
         outer.addWidget(sep)
 
         # 右侧内容区
-        from .converter_panel import ConverterPanel
-        from .splitting_panel import SplittingPanel
-        from .analysis_panel import AnalysisPanel
-        from .settings_panel import SettingsPanel
-        from .search_panel import SearchPanel
-        
         self.content = QWidget()
         content_layout = QVBoxLayout(self.content)
         content_layout.setContentsMargins(16, 16, 16, 16)
-        
-        # 初始化所有面板
-        self.converter_panel = ConverterPanel(self)
-        self.splitting_panel = SplittingPanel(self)
-        self.analysis_panel = AnalysisPanel(self)
-        self.settings_panel = SettingsPanel(self)
-        self.search_panel = SearchPanel(self)
-        self.visualization_panel = self.create_visualization_panel()
-        
-        content_layout.addWidget(self.converter_panel)
         outer.addWidget(self.content)
         
+        # 面板在对应菜单项第一次被选中时才创建（各面板模块及其依赖也在此时导入）
+        self._panel_factories = [
+            self.create_converter_panel,
+            self.create_splitting_panel,
+            self.create_analysis_panel,
+            self.create_visualization_panel,
+            self.create_search_panel,
+            self.create_settings_panel,
+        ]
+        self._panels = {}
+        
         # 连接主题管理器信号
         from .theme_manager import theme_manager
         theme_manager.theme_changed.connect(self.apply_theme)
-        self.settings_panel.settings_changed.connect(self.apply_theme)
 
         # 切换逻辑
         self.menu.currentRowChanged.connect(self.on_menu_change)
@@ -90,6 +82,39 @@ class HomeWindow(QMainWindow):
         # 在所有组件初始化完成后应用主题
         self.apply_theme()
 
+    def panel(self, idx: int) -> QWidget:
+        """返回第 idx 个菜单项的面板，第一次访问时创建"""
+        widget = self._panels.get(idx)
+        if widget is None:
+            widget = self._panels[idx] = self._panel_factories[idx]()
+        return widget
+
+    def create_converter_panel(self) -> QWidget:
+        from .converter_panel import ConverterPanel
+        self.converter_panel = ConverterPanel(self)
+        return self.converter_panel
+
+    def create_splitting_panel(self) -> QWidget:
+        from .splitting_panel import SplittingPanel
+        self.splitting_panel = SplittingPanel(self)
+        return self.splitting_panel
+
+    def create_analysis_panel(self) -> QWidget:
+        from .analysis_panel import AnalysisPanel
+        self.analysis_panel = AnalysisPanel(self)
+        return self.analysis_panel
+
+    def create_search_panel(self) -> QWidget:
+        from .search_panel import SearchPanel
+        self.search_panel = SearchPanel(self)
+        return self.search_panel
+
+    def create_settings_panel(self) -> QWidget:
+        from .settings_panel import SettingsPanel
+        self.settings_panel = SettingsPanel(self)
+        self.settings_panel.settings_changed.connect(self.apply_theme)
+        return self.settings_panel
+
     def on_menu_change(self, idx: int):
         # 清空右侧内容
         for i in range(self.content.layout().count()):
@@ -97,19 +122,9 @@ class HomeWindow(QMainWindow):
             if item and item.widget():
                 item.widget().setParent(None)
         
-        # 根据选择显示对应面板
-        if idx == 0:  # 数据集格式转换
-            self.content.layout().addWidget(self.converter_panel)
-        elif idx == 1:  # 数据集划分
-            self.content.layout().addWidget(self.splitting_panel)
-        elif idx == 2:  # 数据集分析
-            self.content.layout().addWidget(self.analysis_panel)
-        elif idx == 3:  # 数据可视化
-            self.content.layout().addWidget(self.visualization_panel)
-        elif idx == 4:  # 数据搜索
-            self.content.layout().addWidget(self.search_panel)
-        elif idx == 5:  # 设置
-            self.content.layout().addWidget(self.settings_panel)
+        # 根据选择显示对应面板：0 格式转换 / 1 划分 / 2 分析 / 3 可视化 / 4 搜索 / 5 设置
+        if 0 <= idx < len(self._panel_factories):
+            self.content.layout().addWidget(self.panel(idx))
         else:
             placeholder = QWidget()
             ph_layout = QVBoxLayout(placeholder)
@@ -246,8 +261,8 @@ class HomeWindow(QMainWindow):
             self.viz_dataset_dir = Path(directory)
             self.viz_dataset_label.setText(f"数据集: {directory}")
             
-            from ..core.converter import PARSERS
-            parser = PARSERS[format_name]
+            from ..core.converter import new_parser
+            parser = new_parser(format_name)
             
             # 如果解析器支持标签映射，设置空映射避免错误
             if hasattr(parser, "set_label_map"):
@@ -366,3 +381,19 @@ class HomeWindow(QMainWindow):
         finally:
             self.setUpdatesEnabled(True)
             self.update()  # 强制重绘
+    
+    def closeEvent(self, event):
+        """关闭窗口时取消后台任务，并等待正在写文件的任务退出"""
+        from .jobs import get_job_runner
+        
+        runner = get_job_runner()
+        if runner.active_jobs():
+            from PyQt5.QtWidgets import QMessageBox
+            reply = QMessageBox.question(self, "确认退出", "还有任务正在进行，退出将取消这些任务。是否退出？",
+                                         QMessageBox.Yes | QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                event.ignore()
+                return
+            runner.cancel_all()
+            runner.wait(10000)
+        super().closeEvent(event)
@@ -0,0 +1,174 @@
+"""
+后台任务
+
+耗时操作（解析、分析、复制文件、导出）在 QThreadPool 的工作线程中执行，界面保持响应：
+    - 任务函数的第一个参数为 Job，用于报告进度、输出日志和检查取消
+    - 取消是协作式的：任务在循环中调用 job.set_progress() / job.check_cancelled()，
+      收到取消请求后抛出 JobCancelled 退出；排队中的任务直接移出队列
+    - 结果、异常与进度通过信号回到界面线程，任务函数中不能直接操作控件
+    - 互不相关的任务可同时运行，超过 max_jobs 的任务排队；
+      CPU 密集的部分仍由各核心模块的进程池（core/parallel.py）完成
+"""
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+DEFAULT_MAX_JOBS = 4  # 同时运行的任务数
+PROGRESS_INTERVAL = 0.1  # 进度信号的最小间隔（秒），避免大量信号阻塞事件循环
+
+QUEUED, RUNNING, FINISHED, FAILED, CANCELLED = "queued", "running", "finished", "failed", "cancelled"
+
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+
+class Job(QObject):
+    """一个后台任务；信号在界面线程中接收"""
+
+    started = pyqtSignal()
+    progress_changed = pyqtSignal(int, int, str)  # 已完成, 总数（0 表示未知）, 说明
+    message_logged = pyqtSignal(str)
+    finished = pyqtSignal(object)  # 任务函数的返回值
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    done = pyqtSignal()  # 以上三种结束方式之后都会发出
+
+    def __init__(self, job_id: int, name: str, func: Callable, args: tuple, kwargs: dict):
+        super().__init__()
+        self.id = job_id
+        self.name = name
+        self.state = QUEUED
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._cancel_event = threading.Event()
+        self._last_progress = 0.0
+
+    # ---- 任务函数中调用（工作线程） ----
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self) -> None:
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def set_progress(self, done: int, total: int = 0, message: str = "") -> None:
+        """报告进度并检查取消；短时间内的多次调用只发出一次信号"""
+        self.check_cancelled()
+        now = time.monotonic()
+        if (total <= 0 or done < total) and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        self.progress_changed.emit(int(done), int(total), message)
+
+    def log(self, message: str) -> None:
+        self.message_logged.emit(message)
+
+    # ---- 界面线程调用 ----
+
+    def cancel(self) -> None:
+        """请求取消：运行中的任务在下一次检查时退出"""
+        self._cancel_event.set()
+
+    @property
+    def active(self) -> bool:
+        return self.state in (QUEUED, RUNNING)
+
+    def _run(self) -> None:
+        if self._cancel_event.is_set():
+            self._finish(CANCELLED)
+            return
+        self.state = RUNNING
+        self.started.emit()
+        try:
+            result = self._func(self, *self._args, **self._kwargs)
+        except JobCancelled:
+            self._finish(CANCELLED)
+        except Exception as e:
+            print(f"{self.name}错误详情: {e}")  # 调试用
+            self._finish(FAILED, str(e))
+        else:
+            self._finish(FINISHED, result)
+
+    def _finish(self, state: str, payload=None) -> None:
+        self.state = state
+        if state == FINISHED:
+            self.finished.emit(payload)
+        elif state == FAILED:
+            self.failed.emit(payload)
+        else:
+            self.cancelled.emit()
+        self.done.emit()
+
+
+class _JobRunnable(QRunnable):
+    def __init__(self, job: Job):
+        super().__init__()
+        self.setAutoDelete(False)  # 由 JobRunner 持有引用，任务结束后释放
+        self.job = job
+
+    def run(self):
+        self.job._run()
+
+
+class JobRunner(QObject):
+    """任务队列：提交、取消与跟踪后台任务"""
+
+    job_added = pyqtSignal(object)
+    job_done = pyqtSignal(object)
+
+    def __init__(self, max_jobs: int = DEFAULT_MAX_JOBS):
+        super().__init__()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max(1, int(max_jobs)))
+        self._ids = itertools.count(1)
+        self._runnables: Dict[int, _JobRunnable] = {}
+
+    def submit(self, name: str, func: Callable, *args, **kwargs) -> Job:
+        """在后台执行 func(job, *args, **kwargs)，返回 Job（连接其信号获取进度与结果）"""
+        job = Job(next(self._ids), name, func, args, kwargs)
+        runnable = _JobRunnable(job)
+        self._runnables[job.id] = runnable
+        job.done.connect(lambda: self._on_done(job))
+        self.job_added.emit(job)
+        self.pool.start(runnable)
+        return job
+
+    def cancel(self, job: Job) -> None:
+        job.cancel()
+        runnable = self._runnables.get(job.id)
+        # 尚未开始的任务直接移出队列
+        if runnable is not None and job.state == QUEUED and self.pool.tryTake(runnable):
+            job._finish(CANCELLED)
+
+    def cancel_all(self) -> None:
+        for job in self.active_jobs():
+            self.cancel(job)
+
+    def active_jobs(self) -> List[Job]:
+        return [r.job for r in self._runnables.values() if r.job.active]
+
+    def wait(self, msecs: int = -1) -> bool:
+        """等待所有任务结束（退出程序前调用）"""
+        return self.pool.waitForDone(msecs)
+
+    def _on_done(self, job: Job) -> None:
+        self._runnables.pop(job.id, None)
+        self.job_done.emit(job)
+
+
+_runner: Optional[JobRunner] = None
+
+
+def get_job_runner() -> JobRunner:
+    """进程内共享的任务队列（首次使用时创建）"""
+    global _runner
+    if _runner is None:
+        _runner = JobRunner()
+    return _runner
@@ -12,7 +12,7 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt
 
 from ..core.base_parser import ImageAnnotation
-from ..core.converter import PARSERS
+from ..core.converter import new_parser
 
 
 class SearchPanel(QWidget):
@@ -202,7 +202,7 @@ class SearchPanel(QWidget):
                 format_name = self.format_combo.currentText()
             
             # 解析数据集
-            parser = PARSERS[format_name]
+            parser = new_parser(format_name)
             
             # 如果解析器支持标签映射，设置空映射避免错误
             if hasattr(parser, "set_label_map"):
@@ -328,7 +328,7 @@ class SearchPanel(QWidget):
             return
         
         try:
-            from ..core.converter import PARSERS
+            from ..core.converter import new_parser
             
             # 获取当前格式
             format_name = self.format_combo.currentText()
@@ -354,7 +354,7 @@ class SearchPanel(QWidget):
                     copied_images += 1
             
             # 导出标签
-            exporter = PARSERS[format_name]
+            exporter = new_parser(format_name)
             if hasattr(exporter, "set_label_map"):
                 exporter.set_label_map({})
             
@@ -402,26 +402,12 @@ filtered_dataset/
         
         try:
             # 统计信息
-            total_images = len(self.filtered_annotations)
-            total_boxes = sum(len(ann.boxes) for ann in self.filtered_annotations)
-            total_polygons = sum(len(ann.polygons) if ann.polygons else 0 for ann in self.filtered_annotations)
-            
-            # 类别统计
-            class_counts = {}
-            for ann in self.filtered_annotations:
-                for box in ann.boxes:
-                    class_counts[box.label] = class_counts.get(box.label, 0) + 1
-                if ann.polygons:
-                    for poly in ann.polygons:
-                        class_counts[poly.label] = class_counts.get(poly.label, 0) + 1
-            
-            # 尺寸统计
-            widths = [ann.width for ann in self.filtered_annotations if ann.width > 0]
-            heights = [ann.height for ann in self.filtered_annotations if ann.height > 0]
-            
-            # 标注数量统计
-            annotations_per_image = [len(ann.boxes) + (len(ann.polygons) if ann.polygons else 0) 
-                                   for ann in self.filtered_annotations]
+            from ..core.stats_engine import collect_stats
+            stats = collect_stats(self.filtered_annotations, histograms=False)
+            total_images = stats.total_images
+            total_boxes = stats.total_boxes
+            total_polygons = stats.total_polygons
+            class_counts = stats.class_counts
             
             # 生成详细报告
             report = f"DataForge 数据集统计报告\n"
@@ -437,22 +423,22 @@ filtered_dataset/
             report += f"多边形总数: {total_polygons:,}\n"
             report += f"类别数量: {len(class_counts)}\n\n"
             
-            if widths and heights:
-                import statistics
+            size_stats = stats.image_size_stats()
+            if size_stats:
                 report += f"图片尺寸统计:\n"
                 report += f"-" * 20 + "\n"
-                report += f"平均宽度: {statistics.mean(widths):.1f} 像素\n"
-                report += f"平均高度: {statistics.mean(heights):.1f} 像素\n"
-                report += f"最大尺寸: {max(widths)} x {max(heights)}\n"
-                report += f"最小尺寸: {min(widths)} x {min(heights)}\n\n"
+                report += f"平均宽度: {size_stats['avg_width']:.1f} 像素\n"
+                report += f"平均高度: {size_stats['avg_height']:.1f} 像素\n"
+                report += f"最大尺寸: {size_stats['max_width']} x {size_stats['max_height']}\n"
+                report += f"最小尺寸: {size_stats['min_width']} x {size_stats['min_height']}\n\n"
             
-            if annotations_per_image:
-                import statistics
+            annotation_stats = stats.annotation_stats()
+            if annotation_stats:
                 report += f"标注密度统计:\n"
                 report += f"-" * 20 + "\n"
-                report += f"平均每图标注数: {statistics.mean(annotations_per_image):.2f}\n"
-                report += f"最多标注数: {max(annotations_per_image)}\n"
-                report += f"最少标注数: {min(annotations_per_image)}\n\n"
+                report += f"平均每图标注数: {annotation_stats['avg_per_image']:.2f}\n"
+                report += f"最多标注数: {annotation_stats['max_per_image']}\n"
+                report += f"最少标注数: {annotation_stats['min_per_image']}\n\n"
             
             report += f"类别分布:\n"
             report += f"-" * 20 + "\n"
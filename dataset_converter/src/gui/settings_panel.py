@@ -1,6 +1,8 @@
 """
 设置面板
 """
+import os
+
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, 
     QComboBox, QGroupBox, QCheckBox, QSpinBox, QSlider,
@@ -11,6 +13,8 @@ from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QFont, QColor, QPalette
 
 from .theme_manager import theme_manager
+from ..core.parallel import DEFAULT_CHUNK_SIZE
+from ..utils.metadata_cache import configure_metadata_cache
 
 
 class SettingsPanel(QWidget):
@@ -303,15 +307,28 @@ class SettingsPanel(QWidget):
         
         performance_layout.addWidget(QLabel("线程数量:"), 1, 0)
         self.thread_count_spin = QSpinBox()
-        self.thread_count_spin.setRange(1, 16)
-        self.thread_count_spin.setValue(4)
+        cpu_count = os.cpu_count() or 1
+        self.thread_count_spin.setRange(1, max(16, cpu_count))
+        self.thread_count_spin.setValue(cpu_count)
         performance_layout.addWidget(self.thread_count_spin, 1, 1)
         
-        performance_layout.addWidget(QLabel("内存缓存大小(MB):"), 2, 0)
+        performance_layout.addWidget(QLabel("解析分块大小:"), 2, 0)
+        self.chunk_size_spin = QSpinBox()
+        self.chunk_size_spin.setRange(16, 8192)
+        self.chunk_size_spin.setValue(DEFAULT_CHUNK_SIZE)
+        performance_layout.addWidget(self.chunk_size_spin, 2, 1)
+        
+        performance_layout.addWidget(QLabel("内存缓存大小(MB):"), 3, 0)
         self.cache_size_spin = QSpinBox()
         self.cache_size_spin.setRange(64, 2048)
         self.cache_size_spin.setValue(256)
-        performance_layout.addWidget(self.cache_size_spin, 2, 1)
+        performance_layout.addWidget(self.cache_size_spin, 3, 1)
+        
+        performance_layout.addWidget(QLabel("图片元数据缓存:"), 4, 0)
+        self.metadata_cache_check = QCheckBox()
+        self.metadata_cache_check.setChecked(True)
+        self.metadata_cache_check.setToolTip("缓存图片尺寸与哈希，文件未变化时重复分析无需重新读取图片")
+        performance_layout.addWidget(self.metadata_cache_check, 4, 1)
         
         layout.addWidget(performance_group)
         
@@ -449,6 +466,12 @@ class SettingsPanel(QWidget):
             opacity = self.opacity_slider.value() / 100.0
             self.parent().setWindowOpacity(opacity)
         
+        # 应用并行解析设置
+        from ..core.converter import set_parallel_options
+        workers = self.thread_count_spin.value() if self.multithread_check.isChecked() else 1
+        set_parallel_options(workers, self.chunk_size_spin.value())
+        configure_metadata_cache(enabled=self.metadata_cache_check.isChecked())
+        
         self.settings_changed.emit()
         QMessageBox.information(self, "设置", "设置已应用！")
     
@@ -13,13 +13,15 @@ from PyQt5.QtWidgets import (
     QMessageBox,
     QSpinBox,
     QLineEdit,
-    QProgressBar,
     QScrollArea,
     QGroupBox,
     QGridLayout,
     QCheckBox,
 )
 
+from .widgets.job_status import JobStatusBar
+from ..core.dataset_index import DatasetIndex
+
 
 class SplittingPanel(QWidget):
     def __init__(self, parent=None):
@@ -125,11 +127,9 @@ class SplittingPanel(QWidget):
         scroll_area.setWidget(scroll_content)
         main_layout.addWidget(scroll_area)
 
-        # 进度条 - 固定在底部
-        self.progress = QProgressBar()
-        self.progress.setMinimum(0)
-        self.progress.setMaximum(100)
-        main_layout.addWidget(self.progress)
+        # 后台任务进度 - 固定在底部
+        self.jobs = JobStatusBar()
+        main_layout.addWidget(self.jobs)
         
         # 日志输出 - 固定在底部
         self.log_view = QTextEdit()
@@ -144,6 +144,7 @@ class SplittingPanel(QWidget):
         self.output_dir = None
         self.is_standard_structure = False
         self.current_split_info = {}
+        self.dataset_index = None
 
         # 比例联动：前两个改变，第三个自动补齐为 100 - 前两者
         self.train_ratio.valueChanged.connect(self.on_ratio_change)
@@ -151,6 +152,9 @@ class SplittingPanel(QWidget):
         self.on_ratio_change()
 
     def choose_input(self):
+        if self.jobs.is_busy():
+            QMessageBox.information(self, "提示", "正在划分数据集，请等待完成或取消后再切换")
+            return
         d = QFileDialog.getExistingDirectory(self, "选择数据集目录", str(Path.cwd()))
         if d:
             self.input_dir = Path(d)
@@ -172,19 +176,17 @@ class SplittingPanel(QWidget):
         )
         
         if self.is_standard_structure:
-            # 分析各子集的数据量
+            # 分析各子集的数据量（每个子集目录扫描一次并缓存索引，包含嵌套目录中的图片）
             subsets = ["train", "test", "val"]
+            self.dataset_index = DatasetIndex.build(self.input_dir, recursive=True)
             self.current_split_info = {}
             total_images = 0
             
             for subset in subsets:
-                img_subset_dir = images_dir / subset
-                if img_subset_dir.exists():
-                    imgs = self._gather_images(img_subset_dir)
-                    self.current_split_info[subset] = len(imgs)
-                    total_images += len(imgs)
-                else:
-                    self.current_split_info[subset] = 0
+                sub_index = self.dataset_index.subsets.get(subset)
+                count = len(sub_index.image_files) if sub_index else 0
+                self.current_split_info[subset] = count
+                total_images += count
             
             # 计算当前比例
             if total_images > 0:
@@ -206,6 +208,7 @@ class SplittingPanel(QWidget):
                 self.resplit_checkbox.setEnabled(False)
         else:
             # 非标准结构，统计总图片数
+            self.dataset_index = None
             imgs = self._gather_images(self.input_dir)
             status_text = f"检测到非标准目录结构数据集\n总计: {len(imgs)} 张图片\n将按传统方式进行首次划分"
             self.resplit_checkbox.setEnabled(False)
@@ -215,6 +218,9 @@ class SplittingPanel(QWidget):
         self._append_log(f"数据集分析完成: {status_text.replace(chr(10), ' ')}")
 
     def choose_output(self):
+        if self.jobs.is_busy():
+            QMessageBox.information(self, "提示", "正在划分数据集，请等待完成或取消后再切换")
+            return
         d = QFileDialog.getExistingDirectory(self, "选择输出目录", str(Path.cwd()))
         if d:
             self.output_dir = Path(d)
@@ -223,15 +229,11 @@ class SplittingPanel(QWidget):
     def _gather_images_from_standard_structure(self):
         """从标准目录结构中收集所有图片"""
         all_images = []
-        images_dir = self.input_dir / "images"
         
         for subset in ["train", "test", "val"]:
-            subset_dir = images_dir / subset
-            if subset_dir.exists():
-                imgs = self._gather_images(subset_dir)
-                # 为每个图片添加原始子集信息（用于调试）
-                for img in imgs:
-                    all_images.append(img)
+            sub_index = self.dataset_index.subsets.get(subset)
+            if sub_index:
+                all_images.extend(sub_index.image_files)
         
         return all_images
 
@@ -241,6 +243,11 @@ class SplittingPanel(QWidget):
         images_root = self.input_dir / "images"
         rel_path = img_path.relative_to(images_root)
         
+        # 已索引子集中的图片（含嵌套目录）从目录索引中查找（.txt > .json > .xml）
+        sub_index = self.dataset_index.subsets.get(rel_path.parts[0]) if self.dataset_index is not None else None
+        if sub_index is not None:
+            return sub_index.label_for(sub_index.image_key(img_path))
+        
         # 构造对应的标签路径
         label_base = labels_root / rel_path.parent / img_path.stem
         
@@ -281,48 +288,19 @@ class SplittingPanel(QWidget):
 
     def _validate_standard_structure(self):
         """验证标准目录结构数据集"""
-        images_dir = self.input_dir / "images"
-        labels_dir = self.input_dir / "labels"
+        self.dataset_index = DatasetIndex.build(self.input_dir, recursive=True)
         
         total_images = 0
         total_labels = 0
         missing_labels = []
         orphan_labels = []
         
-        # 检查每个子集
-        for subset in ["train", "test", "val"]:
-            img_subset_dir = images_dir / subset
-            label_subset_dir = labels_dir / subset
-            
-            if img_subset_dir.exists():
-                imgs = self._gather_images(img_subset_dir)
-                total_images += len(imgs)
-                
-                # 检查对应的标签
-                for img in imgs:
-                    label_path = self._find_corresponding_label(img, labels_dir)
-                    if not label_path:
-                        missing_labels.append(img)
-            
-            if label_subset_dir.exists():
-                label_exts = {".txt", ".json", ".xml"}
-                labels = [p for p in label_subset_dir.rglob("*") if p.suffix.lower() in label_exts]
-                total_labels += len(labels)
-                
-                # 检查孤立的标签
-                for label in labels:
-                    # 构造对应的图片路径
-                    rel_path = label.relative_to(labels_dir)
-                    img_base = images_dir / rel_path.parent / label.stem
-                    
-                    found_img = False
-                    for ext in [".jpg", ".jpeg", ".png", ".bmp"]:
-                        if (img_base.with_suffix(ext)).exists():
-                            found_img = True
-                            break
-                    
-                    if not found_img:
-                        orphan_labels.append(label)
+        # 检查每个子集：配对与孤立文件由目录索引一次得出
+        for sub_index in self.dataset_index.subsets.values():
+            total_images += len(sub_index.image_files)
+            total_labels += len(sub_index.label_files)
+            missing_labels.extend(sub_index.orphan_images)
+            orphan_labels.extend(sub_index.orphan_labels)
         
         self._append_log(f"标准结构验证结果：总图片数={total_images}，总标签数={total_labels}")
         self._append_log(f"缺少标签的图片：{len(missing_labels)}；没有对应图片的标签：{len(orphan_labels)}")
@@ -442,121 +420,123 @@ class SplittingPanel(QWidget):
                 QMessageBox.warning(self, "提示", "比例总和必须为 100")
                 return
 
+        # 随机种子（可复现）
+        seed = None
+        seed_text = (self.seed_edit.text() or "").strip()
+        if seed_text:
+            try:
+                seed = int(seed_text)
+                self._append_log(f"使用随机种子：{seed}")
+            except ValueError:
+                self._append_log("随机种子无效，使用默认随机")
+
         if self.is_standard_structure and self.resplit_checkbox.isChecked():
             # 重新划分标准结构数据集
-            self._resplit_standard_dataset(tr, vr, te)
-        else:
-            # 传统方式划分
-            self._split_traditional_dataset(tr, vr, te)
-
-    def _resplit_standard_dataset(self, train_ratio, val_ratio, test_ratio):
-        """重新划分标准结构数据集"""
-        try:
-            # 收集所有图片
-            all_images = self._gather_images_from_standard_structure()
-            if not all_images:
-                QMessageBox.warning(self, "提示", "未在数据集中发现图片文件")
-                return
+            def failed(message):
+                self._append_log(f"重新划分失败: {message}")
+                QMessageBox.critical(self, "错误", f"重新划分失败: {message}")
 
-            self._append_log(f"开始重新划分标准结构数据集...")
-            self._append_log(f"原始划分: 训练集 {self.current_split_info.get('train', 0)} 张, "
-                           f"测试集 {self.current_split_info.get('test', 0)} 张, "
-                           f"验证集 {self.current_split_info.get('val', 0)} 张")
-            self._append_log(f"目标比例: {train_ratio}% : {val_ratio}% : {test_ratio}%")
-            
-            # 设置随机种子
-            seed_text = (self.seed_edit.text() or "").strip()
-            if seed_text:
-                try:
-                    seed = int(seed_text)
-                    random.seed(seed)
-                    self._append_log(f"使用随机种子：{seed}")
-                except ValueError:
-                    self._append_log("随机种子无效，使用默认随机")
-            
-            # 打乱所有图片
-            random.shuffle(all_images)
-            
-            # 计算新的数量分配
-            n = len(all_images)
-            n_train = int(n * train_ratio / 100)
-            n_val = int(n * val_ratio / 100)
-            n_test = n - n_train - n_val
+            self.jobs.run("数据集划分", self._resplit_standard_dataset, tr, vr, te, seed,
+                          on_done=lambda _: QMessageBox.information(self, "完成", "数据集重新划分完成！"),
+                          on_error=failed, on_log=self._append_log)
+        else:
+            # 传统方式划分：先在后台扫描，确认后再复制
+            self.jobs.run("扫描数据集", self._scan_traditional_dataset,
+                          on_done=lambda scan: self._confirm_traditional_split(scan, tr, vr, te, seed))
+
+    def _resplit_standard_dataset(self, job, train_ratio, val_ratio, test_ratio, seed):
+        """工作线程：重新划分标准结构数据集"""
+        # 收集所有图片（重新扫描，保证与磁盘一致）
+        job.set_progress(0, 0, "扫描数据集")
+        self.dataset_index = DatasetIndex.build(self.input_dir, recursive=True)
+        all_images = self._gather_images_from_standard_structure()
+        if not all_images:
+            raise ValueError("未在数据集中发现图片文件")
+
+        job.log(f"开始重新划分标准结构数据集...")
+        job.log(f"原始划分: 训练集 {self.current_split_info.get('train', 0)} 张, "
+                f"测试集 {self.current_split_info.get('test', 0)} 张, "
+                f"验证集 {self.current_split_info.get('val', 0)} 张")
+        job.log(f"目标比例: {train_ratio}% : {val_ratio}% : {test_ratio}%")
+        
+        # 打乱所有图片（独立的随机数生成器，与同一种子的 random.seed + random.shuffle 结果相同）
+        random.Random(seed).shuffle(all_images)
+        
+        # 计算新的数量分配
+        n = len(all_images)
+        n_train = int(n * train_ratio / 100)
+        n_val = int(n * val_ratio / 100)
+        n_test = n - n_train - n_val
+        
+        job.log(f"新划分: 训练集 {n_train} 张, 验证集 {n_val} 张, 测试集 {n_test} 张")
+        
+        # 创建输出目录结构
+        output_images_dir = self.output_dir / "images"
+        output_labels_dir = self.output_dir / "labels"
+        
+        for subset in ["train", "val", "test"]:
+            (output_images_dir / subset).mkdir(parents=True, exist_ok=True)
+            (output_labels_dir / subset).mkdir(parents=True, exist_ok=True)
+        
+        # 复制文件到新的划分
+        labels_root = self.input_dir / "labels"
+        
+        for i, img in enumerate(all_images):
+            # 更新进度（同时响应取消）
+            job.set_progress(i, n, "复制文件")
             
-            self._append_log(f"新划分: 训练集 {n_train} 张, 验证集 {n_val} 张, 测试集 {n_test} 张")
+            # 确定目标子集
+            if i < n_train:
+                target_subset = "train"
+            elif i < n_train + n_val:
+                target_subset = "val"
+            else:
+                target_subset = "test"
             
-            # 创建输出目录结构
-            output_images_dir = self.output_dir / "images"
-            output_labels_dir = self.output_dir / "labels"
+            # 复制图片
+            target_img_dir = output_images_dir / target_subset
+            target_img_path = target_img_dir / img.name
             
-            for subset in ["train", "val", "test"]:
-                (output_images_dir / subset).mkdir(parents=True, exist_ok=True)
-                (output_labels_dir / subset).mkdir(parents=True, exist_ok=True)
+            # 处理同名文件
+            if target_img_path.exists():
+                base = img.stem
+                suffix = img.suffix
+                k = 1
+                while True:
+                    candidate = target_img_dir / f"{base}_{k}{suffix}"
+                    if not candidate.exists():
+                        target_img_path = candidate
+                        break
+                    k += 1
             
-            # 复制文件到新的划分
-            labels_root = self.input_dir / "labels"
+            shutil.copy2(img, target_img_path)
             
-            for i, img in enumerate(all_images):
-                # 确定目标子集
-                if i < n_train:
-                    target_subset = "train"
-                elif i < n_train + n_val:
-                    target_subset = "val"
-                else:
-                    target_subset = "test"
+            # 复制对应的标签文件
+            label_path = self._find_corresponding_label(img, labels_root)
+            if label_path:
+                target_label_dir = output_labels_dir / target_subset
+                target_label_path = target_label_dir / label_path.name
                 
-                # 复制图片
-                target_img_dir = output_images_dir / target_subset
-                target_img_path = target_img_dir / img.name
-                
-                # 处理同名文件
-                if target_img_path.exists():
-                    base = img.stem
-                    suffix = img.suffix
+                # 处理同名标签文件
+                if target_label_path.exists():
+                    base = label_path.stem
+                    suffix = label_path.suffix
                     k = 1
                     while True:
-                        candidate = target_img_dir / f"{base}_{k}{suffix}"
+                        candidate = target_label_dir / f"{base}_{k}{suffix}"
                         if not candidate.exists():
-                            target_img_path = candidate
+                            target_label_path = candidate
                             break
                         k += 1
                 
-                shutil.copy2(img, target_img_path)
-                
-                # 复制对应的标签文件
-                label_path = self._find_corresponding_label(img, labels_root)
-                if label_path:
-                    target_label_dir = output_labels_dir / target_subset
-                    target_label_path = target_label_dir / label_path.name
-                    
-                    # 处理同名标签文件
-                    if target_label_path.exists():
-                        base = label_path.stem
-                        suffix = label_path.suffix
-                        k = 1
-                        while True:
-                            candidate = target_label_dir / f"{base}_{k}{suffix}"
-                            if not candidate.exists():
-                                target_label_path = candidate
-                                break
-                            k += 1
-                    
-                    shutil.copy2(label_path, target_label_path)
-                
-                # 更新进度
-                progress = int((i + 1) * 100 / len(all_images))
-                self.progress.setValue(progress)
-            
-            self._append_log(f"重新划分完成！输出目录：{self.output_dir}")
-            QMessageBox.information(self, "完成", "数据集重新划分完成！")
-            
-        except Exception as e:
-            self._append_log(f"重新划分失败: {str(e)}")
-            QMessageBox.critical(self, "错误", f"重新划分失败: {str(e)}")
+                shutil.copy2(label_path, target_label_path)
+        
+        job.set_progress(n, n, "复制文件")
+        job.log(f"重新划分完成！输出目录：{self.output_dir}")
 
-    def _split_traditional_dataset(self, train_ratio, val_ratio, test_ratio):
-        """传统方式划分数据集"""
-        # 开始前自动进行一次简单验证
+    def _scan_traditional_dataset(self, job):
+        """工作线程：收集图片并统计缺少标签 / 没有对应图片的标签数量"""
+        job.set_progress(0, 0, "扫描图片与标签")
         imgs = self._gather_images(self.input_dir)
         label_exts = {".txt", ".json", ".xml"}
         label_files = [p for p in self.input_dir.rglob("*") if p.suffix.lower() in label_exts]
@@ -564,7 +544,11 @@ class SplittingPanel(QWidget):
         lab_stems = {self._relative_stem(p, self.input_dir) for p in label_files}
         missing_cnt = len([s for s in img_stems if s not in lab_stems])
         orphan_cnt = len([s for s in lab_stems if s not in img_stems])
-        
+        return imgs, missing_cnt, orphan_cnt
+
+    def _confirm_traditional_split(self, scan, train_ratio, val_ratio, test_ratio, seed):
+        """扫描完成后确认并提交复制任务"""
+        imgs, missing_cnt, orphan_cnt = scan
         if missing_cnt or orphan_cnt:
             msg = f"检测到问题：缺少标签图片数={missing_cnt}；标签无对应图片数={orphan_cnt}。是否继续？"
             ret = QMessageBox.question(self, "验证警告", msg, QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
@@ -576,17 +560,13 @@ class SplittingPanel(QWidget):
             return
 
         self._append_log(f"发现图片文件 {len(imgs)} 个，开始传统方式划分...")
-        
-        # 随机种子（可复现）与打乱
-        seed_text = (self.seed_edit.text() or "").strip()
-        if seed_text:
-            try:
-                seed = int(seed_text)
-                random.seed(seed)
-                self._append_log(f"使用随机种子：{seed}")
-            except ValueError:
-                self._append_log("随机种子无效，忽略并使用默认随机")
-        random.shuffle(imgs)
+        self.jobs.run("数据集划分", self._split_traditional_dataset, imgs, train_ratio, val_ratio, test_ratio, seed,
+                      on_done=lambda _: QMessageBox.information(self, "完成", "数据集划分完成！"),
+                      on_log=self._append_log)
+
+    def _split_traditional_dataset(self, job, imgs, train_ratio, val_ratio, test_ratio, seed):
+        """工作线程：传统方式划分数据集"""
+        random.Random(seed).shuffle(imgs)
 
         # 计算数量
         n = len(imgs)
@@ -601,23 +581,20 @@ class SplittingPanel(QWidget):
         val_dir.mkdir(parents=True, exist_ok=True)
         test_dir.mkdir(parents=True, exist_ok=True)
 
-        # 进度条按已处理数量更新
-        total = len(imgs)
+        # 进度按已处理数量更新
         for i, img in enumerate(imgs):
+            job.set_progress(i, n, "复制文件")
             if i < n_train:
                 self._copy_pair(img, train_dir, self.input_dir)
             elif i < n_train + n_val:
                 self._copy_pair(img, val_dir, self.input_dir)
             else:
                 self._copy_pair(img, test_dir, self.input_dir)
-            # 更新进度
-            pct = int((i + 1) * 100 / total)
-            self.progress.setValue(pct)
+        job.set_progress(n, n, "复制文件")
 
-        self._append_log(
+        job.log(
             f"传统划分完成：train={n_train}, val={n_val}, test={n_test}，输出目录：{self.output_dir}"
         )
-        QMessageBox.information(self, "完成", "数据集划分完成！")
 
     def on_ratio_change(self):
         tr = self.train_ratio.value()
@@ -0,0 +1,86 @@
+from typing import Callable, Dict, Optional
+
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QProgressBar, QPushButton, QMessageBox
+
+from ..jobs import FINISHED, Job, get_job_runner
+
+
+class JobStatusBar(QWidget):
+    """面板底部的任务状态：提交后台任务，显示最近任务的进度，可取消本面板的全部任务"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.label = QLabel("")
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 100)
+        self.btn_cancel = QPushButton("取消")
+        self.btn_cancel.setEnabled(False)
+        self.btn_cancel.clicked.connect(self.cancel_all)
+        layout.addWidget(self.label, 1)
+        layout.addWidget(self.progress, 2)
+        layout.addWidget(self.btn_cancel)
+        self._jobs: Dict[int, Job] = {}
+        self.setVisible(False)
+
+    def run(self, name: str, func: Callable, *args, on_done: Optional[Callable] = None,
+            on_error: Optional[Callable[[str], None]] = None, on_log: Optional[Callable[[str], None]] = None,
+            **kwargs) -> Optional[Job]:
+        """
+        在后台执行 func(job, *args, **kwargs)。on_done(结果) 在界面线程调用；
+        未指定 on_error 时失败弹出错误框。同名任务正在运行时不重复提交，返回 None。
+        """
+        if any(job.name == name for job in self._jobs.values()):
+            QMessageBox.information(self.window(), "提示", f"{name}正在进行中，请等待完成或取消")
+            return None
+        job = get_job_runner().submit(name, func, *args, **kwargs)
+        self._jobs[job.id] = job
+        job.started.connect(lambda: self._show(job, 0, 0, "开始"))
+        job.progress_changed.connect(lambda done, total, message: self._show(job, done, total, message))
+        if on_log is not None:
+            job.message_logged.connect(on_log)
+        if on_done is not None:
+            job.finished.connect(on_done)
+        job.failed.connect(on_error if on_error is not None else
+                           (lambda message: QMessageBox.critical(self.window(), "错误", f"{name}失败: {message}")))
+        job.cancelled.connect(lambda: self.label.setText(f"{name}已取消"))
+        job.done.connect(lambda: self._remove(job))
+        self._show(job, 0, 0, "排队中")
+        return job
+
+    def cancel_all(self):
+        runner = get_job_runner()
+        for job in list(self._jobs.values()):
+            runner.cancel(job)
+        self.label.setText("正在取消...")
+
+    def is_busy(self) -> bool:
+        return bool(self._jobs)
+
+    def _show(self, job: Job, done: int, total: int, message: str):
+        self.setVisible(True)
+        self.btn_cancel.setEnabled(True)
+        others = len(self._jobs) - 1
+        text = f"{job.name}: {message}" if message else job.name
+        if total > 0:
+            text += f" ({done}/{total})"
+        elif done > 0:
+            text += f" ({done})"
+        if others > 0:
+            text += f"  另有 {others} 个任务运行中"
+        self.label.setText(text)
+        if total > 0:
+            self.progress.setRange(0, 100)
+            self.progress.setValue(int(done * 100 / total))
+        else:
+            self.progress.setRange(0, 0)  # 总数未知时显示忙碌动画
+
+    def _remove(self, job: Job):
+        self._jobs.pop(job.id, None)
+        if not self._jobs:
+            self.btn_cancel.setEnabled(False)
+            self.progress.setRange(0, 100)
+            self.progress.setValue(100 if job.state == FINISHED else 0)
+            if job.state == FINISHED:
+                self.label.setText(f"{job.name}完成")
@@ -0,0 +1,178 @@
+"""
+后台写文件线程池
+
+导出器只负责生成 (路径, 字节)，写盘由 N 个后台线程完成，
+在网络文件系统上让写延迟与格式化重叠。
+    - 有界队列：生产速度超过写盘速度时 write() 阻塞（背压），内存占用有上限
+    - 同一路径的操作总是路由到同一线程，保证顺序
+    - 写失败不会中断导出，错误收集在 errors 中，close() 时统一抛出
+    - flush() 为屏障：返回时此前提交的所有写入都已完成（fsync=True 时已落盘）
+"""
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+DEFAULT_WRITER_THREADS = 8
+DEFAULT_QUEUE_SIZE = 1024  # 所有线程队列长度之和
+
+_WRITE, _APPEND, _SINK, _CLOSE, _BARRIER, _STOP = range(6)
+
+
+class AsyncWriteError(OSError):
+    """后台写入失败，errors 为 [(路径, 异常)]"""
+
+    def __init__(self, errors: List[Tuple[Path, BaseException]]):
+        self.errors = errors
+        path, exc = errors[0]
+        super().__init__(f"{len(errors)} 个文件写入失败，首个错误: {path}: {exc}")
+
+
+class AsyncFileWriter:
+    """写文件线程池，用作上下文管理器时退出即 close()"""
+
+    def __init__(self, workers: int = DEFAULT_WRITER_THREADS, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 fsync: bool = False):
+        self.workers = max(1, int(workers))
+        self.fsync = fsync
+        self.errors: List[Tuple[Path, BaseException]] = []
+        self.files_written = 0
+        self.bytes_written = 0
+
+        self._lock = threading.Lock()
+        self._closed = False
+        per_queue = max(1, queue_size // self.workers)
+        self._queues = [queue.Queue(maxsize=per_queue) for _ in range(self.workers)]
+        self._threads = [
+            threading.Thread(target=self._run, args=(q,), name=f"async-writer-{i}", daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        for t in self._threads:
+            t.start()
+
+    # ---- 提交 ----
+
+    def _route(self, path: Path) -> "queue.Queue":
+        return self._queues[hash(str(path)) % self.workers]
+
+    def _submit(self, op: int, path: Path, payload: Any = None) -> None:
+        if self._closed:
+            raise RuntimeError("AsyncFileWriter 已关闭")
+        self._route(path).put((op, Path(path), payload))
+
+    def write(self, path: Path, data: bytes) -> None:
+        """写出完整文件（覆盖）"""
+        self._submit(_WRITE, path, data)
+
+    def append(self, path: Path, data: bytes) -> None:
+        """追加到流式文件；本写入器中第一次追加时截断重建，句柄保持打开直到 close_stream()/close()"""
+        self._submit(_APPEND, path, data)
+
+    def register_sink(self, path: Path, factory: Callable[[Path], Any]) -> None:
+        """
+        为流式文件指定自定义写入对象（需有 write()，可选 flush()/close()），
+        如 tf.io.TFRecordWriter；须在该路径的第一次 append() 之前调用。
+        """
+        self._submit(_SINK, path, factory)
+
+    def close_stream(self, path: Path) -> None:
+        """关闭流式文件的句柄"""
+        self._submit(_CLOSE, path)
+
+    def flush(self) -> None:
+        """屏障：等待此前提交的所有操作完成，流式文件刷新（fsync=True 时同步到磁盘）"""
+        events = []
+        for q in self._queues:
+            event = threading.Event()
+            q.put((_BARRIER, None, event))
+            events.append(event)
+        for event in events:
+            event.wait()
+
+    def close(self, raise_errors: bool = True) -> None:
+        """等待全部写入完成并停止线程；有写入失败且 raise_errors 时抛出 AsyncWriteError"""
+        if not self._closed:
+            self.flush()
+            self._closed = True
+            for q in self._queues:
+                q.put((_STOP, None, None))
+            for t in self._threads:
+                t.join()
+        if raise_errors and self.errors:
+            raise AsyncWriteError(self.errors)
+
+    def __enter__(self) -> "AsyncFileWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # 主体已抛出异常时不再用写入错误覆盖它
+        self.close(raise_errors=exc_type is None)
+
+    # ---- 后台线程 ----
+
+    def _record_error(self, path: Optional[Path], exc: BaseException) -> None:
+        with self._lock:
+            self.errors.append((path, exc))
+
+    def _sync(self, f) -> None:
+        if self.fsync and hasattr(f, "fileno"):
+            os.fsync(f.fileno())
+
+    def _run(self, q: "queue.Queue") -> None:
+        streams: Dict[Path, Any] = {}
+        factories: Dict[Path, Callable[[Path], Any]] = {}
+        while True:
+            op, path, payload = q.get()
+            try:
+                if op == _WRITE:
+                    with open(path, "wb") as f:
+                        f.write(payload)
+                        f.flush()
+                        self._sync(f)
+                    with self._lock:
+                        self.files_written += 1
+                        self.bytes_written += len(payload)
+                elif op == _APPEND:
+                    stream = streams.get(path)
+                    if stream is None:
+                        factory = factories.pop(path, None)
+                        stream = factory(path) if factory else open(path, "wb")
+                        streams[path] = stream
+                        with self._lock:
+                            self.files_written += 1
+                    stream.write(payload)
+                    with self._lock:
+                        self.bytes_written += len(payload)
+                elif op == _SINK:
+                    factories[path] = payload
+                elif op == _CLOSE:
+                    stream = streams.pop(path, None)
+                    if stream is not None:
+                        self._close_stream(stream)
+                elif op == _BARRIER:
+                    for p, stream in list(streams.items()):
+                        try:
+                            if hasattr(stream, "flush"):
+                                stream.flush()
+                            self._sync(stream)
+                        except Exception as e:
+                            self._record_error(p, e)
+                    payload.set()
+                elif op == _STOP:
+                    for p, stream in streams.items():
+                        try:
+                            self._close_stream(stream)
+                        except Exception as e:
+                            self._record_error(p, e)
+                    return
+            except Exception as e:
+                self._record_error(path, e)
+
+    def _close_stream(self, stream) -> None:
+        if hasattr(stream, "flush"):
+            stream.flush()
+        self._sync(stream)
+        if hasattr(stream, "close"):
+            stream.close()
@@ -0,0 +1,68 @@
+"""
+可选压缩（gzip / zstd）
+
+压缩数据按独立的块（gzip member / zstd frame）写出：
+整个文件可以作为一个流顺序解压，单个块也可以按偏移单独解压（随机读取）。
+zstd 需要安装 zstandard，未安装时选择 zstd 会报错。
+"""
+import gzip
+from pathlib import Path
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 可选依赖
+    zstandard = None
+
+
+COMPRESSIONS = ("gzip", "zstd")
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def check_compression(compression: Optional[str]) -> Optional[str]:
+    """校验压缩方式，None / "" / "none" 表示不压缩"""
+    if not compression or compression == "none":
+        return None
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"不支持的压缩方式: {compression}（可选 {', '.join(COMPRESSIONS)}）")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd 压缩需要安装 zstandard: pip install zstandard")
+    return compression
+
+
+def compression_of(path: Path) -> Optional[str]:
+    """按文件后缀判断压缩方式"""
+    suffix = Path(path).suffix.lower()
+    for compression, ext in SUFFIXES.items():
+        if suffix == ext:
+            return compression
+    return None
+
+
+def compress_block(data: bytes, compression: Optional[str]) -> bytes:
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def decompress_block(data: bytes, compression: Optional[str]) -> bytes:
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def open_compressed(path: Path):
+    """以二进制只读方式打开（按后缀透明解压），返回支持 read() 与上下文管理的对象"""
+    compression = compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError(f"读取 {path} 需要安装 zstandard: pip install zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True,
+                                                          closefd=True)
+    return open(path, "rb")
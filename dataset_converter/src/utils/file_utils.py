@@ -3,9 +3,10 @@ from typing import List, Optional
 
 
 def list_files_by_ext(root: Path, exts: List[str]) -> List[Path]:
+    ext_set = {e.lower() for e in exts}
     result: List[Path] = []
     for p in root.rglob("*"):
-        if p.is_file() and p.suffix.lower() in {e.lower() for e in exts}:
+        if p.suffix.lower() in ext_set and p.is_file():
             result.append(p)
     return sorted(result)
 
@@ -0,0 +1,165 @@
+"""
+图片头部尺寸探测：只读取文件头部少量字节获取宽高，不解码像素。
+支持 JPEG / PNG / BMP / GIF / WebP / TIFF，无法识别时回退到 PIL。
+"""
+import struct
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+
+HEADER_SIZE = 64  # 除 JPEG / TIFF 外，尺寸信息都在文件前 64 字节内
+
+# JPEG 中带尺寸信息的 SOFn 标记（排除 DHT=C4、JPG=C8、DAC=CC）
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_size(f: BinaryIO) -> Optional[Tuple[int, int]]:
+    """逐段跳过 JPEG 标记，读取第一个 SOFn 中的宽高"""
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        # 跳过填充字节
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        # 无长度字段的独立标记
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker in (0xD9, 0xDA):  # EOI / SOS 之前仍未找到 SOF
+            return None
+        seg = f.read(2)
+        if len(seg) != 2:
+            return None
+        length = struct.unpack(">H", seg)[0]
+        if length < 2:
+            return None
+        if marker in _JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) != 5:
+                return None
+            height, width = struct.unpack(">xHH", data)
+            return width, height
+        f.seek(length - 2, 1)
+
+
+def _tiff_size(f: BinaryIO, head: bytes) -> Optional[Tuple[int, int]]:
+    """读取 TIFF 第一个 IFD 中的 ImageWidth(256) / ImageLength(257)"""
+    endian = "<" if head[:2] == b"II" else ">"
+    ifd_offset = struct.unpack(endian + "I", head[4:8])[0]
+    f.seek(ifd_offset)
+    raw = f.read(2)
+    if len(raw) != 2:
+        return None
+    count = struct.unpack(endian + "H", raw)[0]
+    entries = f.read(count * 12)
+    width = height = None
+    for i in range(len(entries) // 12):
+        tag, typ, _, value = struct.unpack(endian + "HHI4s", entries[i * 12:(i + 1) * 12])
+        if tag not in (256, 257):
+            continue
+        if typ == 3:  # SHORT
+            val = struct.unpack(endian + "H", value[:2])[0]
+        elif typ == 4:  # LONG
+            val = struct.unpack(endian + "I", value)[0]
+        else:
+            continue
+        if tag == 256:
+            width = val
+        else:
+            height = val
+        if width is not None and height is not None:
+            return width, height
+    return None
+
+
+def _webp_size(head: bytes) -> Optional[Tuple[int, int]]:
+    chunk = head[12:16]
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and head[20:21] == b"\x2f":
+        bits = struct.unpack("<I", head[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """按文件头魔数判断格式：jpeg/png/bmp/gif/webp/tiff，无法识别返回 None"""
+    if head[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if head[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if head[:2] == b"BM":
+        return "bmp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    return None
+
+
+def probe_stream(f: BinaryIO) -> Optional[Tuple[str, int, int]]:
+    """同 probe_image，从已打开的文件读取（f 位于文件开头，需支持 seek）"""
+    try:
+        head = f.read(HEADER_SIZE)
+        fmt = sniff_format(head)
+        if fmt == "jpeg":
+            size = _jpeg_size(f)
+        elif fmt == "png" and head[12:16] == b"IHDR":
+            size = struct.unpack(">II", head[16:24])
+        elif fmt == "bmp" and len(head) >= 26:
+            header_size = struct.unpack("<I", head[14:18])[0]
+            if header_size == 12:  # OS/2 BITMAPCOREHEADER
+                size = struct.unpack("<HH", head[18:22])
+            else:
+                width, height = struct.unpack("<ii", head[18:26])
+                size = (abs(width), abs(height))  # 高度为负表示自上而下存储
+        elif fmt == "gif":
+            size = struct.unpack("<HH", head[6:10])
+        elif fmt == "webp":
+            size = _webp_size(head)
+        elif fmt == "tiff":
+            size = _tiff_size(f, head)
+        else:
+            return None
+    except (OSError, struct.error):
+        return None
+
+    if not size or size[0] <= 0 or size[1] <= 0:
+        return None
+    return fmt, int(size[0]), int(size[1])
+
+
+def probe_image(image_path: Path) -> Optional[Tuple[str, int, int]]:
+    """
+    仅解析文件头获取 (格式, 宽, 高)，格式为 jpeg/png/bmp/gif/webp/tiff。
+    无法识别或文件损坏时返回 None。
+    """
+    try:
+        with open(image_path, "rb") as f:
+            return probe_stream(f)
+    except OSError:
+        return None
+
+
+def get_image_size(image_path: Path) -> Optional[Tuple[int, int]]:
+    """获取图片 (宽, 高)：优先头部探测，无法识别时回退到 PIL，失败返回 None"""
+    probed = probe_image(image_path)
+    if probed is not None:
+        return probed[1], probed[2]
+    try:
+        from PIL import Image
+        with Image.open(image_path) as im:
+            return im.size
+    except Exception:
+        return None
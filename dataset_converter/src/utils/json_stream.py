@@ -0,0 +1,142 @@
+"""
+增量 JSON 读取
+
+批量标注文件 annotations.json 可能有数 GB，整体 json.loads 需要全文文本加数倍的 dict。
+iter_json_arrays() 按块读取文件，逐个解码顶层对象中指定数组的元素，
+内存占用只取决于最大的单个元素（及其余顶层值中最大的一个）。
+    - 每个元素由 C 实现的 JSONDecoder.raw_decode 一次解出，不做逐字符扫描
+    - 元素跨块时按当前未解析长度倍增读取，重试总量与元素大小成线性关系
+    - 整个文件一次解析的场景（单图 JSON 等）用 loads()：优先 orjson，未安装时回退到标准库
+    - 压缩文件（.gz / .zst）按后缀透明解压
+"""
+import codecs
+import json
+import re
+from pathlib import Path
+from typing import Any, Container, Iterator, Tuple
+
+from .compression import open_compressed
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+
+DEFAULT_BLOCK_SIZE = 1 << 20  # 每次读取 1MB
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+_VALUE_END = {",", "]", "}", " ", "\t", "\n", "\r"}
+_TAIL = 16  # 错误位置距缓冲末尾不超过该值时视为内容被块边界截断
+
+
+def loads(data) -> Any:
+    """用可用的最快解码器解析完整的 JSON 文档（bytes 或 str）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """紧凑序列化为 UTF-8 字节（不转义非 ASCII 字符）"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class _Reader:
+    """按块解码为 str 的滑动缓冲"""
+
+    def __init__(self, f, block_size: int):
+        self._f = f
+        self._block_size = block_size
+        self._utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """丢弃已消费部分并读入更多数据（至少与未消费部分等长），文件已读完返回 False"""
+        if self.eof:
+            return False
+        data = self._f.read(max(self._block_size, len(self.buf) - self.pos))
+        if not data:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + self._utf8.decode(data, final=self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """跳过空白后的下一个字符，文件结束返回空串"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"JSON 格式错误：位置 {self.pos} 处应为 {char!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """解码 pos 处（跳过空白后）的一个完整 JSON 值"""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                truncated = e.msg.startswith("Unterminated string") or e.pos >= len(self.buf) - _TAIL
+                if truncated and self.fill():
+                    continue
+                raise
+            # 数字 / 字面量后面不是分隔符时可能被块边界截断（如 12|.5），读入更多后重新解码
+            if (not isinstance(value, (dict, list, str)) and self.buf[end:end + 1] not in _VALUE_END
+                    and self.fill()):
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_arrays(file_path: Path, keys: Container[str], block_size: int = DEFAULT_BLOCK_SIZE
+                     ) -> Iterator[Tuple[str, Any]]:
+    """
+    按文件顺序产出 (键, 元素)：顶层对象中键属于 keys 的数组逐个元素产出，
+    其余顶层值解码后丢弃。顶层不是对象时不产出任何元素；
+    内容损坏时抛出 ValueError（此前的元素已产出）。
+    """
+    with open_compressed(file_path) as f:
+        reader = _Reader(f, block_size)
+        if reader.peek() != "{":
+            return
+        reader.pos += 1
+        if reader.peek() == "}":
+            return
+        while True:
+            key = reader.value()
+            if not isinstance(key, str):
+                raise ValueError(f"JSON 格式错误：位置 {reader.pos} 处应为键")
+            reader.expect(":")
+            if key in keys and reader.peek() == "[":
+                reader.pos += 1
+                if reader.peek() != "]":
+                    while True:
+                        yield key, reader.value()
+                        if reader.peek() != ",":
+                            break
+                        reader.pos += 1
+                reader.expect("]")
+            else:
+                reader.value()
+            if reader.peek() != ",":
+                break
+            reader.pos += 1
+        reader.expect("}")
+
+
+def iter_json_array(file_path: Path, key: str = "images", block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[Any]:
+    """逐个产出顶层对象中 key 数组的元素，如 {"images": [...]} 中的每张图片条目"""
+    for _, item in iter_json_arrays(file_path, (key,), block_size):
+        yield item
@@ -0,0 +1,210 @@
+"""
+分片记录存储（JSON Lines / 单个批量 JSON）与偏移索引
+
+ShardedRecordWriter 把逐条序列化好的记录写入若干分片文件：
+    - JSONL：每行一条记录，每 shard_size 条一个分片
+    - 批量：全部记录写入一个 {"images": [...]} 文件，边写边输出，不在内存中汇总
+压缩时每 BLOCK_RECORDS 条记录压成一个独立块（gzip member / zstd frame）。
+偏移索引（SQLite）记录 名称→(文件, 块偏移, 块长度, 块内偏移, 记录长度)，
+随机读取一条记录最多只需解压一个块。
+"""
+import os
+import re
+import sqlite3
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from .async_writer import AsyncFileWriter
+from .compression import SUFFIXES, compress_block, compression_of, decompress_block, open_compressed
+
+
+INDEX_NAME = "annotations.index.sqlite3"
+DEFAULT_SHARD_SIZE = 10000  # 每个 JSONL 分片的记录数
+BLOCK_RECORDS = 256  # 压缩时每个独立块的记录数
+BLOCK_BYTES = 1 << 20  # 不压缩时累积多少字节提交一次写入
+READ_BLOCK_SIZE = 1 << 20
+
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    name TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    block_offset INTEGER NOT NULL,
+    block_length INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+"""
+
+JSONL_PATTERN = re.compile(r"\.jsonl(\.gz|\.zst)?$", re.IGNORECASE)
+
+
+def is_jsonl_file(path: Path) -> bool:
+    return JSONL_PATTERN.search(Path(path).name) is not None
+
+
+def shard_name(prefix: str, number: int, compression: Optional[str]) -> str:
+    return f"{prefix}-{number:05d}.jsonl{SUFFIXES.get(compression, '')}"
+
+
+class OffsetIndex:
+    """记录偏移索引，按名称随机读取记录"""
+
+    def __init__(self, directory: Path, create: bool = False):
+        self.directory = Path(directory)
+        self.path = self.directory / INDEX_NAME
+        if not create and not self.path.exists():
+            raise FileNotFoundError(self.path)
+        self._conn = sqlite3.connect(str(self.path))
+        if create:
+            self._conn.execute("DROP TABLE IF EXISTS records")
+        self._conn.executescript(_INDEX_SCHEMA)
+
+    def add(self, rows: List[Tuple[str, str, int, int, int, int]]) -> None:
+        self._conn.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def __contains__(self, name: str) -> bool:
+        return self._conn.execute("SELECT 1 FROM records WHERE name = ?", (name,)).fetchone() is not None
+
+    def names(self) -> List[str]:
+        return [row[0] for row in self._conn.execute("SELECT name FROM records ORDER BY file, block_offset, offset")]
+
+    def read(self, name: str) -> Optional[bytes]:
+        """读取一条记录的原始字节，不存在返回 None"""
+        row = self._conn.execute("SELECT file, block_offset, block_length, offset, length FROM records "
+                                 "WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        file_name, block_offset, block_length, offset, length = row
+        path = self.directory / file_name
+        with open(path, "rb") as f:
+            f.seek(block_offset)
+            block = decompress_block(f.read(block_length), compression_of(path))
+        return block[offset:offset + length]
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class ShardedRecordWriter:
+    """
+    顺序写入记录；写盘交给 AsyncFileWriter，偏移在当前线程计算后写入索引。
+    batch=True 时写成单个批量 JSON 文件（file_name 为完整文件名），否则按 shard_size 分片。
+    """
+
+    def __init__(self, output_dir: Path, writer: AsyncFileWriter, compression: Optional[str] = None,
+                 shard_size: int = DEFAULT_SHARD_SIZE, prefix: str = "annotations", batch: bool = False,
+                 file_name: str = "annotations.json"):
+        self.output_dir = Path(output_dir)
+        self.writer = writer
+        self.compression = compression
+        self.shard_size = max(1, int(shard_size))
+        self.prefix = prefix
+        self.batch = batch
+        self.file_name = file_name + SUFFIXES.get(compression, "") if batch else None
+        if batch:
+            self._header, self._sep, self._footer = b'{"images": [\n', b",\n", b"\n]}\n"
+        else:
+            self._header, self._sep, self._footer = b"", b"\n", b"\n"
+
+        self.files: List[str] = []
+        self.records = 0
+        self._index = OffsetIndex(self.output_dir, create=True)
+        self._path: Optional[Path] = None
+        self._shard_records = 0
+        self._written = 0  # 当前文件已提交的（压缩后）字节数
+        self._block = bytearray()
+        self._block_records = 0
+        self._pending: List[Tuple[str, int, int]] = []  # 当前块内 (名称, 块内偏移, 长度)
+
+    def _open(self) -> None:
+        name = self.file_name if self.batch else shard_name(self.prefix, len(self.files), self.compression)
+        self.files.append(name)
+        self._path = self.output_dir / name
+        self._shard_records = 0
+        self._written = 0
+        self._block += self._header
+
+    def _flush_block(self) -> None:
+        if not self._block:
+            return
+        data = compress_block(bytes(self._block), self.compression)
+        rel = self._path.name
+        if self.compression:
+            rows = [(name, rel, self._written, len(data), offset, length) for name, offset, length in self._pending]
+        else:
+            # 不压缩时直接记录绝对偏移
+            rows = [(name, rel, self._written + offset, length, 0, length) for name, offset, length in self._pending]
+        self._index.add(rows)
+        self.writer.append(self._path, data)
+        self._written += len(data)
+        self._block = bytearray()
+        self._block_records = 0
+        self._pending = []
+
+    def _close_file(self) -> None:
+        self._block += self._footer
+        self._flush_block()
+        self.writer.close_stream(self._path)
+        self._path = None
+
+    def write(self, name: str, record: bytes) -> None:
+        """写入一条记录（record 不含换行），name 为索引键"""
+        if self._path is None:
+            self._open()
+        if self._shard_records:
+            self._block += self._sep
+        self._pending.append((name, len(self._block), len(record)))
+        self._block += record
+        self._block_records += 1
+        self._shard_records += 1
+        self.records += 1
+        if (self._block_records >= BLOCK_RECORDS) if self.compression else (len(self._block) >= BLOCK_BYTES):
+            self._flush_block()
+        if not self.batch and self._shard_records >= self.shard_size:
+            self._close_file()
+
+    def close(self) -> None:
+        if self._path is None and self.batch and not self.files:
+            self._open()  # 批量模式没有记录时也写出空的 {"images": []}
+        if self._path is not None:
+            self._close_file()
+        self._index.commit()
+        self._index.close()
+
+
+def remove_record_files(output_dir: Path, prefix: str = "annotations") -> int:
+    """删除上一次导出留下的分片与批量文件（含压缩版本），避免与新输出混在一起被重复读取"""
+    removed = 0
+    pattern = re.compile(rf"^{re.escape(prefix)}(-\d+\.jsonl|\.json)(\.gz|\.zst)?$")
+    try:
+        names = os.listdir(output_dir)
+    except OSError:
+        return 0
+    for name in names:
+        if pattern.match(name):
+            os.remove(os.path.join(output_dir, name))
+            removed += 1
+    return removed
+
+
+def iter_jsonl(path: Path) -> Iterator[bytes]:
+    """逐行产出 JSONL 文件（可压缩）中的非空记录"""
+    with open_compressed(path) as f:
+        rest = b""
+        while True:
+            chunk = f.read(READ_BLOCK_SIZE)
+            if not chunk:
+                break
+            lines = (rest + chunk).split(b"\n")
+            rest = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield line
+        if rest.strip():
+            yield rest
@@ -0,0 +1,73 @@
+"""
+重量级依赖的按需导入
+
+matplotlib / seaborn / tensorflow / 图像哈希等后端导入耗时数百毫秒到数秒，
+只有少数功能用到。lazy_import() 返回模块代理，第一次访问属性时才真正导入：
+    - 同名模块共用一个代理，setup 回调在真正导入后执行一次（如 matplotlib 的字体配置）
+    - available() 只查找模块是否已安装，不导入
+"""
+import importlib
+import importlib.util
+import sys
+import threading
+from types import ModuleType
+from typing import Callable, Dict, Optional
+
+
+_lock = threading.RLock()
+_proxies: Dict[str, "LazyModule"] = {}
+
+
+class LazyModule(ModuleType):
+    """模块代理：属性访问时导入真正的模块并转发"""
+
+    def __init__(self, name: str, setup: Optional[Callable[[ModuleType], None]] = None):
+        super().__init__(name)
+        self.__dict__["_setup"] = setup
+        self.__dict__["_module"] = None
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__["_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    setup = self.__dict__["_setup"]
+                    if setup is not None:
+                        setup(module)
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    @property
+    def loaded(self) -> bool:
+        return self.__dict__["_module"] is not None
+
+    def __repr__(self) -> str:
+        state = "已导入" if self.loaded else "未导入"
+        return f"<LazyModule {self.__name__!r} ({state})>"
+
+
+def lazy_import(name: str, setup: Optional[Callable[[ModuleType], None]] = None) -> LazyModule:
+    """返回 name 的模块代理；同名模块只注册一次，先注册的 setup 生效"""
+    with _lock:
+        proxy = _proxies.get(name)
+        if proxy is None:
+            proxy = _proxies[name] = LazyModule(name, setup)
+        return proxy
+
+
+def available(name: str) -> bool:
+    """模块是否已安装（不导入；已导入的直接返回 True）"""
+    if name in sys.modules:
+        return True
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
@@ -0,0 +1,426 @@
+"""
+图片元数据持久化缓存（SQLite）
+
+以 (路径, 文件大小, mtime_ns) 为键缓存宽高、格式、内容哈希、感知哈希与完整性校验结果。
+文件被修改后键不再匹配，对应记录自动失效并在下次访问时重算；
+记录数超过上限时按最近使用时间（LRU）淘汰。
+写入先进入内存队列，批量提交，只应由主进程写入。
+"""
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .image_utils import get_image_size, probe_image
+
+
+DEFAULT_CACHE_PATH = Path.home() / ".dataforge" / "image_meta.sqlite3"
+DEFAULT_MAX_ENTRIES = 2_000_000
+HASH_BLOCK_SIZE = 1 << 20  # 流式哈希每次读取 1MB
+FLUSH_THRESHOLD = 2000  # 累积多少条待写记录后自动提交
+_SQL_BATCH = 500  # IN 查询每批路径数（低于 SQLite 变量上限）
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS image_meta (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    format TEXT,
+    content_hash TEXT,
+    decode_ok INTEGER,
+    dhash TEXT,
+    phash TEXT,
+    verify_level INTEGER,
+    verify_error TEXT,
+    last_used INTEGER NOT NULL
+)
+"""
+# 旧版本数据库缺少的列，打开时补上
+_ADDED_COLUMNS = (("dhash", "TEXT"), ("phash", "TEXT"), ("verify_level", "INTEGER"), ("verify_error", "TEXT"))
+_COLUMNS = "path, size, mtime_ns, width, height, format, content_hash, decode_ok, dhash, phash, verify_level, verify_error"
+
+
+def _cache_key(path) -> str:
+    return os.path.abspath(path)
+
+
+def hash_file(file_path: Path) -> str:
+    """分块流式计算文件内容哈希（BLAKE2b-128），不一次性读入整个文件"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+@dataclass
+class ImageMeta:
+    path: str
+    size: int
+    mtime_ns: int
+    width: Optional[int] = None  # 0 表示无法读取尺寸
+    height: Optional[int] = None
+    format: Optional[str] = None
+    content_hash: Optional[str] = None
+    decode_ok: Optional[bool] = None  # None 表示尚未校验
+    dhash: Optional[str] = None  # 64 位感知哈希的十六进制，见 core/near_dedup.py
+    phash: Optional[str] = None
+    verify_level: Optional[int] = None  # decode_ok 由哪一级校验得出，见 core/image_verify.py
+    verify_error: Optional[str] = None  # 校验失败的原因
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "ImageMeta":
+        meta = cls(*row)
+        if meta.decode_ok is not None:
+            meta.decode_ok = bool(meta.decode_ok)
+        return meta
+
+    def matches(self, st: os.stat_result) -> bool:
+        return self.size == st.st_size and self.mtime_ns == st.st_mtime_ns
+
+
+class ImageMetaCache:
+    """图片元数据缓存，线程安全"""
+
+    def __init__(self, db_path: Path = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = Path(db_path)
+        self.max_entries = max(1, int(max_entries))
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(image_meta)")}
+        for name, sql_type in _ADDED_COLUMNS:
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE image_meta ADD COLUMN {name} {sql_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_image_meta_last_used ON image_meta(last_used)")
+        self._conn.commit()
+
+        self._pending: Dict[str, ImageMeta] = {}  # 待写入的记录
+        self._touched: set = set()  # 命中后待更新 last_used 的路径
+
+    # ---- 查询 ----
+
+    @staticmethod
+    def _stat(key: str) -> Optional[os.stat_result]:
+        try:
+            return os.stat(key)
+        except OSError:
+            return None
+
+    def _load(self, key: str) -> Optional[ImageMeta]:
+        if key in self._pending:
+            return self._pending[key]
+        row = self._conn.execute(f"SELECT {_COLUMNS} FROM image_meta WHERE path = ?", (key,)).fetchone()
+        return ImageMeta.from_row(row) if row else None
+
+    def get(self, path) -> Optional[ImageMeta]:
+        """返回与当前文件状态一致的缓存记录，不存在或已失效时返回 None"""
+        key = _cache_key(path)
+        st = self._stat(key)
+        if st is None:
+            return None
+        with self._lock:
+            meta = self._load(key)
+            if meta is None or not meta.matches(st):
+                return None
+            self._touched.add(key)
+            return meta
+
+    def get_many(self, paths: Iterable) -> Dict[str, ImageMeta]:
+        """批量查询，返回 {绝对路径: 有效记录}，只包含命中的条目"""
+        stats: Dict[str, os.stat_result] = {}
+        for path in paths:
+            key = _cache_key(path)
+            st = self._stat(key)
+            if st is not None:
+                stats[key] = st
+
+        hits: Dict[str, ImageMeta] = {}
+        keys = list(stats)
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM image_meta WHERE path IN ({placeholders})", batch
+                ).fetchall()
+                for row in rows:
+                    meta = ImageMeta.from_row(row)
+                    if meta.path not in self._pending and meta.matches(stats[meta.path]):
+                        hits[meta.path] = meta
+            for key in keys:
+                meta = self._pending.get(key)
+                if meta is not None and meta.matches(stats[key]):
+                    hits[key] = meta
+            self._touched.update(hits)
+        return hits
+
+    # ---- 写入 ----
+
+    def update(self, path, **fields) -> Optional[ImageMeta]:
+        """更新记录的部分字段；文件已变化时丢弃旧字段重新建立记录"""
+        key = _cache_key(path)
+        st = self._stat(key)
+        if st is None:
+            return None
+        with self._lock:
+            meta = self._load(key)
+            if meta is None or not meta.matches(st):
+                meta = ImageMeta(path=key, size=st.st_size, mtime_ns=st.st_mtime_ns)
+            for name, value in fields.items():
+                setattr(meta, name, value)
+            self._pending[key] = meta
+            if len(self._pending) >= FLUSH_THRESHOLD:
+                self.flush()
+            return meta
+
+    def flush(self) -> None:
+        """提交待写记录与 LRU 访问时间，必要时淘汰最久未使用的记录"""
+        with self._lock:
+            if not self._pending and not self._touched:
+                return
+            now = time.time_ns()
+            if self._pending:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO image_meta ({_COLUMNS}, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (m.path, m.size, m.mtime_ns, m.width, m.height, m.format, m.content_hash,
+                         None if m.decode_ok is None else int(m.decode_ok), m.dhash, m.phash,
+                         m.verify_level, m.verify_error, now)
+                        for m in self._pending.values()
+                    ],
+                )
+            touched = self._touched - set(self._pending)
+            if touched:
+                self._conn.executemany(
+                    "UPDATE image_meta SET last_used = ? WHERE path = ?", [(now, key) for key in touched]
+                )
+            inserted = bool(self._pending)
+            self._pending.clear()
+            self._touched.clear()
+            if inserted:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM image_meta").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        # 一次多淘汰 10%，避免每次提交都触发
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM image_meta WHERE path IN "
+            "(SELECT path FROM image_meta ORDER BY last_used ASC LIMIT ?)", (excess,)
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._touched.clear()
+            self._conn.execute("DELETE FROM image_meta")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self.flush()
+            finally:
+                self._conn.close()
+
+    # ---- 便捷方法：命中直接返回，未命中则计算并写回 ----
+
+    def get_size(self, path) -> Optional[Tuple[int, int]]:
+        meta = self.get(path)
+        if meta is not None and meta.width is not None:
+            return (meta.width, meta.height) if meta.width > 0 else None
+        probed = probe_image(path)
+        if probed is not None:
+            fmt, width, height = probed
+        else:
+            fmt = None
+            width, height = get_image_size(path) or (0, 0)
+        self.update(path, width=width, height=height, format=fmt)
+        return (width, height) if width > 0 else None
+
+    def get_hash(self, path) -> Optional[str]:
+        meta = self.get(path)
+        if meta is not None and meta.content_hash:
+            return meta.content_hash
+        try:
+            digest = hash_file(path)
+        except OSError:
+            return None
+        self.update(path, content_hash=digest)
+        return digest
+
+
+# ---- 进程级默认缓存 ----
+
+_default_cache: Optional[ImageMetaCache] = None
+_cache_config = {"enabled": True, "path": DEFAULT_CACHE_PATH, "max_entries": DEFAULT_MAX_ENTRIES}
+_cache_lock = threading.Lock()
+
+
+def configure_metadata_cache(enabled: Optional[bool] = None, path: Optional[Path] = None,
+                             max_entries: Optional[int] = None) -> None:
+    """修改默认缓存配置，已打开的默认缓存会被关闭并在下次使用时按新配置重建"""
+    global _default_cache
+    with _cache_lock:
+        if enabled is not None:
+            _cache_config["enabled"] = bool(enabled)
+        if path is not None:
+            _cache_config["path"] = Path(path)
+        if max_entries is not None:
+            _cache_config["max_entries"] = int(max_entries)
+        if _default_cache is not None:
+            _default_cache.close()
+            _default_cache = None
+
+
+def get_metadata_cache() -> Optional[ImageMetaCache]:
+    """返回默认缓存；禁用或无法打开数据库时返回 None"""
+    global _default_cache
+    if not _cache_config["enabled"]:
+        return None
+    with _cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = ImageMetaCache(_cache_config["path"], _cache_config["max_entries"])
+            except (OSError, sqlite3.Error):
+                _cache_config["enabled"] = False
+                return None
+        return _default_cache
+
+
+@atexit.register
+def _close_default_cache() -> None:
+    if _default_cache is not None:
+        try:
+            _default_cache.close()
+        except sqlite3.Error:
+            pass
+
+
+def cached_image_size(path) -> Optional[Tuple[int, int]]:
+    """带缓存的图片尺寸查询，缓存不可用时直接读取文件头"""
+    cache = get_metadata_cache()
+    if cache is None:
+        return get_image_size(path)
+    return cache.get_size(path)
+
+
+def cached_file_hash(path) -> Optional[str]:
+    """带缓存的文件内容哈希，读取失败返回 None"""
+    cache = get_metadata_cache()
+    if cache is None:
+        try:
+            return hash_file(path)
+        except OSError:
+            return None
+    return cache.get_hash(path)
+
+
+def lookup_image_sizes(paths: List[Path]) -> List[Optional[Tuple[int, int]]]:
+    """批量查询缓存中的尺寸，未命中的位置为 None（不计算）"""
+    cache = get_metadata_cache()
+    if cache is None:
+        return [None] * len(paths)
+    hits = cache.get_many(paths)
+    sizes: List[Optional[Tuple[int, int]]] = []
+    for path in paths:
+        meta = hits.get(_cache_key(path))
+        sizes.append((meta.width, meta.height) if meta is not None and meta.width is not None else None)
+    return sizes
+
+
+def store_image_sizes(items: Iterable[Tuple[Path, int, int]]) -> None:
+    """批量写回尺寸（宽高为 0 表示无法读取）"""
+    cache = get_metadata_cache()
+    if cache is None:
+        return
+    for path, width, height in items:
+        cache.update(path, width=width, height=height)
+    cache.flush()
+
+
+def lookup_file_hashes(paths: List[Path]) -> List[Optional[str]]:
+    """批量查询缓存中的内容哈希，未命中的位置为 None（不计算）"""
+    cache = get_metadata_cache()
+    if cache is None:
+        return [None] * len(paths)
+    hits = cache.get_many(paths)
+    digests: List[Optional[str]] = []
+    for path in paths:
+        meta = hits.get(_cache_key(path))
+        digests.append(meta.content_hash if meta is not None and meta.content_hash else None)
+    return digests
+
+
+def store_file_hashes(items: Iterable[Tuple[Path, str]]) -> None:
+    """批量写回内容哈希（hash_file 的结果）"""
+    cache = get_metadata_cache()
+    if cache is None:
+        return
+    for path, digest in items:
+        cache.update(path, content_hash=digest)
+    cache.flush()
+
+
+def lookup_fingerprints(paths: List[Path]) -> List[Optional[Tuple[int, int]]]:
+    """批量查询缓存中的感知哈希 (dhash, phash)，未命中的位置为 None（不计算）"""
+    cache = get_metadata_cache()
+    if cache is None:
+        return [None] * len(paths)
+    hits = cache.get_many(paths)
+    fingerprints: List[Optional[Tuple[int, int]]] = []
+    for path in paths:
+        meta = hits.get(_cache_key(path))
+        if meta is not None and meta.dhash and meta.phash:
+            fingerprints.append((int(meta.dhash, 16), int(meta.phash, 16)))
+        else:
+            fingerprints.append(None)
+    return fingerprints
+
+
+def store_fingerprints(items: Iterable[Tuple[Path, int, int]]) -> None:
+    """批量写回感知哈希 (路径, dhash, phash)"""
+    cache = get_metadata_cache()
+    if cache is None:
+        return
+    for path, dhash, phash in items:
+        cache.update(path, dhash=f"{dhash:016x}", phash=f"{phash:016x}")
+    cache.flush()
+
+
+def lookup_verifications(paths: List[Path]) -> List[Optional[ImageMeta]]:
+    """批量查询缓存中已有完整性校验结果（verify_level 不为空）的记录，未命中的位置为 None"""
+    cache = get_metadata_cache()
+    if cache is None:
+        return [None] * len(paths)
+    hits = cache.get_many(paths)
+    records: List[Optional[ImageMeta]] = []
+    for path in paths:
+        meta = hits.get(_cache_key(path))
+        records.append(meta if meta is not None and meta.verify_level is not None else None)
+    return records
+
+
+def store_verifications(items: Iterable[Tuple[Path, Dict]]) -> None:
+    """批量写回完整性校验结果 (路径, 字段)，字段见 core/image_verify.VerifyResult.cache_fields"""
+    cache = get_metadata_cache()
+    if cache is None:
+        return
+    for path, fields in items:
+        cache.update(path, **fields)
+    cache.flush()
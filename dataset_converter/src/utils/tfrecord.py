@@ -0,0 +1,307 @@
+"""
+不依赖 TensorFlow 的 TFRecord 读写
+
+TFRecord 每条记录的格式：
+    uint64 长度 | uint32 长度的掩码 CRC32C | 数据 | uint32 数据的掩码 CRC32C（均为小端）
+tf.train.Example 只用到少数几个 protobuf 消息，这里直接按线格式编码 / 解码：
+    Example{features=1} → Features{map<string, Feature> feature=1}
+    Feature{bytes_list=1 | float_list=2 | int64_list=3}，各 List{repeated value=1}（数值为 packed）
+    - 编码时特征按键排序，与 SerializeToString(deterministic=True) 逐字节一致
+    - CRC32C 长数据用 NumPy 分道并行计算（slicing-by-4），各道结果按 GF(2) 线性性合并
+"""
+import struct
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Container, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+
+_POLY = 0x82F63B78  # CRC32C（Castagnoli）反射多项式
+_MASK_DELTA = 0xA282EAD8
+_LANE_SMALL, _LANE_LARGE = 32, 256  # 每道字节数（4 的倍数）：数据较小时用短道以减少迭代次数
+_LARGE = 1 << 20
+_NUMPY_MIN = 1024  # 短于该长度的数据逐字节查表
+
+
+def _make_tables() -> np.ndarray:
+    table = np.arange(256, dtype=np.uint32)
+    for _ in range(8):
+        table = np.where(table & 1, (table >> 1) ^ _POLY, table >> 1).astype(np.uint32)
+    tables = [table]
+    for _ in range(3):
+        prev = tables[-1]
+        tables.append((prev >> 8) ^ table[prev & 0xFF])
+    return np.stack(tables)
+
+
+_TABLES = _make_tables()
+_TABLE = _TABLES[0].tolist()
+
+
+def _crc_bytes(crc: int, data) -> int:
+    table = _TABLE
+    for b in data:
+        crc = (crc >> 8) ^ table[(crc ^ b) & 0xFF]
+    return crc
+
+
+def _shift_byte(x: int) -> int:
+    """状态 x 之后追加一个零字节"""
+    return (x >> 8) ^ _TABLE[x & 0xFF]
+
+
+def _apply(op: List[int], x: int) -> int:
+    """op[i] 为第 i 位的像，op 为 GF(2) 上的线性算子"""
+    y = 0
+    i = 0
+    while x:
+        if x & 1:
+            y ^= op[i]
+        x >>= 1
+        i += 1
+    return y
+
+
+@lru_cache(maxsize=None)
+def _shift_tables(nbytes: int) -> np.ndarray:
+    """追加 nbytes 个零字节对 CRC 状态的作用，按状态的 4 个字节拆成 4 张 256 项查找表"""
+    op = [_shift_byte(1 << i) for i in range(32)]
+    result = [1 << i for i in range(32)]  # 单位算子
+    n = nbytes
+    while n:
+        if n & 1:
+            result = [_apply(op, v) for v in result]
+        op = [_apply(op, v) for v in op]
+        n >>= 1
+    cols = np.array(result, dtype=np.uint32).reshape(4, 8)
+    bits = ((np.arange(256)[:, None] >> np.arange(8)) & 1).astype(bool)
+    return np.stack([np.bitwise_xor.reduce(np.where(bits, cols[k], np.uint32(0)), axis=1) for k in range(4)])
+
+
+def crc32c(data: Union[bytes, bytearray, memoryview]) -> int:
+    """标准 CRC32C（初值与结果异或 0xFFFFFFFF）"""
+    n = len(data)
+    if n < _NUMPY_MIN:
+        return _crc_bytes(0xFFFFFFFF, bytes(data)) ^ 0xFFFFFFFF
+    # 前补零到整数道：初始状态为 0 时前导零不改变 CRC；初值 0xFFFFFFFF 等价于异或到原数据前 4 字节
+    lane = _LANE_LARGE if n >= _LARGE else _LANE_SMALL
+    lanes = -(-n // lane)
+    pad = lanes * lane - n
+    buf = np.zeros(lanes * lane, dtype=np.uint8)
+    buf[pad:] = np.frombuffer(data, dtype=np.uint8)
+    buf[pad:pad + 4] ^= 0xFF
+    words = buf.view("<u4").reshape(lanes, lane // 4)
+    t0, t1, t2, t3 = _TABLES
+    crc = np.zeros(lanes, dtype=np.uint32)
+    for j in range(lane // 4):
+        crc ^= words[:, j]
+        crc = t3[crc & 0xFF] ^ t2[(crc >> 8) & 0xFF] ^ t1[(crc >> 16) & 0xFF] ^ t0[crc >> 24]
+    # 两两合并：前一段的 CRC 追加后一段长度的零字节后与后一段异或
+    span = lane
+    while len(crc) > 1:
+        if len(crc) % 2:
+            crc = np.concatenate((np.zeros(1, dtype=np.uint32), crc))
+        s0, s1, s2, s3 = _shift_tables(span)
+        head = crc[0::2]
+        crc = s0[head & 0xFF] ^ s1[(head >> 8) & 0xFF] ^ s2[(head >> 16) & 0xFF] ^ s3[head >> 24] ^ crc[1::2]
+        span *= 2
+    return int(crc[0]) ^ 0xFFFFFFFF
+
+
+def masked_crc32c(data) -> int:
+    crc = crc32c(data)
+    return (((crc >> 15) | (crc << 17)) + _MASK_DELTA) & 0xFFFFFFFF
+
+
+# ---- 记录帧 ----
+
+def frame_record(data: bytes) -> bytes:
+    """把一条记录编码为 TFRecord 帧，与 tf.io.TFRecordWriter（无压缩）写出的字节一致"""
+    length = struct.pack("<Q", len(data))
+    return b"".join((length, struct.pack("<I", masked_crc32c(length)), data,
+                     struct.pack("<I", masked_crc32c(data))))
+
+
+class TFRecordCorruptError(ValueError):
+    """TFRecord 帧损坏：长度或数据校验失败、文件截断"""
+
+
+def iter_tfrecords(file_or_path: Union[Path, BinaryIO], verify: bool = True) -> Iterator[bytes]:
+    """流式逐条产出记录数据；长度的 CRC 总是校验，verify=True 时同时校验数据 CRC"""
+    if isinstance(file_or_path, (str, Path)):
+        with open(file_or_path, "rb") as f:
+            yield from iter_tfrecords(f, verify)
+        return
+    f = file_or_path
+    while True:
+        header = f.read(12)
+        if not header:
+            return
+        if len(header) != 12:
+            raise TFRecordCorruptError("记录头不完整（文件被截断）")
+        length, length_crc = struct.unpack("<QI", header)
+        if masked_crc32c(header[:8]) != length_crc:
+            raise TFRecordCorruptError("记录长度校验失败")
+        body = f.read(length + 4)
+        if len(body) != length + 4:
+            raise TFRecordCorruptError("记录数据不完整（文件被截断）")
+        data = body[:length]
+        if verify and masked_crc32c(data) != struct.unpack("<I", body[length:])[0]:
+            raise TFRecordCorruptError("记录数据校验失败")
+        yield data
+
+
+# ---- tf.train.Example 编码 ----
+
+def _varint(value: int) -> bytes:
+    value &= 0xFFFFFFFFFFFFFFFF  # 负数按 64 位补码编码（10 字节）
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    """长度前缀（wire type 2）字段"""
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def bytes_feature(values: Iterable[bytes]) -> bytes:
+    """编码 Feature{bytes_list}"""
+    return _field(1, b"".join(_field(1, v) for v in values))
+
+
+def float_feature(values: Iterable[float]) -> bytes:
+    """编码 Feature{float_list}（float32，packed）"""
+    packed = np.asarray(list(values), dtype="<f4").tobytes()
+    return _field(2, _field(1, packed) if packed else b"")
+
+
+def int64_feature(values: Iterable[int]) -> bytes:
+    """编码 Feature{int64_list}（packed varint）"""
+    packed = b"".join(_varint(int(v)) for v in values)
+    return _field(3, _field(1, packed) if packed else b"")
+
+
+def encode_example(features: Dict[str, bytes]) -> bytes:
+    """features 为 名称→已编码的 Feature（见 *_feature），按名称排序写出"""
+    entries = b"".join(
+        _field(1, _field(1, name.encode("utf-8")) + _field(2, features[name]))
+        for name in sorted(features)
+    )
+    return _field(1, entries)
+
+
+# ---- tf.train.Example 解码 ----
+
+def _read_varint(buf: memoryview, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        if pos >= len(buf):
+            raise ValueError("protobuf 消息被截断")
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            raise ValueError("varint 过长")
+
+
+def _iter_fields(buf: memoryview) -> Iterator[Tuple[int, int, object]]:
+    """逐个产出 (字段号, wire type, 值)；长度前缀字段的值为 memoryview，不复制"""
+    pos, end = 0, len(buf)
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        number, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire == 1:
+            value, pos = buf[pos:pos + 8], pos + 8
+        elif wire == 2:
+            length, pos = _read_varint(buf, pos)
+            value, pos = buf[pos:pos + length], pos + length
+        elif wire == 5:
+            value, pos = buf[pos:pos + 4], pos + 4
+        else:
+            raise ValueError(f"不支持的 wire type: {wire}")
+        if pos > end:
+            raise ValueError("protobuf 消息被截断")
+        yield number, wire, value
+
+
+def _signed64(value: int) -> int:
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _decode_feature(buf: memoryview) -> List:
+    values: List = []
+    for kind, _, body in _iter_fields(buf):
+        if kind not in (1, 2, 3):
+            continue
+        for number, wire, value in _iter_fields(body):
+            if number != 1:
+                continue
+            if kind == 1:
+                values.append(bytes(value))
+            elif kind == 2:
+                # packed（wire 2）或逐个 fixed32（wire 5）
+                values.extend(np.frombuffer(value, dtype="<f4").tolist())
+            elif wire == 2:
+                pos = 0
+                while pos < len(value):
+                    v, pos = _read_varint(value, pos)
+                    values.append(_signed64(v))
+            else:
+                values.append(_signed64(value))
+    return values
+
+
+def decode_example(data: bytes, keys: Optional[Container[str]] = None) -> Dict[str, List]:
+    """
+    解码序列化的 Example 为 名称→值列表（bytes / float / int）。
+    keys 不为 None 时只解码其中的特征（如跳过 image/encoded 以免复制图片字节）。
+    """
+    features: Dict[str, List] = {}
+    for number, _, body in _iter_fields(memoryview(data)):
+        if number != 1:
+            continue
+        for entry_number, _, entry in _iter_fields(body):
+            if entry_number != 1:
+                continue
+            name, value = "", None
+            for n, _, v in _iter_fields(entry):
+                if n == 1:
+                    name = bytes(v).decode("utf-8")
+                elif n == 2:
+                    value = v
+            if keys is not None and name not in keys:
+                continue
+            features[name] = _decode_feature(value) if value is not None else []
+    return features
+
+
+def verify_with_tensorflow(path: Path) -> Optional[bool]:
+    """
+    用 TensorFlow（如已安装）交叉校验一个 TFRecord 文件：逐条比较读出的记录，
+    并确认每条 Example 按 deterministic 方式重新序列化后与文件中的字节一致。
+    未安装 TensorFlow 时返回 None。
+    """
+    try:
+        import tensorflow as tf
+    except ImportError:
+        return None
+    ours = list(iter_tfrecords(path))
+    theirs = [r.numpy() for r in tf.data.TFRecordDataset(str(path))]
+    if ours != theirs:
+        return False
+    for record in ours:
+        example = tf.train.Example()
+        example.ParseFromString(record)
+        if example.SerializeToString(deterministic=True) != record:
+            return False
+    return True
@@ -14,4 +14,8 @@ def read_xml(file_path: Path) -> Optional[etree._ElementTree]:
 
 def write_xml(root: etree._Element, file_path: Path) -> None:
     tree = etree.ElementTree(root)
-    tree.write(str(file_path), pretty_print=True, xml_declaration=True, encoding="utf-8")
\ No newline at end of file
+    tree.write(str(file_path), pretty_print=True, xml_declaration=True, encoding="utf-8")
+
+
+def to_xml_bytes(root: etree._Element) -> bytes:
+    return etree.tostring(root, pretty_print=True, xml_declaration=True, encoding="utf-8")